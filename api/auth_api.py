@@ -5,8 +5,9 @@
 
 import os
 import sys
-from typing import Dict, Optional
-from fastapi import APIRouter, HTTPException, Depends, status
+import asyncio
+from typing import Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 import logging
@@ -15,13 +16,15 @@ import logging
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.logger_config import setup_logger
+from api.service_container import get_service_container, lifespan
 from services.auth_service import AuthService
-from services.data_service_v3 import DataServiceV3
+from services.password_hasher import PasswordHasherBusy
 
 logger = setup_logger('auth_api', level=logging.INFO)
 
 # 创建路由器
-router = APIRouter(prefix="/api/v3/auth", tags=["认证"])
+# 创建路由器（lifespan 在应用 include_router 时合并，worker 启动时创建共享服务）
+router = APIRouter(prefix="/api/v3/auth", tags=["认证"], lifespan=lifespan)
 
 # 安全模式
 security = HTTPBearer()
@@ -62,6 +65,9 @@ class ResetPasswordConfirmRequest(BaseModel):
     reset_token: str
     new_password: str
 
+class BulkRegisterRequest(BaseModel):
+    users: List[Dict]
+
 # 响应模型
 class AuthResponse(BaseModel):
     success: bool
@@ -75,15 +81,13 @@ class TokenResponse(BaseModel):
     expires_in: int
     user: Dict
 
+# 可以批量导入用户的角色
+BULK_REGISTER_ROLES = ('admin', 'principal')
+
 # 依赖注入
-def get_auth_service():
-    """获取认证服务实例"""
-    data_service = DataServiceV3()
-    auth_service = AuthService(data_service)
-    try:
-        yield auth_service
-    finally:
-        auth_service.close()
+def get_auth_service() -> AuthService:
+    """获取 worker 内共享的认证服务实例（由服务容器在启动时创建）"""
+    return get_service_container().auth_service
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security),
                     auth_service: AuthService = Depends(get_auth_service)) -> Dict:
@@ -100,6 +104,14 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     
     return payload
 
+def _busy_exception(detail: str) -> HTTPException:
+    """密码哈希队列已满时返回503，让客户端稍后重试"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": "1"},
+    )
+
 # API端点
 @router.post("/register", response_model=AuthResponse)
 async def register_user(
@@ -127,7 +139,7 @@ async def register_user(
     """
     try:
         user_data = request.dict()
-        success, message, user_info = auth_service.register_user(user_data)
+        success, message, user_info = await auth_service.register_user_async(user_data)
         
         if success:
             return AuthResponse(
@@ -143,6 +155,8 @@ async def register_user(
             
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise _busy_exception("注册请求过多，请稍后重试")
     except Exception as e:
         logger.error(f"用户注册异常: {e}")
         raise HTTPException(
@@ -162,7 +176,7 @@ async def login_user(
     - **password**: 密码
     """
     try:
-        success, message, auth_data = auth_service.login_user(
+        success, message, auth_data = await auth_service.login_user_async(
             request.email, 
             request.password
         )
@@ -181,6 +195,8 @@ async def login_user(
             
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise _busy_exception("登录请求过多，请稍后重试")
     except Exception as e:
         logger.error(f"用户登录异常: {e}")
         raise HTTPException(
@@ -405,6 +421,27 @@ async def get_current_user_info(
             detail="获取用户信息过程中发生错误"
         )
 
+@router.get("/session-metrics", response_model=AuthResponse)
+async def get_session_metrics(
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    会话表规模和清理速度
+    
+    需要管理员的访问令牌
+    """
+    if current_user.get('role') != 'admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="没有查看会话指标的权限"
+        )
+    metrics = await asyncio.to_thread(get_service_container().reaper.metrics)
+    return AuthResponse(
+        success=True,
+        message="获取会话指标成功",
+        data=metrics
+    )
+
 @router.post("/validate-token", response_model=AuthResponse)
 async def validate_token(
     current_user: Dict = Depends(get_current_user)
@@ -422,4 +459,80 @@ async def validate_token(
             'role': current_user.get('role'),
             'permissions': current_user.get('permissions', [])
         }
-    ) 
\ No newline at end of file
+    ) 
+
+async def _bulk_register(auth_service: AuthService, current_user: Dict, rows: List[Dict]) -> AuthResponse:
+    """校验权限后在线程中执行批量注册，返回逐行结果"""
+    if current_user.get('role') not in BULK_REGISTER_ROLES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="没有批量导入用户的权限"
+        )
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="名单为空"
+        )
+    
+    report = await asyncio.to_thread(auth_service.bulk_register_users, rows)
+    return AuthResponse(
+        success=report['created'] > 0 or report['total'] == 0,
+        message=f"成功导入 {report['created']}/{report['total']} 个用户",
+        data=report
+    )
+
+@router.post("/bulk-register", response_model=AuthResponse)
+async def bulk_register_users(
+    request: BulkRegisterRequest,
+    current_user: Dict = Depends(get_current_user),
+    auth_service: AuthService = Depends(get_auth_service)
+):
+    """
+    批量注册用户（JSON名单）
+    
+    - **users**: 用户列表，字段同 /register
+    
+    需要管理员或校长的访问令牌；返回每一行的导入结果和导入速度
+    """
+    try:
+        return await _bulk_register(auth_service, current_user, request.users)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量注册异常: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="批量注册过程中发生错误"
+        )
+
+@router.post("/bulk-register/upload", response_model=AuthResponse)
+async def bulk_register_upload(
+    file: UploadFile = File(...),
+    current_user: Dict = Depends(get_current_user),
+    auth_service: AuthService = Depends(get_auth_service)
+):
+    """
+    上传名单文件批量注册用户
+    
+    - **file**: CSV（表头为字段名，列表字段用分号分隔）或 JSON 文件
+    
+    需要管理员或校长的访问令牌
+    """
+    try:
+        fmt = 'json' if (file.filename or '').lower().endswith('.json') or file.content_type == 'application/json' else 'csv'
+        try:
+            rows = AuthService.parse_roster(await file.read(), fmt)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"名单解析失败: {e}"
+            )
+        return await _bulk_register(auth_service, current_user, rows)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量注册异常: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="批量注册过程中发生错误"
+        )
@@ -0,0 +1,130 @@
+"""
+API服务容器
+每个 worker 进程在启动时创建一次数据库引擎、DataServiceV3 和 AuthService，
+所有请求共享同一个连接池；关闭时停止会话清理线程并释放连接
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from core.resources import get_registry
+from services.auth_service import AuthService
+from services.data_service_v3 import DataServiceV3
+from services.session_reaper import SessionReaper, get_session_reaper
+
+logger = setup_logger('service_container', level=logging.INFO)
+
+# 是否在API进程内运行会话清理线程；默认关闭，由 scripts/reap_sessions.py 定时任务清理。
+# 开启后每个worker都会启动清理线程，但每轮只有拿到咨询锁的一个执行
+SESSION_REAPER_ENABLED = os.getenv('SESSION_REAPER_ENABLED', 'false').lower() == 'true'
+
+
+class ServiceContainer:
+    """持有 worker 生命周期内共享的服务实例"""
+
+    def __init__(self, data_service: DataServiceV3 = None, auth_service: AuthService = None,
+                 reaper: SessionReaper = None, start_reaper: bool = SESSION_REAPER_ENABLED):
+        """
+        Args:
+            data_service: 数据服务，为空时在 startup 中基于共享的数据库引擎创建
+            auth_service: 认证服务，为空时在 startup 中创建
+            reaper: 会话清理器，为空时使用进程内共享的清理器
+            start_reaper: 是否在 startup 中启动会话清理线程
+        """
+        self._data_service = data_service
+        self._auth_service = auth_service
+        self._reaper = reaper
+        self.start_reaper = start_reaper
+        self._lock = threading.Lock()
+        self.started = False
+
+    def startup(self):
+        """创建共享的服务实例（重复调用无副作用）"""
+        with self._lock:
+            if self.started:
+                return
+            if self._data_service is None:
+                self._data_service = DataServiceV3(engine=get_registry().get('db_engine'))
+            if self._auth_service is None:
+                self._auth_service = AuthService(self._data_service)
+            if self._reaper is None:
+                self._reaper = get_session_reaper()
+            if self.start_reaper:
+                self._reaper.start()
+            self.started = True
+            logger.info("API服务容器已启动")
+
+    def shutdown(self):
+        """停止后台线程并关闭数据库连接池"""
+        with self._lock:
+            if not self.started:
+                return
+            if self.start_reaper:
+                self._reaper.stop()
+            self._auth_service.close()
+            get_registry().reset('db_engine')
+            self.started = False
+            logger.info("API服务容器已关闭")
+
+    def _ensure_started(self):
+        # 未经过 lifespan（如路由器挂载在没有启动事件的应用上）时按需启动
+        if not self.started:
+            self.startup()
+
+    @property
+    def data_service(self) -> DataServiceV3:
+        self._ensure_started()
+        return self._data_service
+
+    @property
+    def auth_service(self) -> AuthService:
+        self._ensure_started()
+        return self._auth_service
+
+    @property
+    def reaper(self) -> SessionReaper:
+        self._ensure_started()
+        return self._reaper
+
+
+_container: Optional[ServiceContainer] = None
+_container_lock = threading.Lock()
+
+
+def get_service_container() -> ServiceContainer:
+    """获取当前 worker 进程的服务容器"""
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = ServiceContainer()
+    return _container
+
+
+def set_service_container(container: Optional[ServiceContainer]):
+    """替换当前进程的服务容器（测试或自定义装配时使用）"""
+    global _container
+    with _container_lock:
+        _container = container
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan：worker 启动时创建服务，退出时释放"""
+    container = get_service_container()
+    # 创建引擎会测试数据库连接，放到线程中避免阻塞事件循环
+    await asyncio.to_thread(container.startup)
+    app.state.services = container
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(container.shutdown)
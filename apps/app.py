@@ -1,22 +1,18 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
-from streamlit_lottie import st_lottie
 import requests
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from PIL import Image
-import json
 import uuid
-import re
 from dotenv import load_dotenv
 import logging
 from core import logger_config
 from streamlit_elements import elements, mui, html
 from typing import List, Dict
 from datetime import datetime
-import pandas as pd
 from components.ui_components import (
     render_stats_overview, render_subject_distribution_chart, 
     render_activity_trend_chart, render_filter_panel,
@@ -28,10 +24,17 @@ logger_config.setup_logging()
 logger = logging.getLogger(__name__)
 
 # --- 只从服务层导入 --- 
-from services import storage_service, ocr_service, llm_service
+from services import storage_service
+from services.search_pipeline import search_pipeline
 from services.data_service import data_service
 from core import user_management as um
+from core.lazy_imports import lazy_import
 
+# 只在统计页用到
+pd = lazy_import('pandas')
+
+# 动画数据不随会话变化，每个进程只请求一次
+@st.cache_data(ttl=3600, show_spinner=False)
 def load_lottieurl(url: str):
     try:
         r = requests.get(url, timeout=5)
@@ -45,65 +48,12 @@ def load_lottieurl(url: str):
 
 # --- 核心业务逻辑 (可被独立测试) ---
 def intelligent_search_logic(user: dict, image_path: str, force_new_analysis: bool = False):
-    logger.info(f"xxxxxStarting intelligent_search_logic for user {user['id']}. Image path: {image_path}, Force new: {force_new_analysis}")
-    
-    # 首先进行OCR识别
-    logger.info("1111Starting OCR process...")
-    ocr_text_list = ocr_service.get_text_from_image(image_path)
-    logger.info(f"OCR识别结果: {ocr_text_list}")
-    ocr_text = '\n'.join(ocr_text_list)
-    logger.info(f"OCR识别出的文字如下: {ocr_text}")
-    
-    # 检查OCR结果是否有效
-    if not ocr_text.strip() or ocr_text_list[0] in ["识别失败", "识别异常"]:
-        logger.error(f"OCR failed for image: {image_path}, result: {ocr_text}")
-        return None, "文字识别失败或图片为空，请确保图片清晰。", None, None
-    
-    logger.info(f"zzzzzOCR successful, text: {ocr_text[:100]}...")
-    
-    # 如果不是强制重新分析，尝试从缓存获取
-    if not force_new_analysis:
-        # L1缓存：通过图片phash查找
-        existing_question = storage_service.get_question_by_phash(image_path)
-        if existing_question and existing_question.get('master_analysis'):
-            logger.info(f"L1 Cache HIT. Question ID: {existing_question['question_id']}")
-            storage_service.save_submission(user['id'], existing_question['question_id'], "(Image match)")
-            # 返回新OCR的结果，而不是历史数据中的canonical_text
-            return existing_question['master_analysis'], ocr_text, "phash_hit", existing_question['question_id']
-        
-        # L2缓存：通过文本hash查找
-        question_id_from_text = storage_service.generate_question_id(ocr_text)
-        existing_question = storage_service.get_question_by_id(question_id_from_text)
-        if existing_question and existing_question.get('master_analysis'):
-            logger.info(f"L2 Cache HIT based on text hash. Question ID: {question_id_from_text}")
-            # 将新图片的phash关联到现有问题
-            storage_service.add_question(ocr_text, existing_question['master_analysis'], image_path, question_id_from_text)
-            storage_service.save_submission(user['id'], question_id_from_text, ocr_text)
-            return existing_question['master_analysis'], ocr_text, "text_hash_hit", question_id_from_text
-
-    # 缓存未命中或强制重新分析，调用大模型
-    question_id_from_text = storage_service.generate_question_id(ocr_text)
-    logger.info(f"Cache MISS or force new analysis. Calling LLM service for Question ID: {question_id_from_text}")
-    
-    analysis_str = llm_service.get_analysis_for_text(ocr_text)
-    match = re.search(r'```json\n({[\s\S]*?})\n```', analysis_str)
-    try:
-        master_analysis = json.loads(match.group(1) if match else analysis_str)
-    except json.JSONDecodeError:
-        logger.error(f"Failed to parse LLM JSON response: {analysis_str}", exc_info=True)
-        return None, f"AI分析结果解析失败: {analysis_str}", None, None
-    
-    # 保存新的分析结果
-    success = storage_service.add_question(ocr_text, master_analysis, image_path, question_id_from_text)
-    if success:
-        storage_service.save_submission(user['id'], question_id_from_text, ocr_text)
-        logger.info(f"Successfully added new question to bank: {question_id_from_text}")
-        cache_status = "miss"
-    else:
-        logger.error(f"Failed to save question data: {question_id_from_text}")
-        return None, "保存分析结果失败，请重试。", None, None
-        
-    return master_analysis, ocr_text, cache_status, question_id_from_text
+    """phash、OCR和文本缓存查询在流水线中并发执行，任一级缓存命中即返回。"""
+    logger.info(f"Starting intelligent_search_logic for user {user['id']}. Image path: {image_path}, Force new: {force_new_analysis}")
+    result = search_pipeline.run(user, image_path, force_new_analysis=force_new_analysis)
+    if not result.analysis:
+        return None, result.error, None, None
+    return result.analysis, result.ocr_text, result.cache_status, result.question_id
 
 # --- UI 渲染函数 ---
 def render_analysis_results(master_analysis, user, question_id, ocr_text):
@@ -183,6 +133,15 @@ def intelligent_search_page():
             elif cache_status == 'text_hash_hit':
                 st.success("⚡️ 题目内容已识别！")
                 st.info("虽然图片是新的，但我们做过这道题。")
+            elif cache_status == 'semantic_hit':
+                st.success("⚡️ 找到了高度相似的题目！")
+                st.info("已复用相似题目的讲解并重新批改了本次作答，如不符合可强制重新分析。")
+            elif cache_status == 'local_grade':
+                st.success("⚡️ 基础运算题，已即时批改！")
+                st.info("由本地判题引擎精确计算，如需更详细的讲解可强制重新分析。")
+            elif cache_status == 'stem_hit':
+                st.success("⚡️ 这道题我们分析过！")
+                st.info("复用了题目讲解，只重新批改了您的答案。")
             else:
                 st.info("✨ 全新题目！已为您永久存入知识库！")
             
@@ -206,6 +165,7 @@ def home():
     lottie_url = "https://lottie.host/embed/a7b5c79a-18c7-4bb9-9a24-9aacb741b330/2Jp4k5t9kM.json"
     lottie_json = load_lottieurl(lottie_url)
     if lottie_json:
+        from streamlit_lottie import st_lottie
         st_lottie(lottie_json, speed=1, width=600, height=300, key="study_lottie")
     st.markdown(
         """
@@ -8,17 +8,13 @@ and the non-intrusive debug panel.
 
 import streamlit as st
 from streamlit_option_menu import option_menu
-from streamlit_lottie import st_lottie
 import requests
 import os
 from PIL import Image
-import json
 import uuid
-import re
 from dotenv import load_dotenv
 import logging
 import sys
-import pandas as pd
 from datetime import datetime
 
 # --- Path Setup ---
@@ -35,7 +31,8 @@ from core import user_management_v2 as um
 from core.ai_services import get_vector_service, get_ocr_engine
 
 # --- Service Imports ---
-from services import storage_service, llm_service, mistake_book_service, ocr_service
+from services import storage_service, ocr_service
+from services.search_pipeline import search_pipeline
 from services.data_service import data_service
 
 # --- UI/Component Imports ---
@@ -61,44 +58,14 @@ def load_lottieurl(url: str):
 
 # --- Core Logic (Backend) ---
 def intelligent_search_logic(user: dict, image_path: str, ocr_text: str, force_new_analysis: bool = False):
-    logs = [f"Starting AI analysis for user {user['id']}..."]
-    question_id = storage_service.generate_question_id(ocr_text)
-    
-    # --- Step 1: Check Cache First (The Correct Logic) ---
-    if not force_new_analysis:
-        cached_q = storage_service.get_question_by_id(question_id)
-        if cached_q:
-            logs.append(f"1. Cache HIT for question_id: {question_id}")
-            storage_service.save_submission(user['id'], question_id, ocr_text)
-            # Return immediately with cached data. No LLM call is made.
-            return cached_q['master_analysis'], ocr_text, "cache_hit", question_id, logs
-
-    # --- Step 2: If Cache Miss, Then and Only Then Call LLM ---
-    logs.append(f"1. Cache MISS for question_id: {question_id}. Calling LLM...")
-    
-    # This is the slow part, now only executed on a cache miss
-    analysis_str = llm_service.get_analysis_for_text(ocr_text)
-    logs.append(f"2. LLM Raw Response (first 200 chars): {analysis_str[:200]}")
-    
-    try:
-        match = re.search(r'```json\n({[\s\S]*?})\n```', analysis_str)
-        if not match:
-            logs.append(f"ERROR: LLM response did not contain a valid JSON block. Response: {analysis_str}")
-            return None, "AI结果格式错误", None, None, logs
-        master_analysis = json.loads(match.group(1))
-    except json.JSONDecodeError:
-        logs.append(f"ERROR: Failed to parse JSON from LLM response. Response: {analysis_str}")
-        return None, "AI结果解析失败", None, None, logs
-
-    logs.append("3. Saving new results to cache...")
-    success = storage_service.add_question(ocr_text, master_analysis, image_path, question_id)
-    if success:
-        storage_service.save_submission(user['id'], question_id, ocr_text)
-        mistake_book_service.add_mistake_if_incorrect(user['id'], question_id, master_analysis, ocr_text)
-        return master_analysis, ocr_text, "miss", question_id, logs
-    else:
-        logs.append("ERROR: Failed to save results to storage.")
-        return None, "保存结果失败", None, None, logs
+    # 文本由用户确认过，流水线只并发计算phash（用于入库）和文本/语义缓存查询
+    result = search_pipeline.run(user, image_path, ocr_text=ocr_text, force_new_analysis=force_new_analysis,
+                                 record_mistakes=True)
+    if not result.analysis:
+        return None, result.error, None, None, result.logs
+    # 精确文本命中沿用本页面的状态名
+    cache_status = "cache_hit" if result.cache_status == "text_hash_hit" else result.cache_status
+    return result.analysis, result.ocr_text, cache_status, result.question_id, result.logs
 
 # --- Page Rendering Functions ---
 
@@ -216,6 +183,12 @@ def intelligent_search_page():
                 status = st.session_state.analysis_results[2] # ('cache_hit' or 'miss')
                 if status == 'cache_hit':
                     st.success("分析完成！结果来自您的专属知识库。")
+                elif status == 'semantic_hit':
+                    st.success("分析完成！结果来自知识库中高度相似的题目。")
+                elif status == 'local_grade':
+                    st.success("分析完成！基础运算题已由本地判题引擎即时批改。")
+                elif status == 'stem_hit':
+                    st.success("分析完成！题目讲解来自知识库，已为您单独批改答案。")
                 else:
                     st.success("AI导师分析完成！结果已为您永久保存。")
     
@@ -23,6 +23,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core import logger_config
 from core import user_management_v2 as um
 from components.page_manager import page_manager
+from core.resources import warmup_from_env
 
 # 初始化
 logger_config.setup_logging()
@@ -35,6 +36,8 @@ class StudyHelperApp:
     def __init__(self):
         self.setup_page_config()
         self.initialize_session_state()
+        # OCR模型等进程级资源只加载一次，按 RESOURCE_WARMUP 在后台提前加载
+        warmup_from_env()
         logger.info("StudyHelper应用初始化完成")
     
     def setup_page_config(self):
@@ -4,10 +4,7 @@
 """
 
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
-import pandas as pd
 from typing import Dict, List, Any, Optional
 import json
 
@@ -15,9 +12,14 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from core.lazy_imports import lazy_import
 from core.user_management_v2 import user_management_v2
 from services.data_service import DataService
 
+# 图表和表格库只在渲染时导入
+px = lazy_import('plotly.express')
+pd = lazy_import('pandas')
+
 class GradeManagerDashboard:
     """年级主任仪表盘类"""
     
@@ -4,19 +4,21 @@
 """
 
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import pandas as pd
 from typing import Dict, List, Any, Optional
 import json
 
+from core.lazy_imports import lazy_import
 from core.user_management_v2 import user_management_v2
 from services.data_service import DataService
+from recommender.recommender import recommend_for_user
+
+# 图表和表格库只在渲染时导入
+go = lazy_import('plotly.graph_objects')
 
 class StudentDashboard:
     """学生仪表盘类"""
@@ -149,30 +151,11 @@ class StudentDashboard:
             st.warning("无法获取用户信息")
             return
         
-        # 模拟推荐练习数据
-        recommendations = [
-            {
-                'type': '基于错题推荐',
-                'count': 3,
-                'subjects': ['数学', '语文'],
-                'difficulty': '中等',
-                'description': '针对你最近的错题类型'
-            },
-            {
-                'type': '知识点巩固',
-                'count': 2,
-                'subjects': ['数学'],
-                'difficulty': '基础',
-                'description': '巩固分数计算基础'
-            },
-            {
-                'type': '难度提升',
-                'count': 1,
-                'subjects': ['数学'],
-                'difficulty': '困难',
-                'description': '挑战几何应用题'
-            }
-        ]
+        # 根据错题本中的薄弱知识点推荐练习题
+        recommendations = recommend_for_user(user_id, k=5)
+        if not recommendations:
+            st.info("暂无推荐练习，先去拍题练习吧！")
+            return
         
         # 显示推荐练习
         for rec in recommendations:
@@ -180,15 +163,15 @@ class StudentDashboard:
                 col1, col2 = st.columns([3, 1])
                 
                 with col1:
-                    st.write(f"**{rec['type']}**")
-                    st.write(f"📝 {rec['description']}")
-                    st.write(f"📚 学科：{', '.join(rec['subjects'])}")
-                    st.write(f"🎯 难度：{rec['difficulty']}")
+                    st.write(f"**{rec['reason']}**")
+                    st.write(f"📝 {rec['question']}")
+                    st.write(f"📚 学科：{rec.get('subject') or '未知'}　🧩 知识点：{rec['knowledge_point']}")
+                    if rec.get('difficulty') is not None:
+                        st.write(f"🎯 难度：{rec['difficulty']}")
                 
                 with col2:
-                    st.write(f"**{rec['count']}题**")
-                    if st.button(f"开始练习", key=f"practice_{rec['type']}"):
-                        st.success(f"开始{rec['type']}练习！")
+                    if st.button(f"开始练习", key=f"practice_{rec['id']}"):
+                        st.success(f"开始练习：{rec['knowledge_point']}！")
                 
                 st.divider()
     
@@ -4,13 +4,15 @@
 """
 
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import json
 
+from core.lazy_imports import lazy_import
+
+# 图表库只在绘图时导入
+px = lazy_import('plotly.express')
+
 # 设计系统常量
 COLORS = {
     'primary': '#1976D2',      # 教育蓝
@@ -0,0 +1,134 @@
+"""
+访问控制索引
+把学校名单（学校→年级→班级→学生）预先编译成查找结构：每个用户可见的用户集合、
+按名单顺序排列的下级用户，以及按位存储的权限，使访问检查成为一次集合/位运算
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+class PermissionBits:
+    """权限名到位的映射，新权限名第一次出现时分配下一位"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._bits: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+        for name in names:
+            self.bit(name)
+
+    def bit(self, name: str) -> int:
+        bit = self._bits.get(name)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.get(name)
+                if bit is None:
+                    bit = 1 << len(self._names)
+                    self._names.append(name)
+                    self._bits[name] = bit
+        return bit
+
+    def mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= self.bit(name)
+        return mask
+
+    def has(self, mask: int, name: str) -> bool:
+        """未登记过的权限名视为没有该权限（不分配新位）"""
+        bit = self._bits.get(name)
+        return bit is not None and bool(mask & bit)
+
+    def names(self, mask: int) -> List[str]:
+        return [name for index, name in enumerate(self._names) if mask >> index & 1]
+
+
+class AccessIndex:
+    """
+    由一份名单数据编译出的访问控制结构（只读，名单变化时整体重建）
+
+    visible[user_id] 为该用户可访问的用户id集合（不含自己时也允许访问自己）；
+    同一年级/班级的用户共享同一个集合对象
+    """
+
+    def __init__(self, data: Dict[str, Any], role_permissions: Dict[str, List[str]] = None,
+                 permission_bits: PermissionBits = None):
+        """
+        Args:
+            data: 名单数据（users / classes / grades / school_info）
+            role_permissions: 角色到权限列表的映射；为空时使用用户记录中的 permissions 字段
+            permission_bits: 权限位映射，多个索引共享时位含义一致
+        """
+        self.bits = permission_bits or PermissionBits()
+        self.role_permissions = role_permissions
+        self.school: Dict[str, Any] = data.get('school_info', {})
+        self.users: Dict[str, Dict] = {}
+        for user in data.get('users', []):
+            # 与线性查找一致：重复id取第一个
+            self.users.setdefault(user['id'], user)
+        self.classes = {cls['id']: cls for cls in reversed(data.get('classes', []))}
+        self.grades = {grade['id']: grade for grade in reversed(data.get('grades', []))}
+
+        users_by_grade = defaultdict(list)
+        students_by_grade = defaultdict(list)
+        teachers_by_grade = defaultdict(list)
+        students_by_class = defaultdict(list)
+        for user_id, user in self.users.items():
+            role = user.get('role')
+            users_by_grade[user.get('grade_id')].append(user_id)
+            if role == 'student':
+                students_by_grade[user.get('grade_id')].append(user_id)
+                students_by_class[user.get('class_id')].append(user_id)
+            elif role == 'teacher':
+                teachers_by_grade[user.get('grade_id')].append(user_id)
+
+        all_ids = frozenset(self.users)
+        all_ordered = tuple(self.users)
+        grade_visible = {key: frozenset(ids) for key, ids in users_by_grade.items()}
+        class_visible = {key: frozenset(ids) for key, ids in students_by_class.items()}
+        empty: FrozenSet[str] = frozenset()
+
+        self.visible: Dict[str, FrozenSet[str]] = {}
+        self.managed: Dict[str, Tuple[str, ...]] = {}
+        self.permission_masks: Dict[str, int] = {}
+        for user_id, user in self.users.items():
+            role = user.get('role')
+            grade_id, class_id = user.get('grade_id'), user.get('class_id')
+            if role == 'principal':
+                self.visible[user_id] = all_ids
+                self.managed[user_id] = all_ordered
+            elif role == 'grade_manager':
+                self.visible[user_id] = grade_visible.get(grade_id, empty)
+                self.managed[user_id] = (tuple(students_by_grade[grade_id] + teachers_by_grade[grade_id])
+                                         if grade_id else ())
+            elif role == 'teacher':
+                self.visible[user_id] = class_visible.get(class_id, empty)
+                self.managed[user_id] = tuple(students_by_class[class_id]) if class_id else ()
+            else:
+                self.visible[user_id] = empty
+                self.managed[user_id] = ()
+
+            if role_permissions is not None:
+                permissions = role_permissions.get(role, [])
+            else:
+                permissions = user.get('permissions') or []
+            self.permission_masks[user_id] = self.bits.mask(permissions)
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        return self.users.get(user_id)
+
+    def can_access(self, requester_id: str, target_id: str) -> bool:
+        if requester_id not in self.users or target_id not in self.users:
+            return False
+        return requester_id == target_id or target_id in self.visible[requester_id]
+
+    def managed_users(self, user_id: str) -> List[Dict]:
+        return [self.users[managed_id] for managed_id in self.managed.get(user_id, ())]
+
+    def has_permission(self, user_id: str, permission: str) -> bool:
+        return self.bits.has(self.permission_masks.get(user_id, 0), permission)
+
+    def permissions(self, user_id: str) -> List[str]:
+        return self.bits.names(self.permission_masks.get(user_id, 0))
@@ -0,0 +1,54 @@
+"""
+延迟导入工具
+plotly、pandas、chromadb、paddleocr 等重量级依赖只在某个页面或功能里用到，
+在模块顶层导入会拖慢每个 Streamlit 进程的启动；lazy_import 返回一个代理模块，
+第一次访问属性时才真正导入
+"""
+
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """第一次访问属性时才导入的模块代理"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__['_lazy_module'] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    返回 name 对应模块的延迟代理，用法与 `import name` 相同：
+
+        px = lazy_import('plotly.express')
+
+    依赖缺失时，ModuleNotFoundError 在第一次使用时抛出，而不是在导入调用方模块时
+    """
+    return LazyModule(name)
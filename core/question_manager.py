@@ -5,6 +5,7 @@ import imagehash
 from PIL import Image
 import logging
 import os
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,15 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
 BANK_FILE = os.path.join(DATA_DIR, 'question_bank.json')
 PHASH_MAP_FILE = os.path.join(DATA_DIR, 'phash_to_question_id.json')
+# Stem analyses shared by every student answer to the same question stem
+STEM_BANK_FILE = os.path.join(DATA_DIR, 'stem_bank.json')
+# The stem journal is folded into the snapshot once it grows past this size
+STEM_JOURNAL_MAX_BYTES = int(os.getenv('STEM_JOURNAL_MAX_BYTES', str(1024 * 1024)))
+_stem_lock = threading.Lock()
+# Parsed stem bank, reused until the snapshot or a journal file changes on disk
+_stem_cache = None
+_stem_cache_key = None
+_stem_cache_lock = threading.Lock()
 
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -28,11 +38,15 @@ def generate_question_id(text: str) -> str:
 def generate_phash(image_path: str) -> str:
     try:
         with Image.open(image_path) as img:
-            return str(imagehash.phash(img))
+            return phash_from_image(img)
     except Exception as e:
         logger.error(f"Failed to generate phash for {image_path}: {e}")
         return None
 
+def phash_from_image(img: Image.Image) -> str:
+    """Compute the phash of an already decoded image."""
+    return str(imagehash.phash(img))
+
 def load_bank():
     try:
         with open(BANK_FILE, 'r', encoding='utf-8') as f:
@@ -73,10 +87,9 @@ def is_valid_question_data(question_data: dict) -> bool:
     
     return True
 
-def add_question(question_id: str, text: str, analysis: dict, phash: str, image_path: str):
-    bank = load_bank()
-    phash_map = load_phash_map()
-
+def _merge_question(bank: dict, phash_map: dict, question_id: str, text: str, analysis: dict, phash: str,
+                    image_path: str) -> bool:
+    """Adds or updates one question in the loaded bank and phash map (in memory only)."""
     if not text or text in ['识别失败', '识别异常']:
         logger.warning(f"Invalid OCR text: {text}, skipping question addition")
         return False
@@ -103,18 +116,152 @@ def add_question(question_id: str, text: str, analysis: dict, phash: str, image_
     
     if phash:
         phash_map[phash] = question_id
+    return True
 
+def _save_bank(bank: dict, phash_map: dict) -> bool:
     try:
         with open(BANK_FILE, 'w', encoding='utf-8') as f:
             json.dump(bank, f, ensure_ascii=False, indent=4)
         with open(PHASH_MAP_FILE, 'w', encoding='utf-8') as f:
             json.dump(phash_map, f, ensure_ascii=False, indent=4)
-        logger.info(f"Successfully saved question {question_id} with phash {phash}")
         return True
     except Exception as e:
         logger.error(f"Failed to save question data: {e}", exc_info=True)
         return False
 
+def add_question(question_id: str, text: str, analysis: dict, phash: str, image_path: str):
+    bank = load_bank()
+    phash_map = load_phash_map()
+    if not _merge_question(bank, phash_map, question_id, text, analysis, phash, image_path):
+        return False
+    if not _save_bank(bank, phash_map):
+        return False
+    logger.info(f"Successfully saved question {question_id} with phash {phash}")
+    return True
+
+def add_questions(questions) -> int:
+    """
+    Adds many questions with a single read and write of the bank files.
+
+    Args:
+        questions: iterable of (question_id, text, analysis, phash, image_path) tuples
+
+    Returns:
+        Number of questions saved (0 if the write failed)
+    """
+    bank = load_bank()
+    phash_map = load_phash_map()
+    added = sum(_merge_question(bank, phash_map, *question) for question in questions)
+    if not added or not _save_bank(bank, phash_map):
+        return 0
+    logger.info(f"Successfully saved {added} questions")
+    return added
+
+def _stem_journal_path() -> str:
+    """Stem saves are appended to a journal next to the snapshot file."""
+    return STEM_BANK_FILE + '.log'
+
+def _replay_stem_journal(stem_bank: dict, path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt stem journal line in {path}")
+                    continue
+                entry = stem_bank.setdefault(record["stem_id"], {
+                    "stem_id": record["stem_id"],
+                    "first_seen_timestamp": record.get("timestamp"),
+                })
+                entry["stem_text"] = record.get("stem_text")
+                entry["analysis"] = record.get("analysis")
+    except FileNotFoundError:
+        pass
+
+def load_stem_bank():
+    """Loads the stem snapshot, then replays the journal (and one being compacted) on top of it."""
+    try:
+        with open(STEM_BANK_FILE, 'r', encoding='utf-8') as f:
+            stem_bank = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        stem_bank = {}
+    journal = _stem_journal_path()
+    _replay_stem_journal(stem_bank, journal + '.compacting')
+    _replay_stem_journal(stem_bank, journal)
+    return stem_bank
+
+def _file_key(path: str):
+    try:
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return (path, None, None)
+
+def _cached_stem_bank():
+    """The stem bank, reloaded only when the snapshot or journal (path, mtime, size) changes."""
+    global _stem_cache, _stem_cache_key
+    journal = _stem_journal_path()
+    key = tuple(_file_key(path) for path in (STEM_BANK_FILE, journal + '.compacting', journal))
+    if _stem_cache_key != key:
+        with _stem_cache_lock:
+            if _stem_cache_key != key:
+                _stem_cache = load_stem_bank()
+                _stem_cache_key = key
+    return _stem_cache
+
+def get_stem_analysis(stem_id: str):
+    entry = _cached_stem_bank().get(stem_id)
+    return dict(entry['analysis']) if entry and entry.get('analysis') else None
+
+def save_stem_analysis(stem_id: str, stem: str, analysis: dict):
+    """Appends one journal line; concurrent sessions never rewrite the snapshot under each other."""
+    record = {
+        "stem_id": stem_id,
+        "stem_text": stem,
+        "analysis": analysis,
+        "timestamp": datetime.datetime.now().isoformat(),
+    }
+    journal = _stem_journal_path()
+    try:
+        with _stem_lock:
+            with open(journal, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            needs_compaction = os.path.getsize(journal) >= STEM_JOURNAL_MAX_BYTES
+    except Exception as e:
+        logger.error(f"Failed to save stem analysis: {e}", exc_info=True)
+        return False
+    if needs_compaction:
+        compact_stem_bank()
+    return True
+
+def compact_stem_bank() -> bool:
+    """
+    Folds the journal into a fresh snapshot (temp file + os.replace).
+    The journal is renamed first, so saves made during compaction go to a new journal.
+    """
+    journal = _stem_journal_path()
+    compacting = journal + '.compacting'
+    tmp_path = STEM_BANK_FILE + '.tmp'
+    with _stem_lock:
+        try:
+            if not os.path.exists(compacting):
+                os.replace(journal, compacting)
+            stem_bank = load_stem_bank()
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(stem_bank, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, STEM_BANK_FILE)
+            os.remove(compacting)
+            return True
+        except FileNotFoundError:
+            return True
+        except Exception as e:
+            logger.error(f"Failed to compact stem bank: {e}", exc_info=True)
+            return False
+
 def cleanup_invalid_data():
     bank = load_bank()
     phash_map = load_phash_map()
@@ -0,0 +1,274 @@
+"""
+进程级资源注册表
+OCR引擎、向量库客户端、SQLAlchemy引擎、LLM客户端初始化代价高（加载模型、建立连接池），
+Streamlit 每次交互都会重新执行页面脚本，这些对象必须在进程内只创建一次。
+注册表负责按需创建、预热、健康检查和进程退出时的统一关闭
+"""
+
+import os
+import sys
+import time
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('resources', level=logging.INFO)
+
+# 初始化失败后，在这段时间内直接报错而不是重新加载（避免每次页面重跑都重试加载模型）
+DEFAULT_RETRY_AFTER_SECONDS = float(os.getenv('RESOURCE_RETRY_AFTER_SECONDS', '30'))
+# 应用启动时在后台预热的资源，逗号分隔，如 "ocr_engine,vector_client"
+DEFAULT_WARMUP = os.getenv('RESOURCE_WARMUP', '')
+
+
+class ResourceUnavailable(RuntimeError):
+    """资源初始化失败，且仍在重试等待期内"""
+
+
+class _Resource:
+    def __init__(self, name: str, factory: Callable[[], Any], health_check: Optional[Callable[[Any], Any]],
+                 close: Optional[Callable[[Any], Any]]):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.close = close
+        self.lock = threading.Lock()
+        self.instance = None
+        self.created = False
+        self.init_seconds = None
+        self.error: Optional[str] = None
+        self.failed_at: Optional[float] = None
+
+
+class ResourceRegistry:
+    """按名称管理进程内只创建一次的重量级对象"""
+
+    def __init__(self, retry_after_seconds: float = DEFAULT_RETRY_AFTER_SECONDS):
+        self.retry_after_seconds = retry_after_seconds
+        self._resources: Dict[str, _Resource] = {}
+        # 创建顺序，关闭时逆序
+        self._created_order: List[str] = []
+        self._lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory: Callable[[], Any], health_check: Callable[[Any], Any] = None,
+                 close: Callable[[Any], Any] = None, replace: bool = False):
+        """
+        注册资源
+
+        Args:
+            name: 资源名称
+            factory: 无参数的创建函数，失败时抛出异常
+            health_check: 接收实例的检查函数，抛异常或返回 False 视为不健康；为空时只要已创建即健康
+            close: 接收实例的关闭函数，shutdown 时调用
+            replace: 是否覆盖同名资源（已创建的旧实例会先关闭）
+        """
+        with self._lock:
+            existing = self._resources.get(name)
+            if existing is not None and not replace:
+                raise ValueError(f"资源已注册: {name}")
+        if existing is not None:
+            self._close(existing)
+        with self._lock:
+            self._resources[name] = _Resource(name, factory, health_check, close)
+
+    def _entry(self, name: str) -> _Resource:
+        entry = self._resources.get(name)
+        if entry is None:
+            raise KeyError(f"未注册的资源: {name}")
+        return entry
+
+    def get(self, name: str) -> Any:
+        """获取资源，首次调用时创建；并发调用只会创建一次"""
+        entry = self._entry(name)
+        if entry.created:
+            return entry.instance
+        with entry.lock:
+            if entry.created:
+                return entry.instance
+            if entry.failed_at is not None and time.monotonic() - entry.failed_at < self.retry_after_seconds:
+                raise ResourceUnavailable(f"{name} 初始化失败: {entry.error}")
+
+            logger.info(f"初始化资源: {name}")
+            start = time.perf_counter()
+            try:
+                instance = entry.factory()
+            except Exception as e:
+                entry.error = str(e)
+                entry.failed_at = time.monotonic()
+                logger.error(f"资源 {name} 初始化失败: {e}")
+                raise
+            entry.init_seconds = round(time.perf_counter() - start, 3)
+            entry.instance, entry.error, entry.failed_at = instance, None, None
+            entry.created = True
+            with self._lock:
+                self._created_order.append(name)
+            logger.info(f"资源 {name} 初始化完成，耗时 {entry.init_seconds}秒")
+            return instance
+
+    def peek(self, name: str) -> Any:
+        """返回已创建的实例，未创建时返回 None（不触发创建）"""
+        entry = self._entry(name)
+        return entry.instance if entry.created else None
+
+    def set(self, name: str, instance: Any):
+        """直接放入已创建好的实例（如测试或由调用方自行构造时）"""
+        entry = self._entry(name)
+        with entry.lock:
+            entry.instance, entry.error, entry.failed_at = instance, None, None
+            if not entry.created:
+                entry.created = True
+                with self._lock:
+                    self._created_order.append(name)
+
+    def names(self) -> List[str]:
+        return list(self._resources)
+
+    def warmup(self, names: Iterable[str] = None, background: bool = False) -> Dict[str, bool]:
+        """
+        预先创建资源，避免第一个用户请求承担加载耗时
+
+        Args:
+            names: 要预热的资源，为空时预热全部
+            background: 在后台线程中预热（重复调用时不会启动第二个线程），立即返回空字典
+
+        Returns:
+            {资源名: 是否成功}
+        """
+        names = list(names) if names is not None else self.names()
+        if background:
+            with self._lock:
+                if self._warmup_thread is None or not self._warmup_thread.is_alive():
+                    self._warmup_thread = threading.Thread(target=self.warmup, args=(names,),
+                                                           name='resource-warmup', daemon=True)
+                    self._warmup_thread.start()
+            return {}
+
+        results = {}
+        for name in names:
+            try:
+                self.get(name)
+                results[name] = True
+            except Exception:
+                results[name] = False
+        return results
+
+    def health(self, names: Iterable[str] = None) -> Dict[str, Dict]:
+        """
+        检查资源状态；只检查已创建的资源，不会为了检查而创建
+
+        Returns:
+            {资源名: {'initialized', 'healthy', 'init_seconds', 'error'}}
+        """
+        report = {}
+        for name in (list(names) if names is not None else self.names()):
+            entry = self._entry(name)
+            status = {'initialized': entry.created, 'healthy': False,
+                      'init_seconds': entry.init_seconds, 'error': entry.error}
+            if entry.created:
+                try:
+                    status['healthy'] = entry.health_check is None or entry.health_check(entry.instance) is not False
+                except Exception as e:
+                    status['error'] = str(e)
+            report[name] = status
+        return report
+
+    def _close(self, entry: _Resource):
+        with entry.lock:
+            if not entry.created:
+                return
+            instance = entry.instance
+            entry.instance, entry.created = None, False
+        with self._lock:
+            if entry.name in self._created_order:
+                self._created_order.remove(entry.name)
+        if entry.close is not None:
+            try:
+                entry.close(instance)
+                logger.info(f"资源 {entry.name} 已关闭")
+            except Exception as e:
+                logger.error(f"关闭资源 {entry.name} 失败: {e}")
+
+    def reset(self, name: str):
+        """关闭并丢弃某个资源，下次 get 时重新创建"""
+        entry = self._entry(name)
+        self._close(entry)
+        entry.error, entry.failed_at = None, None
+
+    def shutdown(self):
+        """按创建顺序的逆序关闭所有资源"""
+        with self._lock:
+            order = list(reversed(self._created_order))
+        for name in order:
+            self._close(self._resources[name])
+
+
+# --- 默认资源 ---
+
+def _create_ocr_engine():
+    from core.ai_services import create_ocr_engine
+    return create_ocr_engine()
+
+
+def _create_vector_client():
+    from services.vector_service import create_client
+    return create_client()
+
+
+def _create_db_engine():
+    from services.data_service_v3 import create_db_engine
+    return create_db_engine()
+
+
+def _check_db_engine(engine):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _create_llm_client():
+    from llm.gpt4_analyzer import create_client
+    return create_client()
+
+
+def register_default_resources(registry: ResourceRegistry):
+    """注册应用用到的重量级资源，所有依赖都在首次创建时才导入"""
+    registry.register('ocr_engine', _create_ocr_engine)
+    registry.register('vector_client', _create_vector_client, health_check=lambda client: client.heartbeat())
+    registry.register('db_engine', _create_db_engine, health_check=_check_db_engine,
+                      close=lambda engine: engine.dispose())
+    registry.register('llm_client', _create_llm_client, close=lambda client: client.close())
+
+
+_registry: Optional[ResourceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    """获取进程内共享的资源注册表（进程退出时自动关闭资源）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = ResourceRegistry()
+                register_default_resources(registry)
+                atexit.register(registry.shutdown)
+                _registry = registry
+    return _registry
+
+
+def get_resource(name: str) -> Any:
+    """get_registry().get(name) 的简写"""
+    return get_registry().get(name)
+
+
+def warmup_from_env():
+    """按 RESOURCE_WARMUP 环境变量在后台预热资源（应用每次重跑都可调用）"""
+    names = [name.strip() for name in DEFAULT_WARMUP.split(',') if name.strip()]
+    if names:
+        get_registry().warmup(names, background=True)
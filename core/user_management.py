@@ -1,4 +1,8 @@
 import json
+import os
+import threading
+
+from core.access_index import AccessIndex, PermissionBits
 
 DATA_FILE = '/Users/xulater/studyHelper/studyhelper-demo/studyhelper-demo-final/data/school_data.json'
 
@@ -105,14 +109,74 @@ def get_school_info():
     data = load_all_data()
     return data.get('school_info', {})
 
+# 各角色的权限列表
+ROLE_PERMISSIONS = {
+    'principal': [
+        'view_school_overview',
+        'view_all_grades',
+        'view_all_classes',
+        'view_all_teachers',
+        'view_all_students',
+        'manage_school_settings',
+        'view_school_analytics'
+    ],
+    'grade_manager': [
+        'view_grade_overview',
+        'view_grade_classes',
+        'view_grade_teachers',
+        'view_grade_students',
+        'manage_grade_settings',
+        'view_grade_analytics'
+    ],
+    'teacher': [
+        'view_class_overview',
+        'view_class_students',
+        'manage_class_settings',
+        'view_class_analytics',
+        'view_student_details'
+    ],
+    'student': [
+        'view_own_profile',
+        'view_own_submissions',
+        'view_own_analytics',
+        'upload_questions'
+    ],
+}
+
+PERMISSION_BITS = PermissionBits(name for permissions in ROLE_PERMISSIONS.values() for name in permissions)
+
+_access_index = None
+_access_index_key = None
+_access_index_lock = threading.Lock()
+
+def get_access_index():
+    """获取编译好的访问控制索引，数据文件（路径、修改时间、大小）变化时重建。"""
+    global _access_index, _access_index_key
+    stat = os.stat(DATA_FILE)
+    key = (DATA_FILE, stat.st_mtime_ns, stat.st_size)
+    if _access_index_key != key:
+        with _access_index_lock:
+            if _access_index_key != key:
+                _access_index = AccessIndex(load_all_data(), ROLE_PERMISSIONS, PERMISSION_BITS)
+                _access_index_key = key
+    return _access_index
+
+def invalidate_access_index():
+    """丢弃访问控制索引（在同一时间戳内改写数据文件时使用）。"""
+    global _access_index, _access_index_key
+    with _access_index_lock:
+        _access_index = None
+        _access_index_key = None
+
 def get_user_hierarchy(user_id):
     """获取用户的层级信息（班级、年级、学校）。"""
-    user = get_user_by_id(user_id)
+    index = get_access_index()
+    user = index.get_user(user_id)
     if not user:
         return None
     
     hierarchy = {
-        'user': user,
+        'user': dict(user),
         'class': None,
         'grade': None,
         'school': None
@@ -120,119 +184,40 @@ def get_user_hierarchy(user_id):
     
     # 获取班级信息
     if user.get('class_id'):
-        all_classes = get_all_classes()
-        hierarchy['class'] = next((cls for cls in all_classes if cls['id'] == user['class_id']), None)
+        cls = index.classes.get(user['class_id'])
+        hierarchy['class'] = dict(cls) if cls else None
     
     # 获取年级信息
     if user.get('grade_id'):
-        all_grades = get_all_grades()
-        hierarchy['grade'] = next((grade for grade in all_grades if grade['id'] == user['grade_id']), None)
+        grade = index.grades.get(user['grade_id'])
+        hierarchy['grade'] = dict(grade) if grade else None
     
     # 获取学校信息
     if user.get('school_id'):
-        hierarchy['school'] = get_school_info()
+        hierarchy['school'] = dict(index.school)
     
     return hierarchy
 
 def get_managed_users(user_id):
-    """获取用户管理的所有下级用户。"""
-    user = get_user_by_id(user_id)
-    if not user:
-        return []
-    
-    role = user.get('role')
-    managed_users = []
-    
-    if role == 'principal':
-        # 校长管理全校用户
-        managed_users = get_all_users()
-    elif role == 'grade_manager':
-        # 年级主任管理本年级用户
-        grade_id = user.get('grade_id')
-        if grade_id:
-            managed_users = get_students_by_grade(grade_id)
-            # 添加本年级的老师
-            managed_users.extend(get_teachers_by_grade(grade_id))
-    elif role == 'teacher':
-        # 老师管理本班学生
-        class_id = user.get('class_id')
-        if class_id:
-            managed_users = get_students_by_class(class_id)
-    
-    return managed_users
+    """获取用户管理的所有下级用户（校长：全校；年级主任：本年级学生和老师；老师：本班学生）。"""
+    return [dict(user) for user in get_access_index().managed_users(user_id)]
 
 def get_user_permissions(user_id):
     """获取用户的权限列表。"""
-    user = get_user_by_id(user_id)
+    user = get_access_index().get_user(user_id)
     if not user:
         return []
-    
-    role = user.get('role')
-    permissions = []
-    
-    if role == 'principal':
-        permissions = [
-            'view_school_overview',
-            'view_all_grades',
-            'view_all_classes', 
-            'view_all_teachers',
-            'view_all_students',
-            'manage_school_settings',
-            'view_school_analytics'
-        ]
-    elif role == 'grade_manager':
-        permissions = [
-            'view_grade_overview',
-            'view_grade_classes',
-            'view_grade_teachers',
-            'view_grade_students',
-            'manage_grade_settings',
-            'view_grade_analytics'
-        ]
-    elif role == 'teacher':
-        permissions = [
-            'view_class_overview',
-            'view_class_students',
-            'manage_class_settings',
-            'view_class_analytics',
-            'view_student_details'
-        ]
-    elif role == 'student':
-        permissions = [
-            'view_own_profile',
-            'view_own_submissions',
-            'view_own_analytics',
-            'upload_questions'
-        ]
-    
-    return permissions
+    return list(ROLE_PERMISSIONS.get(user.get('role'), []))
+
+def has_permission(user_id, permission):
+    """检查用户是否拥有某项权限。"""
+    return get_access_index().has_permission(user_id, permission)
 
 def can_access_user_data(requester_id, target_user_id):
-    """检查用户是否有权限访问目标用户的数据。"""
-    requester = get_user_by_id(requester_id)
-    target = get_user_by_id(target_user_id)
-    
-    if not requester or not target:
-        return False
-    
-    # 自己可以访问自己的数据
-    if requester_id == target_user_id:
-        return True
-    
-    requester_role = requester.get('role')
-    target_role = target.get('role')
-    
-    # 校长可以访问所有用户数据
-    if requester_role == 'principal':
-        return True
-    
-    # 年级主任可以访问本年级用户数据
-    if requester_role == 'grade_manager':
-        return (requester.get('grade_id') == target.get('grade_id'))
-    
-    # 老师可以访问本班学生数据
-    if requester_role == 'teacher':
-        return (target_role == 'student' and 
-                requester.get('class_id') == target.get('class_id'))
-    
-    return False
+    """
+    检查用户是否有权限访问目标用户的数据。
+
+    自己可以访问自己的数据；校长可以访问所有用户；年级主任可以访问本年级用户；
+    老师可以访问本班学生。
+    """
+    return get_access_index().can_access(requester_id, target_user_id)
@@ -6,19 +6,37 @@
 
 import json
 import os
+import threading
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import logging
 
+from core.access_index import AccessIndex
+
 logger = logging.getLogger(__name__)
 
+# 最后登录时间日志超过该行数时压缩为每个用户一行
+LAST_LOGIN_COMPACT_LINES = int(os.getenv('LAST_LOGIN_COMPACT_LINES', '2000'))
+
 class UserManagementV2:
     """升级版用户管理类"""
     
-    def __init__(self, data_file: str = 'data/school_data_v2.json'):
+    def __init__(self, data_file: str = 'data/school_data_v2.json', last_login_file: str = None):
+        """
+        Args:
+            data_file: 学校名单数据文件
+            last_login_file: 最后登录时间日志（每行一条JSON记录），默认与数据文件同目录；
+                读取名单时合并，登录时只追加一行，不重写名单文件
+        """
         self.data_file = data_file
+        self.last_login_file = last_login_file or os.path.splitext(data_file)[0] + '.last_login.jsonl'
         self._data = None
         self._cache_timestamp = None
+        self._last_logins: Dict[str, str] = {}
+        self._last_login_lines = 0
+        self._lock = threading.Lock()
+        self._access_index: Optional[AccessIndex] = None
+        self._access_index_source = None
     
     def _load_data(self) -> Dict[str, Any]:
         """加载数据文件"""
@@ -38,12 +56,47 @@ class UserManagementV2:
             logger.error(f"加载数据文件失败: {e}")
             raise
     
+    def _load_last_logins(self) -> Dict[str, str]:
+        """读取最后登录时间日志，同一用户取最新时间"""
+        last_logins, lines = {}, 0
+        if os.path.exists(self.last_login_file):
+            with open(self.last_login_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 进程中断时可能留下不完整的一行
+                        continue
+                    lines += 1
+                    if entry['last_login'] > last_logins.get(entry['id'], ''):
+                        last_logins[entry['id']] = entry['last_login']
+        self._last_login_lines = lines
+        return last_logins
+    
     def _get_data(self) -> Dict[str, Any]:
-        """获取数据（带缓存）"""
+        """获取数据（带缓存，合并最后登录时间日志）"""
         if self._data is None:
-            self._data = self._load_data()
+            with self._lock:
+                if self._data is None:
+                    data = self._load_data()
+                    self._last_logins = self._load_last_logins()
+                    for user in data.get('users', []):
+                        last_login = self._last_logins.get(user['id'])
+                        if last_login and last_login > (user.get('last_login') or ''):
+                            user['last_login'] = last_login
+                    self._data = data
         return self._data
     
+    def _get_access_index(self) -> AccessIndex:
+        """获取访问控制索引（按id查用户、权限位），名单重新加载后重建"""
+        data = self._get_data()
+        if self._access_index_source is not data:
+            with self._lock:
+                if self._access_index_source is not data:
+                    self._access_index = AccessIndex(data)
+                    self._access_index_source = data
+        return self._access_index
+    
     def get_all_users(self) -> List[Dict[str, Any]]:
         """获取所有用户列表"""
         data = self._get_data()
@@ -51,11 +104,7 @@ class UserManagementV2:
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """根据ID查找用户"""
-        users = self.get_all_users()
-        for user in users:
-            if user['id'] == user_id:
-                return user
-        return None
+        return self._get_access_index().get_user(user_id)
     
     def get_users_by_role(self, role: str) -> List[Dict[str, Any]]:
         """根据角色获取用户列表"""
@@ -207,8 +256,7 @@ class UserManagementV2:
     
     def has_permission(self, user_id: str, permission: str) -> bool:
         """检查用户是否有指定权限"""
-        permissions = self.get_user_permissions(user_id)
-        return permission in permissions
+        return self._get_access_index().has_permission(user_id, permission)
     
     def get_user_hierarchy(self, user_id: str) -> Dict[str, Any]:
         """获取用户的层级关系"""
@@ -254,29 +302,45 @@ class UserManagementV2:
         return user.get('learning_stats', {})
     
     def update_user_last_login(self, user_id: str) -> bool:
-        """更新用户最后登录时间"""
+        """
+        更新用户最后登录时间
+        
+        只在最后登录时间日志中追加一行并更新内存中的用户记录，名单文件保持不变
+        """
         try:
-            data = self._get_data()
-            users = data.get('users', [])
-            
-            for user in users:
-                if user['id'] == user_id:
-                    user['last_login'] = datetime.now().isoformat()
-                    user['updated_at'] = datetime.now().isoformat()
-                    break
+            user = self.get_user_by_id(user_id)
+            if not user:
+                logger.warning(f"更新登录时间时未找到用户: {user_id}")
+                return False
             
-            # 保存数据
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            # 清除缓存
-            self._data = None
+            now = datetime.now().isoformat()
+            with self._lock:
+                with open(self.last_login_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'id': user_id, 'last_login': now}, ensure_ascii=False) + '\n')
+                user['last_login'] = now
+                self._last_logins[user_id] = now
+                self._last_login_lines += 1
+                if self._last_login_lines >= LAST_LOGIN_COMPACT_LINES:
+                    self._compact_last_login_log()
             
             return True
         except Exception as e:
             logger.error(f"更新用户登录时间失败: {e}")
             return False
     
+    def _compact_last_login_log(self):
+        """把日志重写为每个用户一行（调用方持有锁）"""
+        # 重新读取日志，保留其他进程追加的记录
+        for user_id, last_login in self._load_last_logins().items():
+            if last_login > self._last_logins.get(user_id, ''):
+                self._last_logins[user_id] = last_login
+        temp_file = self.last_login_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for user_id, last_login in self._last_logins.items():
+                f.write(json.dumps({'id': user_id, 'last_login': last_login}, ensure_ascii=False) + '\n')
+        os.replace(temp_file, self.last_login_file)
+        self._last_login_lines = len(self._last_logins)
+    
     def get_user_summary(self, user_id: str) -> Dict[str, Any]:
         """获取用户摘要信息"""
         user = self.get_user_by_id(user_id)
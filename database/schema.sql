@@ -221,6 +221,9 @@ CREATE TABLE mistake_book_entries (
     review_count INTEGER DEFAULT 0,
     last_reviewed_at TIMESTAMP WITH TIME ZONE,
     mastery_level INTEGER DEFAULT 1 CHECK (mastery_level >= 1 AND mastery_level <= 5),
+    ease_factor REAL DEFAULT 2.5, -- SM-2 easiness factor
+    interval_days INTEGER DEFAULT 0, -- Current SM-2 review interval
+    next_review_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP, -- New entries are due immediately
     notes TEXT,
     tags JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -289,11 +292,11 @@ CREATE INDEX idx_users_class_id ON users(class_id);
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_status ON users(status);
 
--- User sessions indexes
+-- User sessions indexes (lookups only touch active sessions; expired/inactive rows are reaped)
 CREATE INDEX idx_user_sessions_user_id ON user_sessions(user_id);
-CREATE INDEX idx_user_sessions_token_hash ON user_sessions(token_hash);
+CREATE INDEX idx_user_sessions_active_refresh ON user_sessions(refresh_token_hash) WHERE is_active;
 CREATE INDEX idx_user_sessions_expires_at ON user_sessions(expires_at);
-CREATE INDEX idx_user_sessions_is_active ON user_sessions(is_active);
+CREATE INDEX idx_user_sessions_inactive ON user_sessions(updated_at) WHERE NOT is_active;
 
 -- Questions table indexes
 CREATE INDEX idx_questions_subject ON questions(subject);
@@ -323,6 +326,7 @@ CREATE INDEX idx_mistake_book_entries_user_id ON mistake_book_entries(user_id);
 CREATE INDEX idx_mistake_book_entries_subject ON mistake_book_entries(subject);
 CREATE INDEX idx_mistake_book_entries_knowledge_point ON mistake_book_entries(knowledge_point);
 CREATE INDEX idx_mistake_book_entries_mastery_level ON mistake_book_entries(mastery_level);
+CREATE INDEX idx_mistake_book_entries_user_next_review ON mistake_book_entries(user_id, next_review_at);
 
 -- Analytics indexes
 CREATE INDEX idx_user_learning_analytics_user_id_date ON user_learning_analytics(user_id, date);
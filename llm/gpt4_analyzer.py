@@ -26,24 +26,18 @@
 
 
 import os
+import threading
+from typing import List, Optional
 from dotenv import load_dotenv
 from openai import OpenAI
 
 # 加载 .env 文件中的环境变量
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com/v1"
-)
+ANALYSIS_SYSTEM_PROMPT = "你是一位顶级的AI分析专家，你的任务是分析题目，并严格按照用户要求的JSON格式输出，不得包含任何额外文本。"
 
-def analyze_question_with_gpt4(question_text: str) -> str:
-    prompt = f"""
-你是一位顶级的AI老师，你的任务是分析学生提交的题目并严格以JSON格式返回结果。
-
-**核心指令:** 无论任何情况，你的最终输出**必须**是一个完整的、无任何多余修饰的JSON代码块。
-
----
+# 单题分析和批量分析共用的示例
+FEW_SHOT_EXAMPLES = """---
 **示例 1: 一个错误的数学题**
 
 **输入:**
@@ -53,7 +47,7 @@ def analyze_question_with_gpt4(question_text: str) -> str:
 
 **你的输出:**
 ```json
-{{
+{
   "subject": "数学",
   "is_correct": false,
   "error_analysis": "计算错误。这道题的计算结果是错误的，1加1的正确结果应该是2，而不是3。",
@@ -61,7 +55,7 @@ def analyze_question_with_gpt4(question_text: str) -> str:
   "solution_steps": "这是一个基础的加法运算。将数字1和另一个数字1相加，根据基础加法原则，得到最终结果2。",
   "knowledge_point": "5以内的加法",
   "common_mistakes": "在初学加法时，学生可能会因为数数不准确或者对加法概念理解不清晰而犯错。反复练习是关键。"
-}}
+}
 ```
 
 ---
@@ -74,7 +68,7 @@ def analyze_question_with_gpt4(question_text: str) -> str:
 
 **你的输出:**
 ```json
-{{
+{
   "subject": "地理",
   "is_correct": true,
   "error_analysis": "",
@@ -82,12 +76,59 @@ def analyze_question_with_gpt4(question_text: str) -> str:
   "solution_steps": "这是一个关于国家首都的基本常识题。中国的首都确实是北京。",
   "knowledge_point": "世界各国首都",
   "common_mistakes": "对于中国地理不熟悉的学生，可能会将上海等经济中心误认为是首都。"
-}}
+}
 ```
 
 ---
 
-**任务开始**
+"""
+
+# 进程内累计的请求数和token用量（基准测试用）
+_usage_lock = threading.Lock()
+token_usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+DEFAULT_MODEL = "deepseek-chat"
+
+def create_client(base_url: str = DEFAULT_BASE_URL, api_key: Optional[str] = None, **options) -> OpenAI:
+    """创建 DeepSeek（或兼容OpenAI接口的）客户端；进程内共享的实例见 get_client()"""
+    return OpenAI(
+        api_key=api_key or os.getenv("DEEPSEEK_API_KEY"),
+        base_url=base_url,
+        **options
+    )
+
+
+def get_client() -> OpenAI:
+    """获取资源注册表中共享的客户端（复用HTTP连接池）"""
+    from core.resources import get_resource
+    return get_resource('llm_client')
+
+def _complete(system_prompt: str, prompt: str, temperature: float, max_tokens: int,
+              client: Optional[OpenAI] = None, model: str = DEFAULT_MODEL) -> str:
+    response = (client or get_client()).chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    usage = getattr(response, 'usage', None)
+    with _usage_lock:
+        token_usage['requests'] += 1
+        token_usage['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+        token_usage['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+    return response.choices[0].message.content.strip() if response.choices[0].message.content else ""
+
+def build_analysis_prompt(question_text: str) -> str:
+    return f"""
+你是一位顶级的AI老师，你的任务是分析学生提交的题目并严格以JSON格式返回结果。
+
+**核心指令:** 无论任何情况，你的最终输出**必须**是一个完整的、无任何多余修饰的JSON代码块。
+
+{FEW_SHOT_EXAMPLES}**任务开始**
 
 现在，请严格遵循以上示例的格式，分析以下题目。不要添加任何额外的解释、对话或说明文字，直接输出JSON代码块。
 
@@ -97,13 +138,95 @@ def analyze_question_with_gpt4(question_text: str) -> str:
 ```
 """
 
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": "你是一位顶级的AI分析专家，你的任务是分析题目，并严格按照用户要求的JSON格式输出，不得包含任何额外文本。"},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.1, # 进一步降低随机性
-        max_tokens=1500  # 稍微增加token以容纳更复杂的分析
-    )
-    return response.choices[0].message.content.strip() if response.choices[0].message.content else ""
+def analyze_question_with_gpt4(question_text: str, client: Optional[OpenAI] = None, model: str = DEFAULT_MODEL,
+                               max_tokens: int = 1500) -> str:
+    """分析单道题目；client/model 为空时使用共享客户端和默认模型（分级路由见 services/model_router.py）"""
+    return _complete(ANALYSIS_SYSTEM_PROMPT, build_analysis_prompt(question_text), temperature=0.1,
+                     max_tokens=max_tokens, client=client, model=model)
+
+
+def analyze_question_stem(stem_text: str) -> str:
+    """
+    只分析题干（不含学生答案），结果按题干缓存，同一道题的所有学生共用
+    """
+    prompt = f"""
+你是一位顶级的AI老师。下面是一道题目的题干，不包含学生的作答。请给出这道题的标准分析，并严格以JSON格式返回结果。
+
+**输出格式:**
+```json
+{{
+  "subject": "学科",
+  "correct_answer": "标准答案",
+  "solution_steps": "解题步骤",
+  "knowledge_point": "考察的知识点",
+  "common_mistakes": "学生常见的错误"
+}}
+```
+
+不要添加任何额外的解释、对话或说明文字，直接输出JSON代码块。
+
+**题干:**
+```
+{stem_text}
+```
+"""
+
+    return _complete(ANALYSIS_SYSTEM_PROMPT, prompt, temperature=0.1, max_tokens=1200)
+
+
+def check_student_answer(stem_text: str, correct_answer: str, student_answer: str) -> str:
+    """
+    对照标准答案判断学生答案是否正确（小请求，每个学生答案一次）
+    """
+    prompt = f"""题目：{stem_text}
+标准答案：{correct_answer}
+学生答案：{student_answer}
+
+判断学生答案是否正确（与标准答案等价即为正确），只输出JSON：
+{{"is_correct": true或false, "error_analysis": "答错时用一两句话指出错误原因，答对时为空字符串"}}"""
+
+    return _complete("你是一位严谨的阅卷老师，只输出JSON。", prompt, temperature=0, max_tokens=200)
+
+
+def check_submission(question_text: str, correct_answer: str) -> str:
+    """
+    对照标准答案判断整份提交（题目和学生作答在同一段文本里）是否正确；
+    语义缓存命中时只复用近似题目的讲解，对错用这个小请求重新判断
+    """
+    prompt = f"""学生提交的内容（包含题目，可能包含学生的作答）：
+{question_text}
+
+这道题的标准答案：{correct_answer}
+
+判断学生的作答是否正确；如果内容里没有单独的作答，就判断其中给出的陈述或结果是否正确。只输出JSON：
+{{"is_correct": true或false, "error_analysis": "答错时用一两句话指出错误原因，答对时为空字符串"}}"""
+
+    return _complete("你是一位严谨的阅卷老师，只输出JSON。", prompt, temperature=0, max_tokens=200)
+
+
+def build_batch_prompt(question_texts: List[str]) -> str:
+    """多道题目共用一份示例的提示词，题目从1开始编号"""
+    items = "\n\n".join(f"**题目 {i}:**\n```\n{text}\n```" for i, text in enumerate(question_texts, 1))
+    return f"""
+你是一位顶级的AI老师，你的任务是分析学生提交的题目并严格以JSON格式返回结果。
+
+**核心指令:** 无论任何情况，你的最终输出**必须**是一个完整的、无任何多余修饰的JSON代码块。
+
+{FEW_SHOT_EXAMPLES}**任务开始**
+
+下面有 {len(question_texts)} 道互相独立的题目，请按以上示例的格式逐题分析，不要让题目之间互相影响。
+把所有结果放在一个JSON数组里输出，每个元素在示例格式的基础上增加 "id" 字段，值为题目编号（整数）。
+每道题都必须有且只有一个结果。不要添加任何额外的解释、对话或说明文字，直接输出JSON代码块。
+
+{items}
+"""
+
+
+def analyze_questions_batch(question_texts: List[str], max_tokens: int = 8000) -> str:
+    """
+    一次请求分析多道互相独立的题目，示例只发送一次
+
+    Returns:
+        JSON数组代码块，每个元素是单题分析格式加上题目编号 "id"（从1开始）
+    """
+    return _complete(ANALYSIS_SYSTEM_PROMPT, build_batch_prompt(question_texts), temperature=0.1, max_tokens=max_tokens)
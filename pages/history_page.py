@@ -8,6 +8,8 @@ import logging
 from datetime import datetime
 from typing import List, Dict
 
+from services.data_service import data_service
+
 logger = logging.getLogger(__name__)
 
 def render_history_page():
@@ -24,8 +26,6 @@ def render_history_page():
     
     try:
         # 获取用户提交记录
-        from services.data_service import data_service
-        
         with st.spinner("📊 加载数据中..."):
             submissions = data_service.get_user_submissions(current_user['id'], current_user['role'])
             
@@ -255,7 +255,6 @@ def _render_grouped_view(submissions):
     st.subheader("📚 按题目分组")
     
     try:
-        from services.data_service import data_service
         grouped = data_service.group_submissions_by_question(submissions)
         
         if not grouped:
@@ -278,7 +277,6 @@ def _render_question_group(question_id, submissions):
     
     # 获取题目详情
     try:
-        from services.data_service import data_service
         question_details = data_service.get_question_details(question_id)
         
         # 使用expander显示每个题目组
@@ -365,7 +363,6 @@ def _render_timeline_item(submission):
             # 尝试从题目详情获取
             question_id = submission.get('question_id')
             if question_id:
-                from services.data_service import data_service
                 question_details = data_service.get_question_details(question_id)
                 if question_details:
                     analysis = question_details.get('master_analysis', {})
@@ -476,7 +473,6 @@ def _get_submission_subject(submission):
     question_id = submission.get('question_id')
     if question_id:
         try:
-            from services.data_service import data_service
             question_details = data_service.get_question_details(question_id)
             if question_details:
                 return question_details.get('master_analysis', {}).get('subject', '未知')
@@ -495,7 +491,6 @@ def _get_submission_correctness(submission):
     question_id = submission.get('question_id')
     if question_id:
         try:
-            from services.data_service import data_service
             question_details = data_service.get_question_details(question_id)
             if question_details:
                 return question_details.get('master_analysis', {}).get('is_correct')
@@ -4,12 +4,12 @@
 """
 
 import streamlit as st
-from streamlit_lottie import st_lottie
 import requests
 import logging
 
 logger = logging.getLogger(__name__)
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def load_lottie_animation(url: str):
     """
     加载Lottie动画
@@ -44,6 +44,7 @@ def render_home_page():
     lottie_json = load_lottie_animation(lottie_url)
     
     if lottie_json:
+        from streamlit_lottie import st_lottie
         st_lottie(lottie_json, speed=1, width=600, height=300, key="study_lottie")
     else:
         # 动画加载失败时显示静态内容
@@ -10,7 +10,8 @@ import logging
 from PIL import Image
 
 # 导入服务层
-from services import ocr_service, storage_service
+from services import storage_service
+from services.search_pipeline import search_pipeline
 from core.ai_services import get_ocr_engine
 
 logger = logging.getLogger(__name__)
@@ -87,8 +88,8 @@ def _process_uploaded_image(uploaded_file, current_user):
         st.session_state.uploaded_image_path = image_path
         logger.info(f"图片已保存到: {image_path}")
         
-        # 开始OCR识别
-        with st.spinner("🔍 正在识别图片中的文字..."):
+        # 识别并分析题目
+        with st.spinner("🔍 正在识别并分析题目..."):
             _perform_ocr_analysis(image_path, current_user)
             
     except Exception as e:
@@ -97,46 +98,22 @@ def _process_uploaded_image(uploaded_file, current_user):
 
 def _perform_ocr_analysis(image_path, current_user):
     """
-    执行OCR识别和AI分析
+    执行OCR识别和AI分析（OCR与phash、缓存查询在搜题流水线中并发执行）
     
     Args:
         image_path: 图片路径
         current_user: 当前用户信息
     """
     try:
-        # Step 1: OCR识别
-        logger.info("开始OCR文字识别")
-        ocr_result = ocr_service.get_text_from_image(image_path)
+        result = search_pipeline.run(current_user, image_path, record_mistakes=True)
         
-        if not ocr_result or ocr_result[0] in ["识别失败", "识别异常"]:
-            st.error("❌ 文字识别失败，请确保图片清晰且包含文字内容")
-            logger.warning(f"OCR识别失败: {ocr_result}")
-            return
-        
-        ocr_text = '\n'.join(ocr_result)
-        logger.info(f"OCR识别成功，文字长度: {len(ocr_text)}")
-        
-        # Step 2: AI分析
-        with st.spinner("🤖 AI正在分析题目..."):
-            from apps.app_v2 import intelligent_search_logic
-            
-            analysis, _, cache_status, question_id, logs = intelligent_search_logic(
-                current_user, image_path, ocr_text, force_new_analysis=False
-            )
-            
-            if analysis:
-                st.session_state.search_results = {
-                    'analysis': analysis,
-                    'ocr_text': ocr_text,
-                    'cache_status': cache_status,
-                    'question_id': question_id,
-                    'logs': logs
-                }
-                logger.info(f"AI分析完成，缓存状态: {cache_status}")
-                st.success("✅ 分析完成！")
-            else:
-                st.error("❌ AI分析失败，请重试")
-                logger.error("AI分析返回空结果")
+        if result.analysis:
+            _store_search_result(result)
+            logger.info(f"AI分析完成，缓存状态: {result.cache_status}，耗时: {result.elapsed_ms}ms")
+            st.success("✅ 分析完成！")
+        else:
+            st.error(f"❌ {result.error}")
+            logger.error(f"AI分析失败: {result.error}")
                 
     except Exception as e:
         logger.error(f"OCR分析过程中发生错误: {e}")
@@ -152,35 +129,31 @@ def _force_reanalyze(current_user):
     
     with st.spinner("🔄 正在重新分析..."):
         try:
-            # 重新获取OCR文本
-            ocr_result = ocr_service.get_text_from_image(st.session_state.uploaded_image_path)
-            ocr_text = '\n'.join(ocr_result) if ocr_result else ""
-            
-            # 强制重新分析
-            from apps.app_v2 import intelligent_search_logic
+            result = search_pipeline.run(current_user, st.session_state.uploaded_image_path,
+                                         force_new_analysis=True, record_mistakes=True)
             
-            analysis, _, cache_status, question_id, logs = intelligent_search_logic(
-                current_user, st.session_state.uploaded_image_path, ocr_text, force_new_analysis=True
-            )
-            
-            if analysis:
-                st.session_state.search_results = {
-                    'analysis': analysis,
-                    'ocr_text': ocr_text,
-                    'cache_status': cache_status,
-                    'question_id': question_id,
-                    'logs': logs
-                }
+            if result.analysis:
+                _store_search_result(result)
                 st.success("✅ 重新分析完成！")
                 logger.info("强制重新分析完成")
             else:
                 st.error("❌ 重新分析失败")
-                logger.error("强制重新分析失败")
+                logger.error(f"强制重新分析失败: {result.error}")
                 
         except Exception as e:
             logger.error(f"强制重新分析时发生错误: {e}")
             st.error(f"重新分析失败: {str(e)}")
 
+def _store_search_result(result):
+    """把流水线结果保存到session state"""
+    st.session_state.search_results = {
+        'analysis': result.analysis,
+        'ocr_text': result.ocr_text,
+        'cache_status': result.cache_status,
+        'question_id': result.question_id,
+        'logs': result.logs
+    }
+
 def _render_analysis_results():
     """渲染分析结果"""
     results = st.session_state.search_results
@@ -195,8 +168,16 @@ def _render_analysis_results():
     st.subheader("📋 识别结果")
     
     # 显示缓存状态
-    if cache_status == "cache_hit":
+    if cache_status == "phash_hit":
+        st.success("⚡ 图片已识别！直接展示历史分析结果")
+    elif cache_status in ("cache_hit", "text_hash_hit"):
         st.success("⚡ 缓存命中！从知识库中快速获取结果")
+    elif cache_status == "semantic_hit":
+        st.success("⚡ 语义缓存命中！已复用高度相似题目的讲解，并重新批改了本次作答")
+    elif cache_status == "local_grade":
+        st.success("⚡ 基础运算题，已由本地判题引擎即时批改")
+    elif cache_status == "stem_hit":
+        st.success("⚡ 题目讲解已在知识库中，只批改了您的答案")
     else:
         st.info("✨ 全新题目！已添加到知识库")
     
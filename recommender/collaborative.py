@@ -0,0 +1,158 @@
+"""
+基于物品的协同过滤（"做错这道题的同学也常做错那道题"）
+离线把提交记录构建为 学生 × 题目 的稀疏错题矩阵，分块计算题目之间的余弦相似度，
+每道题只保留 top-k 个邻居，保存为紧凑的 .npz 邻居表供在线推荐从内存读取
+"""
+
+import os
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_NEIGHBORS_PATH = "data/item_neighbors.npz"
+
+
+def build_struggle_matrix(batches: Iterable[Sequence[Tuple[str, str, bool]]]):
+    """
+    流式构建稀疏错题矩阵
+
+    Args:
+        batches: 批次迭代器，每批为 (user_id, question_id, is_correct) 列表
+
+    Returns:
+        (csr矩阵 学生×题目，做错过为1, user_ids, question_ids)
+    """
+    user_index: Dict[str, int] = {}
+    item_index: Dict[str, int] = {}
+    rows, cols = array('i'), array('i')
+    for batch in batches:
+        for user_id, question_id, is_correct in batch:
+            if is_correct or not user_id or not question_id:
+                continue
+            rows.append(user_index.setdefault(user_id, len(user_index)))
+            cols.append(item_index.setdefault(question_id, len(item_index)))
+
+    data = np.ones(len(rows), dtype=np.float32)
+    matrix = sparse.csr_matrix(
+        (data, (np.frombuffer(rows, dtype=np.int32), np.frombuffer(cols, dtype=np.int32))),
+        shape=(len(user_index), len(item_index))
+    )
+    # 同一学生多次做错同一题只计一次
+    matrix.data[:] = 1.0
+    return matrix, list(user_index), list(item_index)
+
+
+def compute_item_neighbors(matrix: sparse.csr_matrix, k: int = 20, min_support: int = 2,
+                           shrinkage: float = 10.0, chunk_size: int = 2048) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算每道题的 top-k 相似题
+
+    相似度为二值余弦相似度 co / sqrt(n_i * n_j)，再乘以收缩系数 co / (co + shrinkage)
+    以压低共现次数少的偶然相关；按题目分块做稀疏矩阵乘法，内存只与块大小相关
+
+    Returns:
+        (neighbors, scores)：形状均为 (n_items, k)，不足k个邻居的位置 neighbors 为 -1
+    """
+    n_items = matrix.shape[1]
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    if n_items == 0:
+        return neighbors, scores
+
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    item_user = matrix.T.tocsr()
+    user_item = matrix.tocsr()
+
+    for start in range(0, n_items, chunk_size):
+        end = min(start + chunk_size, n_items)
+        co = (item_user[start:end] @ user_item).tocsr()
+        for offset in range(end - start):
+            item = start + offset
+            lo, hi = co.indptr[offset], co.indptr[offset + 1]
+            idx, co_counts = co.indices[lo:hi], co.data[lo:hi]
+            keep = (idx != item) & (co_counts >= min_support)
+            idx, co_counts = idx[keep], co_counts[keep]
+            if len(idx) == 0:
+                continue
+            sims = co_counts / np.sqrt(counts[item] * counts[idx]) * (co_counts / (co_counts + shrinkage))
+            if len(sims) > k:
+                top = np.argpartition(-sims, k)[:k]
+            else:
+                top = np.arange(len(sims))
+            top = top[np.lexsort((idx[top], -sims[top]))]
+            neighbors[item, :len(top)] = idx[top]
+            scores[item, :len(top)] = sims[top]
+    return neighbors, scores
+
+
+class ItemNeighborTable:
+    """内存中的题目邻居表"""
+
+    def __init__(self, question_ids: List[str], neighbors: np.ndarray, scores: np.ndarray):
+        self.question_ids = list(question_ids)
+        self.neighbors = neighbors
+        self.scores = scores
+        self._index = {qid: i for i, qid in enumerate(self.question_ids)}
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    @classmethod
+    def train(cls, batches: Iterable[Sequence[Tuple[str, str, bool]]], k: int = 20, min_support: int = 2,
+              shrinkage: float = 10.0, chunk_size: int = 2048) -> 'ItemNeighborTable':
+        """从提交记录训练邻居表"""
+        matrix, _, question_ids = build_struggle_matrix(batches)
+        neighbors, scores = compute_item_neighbors(matrix, k=k, min_support=min_support,
+                                                   shrinkage=shrinkage, chunk_size=chunk_size)
+        return cls(question_ids, neighbors, scores)
+
+    def similar(self, question_id: str, k: int = None) -> List[Tuple[str, float]]:
+        """返回与题目最相似的题目 [(question_id, similarity)]"""
+        row = self._index.get(str(question_id))
+        if row is None:
+            return []
+        result = []
+        for neighbor, score in zip(self.neighbors[row], self.scores[row]):
+            if neighbor < 0:
+                break
+            result.append((self.question_ids[neighbor], float(score)))
+        return result[:k] if k else result
+
+    def score_candidates(self, weights: Dict[str, float]) -> Dict[str, float]:
+        """
+        按学生做错的题目聚合邻居得分
+
+        Args:
+            weights: 做错的题目ID -> 权重
+
+        Returns:
+            候选题目ID -> 加权相似度之和（不含输入题目本身）
+        """
+        scores: Dict[str, float] = {}
+        for question_id, weight in weights.items():
+            for neighbor, similarity in self.similar(question_id):
+                scores[neighbor] = scores.get(neighbor, 0.0) + weight * similarity
+        for question_id in weights:
+            scores.pop(question_id, None)
+        return scores
+
+    def save(self, path: str = DEFAULT_NEIGHBORS_PATH):
+        """保存邻居表（原子替换）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, question_ids=np.asarray(self.question_ids, dtype=str),
+                            neighbors=self.neighbors, scores=self.scores.astype(np.float16))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_NEIGHBORS_PATH) -> Optional['ItemNeighborTable']:
+        """加载邻居表，文件不存在时返回None"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['question_ids'].tolist(), data['neighbors'], data['scores'].astype(np.float32))
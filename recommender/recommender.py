@@ -1,13 +1,270 @@
+"""
+练习题推荐
+题目池只载入一次，按知识点/学科/难度建立倒排索引；根据学生错题本中的知识点权重排序候选题，
+并可叠加离线训练的协同过滤邻居表（recommender.collaborative），
+支持单个学生的 top-k 推荐和整个班级的批量推荐
+"""
 
+import os
+import sys
 import json
+import math
+import heapq
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
 
-def load_question_bank(path="data/sample_questions.json"):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_POOL_PATH = "data/sample_questions.json"
+
+# 错题复习状态对推荐权重的影响：越未掌握越需要练习
+STATUS_WEIGHTS = {'needs_review': 1.0, 'reviewed': 0.5, 'mastered': 0.1}
+RECENCY_HALF_LIFE_DAYS = 30
+SUBJECT_WEIGHT = 0.3
+# 协同过滤得分（"做错这道题的同学也常做错"）的权重
+COLLABORATIVE_WEIGHT = 1.0
+
+
+def load_question_bank(path=DEFAULT_POOL_PATH):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+
+def _normalize_question(question_id, question: Dict) -> Optional[Dict]:
+    """把 sample_questions.json 条目或题库条目统一为推荐所需的字段"""
+    analysis = question.get('master_analysis') or {}
+    knowledge_point = question.get('knowledge_point') or analysis.get('knowledge_point')
+    if not knowledge_point:
+        return None
+    return {
+        'id': str(question_id),
+        'question': question.get('question') or question.get('canonical_text', ''),
+        'knowledge_point': knowledge_point,
+        'subject': question.get('subject') or analysis.get('subject'),
+        'difficulty': question.get('difficulty') or question.get('difficulty_level') or analysis.get('difficulty_level'),
+        'explanation': question.get('explanation') or analysis.get('solution_steps'),
+    }
+
+
+class QuestionRecommender:
+    """基于倒排索引的练习题推荐器"""
+
+    def __init__(self, questions: Iterable[Dict] = (), neighbor_table=None):
+        """
+        Args:
+            questions: 已规范化的题目
+            neighbor_table: 可选的 ItemNeighborTable（协同过滤邻居表）
+        """
+        self.neighbor_table = neighbor_table
+        self._questions: Dict[str, Dict] = {}
+        self._by_knowledge_point: Dict[str, List[str]] = defaultdict(list)
+        self._by_subject: Dict[str, set] = defaultdict(set)
+        self._by_difficulty: Dict[object, set] = defaultdict(set)
+        for question in questions:
+            self.add(question)
+
+    def __len__(self):
+        return len(self._questions)
+
+    @classmethod
+    def from_sources(cls, sample_questions: List[Dict] = None, question_bank: Dict[str, Dict] = None,
+                     neighbor_table=None):
+        """从 sample_questions.json 列表和/或题库字典构建"""
+        questions = []
+        for item in sample_questions or []:
+            questions.append(_normalize_question(item.get('id'), item))
+        for question_id, item in (question_bank or {}).items():
+            questions.append(_normalize_question(question_id, item))
+        return cls((q for q in questions if q is not None), neighbor_table=neighbor_table)
+
+    def add(self, question: Dict):
+        """加入一道已规范化的题目"""
+        question_id = question['id']
+        if question_id in self._questions:
+            return
+        self._questions[question_id] = question
+        self._by_knowledge_point[question['knowledge_point']].append(question_id)
+        if question.get('subject'):
+            self._by_subject[question['subject']].add(question_id)
+        if question.get('difficulty') is not None:
+            self._by_difficulty[question['difficulty']].add(question_id)
+
+    def get(self, question_id: str) -> Optional[Dict]:
+        return self._questions.get(str(question_id))
+
+    def find_by_knowledge_point(self, knowledge_point: str) -> List[Dict]:
+        """按知识点查找题目；没有精确匹配时退回到包含关系匹配（知识点种类远少于题目数）"""
+        ids = self._by_knowledge_point.get(knowledge_point)
+        if ids is None:
+            ids = [qid for kp, kp_ids in self._by_knowledge_point.items() if knowledge_point in kp for qid in kp_ids]
+        return [self._questions[qid] for qid in ids]
+
+    @staticmethod
+    def build_profile(mistakes: Iterable[Dict], now: datetime = None) -> Dict:
+        """
+        根据错题本条目计算学生的薄弱点画像
+
+        Returns:
+            {'knowledge_points': {kp: 权重}, 'subjects': {subject: 权重},
+             'seen': {question_id: 权重}}
+        """
+        now = now or datetime.now()
+        knowledge_points, subjects, seen = defaultdict(float), defaultdict(float), defaultdict(float)
+        for entry in mistakes:
+            weight = STATUS_WEIGHTS.get(entry.get('review_status'), 1.0)
+            added = entry.get('added_timestamp')
+            if added:
+                try:
+                    age_days = max((now - datetime.fromisoformat(added)).total_seconds() / 86400, 0)
+                    weight *= math.pow(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+                except (TypeError, ValueError):
+                    pass
+            if entry.get('knowledge_point'):
+                knowledge_points[entry['knowledge_point']] += weight
+            if entry.get('subject'):
+                subjects[entry['subject']] += weight * SUBJECT_WEIGHT
+            if entry.get('question_id'):
+                seen[str(entry['question_id'])] += weight
+        return {'knowledge_points': dict(knowledge_points), 'subjects': dict(subjects), 'seen': dict(seen)}
+
+    def recommend(self, mistakes: Iterable[Dict] = (), k: int = 5, subject: str = None,
+                  difficulty=None, profile: Dict = None) -> List[Dict]:
+        """
+        为单个学生推荐 top-k 练习题
+
+        只对错题知识点（不足时再加上相关学科）索引出的候选题打分，不扫描整个题目池
+
+        Args:
+            mistakes: 学生的错题本条目
+            k: 推荐数量
+            subject: 只推荐该学科
+            difficulty: 只推荐该难度
+            profile: 预先计算的画像（批量推荐时复用）
+
+        Returns:
+            题目列表，每项附带 score 和 reason
+        """
+        profile = profile or self.build_profile(mistakes)
+        kp_weights, subject_weights, seen = profile['knowledge_points'], profile['subjects'], profile['seen']
+
+        allowed = None
+        if subject is not None:
+            allowed = self._by_subject.get(subject, set())
+        if difficulty is not None:
+            by_difficulty = self._by_difficulty.get(difficulty, set())
+            allowed = by_difficulty if allowed is None else allowed & by_difficulty
+
+        collaborative = self.neighbor_table.score_candidates(seen) if self.neighbor_table and seen else {}
+        candidates = {qid for qid in collaborative if qid in self._questions}
+        for kp in kp_weights:
+            candidates.update(self._by_knowledge_point.get(kp, ()))
+        if len(candidates) < k:
+            for subj in (subject_weights or ([subject] if subject else [])):
+                candidates.update(self._by_subject.get(subj, ()))
+        if len(candidates) < k:
+            # 冷启动：没有错题记录时从允许范围内补齐
+            candidates.update(allowed if allowed is not None else self._questions)
+        candidates -= seen.keys()
+        if allowed is not None:
+            candidates &= allowed
+
+        def score(qid):
+            q = self._questions[qid]
+            return (kp_weights.get(q['knowledge_point'], 0.0) + subject_weights.get(q.get('subject'), 0.0)
+                    + COLLABORATIVE_WEIGHT * collaborative.get(qid, 0.0))
+
+        top = heapq.nsmallest(k, candidates, key=lambda qid: (-score(qid), qid))
+        results = []
+        for qid in top:
+            question = dict(self._questions[qid])
+            question['score'] = round(score(qid), 4)
+            if collaborative.get(qid, 0.0) * COLLABORATIVE_WEIGHT > kp_weights.get(question['knowledge_point'], 0.0):
+                question['reason'] = '做错同类题的同学也常错'
+            elif question['knowledge_point'] in kp_weights:
+                question['reason'] = '基于错题推荐'
+            else:
+                question['reason'] = '知识点拓展'
+            results.append(question)
+        return results
+
+    def recommend_for_class(self, mistakes_by_student: Dict[str, List[Dict]], k: int = 5,
+                            subject: str = None, difficulty=None) -> Dict[str, List[Dict]]:
+        """
+        批量为整个班级推荐练习题，共享同一份索引
+
+        Args:
+            mistakes_by_student: 学生ID -> 错题本条目
+
+        Returns:
+            学生ID -> 推荐题目列表
+        """
+        now = datetime.now()
+        return {
+            student_id: self.recommend(k=k, subject=subject, difficulty=difficulty,
+                                       profile=self.build_profile(mistakes, now))
+            for student_id, mistakes in mistakes_by_student.items()
+        }
+
+
+_recommender: Optional[QuestionRecommender] = None
+_recommender_key = None
+_recommender_lock = threading.Lock()
+
+
+def _file_key(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def get_recommender(path=DEFAULT_POOL_PATH) -> QuestionRecommender:
+    """
+    获取共享的推荐器；题目池（示例题 + 题库）和协同过滤邻居表的文件（路径、修改时间、大小）
+    变化时重新载入，新入库的题目因此会进入推荐池
+    """
+    global _recommender, _recommender_key
+    from core import question_manager as qm
+    from recommender.collaborative import DEFAULT_NEIGHBORS_PATH, ItemNeighborTable
+
+    key = tuple(_file_key(source) for source in (path, qm.BANK_FILE, DEFAULT_NEIGHBORS_PATH))
+    if _recommender is None or _recommender_key != key:
+        with _recommender_lock:
+            if _recommender is None or _recommender_key != key:
+                try:
+                    sample_questions = load_question_bank(path)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    sample_questions = []
+                _recommender = QuestionRecommender.from_sources(sample_questions, qm.load_bank(),
+                                                                neighbor_table=ItemNeighborTable.load())
+                _recommender_key = key
+    return _recommender
+
+
+def reset_recommender():
+    """丢弃缓存的推荐器（在同一时间戳内改写题目池文件时使用）"""
+    global _recommender, _recommender_key
+    with _recommender_lock:
+        _recommender = None
+        _recommender_key = None
+
+
 def recommend_question(knowledge_point: str):
-    questions = load_question_bank()
-    for q in questions:
-        if knowledge_point in q["knowledge_point"]:
-            return q
-    return None
+    matches = get_recommender().find_by_knowledge_point(knowledge_point)
+    return matches[0] if matches else None
+
+
+def recommend_for_user(user_id: str, k: int = 5, subject: str = None) -> List[Dict]:
+    """根据错题本为学生推荐练习题"""
+    from services import mistake_book_service
+    return get_recommender().recommend(mistake_book_service.get_user_mistakes(user_id), k=k, subject=subject)
+
+
+def recommend_for_students(user_ids: Iterable[str], k: int = 5, subject: str = None) -> Dict[str, List[Dict]]:
+    """根据错题本为一组学生（如一个班级）批量推荐练习题"""
+    from services import mistake_book_service
+    store = mistake_book_service.get_store()
+    return get_recommender().recommend_for_class({uid: store.query(uid) for uid in user_ids}, k=k, subject=subject)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+ANN索引基准测试
+对比 IVF 索引与全量精确搜索的召回率和查询延迟
+
+使用方法:
+    python scripts/benchmark_ann_index.py                      # 合成数据
+    python scripts/benchmark_ann_index.py --size 200000 --nprobe 4 8 16
+    python scripts/benchmark_ann_index.py --from-db            # 使用 question_embeddings 中的真实向量
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from services.ann_index import IVFIndex, brute_force_search
+
+logger = setup_logger('benchmark_ann_index', level=logging.INFO)
+
+
+def synthetic_vectors(size: int, dimension: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """生成带聚类结构的合成向量（真实题目向量按知识点聚集）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension))
+    labels = rng.integers(0, clusters, size)
+    return (centers[labels] + 0.35 * rng.standard_normal((size, dimension))).astype(np.float32)
+
+
+def benchmark(vectors: np.ndarray, ids: List[str], nprobes: List[int], k: int = 10, queries: int = 200,
+              seed: int = 1) -> List[Dict]:
+    """
+    运行基准测试
+
+    Returns:
+        每个 nprobe 一行结果：recall@k、平均/p95延迟，以及精确搜索的延迟
+    """
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(ids), min(queries, len(ids)), replace=False)
+    query_vectors = vectors[query_rows] + 0.05 * rng.standard_normal((len(query_rows), vectors.shape[1]))
+
+    t0 = time.time()
+    index = IVFIndex.build(ids, vectors)
+    logger.info(f"构建索引: {len(ids)} 条, {index.nlist} 个聚类, 耗时 {time.time() - t0:.2f}秒")
+
+    exact, exact_latency = [], []
+    normalized = index.vectors
+    for q in query_vectors:
+        t0 = time.perf_counter()
+        exact.append({qid for qid, _ in brute_force_search(normalized, ids, q, k, normalized=True)})
+        exact_latency.append((time.perf_counter() - t0) * 1000)
+
+    results = []
+    for nprobe in nprobes:
+        latency, hits = [], 0
+        for q, truth in zip(query_vectors, exact):
+            t0 = time.perf_counter()
+            found = index.search(q, k=k, nprobe=nprobe)
+            latency.append((time.perf_counter() - t0) * 1000)
+            hits += len(truth & {qid for qid, _ in found})
+        results.append({
+            'nprobe': nprobe,
+            'recall': hits / (k * len(exact)),
+            'mean_ms': float(np.mean(latency)),
+            'p95_ms': float(np.percentile(latency, 95)),
+            'exact_mean_ms': float(np.mean(exact_latency)),
+        })
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='ANN索引基准测试')
+    parser.add_argument('--size', type=int, default=50000, help='合成向量数量')
+    parser.add_argument('--dimension', type=int, default=384, help='合成向量维度')
+    parser.add_argument('--k', type=int, default=10, help='返回数量')
+    parser.add_argument('--queries', type=int, default=200, help='查询次数')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16], help='扫描的聚类数')
+    parser.add_argument('--from-db', action='store_true', help='使用数据库中的题目向量')
+    args = parser.parse_args()
+
+    if args.from_db:
+        from services.data_service_v3 import DataServiceV3
+        from services.embedding_service import DEFAULT_MODEL
+        data_service = DataServiceV3()
+        try:
+            stored = data_service.get_question_embeddings(DEFAULT_MODEL)
+        finally:
+            data_service.close()
+        ids = list(stored)
+        vectors = np.asarray([stored[qid] for qid in ids], dtype=np.float32)
+    else:
+        vectors = synthetic_vectors(args.size, args.dimension)
+        ids = [f"q{i}" for i in range(len(vectors))]
+
+    if not ids:
+        logger.warning("没有可用的向量")
+        return
+
+    for row in benchmark(vectors, ids, args.nprobe, k=args.k, queries=args.queries):
+        logger.info(
+            f"nprobe={row['nprobe']:>3}  recall@{args.k}={row['recall']:.3f}  "
+            f"mean={row['mean_ms']:.2f}ms  p95={row['p95_ms']:.2f}ms  (精确搜索 {row['exact_mean_ms']:.2f}ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+认证API吞吐基准测试
+对比两种装配方式下每秒可处理的请求数：
+    per_request: 改造前的做法，每个请求新建 DataServiceV3（新的引擎、连接池和 SELECT 1 探测），请求结束后释放
+    container:   worker 启动时创建一次引擎和服务，所有请求共享连接池
+
+需要可连接的 PostgreSQL（DB_HOST 等环境变量）且 users 表中至少有一个用户
+
+使用方法:
+    python scripts/benchmark_auth_api.py
+    python scripts/benchmark_auth_api.py --requests 2000 --concurrency 8 --endpoint me
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from api.auth_api import get_auth_service, router
+from api.service_container import ServiceContainer, set_service_container
+from services.auth_service import AuthService
+from services.data_service_v3 import DataServiceV3
+
+logger = setup_logger('benchmark_auth_api', level=logging.INFO)
+
+ENDPOINTS = {
+    # 只校验令牌（认证缓存命中后不查库），体现每个请求的装配开销
+    'validate': ('POST', '/api/v3/auth/validate-token'),
+    # 校验令牌并查询一次用户信息
+    'me': ('GET', '/api/v3/auth/me'),
+}
+
+
+def per_request_auth_service():
+    """改造前的依赖：每个请求一个新引擎"""
+    auth_service = AuthService(DataServiceV3())
+    try:
+        yield auth_service
+    finally:
+        auth_service.close()
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    if mode == 'per_request':
+        app.dependency_overrides[get_auth_service] = per_request_auth_service
+    return app
+
+
+def make_token(container: ServiceContainer) -> str:
+    with container.data_service.get_session() as session:
+        user = session.execute(text("SELECT id, role FROM users LIMIT 1")).fetchone()
+    if user is None:
+        raise SystemExit("users 表为空，无法生成测试令牌")
+    return container.auth_service.create_access_token(user.id, user.role)
+
+
+def benchmark(mode: str, endpoint: str, requests: int, concurrency: int) -> Dict:
+    """
+    Returns:
+        {'mode', 'requests', 'seconds', 'requests_per_sec'}
+    """
+    container = ServiceContainer(start_reaper=False)
+    set_service_container(container)
+    method, path = ENDPOINTS[endpoint]
+    try:
+        with TestClient(build_app(mode)) as client:
+            headers = {'Authorization': f'Bearer {make_token(container)}'}
+
+            def call(_):
+                response = client.request(method, path, headers=headers)
+                return response.status_code
+
+            # 预热（认证缓存、连接池），不计入时间
+            call(0)
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                codes = list(executor.map(call, range(requests)))
+            seconds = time.perf_counter() - t0
+    finally:
+        set_service_container(None)
+
+    failed = sum(1 for code in codes if code != 200)
+    if failed:
+        logger.warning(f"{mode}: {failed} 个请求未返回200")
+    return {'mode': mode, 'requests': requests, 'seconds': seconds, 'requests_per_sec': requests / seconds}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='认证API吞吐基准测试')
+    parser.add_argument('--requests', type=int, default=500, help='每种方式的请求数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发请求数')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='validate', help='测试的接口')
+    args = parser.parse_args()
+
+    logger.info(f"接口: {ENDPOINTS[args.endpoint][1]}, 请求数: {args.requests}, 并发: {args.concurrency}")
+    results = {}
+    for mode in ('per_request', 'container'):
+        results[mode] = benchmark(mode, args.endpoint, args.requests, args.concurrency)
+        logger.info(f"{mode:>12}: {results[mode]['seconds']:.2f}秒, "
+                    f"{results[mode]['requests_per_sec']:.1f} 请求/秒")
+    speedup = results['container']['requests_per_sec'] / results['per_request']['requests_per_sec']
+    logger.info(f"共享服务容器吞吐为每请求装配的 {speedup:.1f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+批量分析基准测试
+对比逐题调用（现有路径）和多题批量请求的每题token数和每秒分析题数。
+--dry-run 只按提示词估算输入token，不调用大模型
+
+使用方法:
+    python scripts/benchmark_llm_batching.py --dry-run
+    python scripts/benchmark_llm_batching.py --count 24 --batch-sizes 4 8 12 --workers 4
+    python scripts/benchmark_llm_batching.py --questions data/new_questions.txt
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from core import question_manager as qm
+from llm import gpt4_analyzer
+from services import llm_service
+from services.batch_analyzer import BatchAnalyzer, estimate_tokens, parse_single_response, plan_batches
+
+logger = setup_logger('benchmark_llm_batching', level=logging.INFO)
+
+
+def load_questions(path: str, count: int) -> List[str]:
+    """从题目文件（每行一道）或题库中取前 count 道不同的题目"""
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = [question['canonical_text'] for question in qm.load_bank().values()
+                 if qm.is_valid_question_data(question)]
+    return list(dict.fromkeys(texts))[:count]
+
+
+def estimate(texts: List[str], batch_size: int) -> Dict:
+    """
+    按提示词估算每题的输入token
+
+    Returns:
+        {'batch_size', 'requests', 'prompt_tokens_per_question'}，batch_size 为1时是逐题调用
+    """
+    if batch_size == 1:
+        prompts = [gpt4_analyzer.build_analysis_prompt(text) for text in texts]
+    else:
+        prompts = [gpt4_analyzer.build_batch_prompt([texts[i] for i in batch])
+                   for batch in plan_batches(texts, max_items=batch_size)]
+    tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+    return {'batch_size': batch_size, 'requests': len(prompts), 'prompt_tokens_per_question': tokens / len(texts)}
+
+
+def run(texts: List[str], batch_size: int, workers: int) -> Dict:
+    """
+    实际调用大模型分析 texts，batch_size 为1时走逐题调用
+
+    Returns:
+        {'batch_size', 'requests', 'prompt_tokens_per_question', 'completion_tokens_per_question',
+         'questions_per_sec', 'failed'}
+    """
+    before = dict(gpt4_analyzer.token_usage)
+    t0 = time.perf_counter()
+    if batch_size == 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda text: parse_single_response(llm_service.get_analysis_for_text(text)),
+                                    texts))
+    else:
+        results = BatchAnalyzer(max_items=batch_size, max_workers=workers).analyze(texts)
+    seconds = time.perf_counter() - t0
+    usage = {key: gpt4_analyzer.token_usage[key] - before[key] for key in before}
+    return {
+        'batch_size': batch_size,
+        'requests': usage['requests'],
+        'prompt_tokens_per_question': usage['prompt_tokens'] / len(texts),
+        'completion_tokens_per_question': usage['completion_tokens'] / len(texts),
+        'questions_per_sec': len(texts) / seconds,
+        'failed': sum(result is None for result in results),
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量分析基准测试')
+    parser.add_argument('--questions', default=None, help='题目文件（每行一道），默认取题库中的题目')
+    parser.add_argument('--count', type=int, default=16, help='测试题目数')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 8], help='每个请求的题目数')
+    parser.add_argument('--workers', type=int, default=4, help='同时进行的请求数')
+    parser.add_argument('--dry-run', action='store_true', help='只估算输入token，不调用大模型')
+    args = parser.parse_args()
+
+    texts = load_questions(args.questions, args.count)
+    if not texts:
+        logger.error("没有可用于测试的题目")
+        return
+    logger.info(f"测试题目 {len(texts)} 道，并发请求数 {args.workers}")
+
+    for batch_size in [1] + [size for size in args.batch_sizes if size > 1]:
+        label = '逐题调用' if batch_size == 1 else f'每批 {batch_size} 题'
+        estimated = estimate(texts, batch_size)
+        if args.dry_run:
+            logger.info(f"{label}: {estimated['requests']} 个请求，"
+                        f"估算输入 {estimated['prompt_tokens_per_question']:.0f} tokens/题")
+            continue
+        result = run(texts, batch_size, args.workers)
+        logger.info(
+            f"{label}: {result['requests']} 个请求，输入 {result['prompt_tokens_per_question']:.0f} tokens/题"
+            f"（估算 {estimated['prompt_tokens_per_question']:.0f}），输出 {result['completion_tokens_per_question']:.0f} tokens/题，"
+            f"{result['questions_per_sec']:.2f} 题/秒，失败 {result['failed']} 道"
+        )
+
+
+if __name__ == "__main__":
+    main()
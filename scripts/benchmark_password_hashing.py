@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+密码哈希吞吐基准测试
+模拟登录高峰：大量并发的 bcrypt 校验请求，对比不同进程数下每秒可完成的登录校验数
+
+使用方法:
+    python scripts/benchmark_password_hashing.py                       # 进程数 0,1,2,4..CPU核数
+    python scripts/benchmark_password_hashing.py --logins 2000 --rounds 12 --workers 0 4 8
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+import bcrypt
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from services.password_hasher import PasswordHasher
+
+logger = setup_logger('benchmark_password_hashing', level=logging.INFO)
+
+
+def default_worker_counts() -> List[int]:
+    """0（请求线程内计算的旧做法）、1，以及不超过CPU核数的2的幂"""
+    cpus = os.cpu_count() or 1
+    counts, n = [0, 1], 2
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    if cpus > 1:
+        counts.append(cpus)
+    return counts
+
+
+async def _storm(hasher: PasswordHasher, password: str, password_hash: str, logins: int) -> int:
+    results = await asyncio.gather(*(hasher.verify_async(password, password_hash) for _ in range(logins)))
+    return sum(results)
+
+
+def benchmark(workers: int, logins: int, rounds: int) -> Dict:
+    """
+    用 workers 个进程完成 logins 次并发的密码校验
+
+    Returns:
+        {'workers', 'logins', 'seconds', 'logins_per_sec'}
+    """
+    password = 'correct horse battery staple'
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=logins)
+    try:
+        # 预热进程池，不计入启动时间
+        hasher.verify(password, password_hash)
+        t0 = time.perf_counter()
+        ok = asyncio.run(_storm(hasher, password, password_hash, logins))
+        seconds = time.perf_counter() - t0
+    finally:
+        hasher.shutdown()
+    assert ok == logins
+    return {'workers': workers, 'logins': logins, 'seconds': seconds, 'logins_per_sec': logins / seconds}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='密码哈希吞吐基准测试')
+    parser.add_argument('--logins', type=int, default=200, help='并发登录校验次数')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt工作因子')
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='要测试的进程数')
+    args = parser.parse_args()
+
+    logger.info(f"CPU核数: {os.cpu_count()}, bcrypt rounds={args.rounds}, 并发登录: {args.logins}")
+    for workers in args.workers or default_worker_counts():
+        result = benchmark(workers, args.logins, args.rounds)
+        label = '请求线程内' if workers == 0 else f'{workers} 个进程'
+        logger.info(f"{label:>10}: {result['seconds']:.2f}秒, {result['logins_per_sec']:.1f} 次登录/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+题目批量分析入库
+把题目文本文件（每行一道题）或整张练习卷的图片批量分析后写入题库。
+基础运算题先用本地判题，其余题目按token预算打包成批量请求（见 services/batch_analyzer.py）
+
+使用方法:
+    python scripts/bulk_analyze.py --questions data/new_questions.txt
+    python scripts/bulk_analyze.py --images data/worksheets/ --max-items 10
+    python scripts/bulk_analyze.py --questions data/new_questions.txt --force  # 重新分析已在题库中的题目
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from core import question_manager as qm
+from llm import gpt4_analyzer
+from services import fast_grader
+from services.batch_analyzer import BatchAnalyzer, split_worksheet
+
+logger = setup_logger('bulk_analyze', level=logging.INFO)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+OCR_FAILURES = ('识别失败', '识别异常')
+
+
+def read_question_file(path: str) -> List[Tuple[str, Optional[str]]]:
+    """每行一道题，跳过空行；返回 (题目文本, 来源图片) 列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(line.strip(), None) for line in f if line.strip()]
+
+
+def read_worksheets(directory: str) -> List[Tuple[str, Optional[str]]]:
+    """识别目录下每张练习卷图片，并按题号拆成单独的题目"""
+    from services import ocr_service
+
+    questions = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        path = os.path.join(directory, name)
+        lines = ocr_service.get_text_from_image(path)
+        if not lines or lines[0] in OCR_FAILURES:
+            logger.warning(f"识别失败，跳过: {path}")
+            continue
+        worksheet = split_worksheet('\n'.join(lines))
+        logger.info(f"{name}: 拆出 {len(worksheet)} 道题目")
+        questions.extend((text, path) for text in worksheet)
+    return questions
+
+
+def bulk_analyze(questions: List[Tuple[str, Optional[str]]], analyzer: BatchAnalyzer,
+                 force: bool = False) -> Dict:
+    """
+    分析并入库
+
+    Args:
+        questions: (题目文本, 来源图片) 列表
+        analyzer: 批量分析器
+        force: 是否重新分析题库中已有的题目
+
+    Returns:
+        {'total', 'skipped', 'local', 'llm', 'failed', 'saved', 'seconds'}
+    """
+    t0 = time.time()
+    bank = qm.load_bank()
+    pending: Dict[str, Tuple[str, Optional[str]]] = {}
+    skipped = 0
+    for text, image_path in questions:
+        question_id = qm.generate_question_id(text)
+        if question_id in pending or (not force and qm.is_valid_question_data(bank.get(question_id))):
+            skipped += 1
+            continue
+        pending[question_id] = (text, image_path)
+
+    analyses: Dict[str, Optional[Dict]] = {}
+    remote: List[str] = []
+    for question_id, (text, _) in pending.items():
+        analysis = fast_grader.grade(text)
+        if analysis is None:
+            remote.append(question_id)
+        analyses[question_id] = analysis
+    local = len(pending) - len(remote)
+
+    if remote:
+        results = analyzer.analyze([pending[question_id][0] for question_id in remote])
+        analyses.update(zip(remote, results))
+
+    # 整批结果一次写入题库，避免每道题都重写一遍题库文件
+    analyzed = [(question_id, text, analyses[question_id], None, image_path)
+                for question_id, (text, image_path) in pending.items() if analyses.get(question_id) is not None]
+    failed = len(pending) - len(analyzed)
+    saved = qm.add_questions(analyzed) if analyzed else 0
+
+    return {'total': len(questions), 'skipped': skipped, 'local': local, 'llm': len(remote),
+            'failed': failed, 'saved': saved, 'seconds': time.time() - t0}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='题目批量分析入库')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--questions', help='题目文本文件，每行一道题')
+    source.add_argument('--images', help='练习卷图片目录，每张图片按题号拆题')
+    parser.add_argument('--max-items', type=int, default=None, help='每个请求最多的题目数')
+    parser.add_argument('--workers', type=int, default=None, help='同时进行的请求数')
+    parser.add_argument('--force', action='store_true', help='重新分析题库中已有的题目')
+    args = parser.parse_args()
+
+    questions = read_question_file(args.questions) if args.questions else read_worksheets(args.images)
+    logger.info(f"共 {len(questions)} 道题目")
+
+    analyzer = BatchAnalyzer()
+    if args.max_items:
+        analyzer.max_items = args.max_items
+    if args.workers:
+        analyzer.max_workers = args.workers
+
+    report = bulk_analyze(questions, analyzer, force=args.force)
+    usage = gpt4_analyzer.token_usage
+    logger.info(
+        f"完成: 入库 {report['saved']} 道，失败 {report['failed']} 道，已在题库中跳过 {report['skipped']} 道；"
+        f"本地判题 {report['local']} 道，大模型分析 {report['llm']} 道，耗时 {report['seconds']:.1f}秒"
+    )
+    logger.info(
+        f"大模型请求 {usage['requests']} 次（批量 {analyzer.stats['batch_requests']} 次，"
+        f"逐题重试 {analyzer.stats['fallback_items']} 道），"
+        f"输入 {usage['prompt_tokens']} tokens，输出 {usage['completion_tokens']} tokens"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -16,19 +16,23 @@ This approach ensures:
 from sentence_transformers import SentenceTransformer
 from paddleocr import PaddleOCR
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Must match services/embedding_service.DEFAULT_MODEL; this script runs before the app code is copied in
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2')
+
 def main():
     logger.info("Starting model download process...")
 
     # --- Download Sentence Transformer Model ---
     try:
-        logger.info("Downloading and caching 'all-MiniLM-L6-v2' model...")
-        SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("'all-MiniLM-L6-v2' model downloaded successfully.")
+        logger.info(f"Downloading and caching '{EMBEDDING_MODEL}' model...")
+        SentenceTransformer(EMBEDDING_MODEL)
+        logger.info(f"'{EMBEDDING_MODEL}' model downloaded successfully.")
     except Exception as e:
         logger.error(f"Failed to download Sentence Transformer model: {e}", exc_info=True)
         raise
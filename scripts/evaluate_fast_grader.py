@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+本地快速判题评估
+用题库中已有的大模型分析结果评估本地判题的覆盖率（能判的题目比例）、
+与大模型的一致率（对错判断、正确答案）和判题耗时
+
+使用方法:
+    python scripts/evaluate_fast_grader.py
+    python scripts/evaluate_fast_grader.py --bank data/question_bank.json --show 20
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Dict, List, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from core import question_manager as qm
+from services import fast_grader
+
+logger = setup_logger('evaluate_fast_grader', level=logging.INFO)
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:/\d+)?')
+
+
+def final_number(answer: str) -> Optional[str]:
+    """取正确答案中的最后一个数，用于比较两边给出的答案"""
+    numbers = _NUMBER.findall((answer or '').replace(' ', ''))
+    return numbers[-1] if numbers else None
+
+
+def evaluate(bank: Dict[str, Dict]) -> Dict:
+    """
+    逐题运行本地判题并与题库中的大模型结果比较
+
+    Returns:
+        {'total', 'covered', 'coverage', 'verdict_agreement', 'answer_agreement',
+         'mean_us', 'max_us', 'disagreements': [...]}
+    """
+    total = covered = verdict_agreed = answer_agreed = 0
+    timings: List[float] = []
+    disagreements = []
+    for question_id, question in bank.items():
+        text = question.get('canonical_text')
+        reference = question.get('master_analysis')
+        if not text or not isinstance(reference, dict) or reference.get('graded_by') == 'fast_grader':
+            # 本地判题写入的结果不能拿来评估自己
+            continue
+        total += 1
+        start = time.perf_counter()
+        local = fast_grader.grade(text)
+        timings.append((time.perf_counter() - start) * 1e6)
+        if local is None:
+            continue
+
+        covered += 1
+        verdict_ok = bool(reference.get('is_correct')) == local['is_correct']
+        answer_ok = final_number(reference.get('correct_answer')) == final_number(local['correct_answer'])
+        verdict_agreed += verdict_ok
+        answer_agreed += answer_ok
+        if not (verdict_ok and answer_ok):
+            disagreements.append({
+                'question_id': question_id,
+                'text': text,
+                'llm': {'is_correct': reference.get('is_correct'), 'correct_answer': reference.get('correct_answer')},
+                'local': {'is_correct': local['is_correct'], 'correct_answer': local['correct_answer']},
+            })
+
+    return {
+        'total': total,
+        'covered': covered,
+        'coverage': covered / total if total else 0.0,
+        'verdict_agreement': verdict_agreed / covered if covered else 0.0,
+        'answer_agreement': answer_agreed / covered if covered else 0.0,
+        'mean_us': sum(timings) / len(timings) if timings else 0.0,
+        'max_us': max(timings) if timings else 0.0,
+        'disagreements': disagreements,
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='本地快速判题评估')
+    parser.add_argument('--bank', default=qm.BANK_FILE, help='题库文件')
+    parser.add_argument('--show', type=int, default=10, help='列出的不一致题目数')
+    args = parser.parse_args()
+
+    with open(args.bank, 'r', encoding='utf-8') as f:
+        bank = json.load(f)
+
+    report = evaluate(bank)
+    logger.info(
+        f"题目 {report['total']} 道，本地可判 {report['covered']} 道（覆盖率 {report['coverage']:.1%}）；"
+        f"对错一致率 {report['verdict_agreement']:.1%}，答案一致率 {report['answer_agreement']:.1%}；"
+        f"判题耗时 平均 {report['mean_us']:.1f}us 最大 {report['max_us']:.1f}us"
+    )
+    for item in report['disagreements'][:args.show]:
+        logger.info(f"不一致: {json.dumps(item, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
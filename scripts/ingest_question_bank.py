@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+题库向量化入库脚本
+将 question_bank.json 中的全部有效题目用本地模型批量向量化后写入向量库（重复执行时按ID覆盖）
+
+使用方法:
+    python scripts/ingest_question_bank.py
+    python scripts/ingest_question_bank.py --batch-size 2000 --collection questions_collection
+    python scripts/ingest_question_bank.py --persist-db  # 同时写入 question_embeddings 表
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+from typing import Dict, List, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from core import question_manager as qm
+
+logger = setup_logger('ingest_question_bank', level=logging.INFO)
+
+
+def build_documents(bank: Dict[str, Dict]) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    从题库构造向量库的 ids/documents/metadatas
+
+    Args:
+        bank: question_id -> 题目数据
+
+    Returns:
+        (ids, documents, metadatas) 元组，无效题目会被跳过
+    """
+    ids, documents, metadatas = [], [], []
+    for question_id, question in bank.items():
+        if not qm.is_valid_question_data(question):
+            continue
+        analysis = question.get('master_analysis', {})
+        ids.append(question_id)
+        documents.append(question['canonical_text'])
+        metadatas.append({
+            'subject': question.get('subject') or analysis.get('subject'),
+            'knowledge_point': analysis.get('knowledge_point'),
+        })
+    return ids, documents, metadatas
+
+
+def ingest(vector_service, bank: Dict[str, Dict], embedding_service=None, persist_db: bool = False) -> int:
+    """
+    将题库写入向量库，返回写入条数
+
+    Args:
+        vector_service: VectorService 实例
+        bank: question_id -> 题目数据
+        embedding_service: 可选的 EmbeddingService，为空时由向量库内置的嵌入函数计算；
+            集合中已有其他模型的向量时先清空集合
+        persist_db: 是否同时把向量写入 question_embeddings 表
+    """
+    ids, documents, metadatas = build_documents(bank)
+    skipped = len(bank) - len(ids)
+    if skipped:
+        logger.info(f"跳过 {skipped} 道无效题目")
+    if not ids:
+        logger.warning("题库中没有可入库的题目")
+        return 0
+
+    t0 = time.time()
+    embeddings = None
+    if embedding_service is not None:
+        if not vector_service.bind_embedding_model(embedding_service.model_name):
+            # 集合中是其他模型的向量，与新向量不可比：清空后整库重新向量化
+            logger.warning(f"集合中的向量不是由 {embedding_service.model_name} 生成的，清空后重新入库")
+            vector_service.reset(embedding_service.model_name)
+        matrix = embedding_service.embed(documents)
+        embeddings = matrix.tolist()
+        logger.info(f"向量化完成: {len(documents)} 条，耗时 {time.time() - t0:.2f}秒")
+        if persist_db and not embedding_service.persist(dict(zip(ids, documents))):
+            logger.error("写入 question_embeddings 表失败")
+
+    written = vector_service.add_documents_batch(ids, documents, metadatas, embeddings)
+    elapsed = time.time() - t0
+    rate = written / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"入库完成: {written}/{len(ids)} 条，耗时 {elapsed:.2f}秒 ({rate:.0f} 条/秒)")
+    return written
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='题库向量化入库')
+    parser.add_argument('--bank-file', default=qm.BANK_FILE, help='题库JSON文件路径')
+    parser.add_argument('--collection', default=None, help='向量库集合名称')
+    parser.add_argument('--batch-size', type=int, default=1000, help='每次写入的条数')
+    parser.add_argument('--persist-db', action='store_true', help='同时写入 question_embeddings 表')
+    args = parser.parse_args()
+
+    from services.vector_service import VectorService, DEFAULT_COLLECTION_NAME
+    from services.embedding_service import EmbeddingService
+
+    qm.BANK_FILE = args.bank_file
+    bank = qm.load_bank()
+    logger.info(f"从 {args.bank_file} 载入 {len(bank)} 道题目")
+
+    data_service = None
+    if args.persist_db:
+        from services.data_service_v3 import DataServiceV3
+        data_service = DataServiceV3()
+
+    service = VectorService(args.collection or DEFAULT_COLLECTION_NAME, batch_size=args.batch_size)
+    try:
+        ingest(service, bank, EmbeddingService(data_service=data_service), persist_db=args.persist_db)
+    finally:
+        if data_service is not None:
+            data_service.close()
+    logger.info(f"集合 '{service.collection_name}' 当前共有 {service.count()} 条记录")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+启动导入耗时分析
+在独立的解释器中用 `python -X importtime` 导入指定模块，汇总累计耗时最高的依赖，
+并检查 pandas、plotly.express、chromadb、paddleocr 等重量级库是否被提前导入
+
+使用方法:
+    python scripts/profile_imports.py                                  # 分析默认的页面和服务模块
+    python scripts/profile_imports.py components.student_dashboard --top 30
+    python scripts/profile_imports.py --budget-ms 1500                 # 超出预算时返回非零退出码
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只应在用到时才导入的库
+HEAVY_MODULES = ('pandas', 'plotly.express', 'chromadb', 'paddleocr', 'streamlit_lottie')
+
+# Streamlit 页面和后端服务在启动时导入的模块
+DEFAULT_MODULES = (
+    'core.ai_services',
+    'services.ocr_service',
+    'services.vector_service',
+    'services.data_service',
+    'services.data_service_v3',
+    'services.auth_service',
+    'components.ui_components',
+    'components.student_dashboard',
+    'components.teacher_dashboard',
+    'components.grade_manager_dashboard',
+    'components.principal_dashboard',
+    'pages.home_page',
+)
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+def parse_importtime(output: str) -> List[Dict]:
+    """
+    解析 -X importtime 的输出
+
+    Returns:
+        [{'module', 'self_us', 'cumulative_us', 'depth'}]，顺序与输出一致（子模块在父模块之前）
+    """
+    entries = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({
+                'module': module,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': (len(indent) - 1) // 2
+            })
+    return entries
+
+
+def profile_import(module: str, python: str = sys.executable, timeout: float = 120) -> Dict:
+    """
+    在新的解释器中导入 module 并统计耗时
+
+    Returns:
+        {'module', 'total_ms', 'entries', 'loaded', 'heavy'}；
+        total_ms 为 module 本身的累计导入耗时，loaded 为导入后 sys.modules 中的全部模块名
+    """
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    entries = parse_importtime(result.stderr)
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    total_us = next((e['cumulative_us'] for e in reversed(entries) if e['module'] == module), 0)
+    return {
+        'module': module,
+        'total_ms': round(total_us / 1000, 1),
+        'entries': entries,
+        'loaded': loaded,
+        'heavy': [name for name in HEAVY_MODULES if name in loaded]
+    }
+
+
+def top_imports(entries: List[Dict], n: int = 20) -> List[Dict]:
+    """按累计耗时排序的顶层依赖（depth 0 和 1），子模块已计入父模块"""
+    top_level = [e for e in entries if e['depth'] <= 1]
+    return sorted(top_level, key=lambda e: e['cumulative_us'], reverse=True)[:n]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description='分析模块导入耗时')
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_MODULES), help='要分析的模块')
+    parser.add_argument('--top', type=int, default=10, help='每个模块列出的耗时最高的依赖数')
+    parser.add_argument('--budget-ms', type=float, default=None, help='单个模块的导入耗时预算（毫秒）')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        report = profile_import(module)
+        over_budget = args.budget_ms is not None and report['total_ms'] > args.budget_ms
+        failed = failed or over_budget or bool(report['heavy'])
+
+        print(f"\n{module}: {report['total_ms']:.1f} ms" + ("  [超出预算]" if over_budget else ""))
+        if report['heavy']:
+            print(f"  提前导入的重量级库: {', '.join(report['heavy'])}")
+        for entry in top_imports(report['entries'], args.top):
+            print(f"  {entry['cumulative_us'] / 1000:9.1f} ms  {'  ' * entry['depth']}{entry['module']}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+会话表清理脚本
+按批删除 user_sessions 中已过期和已失效的会话，可作为定时任务运行；API进程内也有同样的后台清理线程
+
+使用方法:
+    python scripts/reap_sessions.py                    # 清理一轮
+    python scripts/reap_sessions.py --ensure-indexes   # 先把会话表索引升级为部分索引
+    python scripts/reap_sessions.py --stats            # 只输出会话表规模
+    python scripts/reap_sessions.py --loop             # 常驻运行
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from services.session_reaper import (
+    DEFAULT_BATCH_SIZE, DEFAULT_INACTIVE_GRACE_SECONDS, DEFAULT_INTERVAL_SECONDS, DEFAULT_MAX_BATCHES,
+    SessionReaper
+)
+
+logger = setup_logger('reap_sessions', level=logging.INFO)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='清理过期和已失效的用户会话')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批删除的行数')
+    parser.add_argument('--max-batches', type=int, default=DEFAULT_MAX_BATCHES, help='每轮最多批数')
+    parser.add_argument('--inactive-grace', type=int, default=DEFAULT_INACTIVE_GRACE_SECONDS,
+                        help='已失效会话保留的秒数')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL_SECONDS, help='--loop 时每轮间隔（秒）')
+    parser.add_argument('--ensure-indexes', action='store_true', help='升级会话表索引')
+    parser.add_argument('--stats', action='store_true', help='只输出会话表规模')
+    parser.add_argument('--loop', action='store_true', help='常驻运行')
+    args = parser.parse_args()
+
+    reaper = SessionReaper(interval_seconds=args.interval, batch_size=args.batch_size,
+                           max_batches=args.max_batches, inactive_grace_seconds=args.inactive_grace)
+    try:
+        if args.ensure_indexes and not reaper.ensure_indexes():
+            sys.exit(1)
+        if not args.stats:
+            if args.loop:
+                reaper.start()
+                try:
+                    reaper._thread.join()
+                except KeyboardInterrupt:
+                    reaper.stop()
+            else:
+                reaper.run_once()
+        print(json.dumps(reaper.metrics(), ensure_ascii=False, indent=2, default=str))
+    finally:
+        reaper.data_service.close()
+
+
+if __name__ == "__main__":
+    main()
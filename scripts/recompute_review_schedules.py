@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+错题复习计划夜间重算脚本
+先为 next_review_at 为空的旧条目补上复习时间，再从数据库加载全部错题条目，
+按SM-2参数重算下次复习时间并批量写回
+
+使用方法:
+    python scripts/recompute_review_schedules.py
+    python scripts/recompute_review_schedules.py --dry-run  # 仅统计，不写回数据库
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from services.data_service_v3 import DataServiceV3
+from services.review_scheduler import ReviewItem, ReviewScheduler
+
+logger = setup_logger('recompute_review_schedules', level=logging.INFO)
+
+
+def recompute(data_service: DataServiceV3, batch_size: int = 1000, dry_run: bool = False) -> int:
+    """
+    重算所有错题的复习计划
+
+    Args:
+        data_service: 数据服务实例
+        batch_size: 每批写回的条目数
+        dry_run: 为True时只计算不写回
+
+    Returns:
+        写回（或将写回）的条目数量
+    """
+    scheduler = ReviewScheduler()
+    t0 = time.time()
+    if not dry_run:
+        backfilled = data_service.backfill_next_review_at()
+        if backfilled > 0:
+            logger.info(f"补齐 {backfilled} 条错题的复习时间")
+    rows = data_service.get_review_schedule_entries()
+    scheduler.load_items(ReviewItem.from_row(row) for row in rows)
+    scheduler.recompute_all()
+
+    updates = [scheduler.get_item(str(row['id'])).to_update_params() for row in rows]
+    logger.info(f"载入 {len(rows)} 条错题，耗时 {time.time() - t0:.2f}秒")
+
+    if dry_run:
+        logger.info("dry-run 模式，不写回数据库")
+        return len(updates)
+
+    for start in range(0, len(updates), batch_size):
+        batch = updates[start:start + batch_size]
+        if not data_service.update_review_schedules(batch):
+            logger.error(f"第 {start // batch_size + 1} 批写回失败")
+    logger.info(f"复习计划写回完成，共 {len(updates)} 条，总耗时 {time.time() - t0:.2f}秒")
+    return len(updates)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='重算错题复习计划')
+    parser.add_argument('--batch-size', type=int, default=1000, help='每批写回的条目数')
+    parser.add_argument('--dry-run', action='store_true', help='仅计算，不写回数据库')
+    args = parser.parse_args()
+
+    data_service = DataServiceV3()
+    try:
+        recompute(data_service, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        data_service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+协同过滤邻居表离线训练脚本
+从提交记录构建 学生 × 题目 稀疏错题矩阵，计算题目之间的相似度并保存 top-k 邻居表
+
+使用方法:
+    python scripts/train_item_neighbors.py                 # 从 PostgreSQL 读取
+    python scripts/train_item_neighbors.py --source json   # 从 submission_history.json + 题库读取
+    python scripts/train_item_neighbors.py --k 30 --min-support 3 --output data/item_neighbors.npz
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+from typing import Iterator, List, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from recommender.collaborative import DEFAULT_NEIGHBORS_PATH, ItemNeighborTable
+
+logger = setup_logger('train_item_neighbors', level=logging.INFO)
+
+
+def iter_json_outcomes(batch_size: int = 50000) -> Iterator[List[Tuple[str, str, bool]]]:
+    """从JSON存储读取提交记录，正误取自题库中该题的分析结果"""
+    from core import history_management as hm
+    from core import question_manager as qm
+
+    bank = qm.load_bank()
+    batch = []
+    for submission in hm.load_history():
+        question = bank.get(submission.get('question_id'))
+        if not question:
+            continue
+        is_correct = (question.get('master_analysis') or {}).get('is_correct')
+        if is_correct is None:
+            continue
+        batch.append((submission.get('user_id'), submission['question_id'], bool(is_correct)))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _counted(batches, stats):
+    for batch in batches:
+        stats['rows'] += len(batch)
+        yield batch
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='训练协同过滤邻居表')
+    parser.add_argument('--source', choices=['db', 'json'], default='db', help='提交记录来源')
+    parser.add_argument('--k', type=int, default=20, help='每道题保留的邻居数')
+    parser.add_argument('--min-support', type=int, default=2, help='最少共同做错的学生数')
+    parser.add_argument('--shrinkage', type=float, default=10.0, help='相似度收缩系数')
+    parser.add_argument('--chunk-size', type=int, default=2048, help='每块计算的题目数')
+    parser.add_argument('--batch-size', type=int, default=50000, help='每批读取的提交记录数')
+    parser.add_argument('--output', default=DEFAULT_NEIGHBORS_PATH, help='邻居表输出路径')
+    args = parser.parse_args()
+
+    data_service = None
+    if args.source == 'db':
+        from services.data_service_v3 import DataServiceV3
+        data_service = DataServiceV3()
+        batches = data_service.iter_submission_outcomes(args.batch_size)
+    else:
+        batches = iter_json_outcomes(args.batch_size)
+
+    stats = {'rows': 0}
+    t0 = time.time()
+    try:
+        table = ItemNeighborTable.train(_counted(batches, stats), k=args.k, min_support=args.min_support,
+                                        shrinkage=args.shrinkage, chunk_size=args.chunk_size)
+    finally:
+        if data_service is not None:
+            data_service.close()
+
+    table.save(args.output)
+    with_neighbors = int((table.neighbors[:, 0] >= 0).sum()) if len(table) else 0
+    logger.info(
+        f"训练完成: {stats['rows']} 条提交记录, {len(table)} 道做错过的题目, "
+        f"{with_neighbors} 道有邻居, 耗时 {time.time() - t0:.2f}秒, 已保存到 {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+近似最近邻（ANN）索引
+基于倒排文件（IVF）的进程内向量索引：球面k-means粗聚类，查询时只扫描最近的 nprobe 个聚类，
+索引以 .npz 文件持久化在数据库旁边，供 DataServiceV3.find_similar_questions 使用
+"""
+
+import os
+import sys
+import math
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('ann_index', level=logging.INFO)
+
+# 小于该数量时只建一个聚类，等价于精确搜索
+MIN_POINTS_PER_LIST = 64
+DEFAULT_NPROBE = int(os.getenv('ANN_NPROBE', '8'))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回得分最高的k个位置，按得分降序"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def brute_force_search(vectors: np.ndarray, ids: Sequence[str], query: np.ndarray, k: int = 10,
+                       subjects: Sequence[Optional[str]] = None, subject: str = None,
+                       normalized: bool = False) -> List[Tuple[str, float]]:
+    """精确搜索（全量点积），作为基准和召回率参照；normalized=True 表示 vectors 已归一化"""
+    if not normalized:
+        vectors = _normalize(vectors)
+    query = _normalize(query)
+    rows = np.arange(len(ids))
+    if subject is not None and subjects is not None:
+        rows = np.array([i for i in rows if subjects[i] == subject], dtype=np.int64)
+    if len(rows) == 0:
+        return []
+    scores = vectors[rows] @ query
+    return [(ids[rows[i]], float(scores[i])) for i in _top_k(scores, k)]
+
+
+class IVFIndex:
+    """
+    倒排文件向量索引（余弦相似度）
+
+    向量在写入时归一化，余弦相似度即点积。nlist 默认取 sqrt(n)，
+    查询复杂度约为 O(nlist + n * nprobe / nlist)。
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        # 构建时数据源的版本标记（由调用方设置），随索引一起保存，用于判断索引是否过期
+        self.version = ''
+        # 生成向量的嵌入模型，不同模型的向量维度可能相同但不可比
+        self.model = ''
+        self._lock = threading.RLock()
+        self.centroids = np.zeros((1, dimension), dtype=np.float32)
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.ids: List[str] = []
+        self.subjects: List[Optional[str]] = []
+        self.assignments = np.zeros(0, dtype=np.int64)
+        self._positions: Dict[str, int] = {}
+        self._lists: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], vectors, subjects: Sequence[Optional[str]] = None,
+              nlist: int = None, iterations: int = 10, seed: int = 0) -> 'IVFIndex':
+        """
+        从全量向量构建索引
+
+        Args:
+            ids: 题目ID列表
+            vectors: 形状为 (n, dim) 的向量
+            subjects: 与 ids 对齐的学科列表，用于过滤
+            nlist: 聚类数，默认 sqrt(n)
+            iterations: k-means 迭代次数
+            seed: 随机种子
+        """
+        vectors = _normalize(vectors)
+        n, dimension = vectors.shape if vectors.ndim == 2 else (0, 0)
+        index = cls(dimension)
+        if n == 0:
+            return index
+        if nlist is None:
+            nlist = int(math.sqrt(n)) if n >= MIN_POINTS_PER_LIST * 4 else 1
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+        assignments = np.zeros(n, dtype=np.int64)
+        for _ in range(iterations if nlist > 1 else 0):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # 空聚类重新随机选点，避免聚类数塌缩
+                sums[empty] = vectors[rng.choice(n, int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+        if nlist > 1:
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+
+        index.centroids = centroids
+        index.vectors = vectors
+        index.ids = list(ids)
+        index.subjects = list(subjects) if subjects is not None else [None] * n
+        index.assignments = assignments
+        index._reindex()
+        logger.info(f"IVF索引构建完成: {n} 条向量, {nlist} 个聚类")
+        return index
+
+    def _reindex(self):
+        self._positions = {qid: i for i, qid in enumerate(self.ids)}
+        self._lists = {}
+        for row, list_id in enumerate(self.assignments.tolist()):
+            self._lists.setdefault(list_id, []).append(row)
+
+    def add(self, ids: Sequence[str], vectors, subjects: Sequence[Optional[str]] = None):
+        """
+        增量写入向量（已存在的ID会被覆盖），新向量分配到最近的现有聚类
+
+        大量写入后聚类会逐渐失衡，应定期调用 build 重建
+        """
+        vectors = _normalize(vectors)
+        subjects = list(subjects) if subjects is not None else [None] * len(ids)
+        with self._lock:
+            if self.dimension == 0:
+                self.dimension = vectors.shape[1]
+                self.centroids = vectors[:1].copy()
+                self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            assigned = np.argmax(vectors @ self.centroids.T, axis=1)
+            new_rows, new_ids, new_subjects, new_assignments = [], [], [], []
+            for qid, vector, subject, list_id in zip(ids, vectors, subjects, assigned.tolist()):
+                row = self._positions.get(qid)
+                if row is not None:
+                    self._lists[int(self.assignments[row])].remove(row)
+                    self.vectors[row] = vector
+                    self.subjects[row] = subject
+                    self.assignments[row] = list_id
+                    self._lists.setdefault(list_id, []).append(row)
+                else:
+                    new_rows.append(vector)
+                    new_ids.append(qid)
+                    new_subjects.append(subject)
+                    new_assignments.append(list_id)
+            if new_ids:
+                start = len(self.ids)
+                self.vectors = np.vstack([self.vectors, np.asarray(new_rows, dtype=np.float32)])
+                self.ids.extend(new_ids)
+                self.subjects.extend(new_subjects)
+                self.assignments = np.concatenate([self.assignments, np.asarray(new_assignments, dtype=np.int64)])
+                for offset, (qid, list_id) in enumerate(zip(new_ids, new_assignments)):
+                    self._positions[qid] = start + offset
+                    self._lists.setdefault(list_id, []).append(start + offset)
+
+    def search(self, query, k: int = 10, subject: str = None, nprobe: int = DEFAULT_NPROBE) -> List[Tuple[str, float]]:
+        """
+        查询最相似的k个向量
+
+        Args:
+            query: 查询向量
+            k: 返回数量
+            subject: 只返回该学科的题目
+            nprobe: 至少扫描的聚类数；过滤后候选不足k个时继续扫描后续聚类
+
+        Returns:
+            [(question_id, similarity)]，按相似度降序
+        """
+        query = _normalize(query)
+        with self._lock:
+            if not self.ids:
+                return []
+            order = np.argsort(-(self.centroids @ query))
+            candidates: List[int] = []
+            for probed, list_id in enumerate(order.tolist(), start=1):
+                rows = self._lists.get(list_id, [])
+                if subject is not None:
+                    rows = [r for r in rows if self.subjects[r] == subject]
+                candidates.extend(rows)
+                if probed >= nprobe and len(candidates) >= k:
+                    break
+            if not candidates:
+                return []
+            rows = np.asarray(candidates, dtype=np.int64)
+            scores = self.vectors[rows] @ query
+            return [(self.ids[rows[i]], float(scores[i])) for i in _top_k(scores, k)]
+
+    def save(self, path: str):
+        """持久化索引（原子替换）"""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                centroids=self.centroids,
+                vectors=self.vectors,
+                assignments=self.assignments,
+                ids=np.asarray(self.ids, dtype=str),
+                subjects=np.asarray(['' if s is None else s for s in self.subjects], dtype=str),
+                version=np.asarray(self.version),
+                model=np.asarray(self.model),
+            )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFIndex':
+        """从文件加载索引"""
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data['vectors'].shape[1])
+            index.centroids = data['centroids']
+            index.vectors = data['vectors']
+            index.assignments = data['assignments']
+            index.ids = data['ids'].tolist()
+            index.subjects = [s or None for s in data['subjects'].tolist()]
+            index.version = str(data['version']) if 'version' in data.files else ''
+            index.model = str(data['model']) if 'model' in data.files else ''
+        index._reindex()
+        return index
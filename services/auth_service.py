@@ -5,13 +5,17 @@
 
 import os
 import sys
+import io
+import csv
 import jwt
-import bcrypt
+import json
+import time
+import asyncio
 import secrets
-from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
 import logging
 
 # 添加项目根目录到Python路径
@@ -19,40 +23,66 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.logger_config import setup_logger
 from services.data_service_v3 import DataServiceV3
+from services.last_login_writer import LastLoginWriter
+from services.password_hasher import PasswordHasher, PasswordHasherBusy, get_password_hasher
+from services.token_cache import TokenCache, get_token_cache, hash_token
 
 logger = setup_logger('auth_service', level=logging.INFO)
 
+# bcrypt 哈希 $2b$12$ + 22位盐值
+BCRYPT_SALT_LENGTH = 29
+
+USER_ROLES = ('student', 'teacher', 'grade_manager', 'principal', 'admin')
+# users 表中的 JSONB 字段；CSV名单中用分号分隔多个值
+BULK_JSON_FIELDS = ('subject_teach', 'manages_classes', 'permissions')
+BULK_REGISTER_BATCH_SIZE = int(os.getenv('BULK_REGISTER_BATCH_SIZE', '500'))
+
 class AuthService:
     """用户认证服务类"""
     
-    def __init__(self, data_service: DataServiceV3 = None):
+    def __init__(self, data_service: DataServiceV3 = None, token_cache: TokenCache = None,
+                 password_hasher: PasswordHasher = None, last_login_writer: LastLoginWriter = None):
         """
         初始化认证服务
         
         Args:
-            data_service: 数据服务实例
+            data_service: 数据服务实例，默认使用进程内共享的数据库引擎
+            token_cache: 认证缓存，默认使用按JWT密钥共享的进程内缓存
+            password_hasher: 密码哈希器，默认使用进程内共享的进程池
+            last_login_writer: 最后登录时间的批量写入器，默认基于 data_service 创建
         """
-        self.data_service = data_service or DataServiceV3()
+        if data_service is None:
+            from core.resources import get_resource
+            data_service = DataServiceV3(engine=get_resource('db_engine'))
+        self.data_service = data_service
         
         # JWT配置
         self.jwt_secret = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
         self.jwt_algorithm = 'HS256'
         self.access_token_expire_minutes = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', '30'))
         self.refresh_token_expire_days = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', '7'))
+        self.token_cache = token_cache if token_cache is not None else get_token_cache(self.jwt_secret, self.jwt_algorithm)
+        self.password_hasher = password_hasher or get_password_hasher()
+        self.last_login_writer = (last_login_writer if last_login_writer is not None
+                                  else LastLoginWriter(self.data_service))
     
     def hash_password(self, password: str) -> Tuple[str, str]:
         """
-        哈希密码
+        哈希密码（在密码哈希进程池中计算）
         
         Args:
             password: 明文密码
             
         Returns:
-            (password_hash, salt) 元组
+            (password_hash, salt) 元组，salt 为哈希中内含的盐值部分
         """
-        salt = bcrypt.gensalt()
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return password_hash.decode('utf-8'), salt.decode('utf-8')
+        password_hash = self.password_hasher.hash(password)
+        return password_hash, password_hash[:BCRYPT_SALT_LENGTH]
+    
+    async def hash_password_async(self, password: str) -> Tuple[str, str]:
+        """异步哈希密码"""
+        password_hash = await self.password_hasher.hash_async(password)
+        return password_hash, password_hash[:BCRYPT_SALT_LENGTH]
     
     def verify_password(self, password: str, password_hash: str, salt: str) -> bool:
         """
@@ -67,9 +97,24 @@ class AuthService:
             验证是否成功
         """
         try:
-            # 使用存储的盐值重新哈希密码
-            check_hash = bcrypt.hashpw(password.encode('utf-8'), salt.encode('utf-8'))
-            return check_hash.decode('utf-8') == password_hash
+            # 盐值已包含在bcrypt哈希中，存储的盐值必须与之一致
+            if salt and not password_hash.startswith(salt):
+                return False
+            return self.password_hasher.verify(password, password_hash)
+        except PasswordHasherBusy:
+            raise
+        except Exception as e:
+            logger.error(f"密码验证失败: {e}")
+            return False
+    
+    async def verify_password_async(self, password: str, password_hash: str, salt: str) -> bool:
+        """异步验证密码"""
+        try:
+            if salt and not password_hash.startswith(salt):
+                return False
+            return await self.password_hasher.verify_async(password, password_hash)
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             logger.error(f"密码验证失败: {e}")
             return False
@@ -94,7 +139,9 @@ class AuthService:
             'type': 'access',
             'exp': expire
         }
-        return jwt.encode(payload, self.jwt_secret, algorithm=self.jwt_algorithm)
+        token = jwt.encode(payload, self.jwt_secret, algorithm=self.jwt_algorithm)
+        self.token_cache.track(user_id, self._hash_token(token), expire.replace(tzinfo=timezone.utc).timestamp())
+        return token
     
     def create_refresh_token(self, user_id: str) -> str:
         """
@@ -112,20 +159,31 @@ class AuthService:
             'type': 'refresh',
             'exp': expire
         }
-        return jwt.encode(payload, self.jwt_secret, algorithm=self.jwt_algorithm)
+        token = jwt.encode(payload, self.jwt_secret, algorithm=self.jwt_algorithm)
+        self.token_cache.track(user_id, self._hash_token(token), expire.replace(tzinfo=timezone.utc).timestamp())
+        return token
     
     def verify_token(self, token: str) -> Optional[Dict]:
         """
         验证令牌
         
+        先查认证缓存（已撤销的令牌直接拒绝），未命中时才做完整的JWT解码并缓存声明
+        
         Args:
             token: JWT令牌
             
         Returns:
             解码后的令牌数据，验证失败返回None
         """
+        if not token:
+            return None
+        token_hash = self._hash_token(token)
+        found, claims = self.token_cache.get_claims(token_hash)
+        if found:
+            return claims
         try:
             payload = jwt.decode(token, self.jwt_secret, algorithms=[self.jwt_algorithm])
+            self.token_cache.put_claims(token_hash, payload)
             return payload
         except jwt.ExpiredSignatureError:
             logger.warning("令牌已过期")
@@ -145,73 +203,46 @@ class AuthService:
             (success, message, user_info) 元组
         """
         try:
-            # 验证必需字段
-            required_fields = ['name', 'email', 'password', 'role']
-            for field in required_fields:
-                if field not in user_data:
-                    return False, f"缺少必需字段: {field}", None
-            
-            # 验证邮箱格式
-            if not self._is_valid_email(user_data['email']):
-                return False, "邮箱格式无效", None
-            
-            # 验证密码强度
-            if not self._is_valid_password(user_data['password']):
-                return False, "密码强度不足，至少需要8个字符", None
-            
-            # 检查邮箱是否已存在
-            if self._email_exists(user_data['email']):
-                return False, "邮箱已被注册", None
+            error = self._validate_registration(user_data)
+            if error:
+                return False, error, None
             
             # 哈希密码
             password_hash, salt = self.hash_password(user_data['password'])
             
-            # 生成用户ID
-            user_id = self._generate_user_id(user_data['role'])
-            
-            # 准备用户数据
-            user_record = {
-                'id': user_id,
-                'name': user_data['name'],
-                'email': user_data['email'],
-                'role': user_data['role'],
-                'password_hash': password_hash,
-                'salt': salt,
-                'phone': user_data.get('phone'),
-                'school_id': user_data.get('school_id'),
-                'grade_id': user_data.get('grade_id'),
-                'class_id': user_data.get('class_id'),
-                'student_number': user_data.get('student_number'),
-                'gender': user_data.get('gender'),
-                'birth_date': user_data.get('birth_date'),
-                'parent_phone': user_data.get('parent_phone'),
-                'subject_teach': user_data.get('subject_teach'),
-                'manages_classes': user_data.get('manages_classes'),
-                'permissions': user_data.get('permissions', []),
-                'status': 'active'
-            }
+            user_info = self._insert_user(user_data, password_hash, salt)
+            logger.info(f"用户注册成功: {user_data['email']}")
+            return True, "注册成功", user_info
             
-            # 插入用户数据
-            with self.data_service.get_session() as session:
-                session.execute(text("""
-                    INSERT INTO users (id, name, email, role, password_hash, salt, phone,
-                                     school_id, grade_id, class_id, student_number, gender,
-                                     birth_date, parent_phone, subject_teach, manages_classes,
-                                     permissions, status, created_at, updated_at)
-                    VALUES (:id, :name, :email, :role, :password_hash, :salt, :phone,
-                           :school_id, :grade_id, :class_id, :student_number, :gender,
-                           :birth_date, :parent_phone, :subject_teach, :manages_classes,
-                           :permissions, :status, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                """), user_record)
-                session.commit()
+        except PasswordHasherBusy:
+            return False, "注册请求过多，请稍后重试", None
+        except SQLAlchemyError as e:
+            logger.error(f"用户注册失败: {e}")
+            return False, "注册失败，请稍后重试", None
+        except Exception as e:
+            logger.error(f"用户注册异常: {e}")
+            return False, "注册过程中发生错误", None
+    
+    async def register_user_async(self, user_data: Dict) -> Tuple[bool, str, Optional[Dict]]:
+        """
+        异步注册新用户：数据库访问在线程中执行，bcrypt哈希交给进程池，不阻塞事件循环
+        
+        Raises:
+            PasswordHasherBusy: 密码哈希队列已满，调用方应返回503
+        """
+        try:
+            error = await asyncio.to_thread(self._validate_registration, user_data)
+            if error:
+                return False, error, None
             
-            # 返回用户信息（不包含密码）
-            user_info = {k: v for k, v in user_record.items() 
-                        if k not in ['password_hash', 'salt']}
+            password_hash, salt = await self.hash_password_async(user_data['password'])
             
+            user_info = await asyncio.to_thread(self._insert_user, user_data, password_hash, salt)
             logger.info(f"用户注册成功: {user_data['email']}")
             return True, "注册成功", user_info
             
+        except PasswordHasherBusy:
+            raise
         except SQLAlchemyError as e:
             logger.error(f"用户注册失败: {e}")
             return False, "注册失败，请稍后重试", None
@@ -219,6 +250,247 @@ class AuthService:
             logger.error(f"用户注册异常: {e}")
             return False, "注册过程中发生错误", None
     
+    def bulk_register_users(self, rows: List[Dict], batch_size: int = BULK_REGISTER_BATCH_SIZE) -> Dict:
+        """
+        批量注册用户（开学导入全校名单）
+        
+        逐行校验后，用一次查询找出已注册的邮箱，在密码哈希进程池中并行哈希，
+        再按批次用单条多行 INSERT 写入；某一批写入失败时退回逐行写入以给出每行的结果
+        
+        Args:
+            rows: 用户数据列表，字段同 register_user
+            batch_size: 每条 INSERT 语句写入的行数
+            
+        Returns:
+            {'total', 'created', 'failed', 'seconds', 'rows_per_sec',
+             'results': [{'row', 'email', 'success', 'message', 'user_id'}]}
+        """
+        start = time.perf_counter()
+        results = [{'row': i + 1, 'email': row.get('email'), 'success': False, 'message': None, 'user_id': None}
+                   for i, row in enumerate(rows)]
+        
+        # 逐行校验并去除名单内重复的邮箱
+        pending, first_row = [], {}
+        for i, row in enumerate(rows):
+            error = self._check_user_fields(row)
+            if not error and row['email'] in first_row:
+                error = f"与第{first_row[row['email']] + 1}行邮箱重复"
+            if error:
+                results[i]['message'] = error
+                continue
+            first_row[row['email']] = i
+            pending.append(i)
+        
+        try:
+            # 一次查询找出已注册的邮箱
+            existing = self._existing_emails([rows[i]['email'] for i in pending])
+            for i in pending:
+                if rows[i]['email'] in existing:
+                    results[i]['message'] = "邮箱已被注册"
+            pending = [i for i in pending if rows[i]['email'] not in existing]
+            
+            # 并行哈希密码
+            hashes = self.password_hasher.hash_many([rows[i]['password'] for i in pending])
+            
+            for offset in range(0, len(pending), batch_size):
+                batch = pending[offset:offset + batch_size]
+                records = [self._build_user_record(rows[i], password_hash, password_hash[:BCRYPT_SALT_LENGTH])
+                           for i, password_hash in zip(batch, hashes[offset:offset + batch_size])]
+                self._insert_user_batch(batch, records, results)
+        except SQLAlchemyError as e:
+            logger.error(f"批量注册失败: {e}")
+            for result in results:
+                if not result['success'] and result['message'] is None:
+                    result['message'] = "注册失败，请稍后重试"
+        
+        seconds = time.perf_counter() - start
+        created = sum(1 for result in results if result['success'])
+        report = {
+            'total': len(rows),
+            'created': created,
+            'failed': len(rows) - created,
+            'seconds': round(seconds, 3),
+            'rows_per_sec': round(len(rows) / seconds, 1) if seconds > 0 else None,
+            'results': results
+        }
+        logger.info(f"批量注册完成: {created}/{len(rows)} 行成功, 耗时 {seconds:.2f}秒, {report['rows_per_sec']} 行/秒")
+        return report
+    
+    def _existing_emails(self, emails: List[str]) -> set:
+        """查询已注册的邮箱"""
+        if not emails:
+            return set()
+        with self.data_service.get_session() as session:
+            query = session.execute(text("""
+                SELECT email FROM users WHERE email = ANY(:emails)
+            """), {'emails': emails})
+            return {row.email for row in query.fetchall()}
+    
+    def _insert_user_batch(self, row_indexes: List[int], records: List[Dict], results: List[Dict]):
+        """用单条多行 INSERT 写入一批用户；该批失败时（如某行的班级不存在、日期格式错误）退回逐行写入"""
+        try:
+            inserted = self._insert_user_records(records)
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"批量写入失败，改为逐行写入: {e}")
+            inserted = set()
+            for i, record in zip(row_indexes, records):
+                try:
+                    inserted |= self._insert_user_records([record])
+                except (IntegrityError, DataError) as row_error:
+                    results[i]['message'] = f"写入失败: {getattr(row_error, 'orig', row_error)}"
+        
+        for i, record in zip(row_indexes, records):
+            if record['email'] in inserted:
+                results[i].update(success=True, message="注册成功", user_id=record['id'])
+            elif results[i]['message'] is None:
+                # 导入期间被其他请求抢先注册
+                results[i]['message'] = "邮箱已被注册"
+    
+    def _insert_user_records(self, records: List[Dict]) -> set:
+        """执行多行 INSERT，返回实际写入的邮箱"""
+        values, params = [], {}
+        for n, record in enumerate(records):
+            values.append(
+                f"(:id_{n}, :name_{n}, :email_{n}, :role_{n}, :password_hash_{n}, :salt_{n}, :phone_{n}, "
+                f":school_id_{n}, :grade_id_{n}, :class_id_{n}, :student_number_{n}, :gender_{n}, "
+                f":birth_date_{n}, :parent_phone_{n}, CAST(:subject_teach_{n} AS JSONB), "
+                f"CAST(:manages_classes_{n} AS JSONB), CAST(:permissions_{n} AS JSONB), :status_{n}, "
+                f"CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            )
+            for key, value in record.items():
+                if key in BULK_JSON_FIELDS:
+                    value = json.dumps(value, ensure_ascii=False) if value is not None else None
+                params[f"{key}_{n}"] = value
+        
+        with self.data_service.get_session() as session:
+            query = session.execute(text(f"""
+                INSERT INTO users (id, name, email, role, password_hash, salt, phone,
+                                 school_id, grade_id, class_id, student_number, gender,
+                                 birth_date, parent_phone, subject_teach, manages_classes,
+                                 permissions, status, created_at, updated_at)
+                VALUES {', '.join(values)}
+                ON CONFLICT (email) DO NOTHING
+                RETURNING email
+            """), params)
+            inserted = {row.email for row in query.fetchall()}
+            session.commit()
+        return inserted
+    
+    @staticmethod
+    def parse_roster(content, fmt: str = 'csv') -> List[Dict]:
+        """
+        解析名单文件
+        
+        Args:
+            content: 文件内容（str 或 bytes）
+            fmt: 'csv'（表头为字段名，列表字段用分号分隔）或 'json'（对象数组，或 {"users": [...]}）
+            
+        Returns:
+            用户数据列表
+        """
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig')
+        if fmt == 'json':
+            data = json.loads(content)
+            rows = data.get('users', []) if isinstance(data, dict) else data
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ValueError("JSON名单必须是对象数组")
+            return rows
+        if fmt != 'csv':
+            raise ValueError(f"不支持的名单格式: {fmt}")
+        
+        rows = []
+        for record in csv.DictReader(io.StringIO(content)):
+            row = {}
+            for key, value in record.items():
+                if key is None:
+                    continue
+                key, value = key.strip(), (value or '').strip()
+                if not value:
+                    continue
+                row[key] = [item.strip() for item in value.split(';') if item.strip()] if key in BULK_JSON_FIELDS else value
+            rows.append(row)
+        return rows
+    
+    def _validate_registration(self, user_data: Dict) -> Optional[str]:
+        """校验注册数据，返回错误信息，通过时返回None"""
+        error = self._check_user_fields(user_data)
+        if error:
+            return error
+        
+        # 检查邮箱是否已存在
+        if self._email_exists(user_data['email']):
+            return "邮箱已被注册"
+        return None
+    
+    def _check_user_fields(self, user_data: Dict) -> Optional[str]:
+        """校验注册数据中不需要访问数据库的部分"""
+        # 验证必需字段
+        required_fields = ['name', 'email', 'password', 'role']
+        for field in required_fields:
+            if field not in user_data:
+                return f"缺少必需字段: {field}"
+        
+        # 验证邮箱格式
+        if not self._is_valid_email(user_data['email']):
+            return "邮箱格式无效"
+        
+        # 验证密码强度
+        if not self._is_valid_password(user_data['password']):
+            return "密码强度不足，至少需要8个字符"
+        
+        if user_data['role'] not in USER_ROLES:
+            return f"无效的用户角色: {user_data['role']}"
+        return None
+    
+    def _insert_user(self, user_data: Dict, password_hash: str, salt: str) -> Dict:
+        """插入用户记录，返回不含密码的用户信息"""
+        user_record = self._build_user_record(user_data, password_hash, salt)
+        
+        # 插入用户数据
+        with self.data_service.get_session() as session:
+            session.execute(text("""
+                INSERT INTO users (id, name, email, role, password_hash, salt, phone,
+                                 school_id, grade_id, class_id, student_number, gender,
+                                 birth_date, parent_phone, subject_teach, manages_classes,
+                                 permissions, status, created_at, updated_at)
+                VALUES (:id, :name, :email, :role, :password_hash, :salt, :phone,
+                       :school_id, :grade_id, :class_id, :student_number, :gender,
+                       :birth_date, :parent_phone, :subject_teach, :manages_classes,
+                       :permissions, :status, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            """), user_record)
+            session.commit()
+        
+        # 返回用户信息（不包含密码）
+        return {k: v for k, v in user_record.items() 
+                if k not in ['password_hash', 'salt']}
+    
+    def _build_user_record(self, user_data: Dict, password_hash: str, salt: str) -> Dict:
+        """组装 users 表的一行数据"""
+        # 生成用户ID
+        user_id = self._generate_user_id(user_data['role'])
+        
+        return {
+            'id': user_id,
+            'name': user_data['name'],
+            'email': user_data['email'],
+            'role': user_data['role'],
+            'password_hash': password_hash,
+            'salt': salt,
+            'phone': user_data.get('phone'),
+            'school_id': user_data.get('school_id'),
+            'grade_id': user_data.get('grade_id'),
+            'class_id': user_data.get('class_id'),
+            'student_number': user_data.get('student_number'),
+            'gender': user_data.get('gender'),
+            'birth_date': user_data.get('birth_date'),
+            'parent_phone': user_data.get('parent_phone'),
+            'subject_teach': user_data.get('subject_teach'),
+            'manages_classes': user_data.get('manages_classes'),
+            'permissions': user_data.get('permissions', []),
+            'status': 'active'
+        }
+    
     def login_user(self, email: str, password: str) -> Tuple[bool, str, Optional[Dict]]:
         """
         用户登录
@@ -232,17 +504,9 @@ class AuthService:
         """
         try:
             # 获取用户信息
-            with self.data_service.get_session() as session:
-                query = session.execute(text("""
-                    SELECT id, name, email, role, password_hash, salt, permissions, status
-                    FROM users WHERE email = :email
-                """), {'email': email})
-                
-                user = query.fetchone()
-                if not user:
-                    return False, "邮箱或密码错误", None
-                
-                user_dict = dict(user._mapping)
+            user_dict = self._get_login_user(email)
+            if not user_dict:
+                return False, "邮箱或密码错误", None
             
             # 检查用户状态
             if user_dict['status'] != 'active':
@@ -252,43 +516,43 @@ class AuthService:
             if not self.verify_password(password, user_dict['password_hash'], user_dict['salt']):
                 return False, "邮箱或密码错误", None
             
-            # 创建令牌
-            access_token = self.create_access_token(
-                user_dict['id'], 
-                user_dict['role'], 
-                user_dict.get('permissions', [])
-            )
-            refresh_token = self.create_refresh_token(user_dict['id'])
+            auth_data = self._complete_login(user_dict, password)
+            logger.info(f"用户登录成功: {email}")
+            return True, "登录成功", auth_data
             
-            # 保存会话信息
-            self._save_user_session(user_dict['id'], access_token, refresh_token)
+        except PasswordHasherBusy:
+            return False, "登录请求过多，请稍后重试", None
+        except SQLAlchemyError as e:
+            logger.error(f"用户登录失败: {e}")
+            return False, "登录失败，请稍后重试", None
+        except Exception as e:
+            logger.error(f"用户登录异常: {e}")
+            return False, "登录过程中发生错误", None
+    
+    async def login_user_async(self, email: str, password: str) -> Tuple[bool, str, Optional[Dict]]:
+        """
+        异步登录：数据库访问在线程中执行，bcrypt校验交给进程池，不阻塞事件循环
+        
+        Raises:
+            PasswordHasherBusy: 密码哈希队列已满，调用方应返回503
+        """
+        try:
+            user_dict = await asyncio.to_thread(self._get_login_user, email)
+            if not user_dict:
+                return False, "邮箱或密码错误", None
             
-            # 更新最后登录时间
-            with self.data_service.get_session() as session:
-                session.execute(text("""
-                    UPDATE users SET last_login = CURRENT_TIMESTAMP 
-                    WHERE id = :user_id
-                """), {'user_id': user_dict['id']})
-                session.commit()
+            if user_dict['status'] != 'active':
+                return False, "账户已被禁用", None
             
-            # 返回认证数据
-            auth_data = {
-                'access_token': access_token,
-                'refresh_token': refresh_token,
-                'token_type': 'bearer',
-                'expires_in': self.access_token_expire_minutes * 60,
-                'user': {
-                    'id': user_dict['id'],
-                    'name': user_dict['name'],
-                    'email': user_dict['email'],
-                    'role': user_dict['role'],
-                    'permissions': user_dict.get('permissions', [])
-                }
-            }
+            if not await self.verify_password_async(password, user_dict['password_hash'], user_dict['salt']):
+                return False, "邮箱或密码错误", None
             
+            auth_data = await asyncio.to_thread(self._complete_login, user_dict, password)
             logger.info(f"用户登录成功: {email}")
             return True, "登录成功", auth_data
             
+        except PasswordHasherBusy:
+            raise
         except SQLAlchemyError as e:
             logger.error(f"用户登录失败: {e}")
             return False, "登录失败，请稍后重试", None
@@ -296,6 +560,69 @@ class AuthService:
             logger.error(f"用户登录异常: {e}")
             return False, "登录过程中发生错误", None
     
+    def _get_login_user(self, email: str) -> Optional[Dict]:
+        """按邮箱读取登录所需的用户信息"""
+        with self.data_service.get_session() as session:
+            query = session.execute(text("""
+                SELECT id, name, email, role, password_hash, salt, permissions, status
+                FROM users WHERE email = :email
+            """), {'email': email})
+            
+            user = query.fetchone()
+            return dict(user._mapping) if user else None
+    
+    def _complete_login(self, user_dict: Dict, password: str) -> Dict:
+        """
+        密码校验通过后：签发令牌，在一个事务里保存会话（工作因子变化时顺带重新哈希密码），
+        最后登录时间交给批量写入器
+        
+        读取用户和写入会话分两次获取连接，bcrypt校验期间不占用连接池
+        """
+        # 创建令牌
+        access_token = self.create_access_token(
+            user_dict['id'], 
+            user_dict['role'], 
+            user_dict.get('permissions', [])
+        )
+        refresh_token = self.create_refresh_token(user_dict['id'])
+        session_data = self._session_record(user_dict['id'], access_token, refresh_token)
+        
+        # 旧工作因子的哈希在登录成功时升级；失败不影响登录
+        rehash = None
+        if self.password_hasher.needs_rehash(user_dict['password_hash']):
+            try:
+                rehash = self.hash_password(password)
+            except Exception as e:
+                logger.warning(f"密码重新哈希失败: {e}")
+        
+        with self.data_service.get_session() as session:
+            self._insert_user_session(session, session_data)
+            if rehash:
+                session.execute(text("""
+                    UPDATE users SET password_hash = :password_hash, salt = :salt
+                    WHERE id = :user_id
+                """), {'user_id': user_dict['id'], 'password_hash': rehash[0], 'salt': rehash[1]})
+            session.commit()
+        self._cache_new_session(session_data)
+        
+        # 最后登录时间合并后批量写回
+        self.last_login_writer.record(user_dict['id'])
+        
+        # 返回认证数据
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'token_type': 'bearer',
+            'expires_in': self.access_token_expire_minutes * 60,
+            'user': {
+                'id': user_dict['id'],
+                'name': user_dict['name'],
+                'email': user_dict['email'],
+                'role': user_dict['role'],
+                'permissions': user_dict.get('permissions', [])
+            }
+        }
+    
     def refresh_token(self, refresh_token: str) -> Tuple[bool, str, Optional[Dict]]:
         """
         刷新访问令牌
@@ -367,18 +694,24 @@ class AuthService:
             是否成功登出
         """
         try:
+            token_hash = self._hash_token(access_token)
+            
             # 使会话失效
             with self.data_service.get_session() as session:
                 session.execute(text("""
                     UPDATE user_sessions 
                     SET is_active = false, updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = :user_id AND token_hash = :token_hash
+                    WHERE user_id = :user_id AND token_hash = :token_hash AND is_active = true
                 """), {
                     'user_id': user_id,
-                    'token_hash': self._hash_token(access_token)
+                    'token_hash': token_hash
                 })
                 session.commit()
             
+            # 撤销访问令牌并把会话缓存写为无效
+            self.token_cache.revoke(token_hash, self._token_expiry(access_token))
+            self.token_cache.end_session(user_id, token_hash)
+            
             logger.info(f"用户登出成功: {user_id}")
             return True
             
@@ -564,30 +897,55 @@ class AuthService:
     
     def _hash_token(self, token: str) -> str:
         """哈希令牌用于存储"""
-        import hashlib
-        return hashlib.sha256(token.encode()).hexdigest()
+        return hash_token(token)
+    
+    def _token_expiry(self, token: str) -> Optional[float]:
+        """读取令牌的exp（不验证签名），用于确定撤销记录的保留时间"""
+        try:
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+            return float(exp) if exp is not None else None
+        except Exception:
+            return None
+    
+    def _session_record(self, user_id: str, access_token: str, refresh_token: str) -> Dict:
+        """构造 user_sessions 行"""
+        return {
+            'user_id': user_id,
+            'token_hash': self._hash_token(access_token),
+            'refresh_token_hash': self._hash_token(refresh_token),
+            'expires_at': datetime.utcnow() + timedelta(days=self.refresh_token_expire_days)
+        }
+    
+    def _insert_user_session(self, session, session_data: Dict):
+        session.execute(text("""
+            INSERT INTO user_sessions 
+            (user_id, token_hash, refresh_token_hash, expires_at, is_active)
+            VALUES (:user_id, :token_hash, :refresh_token_hash, :expires_at, true)
+        """), session_data)
+    
+    def _cache_new_session(self, session_data: Dict):
+        # 写穿：新会话在刷新时无需回源数据库
+        self.token_cache.put_session(
+            session_data['user_id'], session_data['refresh_token_hash'], True,
+            access_hash=session_data['token_hash'],
+            session_expires_at=session_data['expires_at'].replace(tzinfo=timezone.utc).timestamp()
+        )
     
     def _save_user_session(self, user_id: str, access_token: str, refresh_token: str):
         """保存用户会话"""
         try:
+            session_data = self._session_record(user_id, access_token, refresh_token)
             with self.data_service.get_session() as session:
-                session.execute(text("""
-                    INSERT INTO user_sessions 
-                    (user_id, token_hash, refresh_token_hash, expires_at, is_active)
-                    VALUES (:user_id, :token_hash, :refresh_token_hash, :expires_at, true)
-                """), {
-                    'user_id': user_id,
-                    'token_hash': self._hash_token(access_token),
-                    'refresh_token_hash': self._hash_token(refresh_token),
-                    'expires_at': datetime.utcnow() + timedelta(days=self.refresh_token_expire_days)
-                })
+                self._insert_user_session(session, session_data)
                 session.commit()
+            self._cache_new_session(session_data)
         except Exception as e:
             logger.error(f"保存用户会话失败: {e}")
     
     def _update_user_session(self, user_id: str, new_access_token: str):
         """更新用户会话"""
         try:
+            token_hash = self._hash_token(new_access_token)
             with self.data_service.get_session() as session:
                 session.execute(text("""
                     UPDATE user_sessions 
@@ -595,29 +953,44 @@ class AuthService:
                     WHERE user_id = :user_id AND is_active = true
                 """), {
                     'user_id': user_id,
-                    'token_hash': self._hash_token(new_access_token)
+                    'token_hash': token_hash
                 })
                 session.commit()
+            self.token_cache.update_session_access(user_id, token_hash)
         except Exception as e:
             logger.error(f"更新用户会话失败: {e}")
     
     def _is_session_valid(self, user_id: str, refresh_token: str) -> bool:
-        """检查会话是否有效"""
+        """检查会话是否有效（先查会话缓存，未命中时回源数据库并缓存结果）"""
+        refresh_hash = self._hash_token(refresh_token)
+        cached = self.token_cache.get_session(refresh_hash)
+        if cached is not None:
+            return cached
         try:
             with self.data_service.get_session() as session:
                 query = session.execute(text("""
-                    SELECT 1 FROM user_sessions 
+                    SELECT expires_at FROM user_sessions 
                     WHERE user_id = :user_id 
                     AND refresh_token_hash = :refresh_token_hash 
                     AND is_active = true 
                     AND expires_at > CURRENT_TIMESTAMP
                 """), {
                     'user_id': user_id,
-                    'refresh_token_hash': self._hash_token(refresh_token)
+                    'refresh_token_hash': refresh_hash
                 })
-                return query.fetchone() is not None
+                row = query.fetchone()
         except:
             return False
+        
+        expires_at = getattr(row, 'expires_at', None) if row is not None else None
+        if isinstance(expires_at, datetime):
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            expires_at = expires_at.timestamp()
+        else:
+            expires_at = None
+        self.token_cache.put_session(user_id, refresh_hash, row is not None, session_expires_at=expires_at)
+        return row is not None
     
     def _invalidate_user_sessions(self, user_id: str):
         """使用户所有会话失效"""
@@ -626,11 +999,14 @@ class AuthService:
                 session.execute(text("""
                     UPDATE user_sessions 
                     SET is_active = false, updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = :user_id
+                    WHERE user_id = :user_id AND is_active = true
                 """), {'user_id': user_id})
                 session.commit()
         except Exception as e:
             logger.error(f"使用户会话失效失败: {e}")
+        finally:
+            # 无论数据库是否更新成功，本进程内都不再接受该用户已签发的令牌
+            self.token_cache.revoke_user(user_id)
     
     def _generate_reset_token(self, user_id: str) -> str:
         """生成密码重置令牌"""
@@ -653,6 +1029,7 @@ class AuthService:
         return None
     
     def close(self):
-        """关闭服务"""
+        """关闭服务（先写回待写入的最后登录时间）"""
+        self.last_login_writer.stop()
         if self.data_service:
             self.data_service.close() 
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+多题批量分析
+单题分析每次请求都要带上约1k token的示例；批量分析把多道互相独立的题目放进同一个请求，
+示例只发送一次，大模型按题目编号返回JSON数组。
+批次大小按token预算自动确定；批量结果中缺失或无法解析的题目改为逐题调用
+
+使用方: scripts/bulk_analyze.py（题目文本批量入库、整张练习卷图片）
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from services import llm_service
+
+logger = setup_logger('batch_analyzer', level=logging.INFO)
+
+# 每个请求最多的题目数（题目越多，单题出错时重试的代价越大）
+DEFAULT_MAX_ITEMS = int(os.getenv('LLM_BATCH_MAX_ITEMS', '8'))
+# 每个请求中题目文本部分的token上限（示例部分固定，不计入）
+DEFAULT_INPUT_TOKEN_BUDGET = int(os.getenv('LLM_BATCH_INPUT_TOKENS', '4000'))
+# 每道题预留的输出token，单题分析的 max_tokens 为1500，实际输出一般在300-500之间
+DEFAULT_OUTPUT_TOKENS_PER_ITEM = int(os.getenv('LLM_BATCH_OUTPUT_TOKENS_PER_ITEM', '500'))
+# 单个请求的输出上限（deepseek-chat 最多8K）
+DEFAULT_MAX_OUTPUT_TOKENS = int(os.getenv('LLM_BATCH_MAX_OUTPUT_TOKENS', '8000'))
+# 同时进行的请求数
+DEFAULT_WORKERS = int(os.getenv('LLM_BATCH_WORKERS', '4'))
+# 每道题的编号和代码块标记
+ITEM_OVERHEAD_TOKENS = 12
+
+_CJK = re.compile(r'[　-〿㐀-鿿＀-￯]')
+_ARRAY_BLOCK = re.compile(r'```(?:json)?\s*(\[[\s\S]*\])\s*```')
+_OBJECT_BLOCK = re.compile(r'```json\n({[\s\S]*?})\n```')
+# 练习卷题号："1." "2、" "（3）"，排除 "3.5" 这样的小数
+_QUESTION_NUMBER = re.compile(r'^\s*(?:[（(]\s*(\d{1,2})\s*[)）]|(\d{1,2})\s*(?:、|[.．](?!\d)))\s*')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数：中文字符按每字1个，其他字符按每4个1个（偏保守）"""
+    text = text or ''
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def plan_batches(texts: List[str], max_items: int = DEFAULT_MAX_ITEMS,
+                 input_token_budget: int = DEFAULT_INPUT_TOKEN_BUDGET,
+                 output_tokens_per_item: int = DEFAULT_OUTPUT_TOKENS_PER_ITEM,
+                 max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS) -> List[List[int]]:
+    """
+    按顺序把题目分成批次，每批同时满足题目数、输入token和输出token的上限
+
+    Returns:
+        每批题目在 texts 中的下标；超出输入预算的单道题自成一批
+    """
+    max_items = max(1, min(max_items, max_output_tokens // max(output_tokens_per_item, 1)))
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text) + ITEM_OVERHEAD_TOKENS
+        if current and (len(current) >= max_items or current_tokens + tokens > input_token_budget):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _valid_analysis(item) -> bool:
+    return isinstance(item, dict) and bool(item.get('subject') or item.get('solution_steps'))
+
+
+def parse_batch_response(response: str, count: int) -> Dict[int, Dict]:
+    """
+    解析批量分析返回的JSON数组
+
+    Returns:
+        题目下标（从0开始）-> 分析结果；缺失、重复或格式不对的题目不出现在结果中
+    """
+    response = response or ''
+    match = _ARRAY_BLOCK.search(response)
+    candidate = match.group(1) if match else response[response.find('['):response.rfind(']') + 1]
+    try:
+        items = json.loads(candidate)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    parsed: Dict[int, Dict] = {}
+    for item in items:
+        if not _valid_analysis(item):
+            continue
+        try:
+            index = int(item.get('id')) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and index not in parsed:
+            parsed[index] = {key: value for key, value in item.items() if key != 'id'}
+    return parsed
+
+
+def parse_single_response(response: str) -> Optional[Dict]:
+    """解析单题分析的返回（与搜题流水线相同的格式）"""
+    response = response or ''
+    match = _OBJECT_BLOCK.search(response)
+    try:
+        analysis = json.loads(match.group(1) if match else response)
+    except json.JSONDecodeError:
+        return None
+    return analysis if _valid_analysis(analysis) else None
+
+
+def split_worksheet(text: str) -> List[str]:
+    """
+    按题号（1. 2. 3. 或 （1）（2））把整张练习卷的OCR文本拆成单独的题目
+
+    题号必须从1开始连续递增，题号之前的卷头被丢弃；拆不出两道以上时返回整段文本
+    """
+    questions: List[List[str]] = []
+    for line in (text or '').split('\n'):
+        match = _QUESTION_NUMBER.match(line)
+        number = match and int(match.group(1) or match.group(2))
+        if number == len(questions) + 1:
+            questions.append([line[match.end():]])
+        elif questions:
+            questions[-1].append(line)
+    questions = ['\n'.join(lines).strip() for lines in questions]
+    questions = [question for question in questions if question]
+    return questions if len(questions) >= 2 else [text.strip()] if text and text.strip() else []
+
+
+class BatchAnalyzer:
+    """把多道题目按token预算打包成批量请求，失败的题目逐题重试"""
+
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS, input_token_budget: int = DEFAULT_INPUT_TOKEN_BUDGET,
+                 output_tokens_per_item: int = DEFAULT_OUTPUT_TOKENS_PER_ITEM,
+                 max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, max_workers: int = DEFAULT_WORKERS):
+        self.max_items = max_items
+        self.input_token_budget = input_token_budget
+        self.output_tokens_per_item = output_tokens_per_item
+        self.max_output_tokens = max_output_tokens
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'batch_requests': 0, 'batched_items': 0, 'fallback_items': 0,
+                      'failed_items': 0}
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def analyze(self, texts: List[str]) -> List[Optional[Dict]]:
+        """
+        分析多道题目，相同的题目只分析一次
+
+        Returns:
+            与 texts 一一对应的分析结果，分析失败的为None
+        """
+        unique = list(dict.fromkeys(texts))
+        batches = plan_batches(unique, self.max_items, self.input_token_budget,
+                               self.output_tokens_per_item, self.max_output_tokens)
+        logger.info(f"批量分析 {len(texts)} 道题目（去重后 {len(unique)} 道），分为 {len(batches)} 个请求")
+
+        analyses: Dict[str, Optional[Dict]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix='batch-llm') as pool:
+            batch_texts = [[unique[index] for index in batch] for batch in batches]
+            for batch, results in zip(batch_texts, pool.map(self._run_batch, batch_texts)):
+                analyses.update(zip(batch, results))
+        return [analyses[text] for text in texts]
+
+    def _run_batch(self, texts: List[str]) -> List[Optional[Dict]]:
+        if len(texts) == 1:
+            return [self._analyze_one(texts[0])]
+
+        max_tokens = min(self.max_output_tokens, self.output_tokens_per_item * len(texts))
+        self._count(requests=1, batch_requests=1)
+        try:
+            parsed = parse_batch_response(llm_service.get_batch_analysis(texts, max_tokens=max_tokens), len(texts))
+        except Exception as e:
+            logger.error(f"批量分析请求失败，{len(texts)} 道题目改为逐题调用: {e}")
+            parsed = {}
+
+        self._count(batched_items=len(parsed))
+        if len(parsed) < len(texts):
+            logger.warning(f"批量分析返回 {len(parsed)}/{len(texts)} 道题目的结果，其余逐题调用")
+        return [parsed[index] if index in parsed else self._analyze_one(text, fallback=True)
+                for index, text in enumerate(texts)]
+
+    def _analyze_one(self, text: str, fallback: bool = False) -> Optional[Dict]:
+        self._count(requests=1, fallback_items=int(fallback))
+        try:
+            analysis = parse_single_response(llm_service.get_analysis_for_text(text))
+        except Exception as e:
+            logger.error(f"单题分析失败: {e}")
+            analysis = None
+        if analysis is None:
+            self._count(failed_items=1)
+        return analysis
+
+
+batch_analyzer = BatchAnalyzer()
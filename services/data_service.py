@@ -7,7 +7,6 @@ import json
 import os
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict
-import pandas as pd
 from datetime import datetime, timedelta
 import logging
 
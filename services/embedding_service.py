@@ -0,0 +1,222 @@
+"""
+本地向量化服务
+在CPU上加载一次小型句向量模型，批量计算文本向量，按文本hash缓存，并可持久化到 question_embeddings 表
+"""
+
+import os
+import sys
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('embedding_service', level=logging.INFO)
+
+# 题目以中文为主，默认使用多语言模型；更换模型后需重新入库向量（scripts/ingest_question_bank.py）
+# 并重新校准语义缓存阈值（见 semantic_cache_service.MODEL_THRESHOLDS）
+DEFAULT_MODEL = os.getenv('EMBEDDING_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2')
+DEFAULT_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+DEFAULT_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '20000'))
+
+
+def text_hash(text: str) -> str:
+    """文本hash，与 question_manager.generate_question_id 的规范化规则一致"""
+    normalized = "".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _load_sentence_transformer(model_name: str, num_threads: Optional[int]) -> Callable[[List[str], int], np.ndarray]:
+    """优先使用 sentence-transformers（由 scripts/download_models.py 预先下载到本地缓存）"""
+    from sentence_transformers import SentenceTransformer
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model = SentenceTransformer(model_name, device='cpu')
+
+    def encode(texts: List[str], batch_size: int) -> np.ndarray:
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return encode
+
+
+def _load_onnx_minilm(model_name: str, num_threads: Optional[int]) -> Callable[[List[str], int], np.ndarray]:
+    """备选：chromadb 自带的 ONNX 版 all-MiniLM-L6-v2（仅英文），无需 torch，需显式设置 EMBEDDING_MODEL"""
+    if model_name != 'all-MiniLM-L6-v2':
+        raise ValueError(f"ONNX 后端仅支持 all-MiniLM-L6-v2，当前模型: {model_name}")
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    model = ONNXMiniLM_L6_V2(preferred_providers=['CPUExecutionProvider'])
+
+    def encode(texts: List[str], batch_size: int) -> np.ndarray:
+        return np.asarray(model._forward(texts, batch_size=batch_size), dtype=np.float32)
+    return encode
+
+
+class EmbeddingService:
+    """
+    本地向量化服务
+
+    模型只在首次使用时加载一次；未命中缓存的文本去重后按 batch_size 分批推理，
+    返回的向量均为L2归一化后的结果，可以直接用点积计算余弦相似度。
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, batch_size: int = DEFAULT_BATCH_SIZE,
+                 cache_size: int = DEFAULT_CACHE_SIZE, num_threads: int = None,
+                 encoder: Callable[[List[str], int], np.ndarray] = None, data_service=None):
+        """
+        初始化向量化服务
+
+        Args:
+            model_name: 句向量模型名称
+            batch_size: 单次推理的文本数量
+            cache_size: 缓存的向量条数上限（LRU淘汰）
+            num_threads: CPU推理线程数，默认由后端决定
+            encoder: 自定义的编码函数 (texts, batch_size) -> ndarray，为空时加载本地模型
+            data_service: 可选的 DataServiceV3 实例，用于持久化向量
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.num_threads = num_threads
+        self.data_service = data_service
+        self._encoder = encoder
+        self._load_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'batches': 0}
+
+    @property
+    def encoder(self) -> Callable[[List[str], int], np.ndarray]:
+        """延迟加载模型，并发调用时只加载一次"""
+        if self._encoder is None:
+            with self._load_lock:
+                if self._encoder is None:
+                    self._encoder = self._load_encoder()
+        return self._encoder
+
+    def _load_encoder(self) -> Callable[[List[str], int], np.ndarray]:
+        errors = []
+        for loader in (_load_sentence_transformer, _load_onnx_minilm):
+            try:
+                encoder = loader(self.model_name, self.num_threads)
+                logger.info(f"向量模型已加载: {self.model_name} ({loader.__name__})")
+                return encoder
+            except Exception as e:
+                errors.append(f"{loader.__name__}: {e}")
+        raise RuntimeError(f"无法加载向量模型 {self.model_name}: {'; '.join(errors)}")
+
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key: str, vector: np.ndarray):
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        批量计算文本向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为 (len(texts), dim) 的 float32 数组，行向量已归一化
+        """
+        keys = [text_hash(t) for t in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        pending: Dict[str, str] = {}
+        for key, t in zip(keys, texts):
+            if key in vectors or key in pending:
+                continue
+            cached = self._cache_get(key)
+            if cached is not None:
+                vectors[key] = cached
+            else:
+                pending[key] = t
+
+        with self._cache_lock:
+            self.stats['hits'] += len(texts) - len(pending)
+            self.stats['misses'] += len(pending)
+
+        if pending:
+            pending_keys = list(pending)
+            pending_texts = [pending[k] for k in pending_keys]
+            for start in range(0, len(pending_texts), self.batch_size):
+                batch = np.asarray(self.encoder(pending_texts[start:start + self.batch_size], self.batch_size),
+                                   dtype=np.float32)
+                norms = np.linalg.norm(batch, axis=1, keepdims=True)
+                batch = batch / np.where(norms == 0, 1.0, norms)
+                with self._cache_lock:
+                    self.stats['batches'] += 1
+                for key, vector in zip(pending_keys[start:start + self.batch_size], batch):
+                    vectors[key] = vector
+                    self._cache_put(key, vector)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """计算单条文本的向量"""
+        return self.embed([text])[0]
+
+    def warm_cache(self, question_ids: List[str] = None) -> int:
+        """从 question_embeddings 表预热缓存（question_id 即文本hash）"""
+        if self.data_service is None:
+            return 0
+        stored = self.data_service.get_question_embeddings(self.model_name, question_ids)
+        for question_id, vector in stored.items():
+            self._cache_put(question_id, np.asarray(vector, dtype=np.float32))
+        logger.info(f"从数据库预热 {len(stored)} 条向量")
+        return len(stored)
+
+    def persist(self, questions: Dict[str, str]) -> bool:
+        """
+        计算并持久化题目向量
+
+        Args:
+            questions: question_id -> 题目文本
+
+        Returns:
+            是否写入成功
+        """
+        if self.data_service is None or not questions:
+            return False
+        question_ids = list(questions)
+        matrix = self.embed([questions[qid] for qid in question_ids])
+        embeddings = {qid: matrix[i].tolist() for i, qid in enumerate(question_ids)}
+        return self.data_service.save_question_embeddings(embeddings, self.model_name)
+
+    def clear_cache(self):
+        """清空向量缓存"""
+        with self._cache_lock:
+            self._cache.clear()
+
+
+_default_service: Optional[EmbeddingService] = None
+_default_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """获取进程内共享的向量化服务（模型只加载一次）"""
+    global _default_service
+    if _default_service is None:
+        with _default_lock:
+            if _default_service is None:
+                _default_service = EmbeddingService()
+    return _default_service
@@ -0,0 +1,352 @@
+"""
+本地快速判题
+基础算术（如 "1 + 1 = 3"）和一元一次方程（如 "2x + 3 = 7, x = 2"）不需要大模型：
+解析OCR文本后用有理数精确求值，按大模型分析结果的JSON格式返回；
+无法识别的题目返回None，交给大模型
+"""
+
+import os
+import re
+import ast
+import sys
+import logging
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('fast_grader', level=logging.INFO)
+
+ENABLED = os.getenv('FAST_GRADER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+MAX_TEXT_LENGTH = 120
+MAX_EXPONENT = 10
+MAX_MAGNITUDE = 10 ** 12
+# 乘方结果的位数上限，防止连续乘方构造出巨大的数
+MAX_RESULT_BITS = 256
+# 步骤超过该数时只展示首尾
+MAX_SHOWN_STEPS = 8
+
+_TRANSLATION = str.maketrans({
+    '＋': '+', '－': '-', '−': '-', '—': '-', '–': '-', '×': '*', '✕': '*', '＊': '*', '·': '*',
+    '÷': '/', '／': '/', '＝': '=', '（': '(', '）': ')', '．': '.', '。': '', '，': ',', '；': ';',
+    '＾': '^', 'ｘ': 'x', 'Ｘ': 'x', '？': '?',
+    **{chr(0xFF10 + i): str(i) for i in range(10)},
+})
+_PREFIX = re.compile(r'^(计算|口算|解方程|求解|解)\s*[:：]?')
+_ALLOWED = re.compile(r'^[0-9a-z+\-*/().=,;^]+$')
+_IMPLICIT_MUL = re.compile(r'(?<=[0-9a-z)])(?=[a-z(])|(?<=\))(?=[0-9])')
+
+_DECIMAL = re.compile(r'^-?\d+\.(\d+)$')
+_OP_SYMBOL = {ast.Add: '+', ast.Sub: '-', ast.Mult: '×', ast.Div: '÷', ast.Pow: '^'}
+_PRECEDENCE = {ast.Add: 1, ast.Sub: 1, ast.Mult: 2, ast.Div: 2, ast.Pow: 4}
+
+COMMON_MISTAKES = {
+    '整数加减法': "进位或退位时容易漏算，可以用竖式计算后再验算一遍。",
+    '整数四则运算': "容易忽略运算顺序，记住先乘除后加减，有括号先算括号里面的。",
+    '小数四则运算': "小数点容易对错位置，加减时要把小数点对齐，乘法要数清小数位数。",
+    '分数与除法运算': "除不尽时结果要用分数或小数表示，注意约分。",
+    '乘方运算': "乘方表示几个相同因数相乘，不要和乘法混淆，如 2^3 = 8 而不是 6。",
+    '一元一次方程': "移项时要变号，两边同时除以未知数的系数时不要漏掉符号。",
+}
+
+
+class _Unsupported(Exception):
+    """超出本地判题范围"""
+
+
+def _terminates(value: Fraction) -> bool:
+    """是否能写成有限小数"""
+    denominator = value.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    return denominator == 1
+
+
+def _format(value: Fraction) -> str:
+    if value.denominator == 1:
+        return str(value.numerator)
+    if _terminates(value):
+        return f"{float(value):.10f}".rstrip('0').rstrip('.')
+    return f"{value.numerator}/{value.denominator}"
+
+
+def _check_rounded(exact: Fraction, given: Fraction, answer: str):
+    """无限小数的结果只能写近似值：答案是舍入误差以内的有限小数时不判错，交给大模型按题目的精度要求判断"""
+    match = _DECIMAL.match(answer)
+    if match and given != exact and not _terminates(exact) \
+            and abs(given - exact) <= Fraction(1, 2 * 10 ** len(match.group(1))):
+        raise _Unsupported('近似值')
+
+
+# 表达式树节点：('num', Fraction) / ('var', name) / ('neg', node) / ('bin', op, left, right)
+
+def _to_tree(node: ast.AST) -> tuple:
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = Fraction(str(node.value))
+        if abs(value) > MAX_MAGNITUDE:
+            raise _Unsupported('数值过大')
+        return ('num', value)
+    if isinstance(node, ast.Name) and len(node.id) == 1:
+        return ('var', node.id)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _to_tree(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if operand[0] == 'num':
+            return ('num', -operand[1])
+        return ('neg', operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in _OP_SYMBOL:
+        return ('bin', type(node.op), _to_tree(node.left), _to_tree(node.right))
+    raise _Unsupported(type(node).__name__)
+
+
+def _parse(expression: str) -> tuple:
+    if not expression:
+        raise _Unsupported('空表达式')
+    try:
+        return _to_tree(ast.parse(expression.replace('^', '**'), mode='eval').body)
+    except SyntaxError:
+        raise _Unsupported('无法解析')
+
+
+def _apply(op: type, left: Fraction, right: Fraction) -> Fraction:
+    if op is ast.Add:
+        return left + right
+    if op is ast.Sub:
+        return left - right
+    if op is ast.Mult:
+        return left * right
+    if op is ast.Div:
+        if right == 0:
+            raise _Unsupported('除数为0')
+        return left / right
+    if right.denominator != 1 or not 0 <= right <= MAX_EXPONENT:
+        raise _Unsupported('指数超出范围')
+    if max(left.numerator, left.denominator).bit_length() * int(right) > MAX_RESULT_BITS:
+        raise _Unsupported('结果过大')
+    return left ** int(right)
+
+
+def _linear(tree: tuple) -> Tuple[Fraction, Fraction]:
+    """把表达式化为 a*x + b，返回 (a, b)；非线性时抛出 _Unsupported"""
+    kind = tree[0]
+    if kind == 'num':
+        return Fraction(0), tree[1]
+    if kind == 'var':
+        return Fraction(1), Fraction(0)
+    if kind == 'neg':
+        a, b = _linear(tree[1])
+        return -a, -b
+    op, (la, lb), (ra, rb) = tree[1], _linear(tree[2]), _linear(tree[3])
+    if op in (ast.Add, ast.Sub):
+        sign = 1 if op is ast.Add else -1
+        return la + sign * ra, lb + sign * rb
+    if op is ast.Mult:
+        if la and ra:
+            raise _Unsupported('非线性')
+        return la * rb + ra * lb, lb * rb
+    if ra:
+        raise _Unsupported('未知数在分母或指数中')
+    if op is ast.Div:
+        return _apply(op, la, rb), _apply(op, lb, rb)
+    if la:
+        raise _Unsupported('非线性')
+    return Fraction(0), _apply(op, lb, rb)
+
+
+def _variables(tree: tuple) -> set:
+    if tree[0] == 'var':
+        return {tree[1]}
+    if tree[0] == 'num':
+        return set()
+    return set().union(*(_variables(child) for child in tree[1:] if isinstance(child, tuple)))
+
+
+def _precedence(tree: tuple) -> int:
+    if tree[0] == 'bin':
+        return _PRECEDENCE[tree[1]]
+    if tree[0] == 'neg' or (tree[0] == 'num' and tree[1] < 0):
+        return 3
+    return 5
+
+
+def _render(tree: tuple) -> str:
+    kind = tree[0]
+    if kind == 'num':
+        return _format(tree[1])
+    if kind == 'var':
+        return tree[1]
+    if kind == 'neg':
+        inner = _render(tree[1])
+        return f"-({inner})" if _precedence(tree[1]) < 3 else f"-{inner}"
+    op, left, right = tree[1], tree[2], tree[3]
+    precedence = _PRECEDENCE[op]
+    left_text, right_text = _render(left), _render(right)
+    if _precedence(left) < precedence or (op is ast.Pow and _precedence(left) <= precedence):
+        left_text = f"({left_text})"
+    right_assoc = op in (ast.Sub, ast.Div)
+    if _precedence(right) < precedence or (right_assoc and _precedence(right) == precedence) \
+            or (right[0] == 'num' and right[1] < 0):
+        right_text = f"({right_text})"
+    return f"{left_text} {_OP_SYMBOL[op]} {right_text}"
+
+
+def _reduce_once(tree: tuple) -> tuple:
+    """按运算顺序计算最左边一个可以计算的运算"""
+    if tree[0] == 'neg':
+        inner = _reduce_once(tree[1])
+        return ('num', -inner[1]) if inner[0] == 'num' else ('neg', inner)
+    op, left, right = tree[1], tree[2], tree[3]
+    if left[0] != 'num':
+        return ('bin', op, _reduce_once(left), right)
+    if right[0] != 'num':
+        return ('bin', op, left, _reduce_once(right))
+    return ('num', _apply(op, left[1], right[1]))
+
+
+def _evaluate(tree: tuple) -> Tuple[Fraction, List[str], bool]:
+    """求值并记录每一步的中间式子，同时返回中间结果是否出现过非整数"""
+    steps, fractional = [_render(tree)], False
+    while tree[0] != 'num':
+        tree = _reduce_once(tree)
+        steps.append(_render(tree))
+        fractional = fractional or _has_fraction(tree)
+    return tree[1], steps, fractional
+
+
+def _has_fraction(tree: tuple) -> bool:
+    if tree[0] == 'num':
+        return tree[1].denominator != 1
+    return any(_has_fraction(child) for child in tree[1:] if isinstance(child, tuple))
+
+
+def _operators(tree: tuple) -> set:
+    if tree[0] == 'bin':
+        return {tree[1]} | _operators(tree[2]) | _operators(tree[3])
+    if tree[0] == 'neg':
+        return _operators(tree[1])
+    return set()
+
+
+def _knowledge_point(expression: str, tree: tuple, fractional: bool) -> str:
+    operators = _operators(tree)
+    if ast.Pow in operators:
+        return '乘方运算'
+    if '.' in expression:
+        return '小数四则运算'
+    if fractional:
+        return '分数与除法运算'
+    if operators <= {ast.Add, ast.Sub}:
+        return '整数加减法'
+    return '整数四则运算'
+
+
+def _analysis(is_correct: bool, error_analysis: str, correct_answer: str, solution_steps: str,
+              knowledge_point: str) -> Dict:
+    return {
+        'subject': '数学',
+        'is_correct': is_correct,
+        'error_analysis': '' if is_correct else error_analysis,
+        'correct_answer': correct_answer,
+        'solution_steps': solution_steps,
+        'knowledge_point': knowledge_point,
+        'common_mistakes': COMMON_MISTAKES[knowledge_point],
+        'graded_by': 'fast_grader',
+    }
+
+
+def _show_steps(steps: List[str]) -> str:
+    if len(steps) > MAX_SHOWN_STEPS:
+        steps = [steps[0], '…', steps[-1]]
+    return ' = '.join(steps)
+
+
+def _grade_arithmetic(expression: str, answer: str) -> Dict:
+    tree = _parse(expression)
+    given_tree = _parse(answer)
+    if _variables(tree) or _variables(given_tree):
+        raise _Unsupported('含未知数')
+    value, steps, fractional = _evaluate(tree)
+    given = _evaluate(given_tree)[0]
+    _check_rounded(value, given, answer)
+    shown, value_text = _render(tree), _format(value)
+    return _analysis(
+        is_correct=given == value,
+        error_analysis=f"计算错误。{shown} 的正确结果是 {value_text}，而不是 {_render(given_tree)}。",
+        correct_answer=f"{shown} = {value_text}",
+        solution_steps=f"按运算顺序（先乘方，再乘除，后加减，括号优先）逐步计算：{_show_steps(steps)}。"
+        if len(steps) > 2 else f"直接计算：{shown} = {value_text}。",
+        knowledge_point=_knowledge_point(expression, tree, fractional),
+    )
+
+
+def _grade_equation(equation: str, answer: str) -> Dict:
+    left_text, right_text = equation.split('=')
+    answer_var, answer_value = answer.split('=')
+    left, right = _parse(left_text), _parse(right_text)
+    variables = _variables(left) | _variables(right)
+    if len(variables) != 1 or answer_var not in variables:
+        raise _Unsupported('不是一元方程')
+    given_tree = _parse(answer_value)
+    if _variables(given_tree):
+        raise _Unsupported('答案含未知数')
+    given = _evaluate(given_tree)[0]
+
+    (la, lb), (ra, rb) = _linear(left), _linear(right)
+    a, c = la - ra, rb - lb
+    if a == 0:
+        raise _Unsupported('没有唯一解')
+    solution = c / a
+    _check_rounded(solution, given, answer_value)
+    shown = f"{_render(left)} = {_render(right)}"
+    var, a_text = answer_var, _format(a)
+    coefficient = {'1': '', '-1': '-'}.get(a_text, a_text)
+    steps = f"移项并合并同类项：{coefficient}{var} = {_format(c)}"
+    if a != 1:
+        steps += f"；两边同时除以 {a_text}：{var} = {_format(solution)}"
+    steps += f"。代入检验：{var} = {_format(solution)} 时方程两边相等。"
+    return _analysis(
+        is_correct=given == solution,
+        error_analysis=f"解方程错误。方程 {shown} 的解是 {var} = {_format(solution)}，而不是 {var} = {_format(given)}。",
+        correct_answer=f"{var} = {_format(solution)}",
+        solution_steps=steps,
+        knowledge_point='一元一次方程',
+    )
+
+
+def normalize(text: str) -> str:
+    """全角符号转半角、去掉空白和题号前缀，隐式乘法补上乘号"""
+    text = text.translate(_TRANSLATION).lower()
+    text = re.sub(r'\s+', '', _PREFIX.sub('', text.strip()))
+    text = text.rstrip('?')
+    return _IMPLICIT_MUL.sub('*', text)
+
+
+def grade(text: str) -> Optional[Dict]:
+    """
+    本地判题
+
+    Returns:
+        与大模型分析结果相同格式的字典（subject / is_correct / error_analysis / correct_answer /
+        solution_steps / knowledge_point / common_mistakes），超出判题范围时返回None
+    """
+    if not ENABLED or not text or len(text) > MAX_TEXT_LENGTH:
+        return None
+    expression = normalize(text)
+    if not _ALLOWED.match(expression):
+        return None
+    statements = [part for part in re.split(r'[,;]', expression) if part]
+    try:
+        if len(statements) == 1 and statements[0].count('=') == 1:
+            left, right = statements[0].split('=')
+            return _grade_arithmetic(left, right)
+        if len(statements) == 2 and all(part.count('=') == 1 for part in statements):
+            return _grade_equation(statements[0], statements[1])
+    except (_Unsupported, ZeroDivisionError, OverflowError, RecursionError, ValueError) as e:
+        logger.debug(f"超出本地判题范围: {text!r} ({e})")
+    return None
@@ -0,0 +1,137 @@
+"""
+最后登录时间批量写入
+登录高峰时每次登录都单独 UPDATE users 会争用同一批行和连接；
+这里把最后登录时间先记在内存里，由后台线程定期用一条语句批量写回
+"""
+
+import os
+import sys
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('last_login_writer', level=logging.INFO)
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = float(os.getenv('LAST_LOGIN_FLUSH_INTERVAL_SECONDS', '5'))
+# 待写入的用户数达到该值时立即写回
+DEFAULT_MAX_PENDING = int(os.getenv('LAST_LOGIN_MAX_PENDING', '500'))
+
+
+class LastLoginWriter:
+    """合并同一用户的多次登录，按批更新 users.last_login"""
+
+    def __init__(self, data_service, flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        Args:
+            data_service: DataServiceV3 实例
+            flush_interval_seconds: 后台写回间隔，0 表示每次 record 立即写回
+            max_pending: 待写入用户数上限，达到后立即触发写回
+        """
+        self.data_service = data_service
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._atexit_registered = False
+        self.stats = {'recorded': 0, 'flushes': 0, 'written': 0, 'errors': 0}
+
+    def record(self, user_id: str, at: datetime = None):
+        """记录一次登录（同一用户只保留最新时间）"""
+        at = at or datetime.now(timezone.utc)
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or at > previous:
+                self._pending[user_id] = at
+            self.stats['recorded'] += 1
+            pending = len(self._pending)
+
+        if self.flush_interval_seconds <= 0:
+            self.flush()
+            return
+        self._ensure_started()
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        把待写入的最后登录时间写回数据库
+
+        Returns:
+            写回的用户数；失败时返回0，未写入的记录保留到下次
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            user_ids = list(batch)
+            try:
+                with self.data_service.get_session() as session:
+                    session.execute(text("""
+                        UPDATE users AS u SET last_login = v.last_login
+                        FROM unnest(CAST(:user_ids AS VARCHAR[]), CAST(:times AS TIMESTAMPTZ[]))
+                            AS v(id, last_login)
+                        WHERE u.id = v.id AND (u.last_login IS NULL OR u.last_login < v.last_login)
+                    """), {'user_ids': user_ids, 'times': [batch[user_id] for user_id in user_ids]})
+                    session.commit()
+            except Exception as e:
+                # 放回待写队列，保留较新的时间
+                with self._lock:
+                    for user_id, at in batch.items():
+                        current = self._pending.get(user_id)
+                        if current is None or at > current:
+                            self._pending[user_id] = at
+                self.stats['errors'] += 1
+                logger.error(f"批量更新最后登录时间失败: {e}")
+                return 0
+
+            self.stats['flushes'] += 1
+            self.stats['written'] += len(batch)
+            return len(batch)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name='last-login-writer', daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    # 进程退出前写回剩余记录
+                    atexit.register(self.stop)
+                    self._atexit_registered = True
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程并写回剩余记录"""
+        self._stop.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
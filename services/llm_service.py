@@ -1,6 +1,26 @@
-from llm.gpt4_analyzer import analyze_question_with_gpt4
+from llm.gpt4_analyzer import (analyze_question_with_gpt4, analyze_question_stem, check_student_answer,
+                               check_submission, analyze_questions_batch)
+from services import model_router
 
 def get_analysis_for_text(text: str):
     """LLM服务的统一入口点。"""
-    # 未来可以在这里添加路由逻辑，比如根据题目类型选择不同的大模型
+    # 开启 LLM_ROUTER_ENABLED 后按题目难度在小模型和大模型之间路由（见 services/model_router.py）
+    if model_router.ENABLED:
+        return model_router.model_router.analyze(text)
     return analyze_question_with_gpt4(text)
+
+def get_stem_analysis(stem: str):
+    """分析题干（不含学生答案），结果可以在所有学生之间复用。"""
+    return analyze_question_stem(stem)
+
+def check_answer(stem: str, correct_answer: str, student_answer: str):
+    """对照标准答案批改一个学生答案。"""
+    return check_student_answer(stem, correct_answer, student_answer)
+
+def recheck_submission(text: str, correct_answer: str):
+    """对照标准答案重新判断整份提交的对错（复用近似题目的讲解时使用）。"""
+    return check_submission(text, correct_answer)
+
+def get_batch_analysis(texts, max_tokens: int):
+    """一次请求分析多道题目，返回JSON数组（见 services/batch_analyzer.py）。"""
+    return analyze_questions_batch(texts, max_tokens=max_tokens)
@@ -4,6 +4,10 @@ import os
 import json
 import datetime
 import logging
+import threading
+from collections import defaultdict
+
+from services import review_scheduler
 
 # Get the logger configured in the main app
 logger = logging.getLogger("studyhelper_app")
@@ -13,28 +17,250 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
 MISTAKES_FILE = os.path.join(DATA_DIR, 'mistakes.json')
 
+# Number of journal records after which the snapshot file is rewritten.
+COMPACT_THRESHOLD = 1000
+
+REVIEW_STATUSES = ("needs_review", "reviewed", "mastered")
+
 # Ensure the data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def _load_mistakes():
-    """Helper function to load the mistakes data from the JSON file."""
+def _journal_path(snapshot_path: str) -> str:
+    """The append-only journal lives next to the snapshot file."""
+    return snapshot_path + '.log'
+
+def _load_mistakes(path: str = None):
+    """Helper function to load the mistakes snapshot from the JSON file."""
     try:
-        with open(MISTAKES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(path or MISTAKES_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # Older files may contain a bare list; only the {user_id: [...]} layout is valid.
+        return data if isinstance(data, dict) else {}
     except (FileNotFoundError, json.JSONDecodeError):
         # If the file doesn't exist or is empty/corrupt, start with an empty dict
         return {}
 
-def _save_mistakes(data):
-    """Helper function to save the mistakes data to the JSON file."""
+def _save_mistakes(data, path: str = None):
+    """Helper function to atomically save the mistakes snapshot to the JSON file."""
+    path = path or MISTAKES_FILE
+    tmp_path = path + '.tmp'
     try:
-        with open(MISTAKES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
         return True
     except Exception as e:
         logger.error(f"Failed to save mistakes file: {e}", exc_info=True)
         return False
 
+
+class MistakeBookStore:
+    """
+    In-memory, indexed mistake book backed by a JSON snapshot plus an append-only journal.
+
+    Entries are keyed by user and then by question_id, so duplicate detection is a dict
+    lookup. Secondary indexes map subject, knowledge point and review_status to sets of
+    question_ids per user. Each write appends one line to the journal; the snapshot is
+    only rewritten once the journal grows past COMPACT_THRESHOLD records.
+    """
+
+    def __init__(self, snapshot_path: str, compact_threshold: int = COMPACT_THRESHOLD):
+        self.snapshot_path = snapshot_path
+        self.journal_path = _journal_path(snapshot_path)
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._entries = defaultdict(dict)  # user_id -> {question_id: entry}
+        self._by_subject = defaultdict(lambda: defaultdict(set))
+        self._by_knowledge_point = defaultdict(lambda: defaultdict(set))
+        self._by_status = defaultdict(lambda: defaultdict(set))
+        self._journal_records = 0
+        # Review queue, built on the first due-list read and then kept in step by _index
+        self._scheduler = None
+        self._load()
+
+    # --- Loading ---
+
+    def _load(self):
+        """Loads the snapshot, then replays the journal on top of it."""
+        for user_id, mistakes in _load_mistakes(self.snapshot_path).items():
+            for entry in mistakes or []:
+                if isinstance(entry, dict) and entry.get('question_id'):
+                    self._index(user_id, entry)
+
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash is skipped rather than failing the load.
+                    logger.warning(f"Skipping corrupt mistake journal line in {self.journal_path}")
+                    continue
+                self._apply(record)
+                self._journal_records += 1
+
+    def _apply(self, record: dict):
+        """Applies a single journal record to the in-memory state."""
+        op = record.get('op')
+        if op == 'add':
+            entry = record.get('entry', {})
+            self._index(entry.get('user_id'), entry)
+        elif op == 'update':
+            self._update_in_memory(record.get('user_id'), record.get('question_id'), record.get('fields', {}))
+
+    # --- Index maintenance ---
+
+    def _index(self, user_id: str, entry: dict):
+        question_id = entry['question_id']
+        self._unindex(user_id, question_id)
+        self._entries[user_id][question_id] = entry
+        if entry.get('subject'):
+            self._by_subject[user_id][entry['subject']].add(question_id)
+        if entry.get('knowledge_point'):
+            self._by_knowledge_point[user_id][entry['knowledge_point']].add(question_id)
+        self._by_status[user_id][entry.get('review_status', 'needs_review')].add(question_id)
+        if self._scheduler is not None:
+            self._scheduler.upsert(_review_item(user_id, entry))
+
+    def _unindex(self, user_id: str, question_id: str):
+        old = self._entries.get(user_id, {}).get(question_id)
+        if not old:
+            return
+        if old.get('subject'):
+            self._by_subject[user_id][old['subject']].discard(question_id)
+        if old.get('knowledge_point'):
+            self._by_knowledge_point[user_id][old['knowledge_point']].discard(question_id)
+        self._by_status[user_id][old.get('review_status', 'needs_review')].discard(question_id)
+
+    def _update_in_memory(self, user_id: str, question_id: str, fields: dict) -> bool:
+        entry = self._entries.get(user_id, {}).get(question_id)
+        if entry is None:
+            return False
+        updated = {**entry, **fields}
+        self._index(user_id, updated)
+        return True
+
+    # --- Persistence ---
+
+    def _append(self, record: dict) -> bool:
+        try:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._journal_records += 1
+        except Exception as e:
+            logger.error(f"Failed to append to mistake journal: {e}", exc_info=True)
+            return False
+        return True
+
+    def _maybe_compact(self):
+        if self._journal_records >= self.compact_threshold:
+            self.compact()
+
+    def compact(self) -> bool:
+        """Folds the journal into a fresh snapshot and truncates the journal."""
+        with self._lock:
+            snapshot = {user_id: list(entries.values()) for user_id, entries in self._entries.items() if entries}
+            if not _save_mistakes(snapshot, self.snapshot_path):
+                return False
+            try:
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+            except OSError as e:
+                logger.error(f"Failed to truncate mistake journal: {e}", exc_info=True)
+                return False
+            self._journal_records = 0
+            logger.info(f"Compacted mistake book into {self.snapshot_path}.")
+            return True
+
+    # --- Public API ---
+
+    def contains(self, user_id: str, question_id: str) -> bool:
+        with self._lock:
+            return question_id in self._entries.get(user_id, {})
+
+    def add(self, entry: dict) -> bool:
+        """Adds an entry; returns True without writing if the question is already recorded."""
+        with self._lock:
+            user_id, question_id = entry['user_id'], entry['question_id']
+            if question_id in self._entries.get(user_id, {}):
+                return True
+            if not self._append({'op': 'add', 'entry': entry}):
+                return False
+            self._index(user_id, entry)
+            self._maybe_compact()
+            return True
+
+    def update(self, user_id: str, question_id: str, **fields) -> bool:
+        with self._lock:
+            if question_id not in self._entries.get(user_id, {}):
+                return False
+            if not self._append({'op': 'update', 'user_id': user_id, 'question_id': question_id, 'fields': fields}):
+                return False
+            self._update_in_memory(user_id, question_id, fields)
+            self._maybe_compact()
+            return True
+
+    def get(self, user_id: str, question_id: str):
+        with self._lock:
+            entry = self._entries.get(user_id, {}).get(question_id)
+            return dict(entry) if entry else None
+
+    def query(self, user_id: str, subject: str = None, knowledge_point: str = None, review_status: str = None):
+        """Returns the user's entries matching every given filter, newest first."""
+        with self._lock:
+            entries = self._entries.get(user_id, {})
+            candidates = None
+            for index, key in ((self._by_subject, subject),
+                               (self._by_knowledge_point, knowledge_point),
+                               (self._by_status, review_status)):
+                if key is None:
+                    continue
+                ids = index[user_id].get(key, set())
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            selected = entries.values() if candidates is None else (entries[q] for q in candidates)
+            results = [dict(e) for e in selected]
+        results.sort(key=lambda e: e.get('added_timestamp', ''), reverse=True)
+        return results
+
+    def due(self, user_id: str, limit: int = 10, now: datetime.datetime = None):
+        """Returns up to `limit` of the user's entries that are due for review, most overdue first."""
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = review_scheduler.ReviewScheduler()
+                self._scheduler.load_items(_review_item(uid, entry)
+                                           for uid, entries in self._entries.items() for entry in entries.values())
+            items = self._scheduler.next_due(user_id, limit=limit, now=now)
+            return [dict(self._entries[user_id][item.question_id]) for item in items]
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            return len(self._entries.get(user_id, {}))
+
+
+def _review_item(user_id: str, entry: dict) -> review_scheduler.ReviewItem:
+    """Scheduler entry ids are per user, since question_ids repeat across users."""
+    return review_scheduler.ReviewItem.from_row(
+        dict(entry, id=f"mistake_{user_id}_{entry['question_id']}", user_id=user_id))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store() -> MistakeBookStore:
+    """Returns the process-wide store for the current MISTAKES_FILE."""
+    with _stores_lock:
+        store = _stores.get(MISTAKES_FILE)
+        if store is None:
+            store = MistakeBookStore(MISTAKES_FILE)
+            _stores[MISTAKES_FILE] = store
+        return store
+
 def add_mistake_if_incorrect(user_id: str, question_id: str, master_analysis: dict, submitted_text: str):
     """
     Checks the analysis result and adds the question to the user's mistake book if it was answered incorrectly.
@@ -54,30 +280,70 @@ def add_mistake_if_incorrect(user_id: str, question_id: str, master_analysis: di
 
     # The core logic: only add to the mistake book if the answer is NOT correct.
     if master_analysis.get('is_correct') is not True:
-        logger.info(f"Answer is incorrect. Adding question {question_id} to user {user_id}'s mistake book.")
-        
-        all_mistakes = _load_mistakes()
-        user_mistakes = all_mistakes.get(user_id, [])
+        store = get_store()
 
         # Check if this exact question is already in the mistake book to avoid duplicates
-        if any(m['question_id'] == question_id for m in user_mistakes):
+        if store.contains(user_id, question_id):
             logger.info(f"Question {question_id} is already in the mistake book for user {user_id}. Skipping.")
             return True
 
+        logger.info(f"Answer is incorrect. Adding question {question_id} to user {user_id}'s mistake book.")
         # Create a new mistake entry
         new_mistake = {
             "mistake_id": f"mistake_{user_id}_{question_id}",
             "question_id": question_id,
             "user_id": user_id,
             "submitted_text": submitted_text,
-            "added_timestamp": datetime.datetime.now().isoformat(),
+            "subject": master_analysis.get('subject'),
+            "knowledge_point": master_analysis.get('knowledge_point'),
+            "added_timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
             "review_status": "needs_review" # Possible values: needs_review, reviewed, mastered
         }
-        
-        user_mistakes.append(new_mistake)
-        all_mistakes[user_id] = user_mistakes
-        
-        return _save_mistakes(all_mistakes)
+        return store.add(new_mistake)
     else:
         logger.info(f"Answer is correct. No mistake added for question {question_id} for user {user_id}.")
-        return True # Return True because the operation was successful (no mistake to add)
\ No newline at end of file
+        return True # Return True because the operation was successful (no mistake to add)
+
+def get_user_mistakes(user_id: str, subject: str = None, knowledge_point: str = None, review_status: str = None):
+    """
+    Returns a user's mistake entries, optionally filtered by subject, knowledge point and review status.
+    Filters are answered from the in-memory indexes, not by scanning the user's entries.
+    """
+    return get_store().query(user_id, subject=subject, knowledge_point=knowledge_point, review_status=review_status)
+
+def update_review_status(user_id: str, question_id: str, review_status: str) -> bool:
+    """Sets the review_status of an existing mistake entry."""
+    if review_status not in REVIEW_STATUSES:
+        logger.warning(f"Unknown review_status '{review_status}' for question {question_id}.")
+        return False
+    return get_store().update(user_id, question_id, review_status=review_status)
+
+def record_review(user_id: str, question_id: str, quality: int, reviewed_at: datetime.datetime = None) -> bool:
+    """
+    Records one review of a mistake (quality 0-5, >= 3 counts as answered correctly).
+    The SM-2 scheduler updates the entry's review schedule and derives its review_status.
+    """
+    store = get_store()
+    entry = store.get(user_id, question_id)
+    if entry is None:
+        logger.warning(f"No mistake entry for question {question_id} of user {user_id}.")
+        return False
+    item = review_scheduler.ReviewItem.from_row(dict(entry, id=question_id))
+    review_scheduler.apply_sm2(item, quality, reviewed_at or review_scheduler.utcnow())
+    return store.update(
+        user_id, question_id,
+        review_status=review_scheduler.review_status_for(item),
+        review_count=item.review_count,
+        mastery_level=item.mastery_level,
+        ease_factor=item.ease_factor,
+        interval_days=item.interval_days,
+        last_reviewed_at=item.last_reviewed_at.isoformat(),
+        next_review_at=item.next_review_at.isoformat(),
+    )
+
+def get_due_mistakes(user_id: str, limit: int = 10, now: datetime.datetime = None):
+    """
+    Returns up to `limit` of the user's mistakes that are due for review, most overdue first.
+    The store keeps one review queue per process, so this is a heap read rather than a rebuild.
+    """
+    return get_store().due(user_id, limit=limit, now=now)
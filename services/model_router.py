@@ -0,0 +1,337 @@
+"""
+分级模型路由
+按题目难度选择模型：简单题（本地可判的基础运算、短的记忆类题目）交给小而快的模型，
+难题（证明、应用题、多步计算、阅读写作）交给大模型。
+每个模型端点维护延迟和错误率的EWMA：首选端点变慢或频繁出错时流量转到另一个端点，
+冷却一段时间后再放请求试探恢复；请求在预期时间内没有返回时向同一端点再发一次对冲请求，
+取先返回的结果，换档位只在请求失败时进行（故障转移）
+
+端点由环境变量配置，可以指向本地的桩服务做测试（{TIER} 为 SMALL 或 LARGE）:
+    LLM_{TIER}_MODEL, LLM_{TIER}_BASE_URL, LLM_{TIER}_API_KEY_ENV, LLM_{TIER}_MAX_TOKENS,
+    LLM_{TIER}_COST, LLM_{TIER}_LATENCY_SLO_MS, LLM_{TIER}_TIMEOUT_S
+
+大模型档位默认也是 deepseek-chat，只是输出预算更大。改用 deepseek-reasoner 等推理模型时，
+推理内容同样计入输出token，需要把 LLM_LARGE_MAX_TOKENS 调到8000左右，否则JSON会被截断
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from llm.gpt4_analyzer import DEFAULT_BASE_URL, DEFAULT_MODEL, analyze_question_with_gpt4, create_client
+from services import fast_grader
+
+logger = setup_logger('model_router', level=logging.INFO)
+
+# 关闭时 llm_service 和原来一样只调用默认模型
+ENABLED = os.getenv('LLM_ROUTER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# EWMA平滑系数，越大越看重最近的请求
+EWMA_ALPHA = float(os.getenv('LLM_ROUTER_EWMA_ALPHA', '0.2'))
+# 错误率EWMA超过该值的端点不再作为首选
+ERROR_THRESHOLD = float(os.getenv('LLM_ROUTER_ERROR_THRESHOLD', '0.5'))
+# 端点出错或变慢后经过这段时间重新放请求试探
+COOLDOWN_SECONDS = float(os.getenv('LLM_ROUTER_COOLDOWN_SECONDS', '30'))
+# 请求超过 预期延迟 × 倍数 仍未返回时发出对冲请求
+HEDGE_MULTIPLIER = float(os.getenv('LLM_ROUTER_HEDGE_MULTIPLIER', '2.0'))
+MIN_HEDGE_MS = float(os.getenv('LLM_ROUTER_MIN_HEDGE_MS', '1000'))
+# 对冲请求最多占总请求数的比例，避免端点整体变慢时请求量翻倍
+MAX_HEDGE_RATIO = float(os.getenv('LLM_ROUTER_MAX_HEDGE_RATIO', '0.2'))
+
+SMALL, LARGE = 'small', 'large'
+
+# 出现这些词的题目通常需要多步推理或长篇作答
+HARD_KEYWORDS = ('证明', '求证', '推理', '为什么', '说明理由', '论述', '作文', '阅读', '短文', '赏析',
+                 '概率', '函数', '方程组', '不等式', '几何', '辅助线', '应用题', '行程', '工程', '浓度', '鸡兔')
+LONG_TEXT_CHARS = 120
+MEDIUM_TEXT_CHARS = 50
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_LATIN = re.compile(r'[A-Za-z]')
+_CJK = re.compile(r'[\u4e00-\u9fff]')
+
+
+@dataclass
+class Route:
+    """路由结果：目标档位、推测的学科和判断依据"""
+    tier: str
+    subject: str
+    reasons: List[str] = field(default_factory=list)
+
+
+def guess_subject(text: str) -> str:
+    """按字符组成粗略推测学科，只用于路由和日志"""
+    latin, cjk = len(_LATIN.findall(text)), len(_CJK.findall(text))
+    if latin >= 10 and latin > cjk:
+        return '英语'
+    if _NUMBER.search(text) or re.search(r'[+\-×÷=*/<>]', text):
+        return '数学'
+    return '语文' if cjk else '未知'
+
+
+def classify(text: str) -> Route:
+    """
+    不调用模型判断题目难度
+
+    本地判题能处理的基础运算为简单题；其余按长度、关键词、小题数和数字个数打分，2分及以上为难题
+    """
+    text = text or ''
+    if fast_grader.grade(text) is not None:
+        return Route(SMALL, '数学', ['fast_grader'])
+
+    subject = guess_subject(text)
+    score, reasons = 0, []
+    if len(text) > LONG_TEXT_CHARS:
+        score, reasons = score + 2, reasons + ['long']
+    elif len(text) > MEDIUM_TEXT_CHARS:
+        score, reasons = score + 1, reasons + ['medium']
+    keywords = [keyword for keyword in HARD_KEYWORDS if keyword in text]
+    if keywords:
+        score, reasons = score + 2, reasons + [f"keyword:{keywords[0]}"]
+    if len([line for line in text.split('\n') if line.strip()]) > 3:
+        score, reasons = score + 1, reasons + ['multi_part']
+    if subject == '数学' and len(_NUMBER.findall(text)) >= 3:
+        score, reasons = score + 1, reasons + ['multi_step']
+    return Route(LARGE if score >= 2 else SMALL, subject, reasons)
+
+
+class ModelEndpoint:
+    """一个模型端点及其延迟、错误率的EWMA"""
+
+    def __init__(self, name: str, model: str, base_url: str = DEFAULT_BASE_URL, api_key: Optional[str] = None,
+                 cost: float = 1.0, latency_slo_ms: float = 10000, timeout_s: float = 60, max_tokens: int = 1500):
+        """
+        Args:
+            name: 端点名称（日志和统计用）
+            model: 模型名
+            base_url: 兼容OpenAI接口的服务地址
+            api_key: 为空时使用 DEEPSEEK_API_KEY
+            cost: 相对单次请求成本，只用于统计
+            latency_slo_ms: 延迟EWMA超过该值时视为变慢，优先使用其他端点
+            timeout_s: 单次请求超时
+            max_tokens: 单次请求的输出token上限
+        """
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.cost = cost
+        self.latency_slo_ms = latency_slo_ms
+        self.timeout_s = timeout_s
+        self.max_tokens = max_tokens
+        self.latency_ewma_ms: Optional[float] = None
+        self.error_ewma = 0.0
+        self.last_error_at: Optional[float] = None
+        self.last_slow_at: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._client = None
+
+    def client(self):
+        """重试交给路由器的故障转移和对冲请求，客户端自身不重试"""
+        with self._lock:
+            if self._client is None:
+                self._client = create_client(self.base_url, self.api_key, timeout=self.timeout_s, max_retries=0)
+            return self._client
+
+    def record(self, latency_ms: float, ok: bool):
+        with self._lock:
+            self.requests += 1
+            self.error_ewma += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_ewma)
+            if ok:
+                self.latency_ewma_ms = latency_ms if self.latency_ewma_ms is None else \
+                    self.latency_ewma_ms + EWMA_ALPHA * (latency_ms - self.latency_ewma_ms)
+                if self.latency_ewma_ms > self.latency_slo_ms:
+                    self.last_slow_at = time.monotonic()
+            else:
+                self.errors += 1
+                self.last_error_at = time.monotonic()
+
+    def healthy(self, now: Optional[float] = None) -> bool:
+        """
+        错误率和延迟都在阈值内；出错或变慢的端点冷却期过后重新视为可用，
+        放进来的试探请求会更新EWMA，仍然超出阈值时再冷却一轮
+        """
+        now = time.monotonic() if now is None else now
+        if self.error_ewma >= ERROR_THRESHOLD and self.last_error_at is not None \
+                and now - self.last_error_at < COOLDOWN_SECONDS:
+            return False
+        if self.latency_ewma_ms is not None and self.latency_ewma_ms > self.latency_slo_ms \
+                and self.last_slow_at is not None and now - self.last_slow_at < COOLDOWN_SECONDS:
+            return False
+        return True
+
+    def expected_latency_ms(self) -> float:
+        return self.latency_ewma_ms if self.latency_ewma_ms is not None else self.latency_slo_ms
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'name': self.name, 'model': self.model, 'requests': self.requests, 'errors': self.errors,
+                    'latency_ewma_ms': self.latency_ewma_ms, 'error_ewma': round(self.error_ewma, 3),
+                    'cost': self.requests * self.cost, 'healthy': self.healthy()}
+
+
+def _endpoint_from_env(tier: str, model: str, cost: float, latency_slo_ms: float, timeout_s: float,
+                       max_tokens: int) -> ModelEndpoint:
+    prefix = f"LLM_{tier.upper()}_"
+    api_key_env = os.getenv(prefix + 'API_KEY_ENV', 'DEEPSEEK_API_KEY')
+    return ModelEndpoint(
+        name=tier,
+        model=os.getenv(prefix + 'MODEL', model),
+        base_url=os.getenv(prefix + 'BASE_URL', DEFAULT_BASE_URL),
+        api_key=os.getenv(api_key_env),
+        cost=float(os.getenv(prefix + 'COST', str(cost))),
+        latency_slo_ms=float(os.getenv(prefix + 'LATENCY_SLO_MS', str(latency_slo_ms))),
+        timeout_s=float(os.getenv(prefix + 'TIMEOUT_S', str(timeout_s))),
+        max_tokens=int(os.getenv(prefix + 'MAX_TOKENS', str(max_tokens))),
+    )
+
+
+def default_endpoints() -> Dict[str, ModelEndpoint]:
+    """两个档位默认都是 deepseek-chat，大模型档位给难题留更多的输出token"""
+    return {
+        SMALL: _endpoint_from_env(SMALL, DEFAULT_MODEL, cost=1.0, latency_slo_ms=10000, timeout_s=60,
+                                  max_tokens=1500),
+        LARGE: _endpoint_from_env(LARGE, DEFAULT_MODEL, cost=2.0, latency_slo_ms=20000, timeout_s=90,
+                                  max_tokens=3000),
+    }
+
+
+class ModelRouter:
+    """按难度选择端点，根据EWMA调整流量，并对慢请求发出对冲请求"""
+
+    def __init__(self, endpoints: Optional[Dict[str, ModelEndpoint]] = None,
+                 call: Optional[Callable[[ModelEndpoint, str], str]] = None, max_workers: int = 8,
+                 hedge_multiplier: float = HEDGE_MULTIPLIER, min_hedge_ms: float = MIN_HEDGE_MS,
+                 max_hedge_ratio: float = MAX_HEDGE_RATIO):
+        """
+        Args:
+            endpoints: 档位 -> 端点，默认由环境变量构造
+            call: (端点, 题目文本) -> 分析结果字符串，默认调用 analyze_question_with_gpt4
+            max_workers: 请求线程数（对冲请求中落后的一方会在后台跑完，用于更新EWMA）
+            hedge_multiplier: 请求超过 预期延迟 × 倍数 仍未返回时发出对冲请求
+            min_hedge_ms: 对冲等待时间的下限
+            max_hedge_ratio: 对冲请求最多占总请求数的比例
+        """
+        self.endpoints = endpoints or default_endpoints()
+        self.call = call or self._call_model
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-router')
+        self.hedge_multiplier = hedge_multiplier
+        self.min_hedge_ms = min_hedge_ms
+        self.max_hedge_ratio = max_hedge_ratio
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'routed_small': 0, 'routed_large': 0, 'steered': 0,
+                      'hedged': 0, 'hedge_wins': 0, 'failovers': 0}
+
+    @staticmethod
+    def _call_model(endpoint: ModelEndpoint, text: str) -> str:
+        return analyze_question_with_gpt4(text, client=endpoint.client(), model=endpoint.model,
+                                          max_tokens=endpoint.max_tokens)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def candidates(self, tier: str) -> List[ModelEndpoint]:
+        """
+        按优先顺序排列端点：目标档位在前；不健康的端点排到后面，其中错误率低的在前
+
+        Returns:
+            去重后的端点列表，第一个为本次请求的首选
+        """
+        preferred = [self.endpoints[name] for name in (tier, SMALL if tier == LARGE else LARGE)
+                     if name in self.endpoints]
+        ordered: List[ModelEndpoint] = []
+        for endpoint in preferred:
+            if endpoint not in ordered:
+                ordered.append(endpoint)
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in ordered if endpoint.healthy(now)]
+        unhealthy = sorted((endpoint for endpoint in ordered if endpoint not in healthy),
+                           key=lambda endpoint: endpoint.error_ewma)
+        ranked = healthy + unhealthy
+        if ranked[0] is not ordered[0]:
+            self._count('steered')
+        return ranked
+
+    def analyze(self, text: str) -> str:
+        """
+        按难度路由并返回大模型的分析结果
+
+        Raises:
+            所有端点都失败时抛出最后一个错误
+        """
+        route = classify(text)
+        self._count('requests')
+        self._count(f"routed_{route.tier}")
+        candidates = self.candidates(route.tier)
+        logger.info(f"路由到 {candidates[0].name}（{route.tier}，{route.subject}，{','.join(route.reasons) or '-'}）")
+        return self._hedged(text, candidates)
+
+    def _timed(self, endpoint: ModelEndpoint, text: str) -> str:
+        t0 = time.perf_counter()
+        try:
+            result = self.call(endpoint, text)
+        except Exception:
+            endpoint.record((time.perf_counter() - t0) * 1000, ok=False)
+            raise
+        endpoint.record((time.perf_counter() - t0) * 1000, ok=True)
+        return result
+
+    def _allow_hedge(self) -> bool:
+        with self._stats_lock:
+            return self.stats['hedged'] < self.max_hedge_ratio * self.stats['requests'] + 1
+
+    def _hedged(self, text: str, candidates: List[ModelEndpoint]) -> str:
+        """
+        首选端点超时未返回时向同一端点发出对冲请求（对冲不换档位，否则慢请求会把题目推到另一档模型）；
+        请求都失败时才转到备用端点
+        """
+        primary = candidates[0]
+        backup = candidates[1] if len(candidates) > 1 else primary
+        first = self.executor.submit(self._timed, primary, text)
+        pending = {first}
+        hedge_delay = max(self.min_hedge_ms, primary.expected_latency_ms() * self.hedge_multiplier) / 1000
+        hedged = backup_sent = False
+
+        done, _ = wait(pending, timeout=hedge_delay)
+        if not done and self._allow_hedge():
+            logger.info(f"{primary.name} 超过 {hedge_delay:.1f}秒 未返回，再发一次对冲请求")
+            self._count('hedged')
+            pending.add(self.executor.submit(self._timed, primary, text))
+            hedged = True
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if hedged and future is not first:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+                logger.warning(f"大模型请求失败: {error}")
+            if not pending and not backup_sent and backup is not primary:
+                logger.warning(f"{primary.name} 请求失败，转到 {backup.name}")
+                self._count('failovers')
+                pending.add(self.executor.submit(self._timed, backup, text))
+                backup_sent = True
+        raise error
+
+    def snapshot(self) -> Dict:
+        """各端点的统计和路由计数"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {'stats': stats, 'endpoints': {tier: endpoint.snapshot() for tier, endpoint in self.endpoints.items()}}
+
+
+model_router = ModelRouter()
@@ -0,0 +1,172 @@
+"""
+密码哈希服务
+bcrypt 是刻意设计的CPU密集型计算，放在请求线程上执行会让登录高峰排队；
+这里把哈希和校验交给独立的进程池，用有界的在途任务数实现背压，并提供异步接口
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional
+
+import bcrypt
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('password_hasher', level=logging.INFO)
+
+DEFAULT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+# 0 表示在调用线程内直接计算（不启动进程池）
+DEFAULT_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+DEFAULT_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '0')) or None
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '5'))
+
+
+class PasswordHasherBusy(RuntimeError):
+    """在途的哈希任务已满，调用方应稍后重试"""
+
+
+def _hash_password(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check_password(password: bytes, password_hash: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, password_hash)
+    except ValueError:
+        # 哈希格式无效
+        return False
+
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """从 $2b$12$... 格式的哈希中读取工作因子"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    基于进程池的bcrypt哈希器
+
+    在途任务（排队 + 执行中）数量不超过 max_pending；同步接口最多等待 queue_timeout 秒，
+    异步接口不等待，队列已满时立即抛出 PasswordHasherBusy 以便接口返回503
+    """
+
+    def __init__(self, rounds: int = DEFAULT_ROUNDS, workers: int = DEFAULT_WORKERS,
+                 max_pending: int = DEFAULT_MAX_PENDING, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        """
+        Args:
+            rounds: 新哈希使用的bcrypt工作因子
+            workers: 进程数，0 表示在调用线程内计算
+            max_pending: 在途任务上限，默认为进程数的16倍
+            queue_timeout: 同步接口等待空位的最长时间（秒）
+        """
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 16
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'rejected': 0}
+
+    @property
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    logger.info(f"密码哈希进程池已启动: {self.workers} 个进程, bcrypt rounds={self.rounds}")
+        return self._executor
+
+    def _submit(self, fn, *args, blocking: bool = True, timeout: Optional[float] = None) -> Future:
+        acquired = self._slots.acquire(timeout=timeout) if blocking else self._slots.acquire(blocking=False)
+        if not acquired:
+            self.stats['rejected'] += 1
+            raise PasswordHasherBusy(f"密码哈希队列已满（{self.max_pending}）")
+        self.stats['submitted'] += 1
+        try:
+            executor = self.executor
+            if executor is None:
+                future = Future()
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                future = executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password: str) -> str:
+        """计算新密码的bcrypt哈希（盐值已包含在哈希中）"""
+        future = self._submit(_hash_password, password.encode('utf-8'), self.rounds, timeout=self.queue_timeout)
+        return future.result().decode('utf-8')
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        批量哈希（如开学批量导入名单），所有进程并行计算
+
+        批量任务在后台执行，队列满时等待空位而不是报错；每次最多占用一半的在途名额，
+        给同时进行的登录留出空间。返回结果与输入顺序一致
+        """
+        window = max(1, self.max_pending // 2)
+        hashes = []
+        for start in range(0, len(passwords), window):
+            futures = [self._submit(_hash_password, password.encode('utf-8'), self.rounds)
+                       for password in passwords[start:start + window]]
+            hashes.extend(future.result().decode('utf-8') for future in futures)
+        return hashes
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """常数时间校验密码"""
+        future = self._submit(_check_password, password.encode('utf-8'), password_hash.encode('utf-8'),
+                              timeout=self.queue_timeout)
+        return future.result()
+
+    async def hash_async(self, password: str) -> str:
+        future = self._submit(_hash_password, password.encode('utf-8'), self.rounds, blocking=False)
+        return (await asyncio.wrap_future(future)).decode('utf-8')
+
+    async def verify_async(self, password: str, password_hash: str) -> bool:
+        future = self._submit(_check_password, password.encode('utf-8'), password_hash.encode('utf-8'),
+                              blocking=False)
+        return await asyncio.wrap_future(future)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """哈希的工作因子与当前配置不一致时，应在下次登录成功后重新哈希"""
+        rounds = hash_rounds(password_hash)
+        return rounds is not None and rounds != self.rounds
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """获取进程内共享的密码哈希器"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
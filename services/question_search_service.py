@@ -0,0 +1,301 @@
+"""
+题目全文检索服务（JSON后端）
+数据库不可用时的备选方案：对 question_bank.json 建立内存倒排索引，
+支持BM25排序、前缀/短语查询、高亮、学科/难度过滤和分页。
+查询语法与 DataServiceV3.search_questions 一致：
+    二次方程            普通词（多个词之间为AND）
+    "解 一元二次方程"   短语，要求按顺序相邻出现
+    func*               前缀
+"""
+
+import os
+import re
+import sys
+import math
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('question_search_service', level=logging.INFO)
+
+# 连续的中文字符或连续的字母数字视为一段
+_RUN_PATTERN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]+|[A-Za-z0-9_]+')
+_CLAUSE_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _is_cjk(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """
+    分词：中文按字二元组（bigram）切分，无需词典；英文和数字按单词切分并转小写
+
+    Returns:
+        [(token, 起始字符位置, 结束字符位置)]，列表下标即词位置
+    """
+    tokens = []
+    for match in _RUN_PATTERN.finditer(text or ''):
+        run, start = match.group(), match.start()
+        if not _is_cjk(run):
+            tokens.append((run.lower(), start, match.end()))
+        elif len(run) == 1:
+            tokens.append((run, start, start + 1))
+        else:
+            tokens.extend((run[i:i + 2], start + i, start + i + 2) for i in range(len(run) - 1))
+    return tokens
+
+
+def parse_query(query: str) -> List[Dict]:
+    """
+    解析查询字符串
+
+    Returns:
+        子句列表，每项为 {'text': str, 'phrase': bool, 'prefix': bool}
+    """
+    clauses = []
+    for match in _CLAUSE_PATTERN.finditer(query or ''):
+        phrase, term = match.group(1), match.group(2)
+        if phrase is not None:
+            if _RUN_PATTERN.search(phrase):
+                clauses.append({'text': phrase.strip(), 'phrase': True, 'prefix': False})
+            continue
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        # 普通词中的标点按分隔符处理，拆成多个子句
+        for run in _RUN_PATTERN.findall(term):
+            clauses.append({'text': run, 'phrase': False, 'prefix': prefix})
+    return clauses
+
+
+class QuestionSearchIndex:
+    """题目倒排索引：token -> {question_id: [词位置]}"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._docs: Dict[str, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @classmethod
+    def from_bank(cls, bank: Dict[str, Dict]) -> 'QuestionSearchIndex':
+        """从题库构建索引"""
+        index = cls()
+        for question_id, question in bank.items():
+            text = question.get('canonical_text')
+            if not text:
+                continue
+            analysis = question.get('master_analysis') or {}
+            index.add(
+                question_id, text,
+                subject=question.get('subject') or analysis.get('subject'),
+                difficulty_level=question.get('difficulty_level') or analysis.get('difficulty_level')
+            )
+        return index
+
+    def add(self, question_id: str, text: str, subject: str = None, difficulty_level: int = None):
+        """添加或替换一道题目"""
+        with self._lock:
+            self.remove(question_id)
+            tokens = tokenize(text)
+            for position, (token, _, _) in enumerate(tokens):
+                postings = self._postings[token]
+                if not postings:
+                    self._vocabulary_dirty = True
+                postings.setdefault(question_id, []).append(position)
+            self._docs[question_id] = {
+                'text': text,
+                'spans': [(start, end) for _, start, end in tokens],
+                'tokens': {token for token, _, _ in tokens},
+                'subject': subject,
+                'difficulty_level': difficulty_level,
+            }
+
+    def remove(self, question_id: str):
+        """移除题目"""
+        with self._lock:
+            doc = self._docs.pop(question_id, None)
+            if doc is None:
+                return
+            for token in doc['tokens']:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(question_id, None)
+                    if not postings:
+                        del self._postings[token]
+                        self._vocabulary_dirty = True
+
+    def _sorted_vocabulary(self) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        return self._vocabulary
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        self._sorted_vocabulary()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + '\uffff')
+        return self._vocabulary[start:end]
+
+    def _clause_groups(self, clause: Dict) -> List[List[str]]:
+        """把子句转换为按顺序相邻出现的token组，每组内任意一个token匹配即可"""
+        tokens = [token for token, _, _ in tokenize(clause['text'])]
+        if not tokens:
+            return []
+        groups = [[token] for token in tokens]
+        last = tokens[-1]
+        if clause['prefix'] and last.isascii():
+            groups[-1] = self._expand_prefix(last)
+        elif len(tokens) == 1 and len(last) == 1 and not last.isascii():
+            # 单个汉字：匹配包含该字的所有二元组
+            groups[-1] = [token for token in self._sorted_vocabulary() if last in token]
+        return groups
+
+    def _match_clause(self, groups: List[List[str]]) -> Dict[str, List[int]]:
+        """返回 question_id -> 子句匹配的起始词位置"""
+        merged = []
+        for group in groups:
+            positions: Dict[str, set] = defaultdict(set)
+            for token in group:
+                for question_id, token_positions in self._postings.get(token, {}).items():
+                    positions[question_id].update(token_positions)
+            if not positions:
+                return {}
+            merged.append(positions)
+
+        candidates = set(merged[0])
+        for positions in merged[1:]:
+            candidates &= positions.keys()
+
+        matches = {}
+        for question_id in candidates:
+            starts = [p for p in sorted(merged[0][question_id])
+                      if all(p + i in merged[i][question_id] for i in range(1, len(merged)))]
+            if starts:
+                matches[question_id] = starts
+        return matches
+
+    def _highlight(self, question_id: str, occurrences: List[Tuple[int, int]]) -> str:
+        doc = self._docs[question_id]
+        spans = doc['spans']
+        char_spans = sorted((spans[start][0], spans[start + length - 1][1]) for start, length in occurrences)
+        merged: List[List[int]] = []
+        for start, end in char_spans:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        text, parts, cursor = doc['text'], [], 0
+        for start, end in merged:
+            parts.append(text[cursor:start])
+            parts.append(f"{HIGHLIGHT_START}{text[start:end]}{HIGHLIGHT_END}")
+            cursor = end
+        parts.append(text[cursor:])
+        return ''.join(parts)
+
+    def search(self, query: str, subject: str = None, difficulty_level: int = None,
+               limit: int = 20, offset: int = 0) -> Dict:
+        """
+        全文检索
+
+        Args:
+            query: 查询字符串
+            subject: 学科过滤
+            difficulty_level: 难度过滤
+            limit: 每页数量
+            offset: 偏移量
+
+        Returns:
+            {'total': 命中总数, 'results': [{question_id, canonical_text, subject,
+             difficulty_level, score, highlight}]}
+        """
+        clauses = parse_query(query)
+        with self._lock:
+            if not clauses or not self._docs:
+                return {'total': 0, 'results': []}
+
+            doc_count = len(self._docs)
+            avg_length = sum(len(d['spans']) for d in self._docs.values()) / doc_count
+            scores: Dict[str, float] = defaultdict(float)
+            occurrences: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+            candidates: Optional[set] = None
+
+            for clause in clauses:
+                groups = self._clause_groups(clause)
+                matches = self._match_clause(groups) if groups else {}
+                candidates = set(matches) if candidates is None else candidates & matches.keys()
+                if not candidates:
+                    return {'total': 0, 'results': []}
+                idf = math.log(1 + (doc_count - len(matches) + 0.5) / (len(matches) + 0.5))
+                for question_id, starts in matches.items():
+                    tf = len(starts)
+                    length_norm = 1 - BM25_B + BM25_B * len(self._docs[question_id]['spans']) / avg_length
+                    scores[question_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+                    occurrences[question_id].extend((start, len(groups)) for start in starts)
+
+            hits = [
+                question_id for question_id in candidates
+                if (subject is None or self._docs[question_id]['subject'] == subject)
+                and (difficulty_level is None or self._docs[question_id]['difficulty_level'] == difficulty_level)
+            ]
+            hits.sort(key=lambda qid: (-scores[qid], qid))
+
+            results = []
+            for question_id in hits[offset:offset + limit]:
+                doc = self._docs[question_id]
+                results.append({
+                    'question_id': question_id,
+                    'canonical_text': doc['text'],
+                    'subject': doc['subject'],
+                    'difficulty_level': doc['difficulty_level'],
+                    'score': round(scores[question_id], 4),
+                    'highlight': self._highlight(question_id, occurrences[question_id]),
+                })
+            return {'total': len(hits), 'results': results}
+
+
+_index: Optional[QuestionSearchIndex] = None
+_index_signature = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> QuestionSearchIndex:
+    """获取题库索引，题库文件变化后自动重建"""
+    global _index, _index_signature
+    from core import question_manager as qm
+
+    try:
+        stat = os.stat(qm.BANK_FILE)
+        signature = (qm.BANK_FILE, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        signature = (qm.BANK_FILE, None, None)
+
+    with _index_lock:
+        if _index is None or signature != _index_signature:
+            _index = QuestionSearchIndex.from_bank(qm.load_bank())
+            _index_signature = signature
+            logger.info(f"题库检索索引已构建: {len(_index)} 道题目")
+        return _index
+
+
+def search_questions(query: str, subject: str = None, difficulty_level: int = None,
+                     limit: int = 20, offset: int = 0) -> Dict:
+    """在JSON题库中全文检索题目"""
+    return get_search_index().search(query, subject=subject, difficulty_level=difficulty_level,
+                                     limit=limit, offset=offset)
@@ -0,0 +1,210 @@
+"""
+题干与学生答案分离
+同一道题不同学生的作答只在答案部分不同：把OCR文本拆成题干和学生答案后，
+题干分析（知识点、解题步骤、易错点）按题干hash缓存，所有学生共用；
+每个答案只需一次对照标准答案的判断，能在本地判断时不调用大模型
+"""
+
+import os
+import re
+import sys
+import logging
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('question_stem', level=logging.INFO)
+
+BLANK = '（ ）'
+STEM_FIELDS = ('subject', 'correct_answer', 'solution_steps', 'knowledge_point', 'common_mistakes')
+MAX_ANSWER_LENGTH = 40
+
+# "答：北京" / "答案：B" / "解：x = 2"，取最后一个标记之后的内容
+_ANSWER_MARKER = re.compile(r'(?<![^\s。；;？?！!，,])(?:我的答案|学生答案|答案|答|解)\s*[:：]\s*')
+# 填在括号里的答案，排除算式、分值（"5分"）和说明（"单位：厘米"）
+_FILLED_BRACKET = re.compile(r'[（(]\s*([^()（）+\-×÷*/=:：\s][^()（）+\-×÷*/=:：]{0,19}?)\s*[)）]')
+_SCORE = re.compile(r'^\d+\s*分$')
+# 图表、小题编号等引用："如图（1）" "第（2）题" "式（3）"
+_REFERENCE_BEFORE = re.compile(r'(?:图|表|式|例|第)\s*$')
+_REFERENCE_AFTER = re.compile(r'^\s*(?:小题|题|问)')
+# 括号里的说明："（写出过程）" "（保留两位小数）"
+_ANNOTATION = re.compile(r'写出|过程|保留|精确|单位|注意|提示|要求|列式|计算|填空|选择')
+# 括号后面还在提问，括号里的是题目的一部分："小明（男孩）今年几岁？"
+_QUESTION_AFTER = re.compile(r'[？?]|多少|几|什么|哪|吗')
+_CHOICE_ANSWER = re.compile(r'^[A-Da-d]{1,4}$')
+# 填在下划线上的答案
+_FILLED_UNDERLINE = re.compile(r'_{2,}\s*([^_\s][^_]{0,19}?)\s*_{2,}')
+# 没有字母的算式后面跟着的数字答案（可带单位）
+_NUMERIC_RESULT = re.compile(r'^([^=a-zA-Z]+=)\s*(-?\d+(?:\.\d+)?(?:/\d+)?\s*[^\d\s=]{0,4})$')
+_NUMBER = re.compile(r'^(-?\d+(?:\.\d+)?(?:/\d+)?)\s*[^\d]{0,4}$')
+_DECIMAL_PLACES = re.compile(r'^-?\d+\.(\d+)')
+_CHOICE = re.compile(r'^([A-Da-d])(?:$|[.、．\s:：)）])')
+
+# 题目中的数字：向量模型对数字几乎不敏感，只改了数字的两道题相似度很高
+_NUMERIC_TOKEN = re.compile(r'\d+(?:\.\d+)?')
+
+_FULLWIDTH = str.maketrans({**{chr(0xFF10 + i): str(i) for i in range(10)},
+                            '．': '.', '／': '/', '－': '-', 'Ａ': 'A', 'Ｂ': 'B', 'Ｃ': 'C', 'Ｄ': 'D'})
+
+
+def split_stem_answer(text: str) -> Tuple[str, str]:
+    """
+    把OCR文本拆成题干和学生答案
+
+    Returns:
+        (题干, 学生答案)；识别不出答案时返回 (原文, '')
+    """
+    text = (text or '').strip()
+    if not text:
+        return '', ''
+
+    markers = list(_ANSWER_MARKER.finditer(text))
+    if markers:
+        stem, answer = text[:markers[-1].start()].strip(), text[markers[-1].end():].strip()
+        if stem and answer:
+            return _checked(text, stem, answer)
+
+    answers = []
+    brackets = list(_FILLED_BRACKET.finditer(text))
+
+    def take_bracket(match):
+        if not _is_filled_blank(text, match, last=match.start() == brackets[-1].start()):
+            return match.group(0)
+        answers.append(match.group(1).strip())
+        return BLANK
+
+    def take_underline(match):
+        if _ANNOTATION.search(match.group(1)):
+            return match.group(0)
+        answers.append(match.group(1).strip())
+        return BLANK
+
+    stem = _FILLED_UNDERLINE.sub(take_underline, _FILLED_BRACKET.sub(take_bracket, text))
+    if answers:
+        return _checked(text, stem, '；'.join(answers))
+
+    lines = text.split('\n')
+    match = _NUMERIC_RESULT.match(lines[-1].strip())
+    if match and match.group(1).strip('= '):
+        return _checked(text, '\n'.join(lines[:-1] + [match.group(1)]).strip(), match.group(2).strip())
+    return text, ''
+
+
+def _is_filled_blank(text: str, match: re.Match, last: bool) -> bool:
+    """
+    括号里的内容是否是学生填的答案
+
+    选项字母和数字在任何位置都算；其他内容只有在最后一个括号、且括号后不再提问时才算。
+    小题编号、图表引用和括号里的说明都不算
+    """
+    content = match.group(1).strip()
+    before, after = text[:match.start()], text[match.end():]
+    if _SCORE.match(content) or _ANNOTATION.search(content):
+        return False
+    if not before.rsplit('\n', 1)[-1].strip():
+        # 行首的 "（1）" 是小题编号
+        return False
+    if _REFERENCE_BEFORE.search(before) or _REFERENCE_AFTER.match(after):
+        return False
+    if _CHOICE_ANSWER.match(content) or _NUMBER.match(content):
+        return True
+    return last and not _QUESTION_AFTER.search(after)
+
+
+def _checked(text: str, stem: str, answer: str) -> Tuple[str, str]:
+    """答案过长时多半拆错了（整段解答或说明），不拆分，按整题分析"""
+    if len(answer) > MAX_ANSWER_LENGTH:
+        return text, ''
+    return stem, answer
+
+
+def _normalize_answer(answer: str) -> str:
+    return re.sub(r'[\s。.，,；;！!]+$', '', re.sub(r'\s+', '', (answer or '').translate(_FULLWIDTH))).lower()
+
+
+def _as_number(answer: str) -> Optional[Fraction]:
+    match = _NUMBER.match(answer)
+    if not match:
+        return None
+    try:
+        return Fraction(match.group(1))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _rounded(answer: str, number: Fraction, exact: Fraction) -> bool:
+    """答案是否为无限小数 exact 在舍入误差以内的有限小数（是否合格取决于题目要求的精度）"""
+    match = _DECIMAL_PLACES.match(answer)
+    if not match:
+        return False
+    denominator = exact.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    return denominator != 1 and abs(number - exact) <= Fraction(1, 2 * 10 ** len(match.group(1)))
+
+
+def local_verdict(student_answer: str, correct_answer: str) -> Optional[Dict]:
+    """
+    不调用大模型判断答案：完全一致、数值相等或选择题选项相同
+
+    Returns:
+        {'is_correct', 'error_analysis'}，无法在本地判断时返回None
+    """
+    student, reference = _normalize_answer(student_answer), _normalize_answer(correct_answer)
+    if not student or not reference:
+        return None
+    if student == reference:
+        return {'is_correct': True, 'error_analysis': ''}
+
+    wrong = {'is_correct': False, 'error_analysis': f"正确答案是 {correct_answer}，你的答案 {student_answer} 不正确。"}
+    student_number, reference_number = _as_number(student), _as_number(reference)
+    if student_number is not None and reference_number is not None:
+        if student_number != reference_number and _rounded(student, student_number, reference_number):
+            return None
+        return {'is_correct': True, 'error_analysis': ''} if student_number == reference_number else wrong
+
+    student_choice, reference_choice = _CHOICE.match(student), _CHOICE.match(reference)
+    if student_choice and reference_choice and len(student) == 1:
+        return {'is_correct': True, 'error_analysis': ''} \
+            if student_choice.group(1) == reference_choice.group(1) else wrong
+    return None
+
+
+def numeric_tokens(text: str) -> List[str]:
+    """按出现顺序取出文本中的数字（全角数字先转成半角）"""
+    return _NUMERIC_TOKEN.findall((text or '').translate(_FULLWIDTH))
+
+
+def same_numbers(a: str, b: str) -> bool:
+    """两段文本中的数字是否完全相同；近似题目只有数字一致时才能复用答案和解题步骤"""
+    return numeric_tokens(a) == numeric_tokens(b)
+
+
+def stem_fields(analysis: Dict) -> Dict:
+    """分析结果中与学生作答无关、可以在同一道题的不同提交之间复用的部分"""
+    return {key: analysis.get(key, '') for key in STEM_FIELDS}
+
+
+def merge_analysis(stem_analysis: Dict, verdict: Dict, stem_id: Optional[str] = None,
+                   student_answer: Optional[str] = None) -> Dict:
+    """把共享的题干分析和本次答案的判断合成为完整的分析结果（与大模型分析格式相同）"""
+    is_correct = bool(verdict.get('is_correct'))
+    merged = {
+        'subject': stem_analysis.get('subject') or '未知',
+        'is_correct': is_correct,
+        'error_analysis': '' if is_correct else verdict.get('error_analysis', ''),
+        'correct_answer': stem_analysis.get('correct_answer', ''),
+        'solution_steps': stem_analysis.get('solution_steps', ''),
+        'knowledge_point': stem_analysis.get('knowledge_point', ''),
+        'common_mistakes': stem_analysis.get('common_mistakes', ''),
+    }
+    if stem_id is not None:
+        merged['stem_id'] = stem_id
+    if student_answer is not None:
+        merged['student_answer'] = student_answer
+    return merged
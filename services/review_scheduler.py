@@ -0,0 +1,322 @@
+"""
+错题复习调度服务
+基于SM-2间隔重复算法，为每个学生维护按到期时间排序的复习队列。
+所有时间都是带时区的UTC时间（与数据库的 TIMESTAMPTZ 列一致），不带时区的输入按UTC处理
+"""
+
+import os
+import sys
+import heapq
+import threading
+import itertools
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('review_scheduler', level=logging.INFO)
+
+# SM-2 参数
+DEFAULT_EASE_FACTOR = 2.5
+MIN_EASE_FACTOR = 1.3
+PASSING_QUALITY = 3
+MAX_MASTERY_LEVEL = 5
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _to_utc(value) -> Optional[datetime]:
+    """把数据库或JSON中的时间统一转换为带时区的UTC时间"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+@dataclass
+class ReviewItem:
+    """一条错题的复习状态"""
+    entry_id: str
+    user_id: str
+    question_id: Optional[str] = None
+    review_count: int = 0
+    mastery_level: int = 1
+    ease_factor: float = DEFAULT_EASE_FACTOR
+    interval_days: int = 0
+    last_reviewed_at: Optional[datetime] = None
+    next_review_at: Optional[datetime] = None
+
+    def __post_init__(self):
+        self.last_reviewed_at = _to_utc(self.last_reviewed_at)
+        self.next_review_at = _to_utc(self.next_review_at)
+
+    @property
+    def repetitions(self) -> int:
+        """连续答对次数；mastery_level 从1开始，每次成功复习加1"""
+        return max(self.mastery_level - 1, 0)
+
+    @classmethod
+    def from_row(cls, row: Dict) -> 'ReviewItem':
+        """从 mistake_book_entries 行或错题本JSON条目构造"""
+        item = cls(
+            entry_id=str(row.get('id') or row.get('mistake_id')),
+            user_id=row['user_id'],
+            question_id=row.get('question_id'),
+            review_count=row.get('review_count') or 0,
+            mastery_level=row.get('mastery_level') or 1,
+            ease_factor=float(row.get('ease_factor') or DEFAULT_EASE_FACTOR),
+            interval_days=row.get('interval_days') or 0,
+            last_reviewed_at=row.get('last_reviewed_at'),
+            next_review_at=row.get('next_review_at'),
+        )
+        if item.next_review_at is None:
+            item.next_review_at = compute_due_date(item, _to_utc(row.get('created_at') or row.get('added_timestamp')))
+        return item
+
+    def to_update_params(self) -> Dict:
+        """转换为 DataServiceV3.update_review_schedules 所需的参数"""
+        return {
+            'entry_id': self.entry_id,
+            'review_count': self.review_count,
+            'mastery_level': self.mastery_level,
+            'ease_factor': self.ease_factor,
+            'interval_days': self.interval_days,
+            'last_reviewed_at': self.last_reviewed_at,
+            'next_review_at': self.next_review_at,
+        }
+
+
+def compute_due_date(item: ReviewItem, created_at: Optional[datetime] = None) -> datetime:
+    """根据上次复习时间和间隔计算下次复习时间；从未复习过的错题从加入时起到期，加入时间未知时从现在起到期"""
+    if item.last_reviewed_at is None:
+        return created_at or utcnow()
+    return item.last_reviewed_at + timedelta(days=item.interval_days)
+
+
+def apply_sm2(item: ReviewItem, quality: int, reviewed_at: datetime) -> ReviewItem:
+    """
+    按SM-2算法更新一条错题的复习状态
+
+    Args:
+        item: 当前复习状态（原地修改）
+        quality: 本次回答质量，0-5，>=3 视为答对
+        reviewed_at: 复习时间
+
+    Returns:
+        更新后的复习状态
+    """
+    quality = max(0, min(5, int(quality)))
+    reviewed_at = _to_utc(reviewed_at)
+
+    if quality >= PASSING_QUALITY:
+        repetitions = item.repetitions
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = max(1, round(item.interval_days * item.ease_factor))
+        item.mastery_level = min(item.mastery_level + 1, MAX_MASTERY_LEVEL)
+    else:
+        interval = 1
+        item.mastery_level = 1
+
+    item.ease_factor = max(
+        MIN_EASE_FACTOR,
+        item.ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    )
+    item.interval_days = interval
+    item.review_count += 1
+    item.last_reviewed_at = reviewed_at
+    item.next_review_at = reviewed_at + timedelta(days=interval)
+    return item
+
+
+def review_status_for(item: ReviewItem) -> str:
+    """把复习状态映射为错题本的 review_status"""
+    if item.mastery_level >= MAX_MASTERY_LEVEL:
+        return 'mastered'
+    if item.review_count > 0 and item.mastery_level > 1:
+        return 'reviewed'
+    return 'needs_review'
+
+
+class ReviewScheduler:
+    """
+    复习调度器
+
+    每个学生一个按 next_review_at 排序的小根堆，条目更新时直接压入新版本，
+    旧版本在出堆时按时间戳不一致惰性丢弃，因此取前N个到期题为 O(N log n)。
+    """
+
+    def __init__(self, data_service=None):
+        """
+        初始化复习调度器
+
+        Args:
+            data_service: 可选的 DataServiceV3 实例，用于持久化复习计划
+        """
+        self.data_service = data_service
+        self._lock = threading.RLock()
+        self._items: Dict[str, ReviewItem] = {}
+        self._heaps: Dict[str, List[Tuple[datetime, int, str]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _push(self, item: ReviewItem):
+        version = next(self._counter)
+        self._versions[item.entry_id] = version
+        heap = self._heaps.setdefault(item.user_id, [])
+        heapq.heappush(heap, (item.next_review_at, version, item.entry_id))
+
+    def _is_current(self, heap_entry: Tuple[datetime, int, str]) -> bool:
+        _, version, entry_id = heap_entry
+        return self._versions.get(entry_id) == version
+
+    def load_items(self, items: Iterable[ReviewItem]):
+        """批量载入复习条目并重建索引（O(n) 建堆）"""
+        with self._lock:
+            for item in items:
+                self._items[item.entry_id] = item
+            self._rebuild_heaps()
+
+    def _rebuild_heaps(self):
+        heaps: Dict[str, List[Tuple[datetime, int, str]]] = {}
+        self._versions = {}
+        for item in self._items.values():
+            version = next(self._counter)
+            self._versions[item.entry_id] = version
+            heaps.setdefault(item.user_id, []).append((item.next_review_at, version, item.entry_id))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        self._heaps = heaps
+
+    def _maybe_rebuild(self):
+        # 失效的旧版本过多时重建堆，避免堆无限增长
+        if sum(len(h) for h in self._heaps.values()) > 2 * len(self._items) + 64:
+            self._rebuild_heaps()
+
+    def upsert(self, item: ReviewItem):
+        """新增或替换一条复习条目"""
+        with self._lock:
+            self._items[item.entry_id] = item
+            self._push(item)
+            self._maybe_rebuild()
+
+    def remove(self, entry_id: str):
+        """移除复习条目（堆中的旧记录会被惰性丢弃）"""
+        with self._lock:
+            self._items.pop(entry_id, None)
+            self._versions.pop(entry_id, None)
+
+    def get_item(self, entry_id: str) -> Optional[ReviewItem]:
+        """获取单条复习状态"""
+        return self._items.get(entry_id)
+
+    def next_due(self, user_id: str, limit: int = 10, now: datetime = None) -> List[ReviewItem]:
+        """
+        获取学生当前到期的前N道错题，按到期时间升序
+
+        Args:
+            user_id: 学生ID
+            limit: 最多返回数量
+            now: 当前时间，默认 UTC 当前时间
+
+        Returns:
+            到期的复习条目列表
+        """
+        now = _to_utc(now) or utcnow()
+        with self._lock:
+            heap = self._heaps.get(user_id)
+            if not heap:
+                return []
+            taken = []
+            while heap and len(taken) < limit:
+                if not self._is_current(heap[0]):
+                    heapq.heappop(heap)  # 丢弃已失效的旧版本
+                    continue
+                if heap[0][0] > now:
+                    break
+                taken.append(heapq.heappop(heap))
+            for heap_entry in taken:
+                heapq.heappush(heap, heap_entry)
+            return [self._items[entry_id] for _, _, entry_id in taken]
+
+    def due_count(self, user_id: str, now: datetime = None) -> int:
+        """统计学生当前到期的错题数量"""
+        now = _to_utc(now) or utcnow()
+        with self._lock:
+            return sum(1 for e in self._heaps.get(user_id, [])
+                       if e[0] <= now and self._is_current(e))
+
+    def record_reviews(self, results: Iterable[Tuple[str, int]], reviewed_at: datetime = None) -> List[ReviewItem]:
+        """
+        批量记录一次复习会话的结果并更新复习计划
+
+        Args:
+            results: (entry_id, quality) 列表
+            reviewed_at: 复习时间，默认 UTC 当前时间
+
+        Returns:
+            更新后的复习条目列表
+        """
+        reviewed_at = _to_utc(reviewed_at) or utcnow()
+        updated = []
+        with self._lock:
+            for entry_id, quality in results:
+                item = self._items.get(entry_id)
+                if item is None:
+                    logger.warning(f"复习条目不存在: {entry_id}")
+                    continue
+                apply_sm2(item, quality, reviewed_at)
+                self._push(item)
+                updated.append(item)
+            self._maybe_rebuild()
+
+        if updated and self.data_service is not None:
+            self.data_service.update_review_schedules([item.to_update_params() for item in updated])
+        return updated
+
+    def recompute_all(self, now: datetime = None) -> int:
+        """
+        全量重算所有条目的到期时间并重建索引（夜间任务使用）
+
+        Returns:
+            到期时间发生变化的条目数量
+        """
+        now = _to_utc(now) or utcnow()
+        changed = 0
+        with self._lock:
+            for item in self._items.values():
+                if item.last_reviewed_at is None:
+                    continue
+                if item.ease_factor < MIN_EASE_FACTOR:
+                    item.ease_factor = MIN_EASE_FACTOR
+                due = compute_due_date(item)
+                if due != item.next_review_at:
+                    item.next_review_at = due
+                    changed += 1
+            self._rebuild_heaps()
+        logger.info(f"复习计划重算完成: {len(self._items)} 条, 变化 {changed} 条")
+        return changed
+
+    def load_from_database(self, user_id: str = None) -> int:
+        """从数据库加载错题复习状态"""
+        if self.data_service is None:
+            return 0
+        rows = self.data_service.get_review_schedule_entries(user_id)
+        self.load_items(ReviewItem.from_row(row) for row in rows)
+        return len(rows)
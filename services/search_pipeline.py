@@ -0,0 +1,580 @@
+"""
+智能搜题流水线
+上传的图片只解码一次；phash、OCR和文本归一化/向量检索作为独立阶段在线程池中并发执行，
+任一级缓存命中即返回，不再等待其余阶段（仍在运行的OCR在后台结束，结果丢弃）
+
+阶段与延迟预算（毫秒，可用 SEARCH_BUDGET_<阶段名大写>_MS 覆盖）：
+    decode      解码上传图片                    50
+    phash       计算phash并查L1缓存             50    ┐ 与右侧分支并发
+    ocr         OCR识别（调用方已给出文本时跳过） 3000  ┤
+    fast_grade  本地判题（基础算术/一元一次方程）  5    │ 依赖 ocr
+    text_hash   文本归一化并查L2缓存             20    │ 依赖 ocr
+    stem        按题干hash查题干分析缓存          20    │ 文本中能分出学生答案时代替 semantic
+    semantic    向量检索查L3缓存                300    ┘ 依赖 text_hash 未命中，本地已判题时跳过
+    llm         缓存未命中且本地无法判题时调用大模型 20000
+    answer_check 对照标准答案批改学生答案（本地判断不了时调用大模型） 3000
+    save        写题库、提交记录和语义索引      200
+缓存命中路径的总预算为 SEARCH_CACHE_BUDGET_MS（默认 3500）；
+超出预算的阶段会记录警告，每次搜题的耗时明细随结果的 spans 返回
+
+能分出学生答案的题目（见 services/question_stem.py）只对题干做一次完整分析并按题干缓存，
+不同学生的答案只需一次批改；近似文本的答案可能不同，这类题目不使用语义缓存。
+其他题目命中语义缓存时也只复用近似题目的讲解（知识点、解题步骤、正确答案），
+对错通过 answer_check 针对本次文本重新判断，不沿用别的学生的批改结果
+
+预先调用大模型（SEARCH_SPECULATIVE_LLM=true）：拿到题目文本后立即发出大模型请求，与
+L2/L3缓存查询并行，真正未命中时省去缓存查询的等待；任一级缓存命中时，尚未开始的请求被取消，
+已在进行的请求结果只用于给语义缓存命中打标签。SpeculationBudget 限制同时进行的预先请求数
+（SEARCH_SPECULATIVE_MAX_INFLIGHT）和每小时被浪费的请求数（SEARCH_SPECULATIVE_WASTE_PER_HOUR），
+超出时退回为未命中后再调用
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+from core import question_manager as qm
+from services import storage_service, ocr_service, llm_service, mistake_book_service, fast_grader, question_stem
+from services.semantic_cache_service import semantic_cache
+
+logger = setup_logger('search_pipeline', level=logging.INFO)
+
+
+def _budget(stage: str, default: float) -> float:
+    return float(os.getenv(f'SEARCH_BUDGET_{stage.upper()}_MS', default))
+
+
+STAGE_BUDGET_MS = {
+    'decode': _budget('decode', 50),
+    'phash': _budget('phash', 50),
+    'ocr': _budget('ocr', 3000),
+    'fast_grade': _budget('fast_grade', 5),
+    'stem': _budget('stem', 20),
+    'text_hash': _budget('text_hash', 20),
+    'semantic': _budget('semantic', 300),
+    'llm': _budget('llm', 20000),
+    'answer_check': _budget('answer_check', 3000),
+    'save': _budget('save', 200),
+}
+CACHE_BUDGET_MS = float(os.getenv('SEARCH_CACHE_BUDGET_MS', '3500'))
+DEFAULT_WORKERS = int(os.getenv('SEARCH_PIPELINE_WORKERS', '4'))
+SPECULATIVE_LLM = os.getenv('SEARCH_SPECULATIVE_LLM', 'false').lower() in ('1', 'true', 'yes')
+SPECULATIVE_MAX_INFLIGHT = int(os.getenv('SEARCH_SPECULATIVE_MAX_INFLIGHT', '2'))
+SPECULATIVE_WASTE_PER_HOUR = int(os.getenv('SEARCH_SPECULATIVE_WASTE_PER_HOUR', '30'))
+
+OCR_FAILURES = ('识别失败', '识别异常', 'OCR服务异常')
+OCR_ERROR = "文字识别失败或图片为空，请确保图片清晰。"
+
+
+class SpeculationBudget:
+    """预先调用大模型的开销上限：同时进行的请求数，以及最近一小时内被浪费的请求数"""
+
+    WINDOW_SECONDS = 3600
+
+    def __init__(self, max_inflight: int = SPECULATIVE_MAX_INFLIGHT,
+                 max_wasted_per_hour: int = SPECULATIVE_WASTE_PER_HOUR):
+        self.max_inflight = max_inflight
+        self.max_wasted_per_hour = max_wasted_per_hour
+        self._inflight = 0
+        self._wasted = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._prune()
+            if self._inflight >= self.max_inflight or len(self._wasted) >= self.max_wasted_per_hour:
+                return False
+            self._inflight += 1
+            return True
+
+    def release(self, wasted: bool = False):
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+            if wasted:
+                self._wasted.append(time.monotonic())
+
+    def wasted_last_hour(self) -> int:
+        with self._lock:
+            self._prune()
+            return len(self._wasted)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.WINDOW_SECONDS
+        while self._wasted and self._wasted[0] < cutoff:
+            self._wasted.popleft()
+
+
+class _Speculation:
+    """一次搜题中预先发出的大模型请求；resolved 后不再发出新请求"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resolved = False
+        self.future: Optional[Future] = None
+
+    def resolve(self) -> Optional[Future]:
+        with self.lock:
+            self.resolved = True
+            return self.future
+
+
+class PipelineTrace:
+    """记录一次搜题各阶段的开始时间、耗时和结果"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        record = {'stage': stage, 'start_ms': round((start - self.started) * 1000, 2), 'status': 'ok'}
+        try:
+            yield record
+        except Exception:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['duration_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            budget = STAGE_BUDGET_MS.get(stage)
+            record['over_budget'] = budget is not None and record['duration_ms'] > budget
+            if record['over_budget']:
+                logger.warning(f"搜题阶段 {stage} 耗时 {record['duration_ms']}ms，超出预算 {budget:.0f}ms")
+            with self._lock:
+                self.spans.append(record)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def summary(self) -> str:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start_ms'])
+        return ' '.join(f"{s['stage']}={s['duration_ms']}ms({s['status']})" for s in spans)
+
+
+@dataclass
+class SearchResult:
+    """一次搜题的结果；analysis 为空时 error 给出原因"""
+    analysis: Optional[Dict]
+    ocr_text: str
+    cache_status: Optional[str]
+    question_id: Optional[str]
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+    spans: List[Dict] = field(default_factory=list)
+    logs: List[str] = field(default_factory=list)
+
+
+class SearchPipeline:
+    """分阶段并发执行的搜题流水线"""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, speculative: bool = SPECULATIVE_LLM,
+                 budget: SpeculationBudget = None):
+        """
+        Args:
+            max_workers: 阶段线程池大小
+            speculative: 拿到文本后是否立即预先调用大模型
+            budget: 预先调用的开销上限
+        """
+        self.max_workers = max_workers
+        self.speculative = speculative
+        self.budget = budget or SpeculationBudget()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._speculative_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'speculative_started': 0, 'speculative_used': 0, 'speculative_cancelled': 0,
+                      'speculative_wasted': 0, 'speculative_denied': 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='search-stage')
+        return self._executor
+
+    @property
+    def speculative_executor(self) -> ThreadPoolExecutor:
+        """预先调用大模型的独立线程池，耗时数秒的请求不占用缓存查询阶段的线程"""
+        if self._speculative_executor is None:
+            with self._lock:
+                if self._speculative_executor is None:
+                    self._speculative_executor = ThreadPoolExecutor(max_workers=max(1, self.budget.max_inflight),
+                                                                    thread_name_prefix='search-speculative')
+        return self._speculative_executor
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def run(self, user: Dict, image_path: str, ocr_text: str = None, force_new_analysis: bool = False,
+            record_mistakes: bool = False) -> SearchResult:
+        """
+        执行一次搜题
+
+        Args:
+            user: 当前用户
+            image_path: 已保存的上传图片路径
+            ocr_text: 调用方已有的题目文本（如用户编辑过的OCR结果）；为空时由流水线做OCR，
+                此时才使用phash缓存，避免图片命中覆盖用户修改过的文本
+            force_new_analysis: 跳过所有缓存，直接调用大模型
+            record_mistakes: 答错的新题是否加入错题本
+        """
+        trace = PipelineTrace()
+        logs = [f"Starting search pipeline for user {user['id']}..."]
+        use_cache = not force_new_analysis
+
+        speculation = _Speculation() if self.speculative and use_cache else None
+
+        image = self._decode(image_path, trace)
+        phash_future = self.executor.submit(self._phash_stage, image, use_cache and ocr_text is None, trace)
+        text_future = self.executor.submit(self._text_stage, image, image_path, ocr_text, use_cache, trace,
+                                           speculation)
+
+        # 先完成的阶段先处理；phash最便宜，文本阶段先命中时仍等phash结果以保证L1优先
+        pending = {phash_future, text_future}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if phash_future in done and self._outcome(phash_future).get('hit'):
+                return self._serve_hit(user, image_path, self._outcome(phash_future)['hit'],
+                                       phash_future, text_future, speculation, record_mistakes, trace, logs)
+            if text_future in done:
+                hit = self._outcome(phash_future).get('hit') or self._outcome(text_future).get('hit')
+                if hit:
+                    return self._serve_hit(user, image_path, hit, phash_future, text_future, speculation,
+                                           record_mistakes, trace, logs)
+
+        elapsed = trace.elapsed_ms()
+        if use_cache and elapsed > CACHE_BUDGET_MS:
+            logger.warning(f"缓存查询耗时 {elapsed}ms，超出预算 {CACHE_BUDGET_MS:.0f}ms")
+        return self._analyze(user, image_path, self._outcome(text_future), self._outcome(phash_future),
+                             record_mistakes, speculation, trace, logs)
+
+    def _decode(self, image_path: str, trace: PipelineTrace) -> Optional[Image.Image]:
+        if not image_path:
+            return None
+        with trace.span('decode') as span:
+            try:
+                with Image.open(image_path) as img:
+                    return img.convert('RGB')
+            except Exception as e:
+                span['status'] = 'failed'
+                logger.error(f"图片解码失败 {image_path}: {e}")
+                return None
+
+    def _phash_stage(self, image: Optional[Image.Image], lookup: bool, trace: PipelineTrace) -> Dict:
+        if image is None:
+            return {'phash': None}
+        with trace.span('phash') as span:
+            outcome = {'phash': qm.phash_from_image(image)}
+            if lookup:
+                question = storage_service.get_question_by_phash_value(outcome['phash'])
+                if question and question.get('master_analysis'):
+                    span['status'] = 'hit'
+                    outcome['hit'] = ('phash_hit', question['question_id'], question)
+                else:
+                    span['status'] = 'miss'
+            return outcome
+
+    def _text_stage(self, image: Optional[Image.Image], image_path: str, ocr_text: Optional[str],
+                    use_cache: bool, trace: PipelineTrace, speculation: Optional[_Speculation] = None) -> Dict:
+        outcome = {'text': ocr_text}
+        if ocr_text is None:
+            with trace.span('ocr') as span:
+                lines = ocr_service.get_text_from_image(image if image is not None else image_path)
+                text = '\n'.join(lines or [])
+                if not text.strip() or lines[0] in OCR_FAILURES:
+                    span['status'] = 'failed'
+                    logger.error(f"OCR failed for image: {image_path}, result: {text}")
+                    outcome['text'] = None
+                    return outcome
+                outcome['text'] = text
+        if not outcome['text'] or not outcome['text'].strip():
+            outcome['text'] = None
+            return outcome
+
+        text = outcome['text']
+        if use_cache:
+            # 本地能判的题目不再预先调用大模型，也不查语义缓存（近似的算式答案不同）
+            with trace.span('fast_grade') as span:
+                outcome['local_analysis'] = fast_grader.grade(text)
+                span['status'] = 'hit' if outcome['local_analysis'] else 'miss'
+        if not outcome.get('local_analysis'):
+            stem, answer = question_stem.split_stem_answer(text)
+            if answer:
+                outcome.update(stem=stem, answer=answer, stem_id=storage_service.generate_question_id(stem))
+        if speculation is not None and not outcome.get('local_analysis') and not outcome.get('answer'):
+            self._speculate(text, speculation, trace)
+        with trace.span('text_hash') as span:
+            question_id = storage_service.generate_question_id(text)
+            outcome['question_id'] = question_id
+            if use_cache:
+                question = storage_service.get_question_by_id(question_id)
+                if question and question.get('master_analysis'):
+                    span['status'] = 'hit'
+                    outcome['hit'] = ('text_hash_hit', question_id, question)
+                    return outcome
+                span['status'] = 'miss'
+        if outcome.get('local_analysis'):
+            return outcome
+        if outcome.get('answer'):
+            with trace.span('stem') as span:
+                outcome['stem_analysis'] = storage_service.get_stem_analysis(outcome['stem_id']) if use_cache else None
+                span['status'] = 'hit' if outcome['stem_analysis'] else 'miss'
+            return outcome
+
+        with trace.span('semantic') as span:
+            if not use_cache:
+                # 强制重新分析时同样查询最近邻，用大模型结果给语义缓存打标签
+                outcome['neighbor'] = semantic_cache.nearest(text)
+                return outcome
+            semantic_id, outcome['neighbor'] = semantic_cache.lookup(text)
+            question = storage_service.get_question_by_id(semantic_id) if semantic_id else None
+            if question and question.get('master_analysis') \
+                    and question_stem.same_numbers(text, question.get('canonical_text', '')):
+                span['status'] = 'hit'
+                outcome['hit'] = ('semantic_hit', semantic_id, question)
+            else:
+                if question:
+                    logger.info(f"L3 semantic neighbor {semantic_id} rejected: numbers differ")
+                span['status'] = 'miss'
+        return outcome
+
+    @staticmethod
+    def _outcome(future: Future) -> Dict:
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"搜题阶段执行失败: {e}", exc_info=True)
+            return {}
+
+    def _call_llm(self, text: str, trace: PipelineTrace, speculative: bool = False) -> str:
+        with trace.span('llm') as span:
+            span['speculative'] = speculative
+            return llm_service.get_analysis_for_text(text)
+
+    def _speculate(self, text: str, speculation: _Speculation, trace: PipelineTrace):
+        """在缓存查询的同时预先发出大模型请求（预算不足或已命中时跳过）"""
+        with speculation.lock:
+            if speculation.resolved:
+                return
+            if not self.budget.try_acquire():
+                self._count('speculative_denied')
+                return
+            self._count('speculative_started')
+            speculation.future = self.speculative_executor.submit(self._call_llm, text, trace, True)
+
+    def _abandon_speculation(self, speculation: Optional[_Speculation], cache_status: str,
+                             neighbor: Optional[Tuple[str, float]], cached_analysis: Dict):
+        """缓存已命中：取消尚未开始的预先请求；已发出的请求结果只用于给语义命中打标签"""
+        future = speculation.resolve() if speculation is not None else None
+        if future is None:
+            return
+        if future.cancel():
+            self.budget.release()
+            self._count('speculative_cancelled')
+            return
+
+        def label(done: Future):
+            self.budget.release(wasted=True)
+            self._count('speculative_wasted')
+            if cache_status != 'semantic_hit' or done.exception() is not None:
+                return
+            fresh_analysis = self._parse_analysis(done.result())
+            if fresh_analysis:
+                semantic_cache.record_outcome(neighbor, cached_analysis, fresh_analysis)
+
+        future.add_done_callback(label)
+
+    def _take_speculation(self, speculation: Optional[_Speculation]) -> Optional[str]:
+        """缓存未命中：取回预先请求的结果，请求失败时返回None"""
+        future = speculation.resolve() if speculation is not None else None
+        if future is None:
+            return None
+        try:
+            analysis_str = future.result()
+            self._count('speculative_used')
+            return analysis_str
+        except Exception as e:
+            logger.error(f"预先调用大模型失败，重新调用: {e}")
+            return None
+        finally:
+            self.budget.release()
+
+    @staticmethod
+    def _parse_analysis(analysis_str: str) -> Optional[Dict]:
+        match = re.search(r'```json\n({[\s\S]*?})\n```', analysis_str)
+        try:
+            return json.loads(match.group(1) if match else analysis_str)
+        except json.JSONDecodeError:
+            return None
+
+    def _grade_answer(self, text_outcome: Dict, trace: PipelineTrace,
+                      logs: List[str]) -> Tuple[Optional[Dict], str, Optional[str]]:
+        """
+        题干分析取缓存（没有时调用大模型并缓存），再批改本次的学生答案
+
+        Returns:
+            (分析结果, 缓存状态, 失败原因)
+        """
+        stem, answer, stem_id = text_outcome['stem'], text_outcome['answer'], text_outcome['stem_id']
+        stem_analysis = text_outcome.get('stem_analysis')
+        cache_status = 'stem_hit' if stem_analysis else 'miss'
+        if stem_analysis:
+            logs.append(f"1. Stem cache HIT for stem_id: {stem_id}")
+        else:
+            logs.append(f"1. Stem cache MISS for stem_id: {stem_id}. Analyzing stem...")
+            with trace.span('llm') as span:
+                span['kind'] = 'stem'
+                analysis_str = llm_service.get_stem_analysis(stem)
+            stem_analysis = self._parse_analysis(analysis_str)
+            if not stem_analysis:
+                logger.error(f"Failed to parse stem analysis: {analysis_str}")
+                return None, cache_status, f"AI分析结果解析失败: {analysis_str}"
+            storage_service.save_stem_analysis(stem_id, stem, stem_analysis)
+
+        correct_answer = stem_analysis.get('correct_answer', '')
+        verdict = question_stem.local_verdict(answer, correct_answer)
+        if verdict is None:
+            with trace.span('answer_check'):
+                verdict_str = llm_service.check_answer(stem, correct_answer, answer)
+            verdict = self._parse_analysis(verdict_str)
+            if not verdict:
+                logger.error(f"Failed to parse answer check: {verdict_str}")
+                return None, cache_status, f"AI批改结果解析失败: {verdict_str}"
+            logs.append("2. Answer checked by LLM")
+        else:
+            logs.append("2. Answer checked locally")
+        return question_stem.merge_analysis(stem_analysis, verdict, stem_id, answer), cache_status, None
+
+    def _serve_hit(self, user: Dict, image_path: str, hit: Tuple[str, str, Dict], phash_future: Future,
+                   text_future: Future, speculation: Optional[_Speculation], record_mistakes: bool,
+                   trace: PipelineTrace, logs: List[str]) -> SearchResult:
+        cache_status, question_id, question = hit
+        # OCR还没结束时不等待，用题库中的原文
+        text_outcome = self._outcome(text_future) if text_future.done() else {}
+        self._abandon_speculation(speculation, cache_status, text_outcome.get('neighbor'),
+                                  question['master_analysis'])
+        text = text_outcome.get('text') or question.get('canonical_text', '')
+        logs.append(f"1. Cache HIT ({cache_status}) for question_id: {question_id}")
+        if cache_status == 'semantic_hit':
+            return self._serve_semantic_hit(user, text, question_id, question, record_mistakes, trace, logs)
+
+        with trace.span('save') as span:
+            if cache_status == 'phash_hit':
+                storage_service.save_submission(user['id'], question_id, "(Image match)")
+            else:
+                phash = self._outcome(phash_future).get('phash')
+                if cache_status == 'text_hash_hit' and phash and qm.get_question_id_by_phash(phash) != question_id:
+                    # 把新图片的phash关联到已有题目
+                    if not storage_service.add_question(text, question['master_analysis'], image_path, question_id,
+                                                        phash=phash):
+                        span['status'] = 'failed'
+                        logger.error(f"Failed to link phash {phash} to question {question_id}")
+                storage_service.save_submission(user['id'], question_id, text)
+        return self._finish(SearchResult(question['master_analysis'], text, cache_status, question_id), trace, logs)
+
+    def _serve_semantic_hit(self, user: Dict, text: str, neighbor_id: str, question: Dict, record_mistakes: bool,
+                            trace: PipelineTrace, logs: List[str]) -> SearchResult:
+        """
+        近似题目只复用题目层面的分析，本次提交的对错重新判断
+
+        结果记在近似题目名下，不作为本次文本自己的题目入库：向量相似不代表是同一道题，
+        入库后精确文本hash会一直返回借来的答案
+        """
+        stem_analysis = question_stem.stem_fields(question['master_analysis'])
+        with trace.span('answer_check'):
+            verdict_str = llm_service.recheck_submission(text, stem_analysis['correct_answer'])
+        verdict = self._parse_analysis(verdict_str)
+        if not verdict:
+            logger.error(f"Failed to parse answer re-check: {verdict_str}")
+            return self._finish(SearchResult(None, text, None, None, error=f"AI批改结果解析失败: {verdict_str}"),
+                                trace, logs)
+        master_analysis = question_stem.merge_analysis(stem_analysis, verdict)
+        logs.append(f"2. Reused stem analysis of {neighbor_id}, answer re-checked")
+
+        with trace.span('save'):
+            storage_service.save_submission(user['id'], neighbor_id, text)
+            if record_mistakes:
+                mistake_book_service.add_mistake_if_incorrect(user['id'], neighbor_id, master_analysis, text)
+        return self._finish(SearchResult(master_analysis, text, 'semantic_hit', neighbor_id), trace, logs)
+
+    def _analyze(self, user: Dict, image_path: str, text_outcome: Dict, phash_outcome: Dict,
+                 record_mistakes: bool, speculation: Optional[_Speculation], trace: PipelineTrace,
+                 logs: List[str]) -> SearchResult:
+        text = text_outcome.get('text')
+        analysis_str = self._take_speculation(speculation)
+        if not text:
+            return self._finish(SearchResult(None, '', None, None, error=OCR_ERROR), trace, logs)
+
+        question_id = text_outcome['question_id']
+        neighbor = text_outcome.get('neighbor')
+        master_analysis = text_outcome.get('local_analysis')
+        cache_status = 'local_grade' if master_analysis else 'miss'
+        if master_analysis:
+            logs.append(f"1. Cache MISS for question_id: {question_id}. Graded locally")
+        elif text_outcome.get('answer'):
+            master_analysis, cache_status, error = self._grade_answer(text_outcome, trace, logs)
+            if master_analysis is None:
+                return self._finish(SearchResult(None, text, None, None, error=error), trace, logs)
+        else:
+            if analysis_str is None:
+                logs.append(f"1. Cache MISS for question_id: {question_id}. Calling LLM...")
+                analysis_str = self._call_llm(text, trace)
+            else:
+                logs.append(f"1. Cache MISS for question_id: {question_id}. Using speculative LLM response")
+            logs.append(f"2. LLM Raw Response (first 200 chars): {analysis_str[:200]}")
+
+            master_analysis = self._parse_analysis(analysis_str)
+            if master_analysis is None:
+                logger.error(f"Failed to parse LLM JSON response: {analysis_str}")
+                logs.append(f"ERROR: Failed to parse JSON from LLM response. Response: {analysis_str}")
+                return self._finish(SearchResult(None, text, None, None,
+                                                 error=f"AI分析结果解析失败: {analysis_str}"), trace, logs)
+
+        logs.append("3. Saving new results to cache...")
+        with trace.span('save') as span:
+            if not storage_service.add_question(text, master_analysis, image_path, question_id,
+                                                phash=phash_outcome.get('phash')):
+                span['status'] = 'failed'
+                logger.error(f"Failed to save question data: {question_id}")
+                logs.append("ERROR: Failed to save results to storage.")
+                return self._finish(SearchResult(None, text, None, None, error="保存分析结果失败，请重试。"),
+                                    trace, logs)
+            storage_service.save_submission(user['id'], question_id, text)
+            if record_mistakes:
+                mistake_book_service.add_mistake_if_incorrect(user['id'], question_id, master_analysis, text)
+            if neighbor and neighbor[0] != question_id:
+                neighbor_question = storage_service.get_question_by_id(neighbor[0])
+                semantic_cache.record_outcome(neighbor, (neighbor_question or {}).get('master_analysis'),
+                                              master_analysis)
+            semantic_cache.index_question(question_id, text, master_analysis)
+        return self._finish(SearchResult(master_analysis, text, cache_status, question_id), trace, logs)
+
+    def _finish(self, result: SearchResult, trace: PipelineTrace, logs: List[str]) -> SearchResult:
+        result.elapsed_ms = trace.elapsed_ms()
+        result.spans = list(trace.spans)
+        result.logs = logs + [f"Stages: {trace.summary()}"]
+        logger.info(f"搜题完成 status={result.cache_status} total={result.elapsed_ms}ms {trace.summary()}")
+        return result
+
+
+search_pipeline = SearchPipeline()
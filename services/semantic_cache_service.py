@@ -0,0 +1,306 @@
+"""
+语义缓存服务（L3缓存）
+在phash和文本hash都未命中时，用向量相似度把近似的OCR文本路由到已有题目的分析结果，
+并记录命中/未命中遥测数据，用于调优相似度阈值
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('semantic_cache_service', level=logging.INFO)
+
+TELEMETRY_FILE = os.path.join(PROJECT_ROOT, 'logs', 'semantic_cache_telemetry.jsonl')
+
+# 各嵌入模型的命中阈值（余弦相似度）。不同模型的相似度分布不同，换模型后要用该模型的标注遥测
+# 重新校准（python services/semantic_cache_service.py 输出 evaluate_thresholds 报告和建议阈值）。
+# 多语言模型对同一模板、不同数字的题目也给出很高的相似度，在积累足够样本前取偏保守的值
+MODEL_THRESHOLDS = {
+    'paraphrase-multilingual-MiniLM-L12-v2': 0.95,
+    'all-MiniLM-L6-v2': 0.92,
+}
+FALLBACK_THRESHOLD = 0.95
+# 校准时要求的最低准确率和最少标注样本数
+CALIBRATION_MIN_PRECISION = float(os.getenv('SEMANTIC_CACHE_MIN_PRECISION', '0.98'))
+CALIBRATION_MIN_SAMPLES = int(os.getenv('SEMANTIC_CACHE_MIN_SAMPLES', '50'))
+CALIBRATION_THRESHOLDS = [0.80, 0.85, 0.88, 0.90, 0.92, 0.93, 0.94, 0.95, 0.96, 0.97, 0.98]
+ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+
+def distance_to_similarity(distance: float, space: str = 'l2') -> float:
+    """
+    把Chroma返回的距离换算成余弦相似度
+
+    默认嵌入模型输出归一化向量，因此 l2 距离（平方）满足 d = 2 - 2cos
+    """
+    if space == 'cosine':
+        return 1.0 - distance
+    if space == 'ip':
+        return -distance if distance < 0 else 1.0 - distance
+    return 1.0 - distance / 2.0
+
+
+def default_threshold(model_name: str) -> float:
+    """命中阈值：SEMANTIC_CACHE_THRESHOLD 优先，否则取该嵌入模型校准过的默认值"""
+    override = os.getenv('SEMANTIC_CACHE_THRESHOLD')
+    if override:
+        return float(override)
+    return MODEL_THRESHOLDS.get(model_name, FALLBACK_THRESHOLD)
+
+
+def _normalize_answer(value) -> str:
+    return "".join(str(value or "").split()).lower()
+
+
+def analyses_agree(a: Dict, b: Dict) -> bool:
+    """判断两份分析结果是否等价（用于给遥测记录打标签）"""
+    if not a or not b:
+        return False
+    return (a.get('subject') == b.get('subject')
+            and a.get('is_correct') == b.get('is_correct')
+            and _normalize_answer(a.get('correct_answer')) == _normalize_answer(b.get('correct_answer')))
+
+
+class SemanticCache:
+    """基于题目向量索引的语义缓存"""
+
+    def __init__(self, vector_service=None, threshold: float = None,
+                 telemetry_file: str = TELEMETRY_FILE, enabled: bool = ENABLED, embedding_service=None):
+        """
+        初始化语义缓存
+
+        Args:
+            vector_service: VectorService 实例，为空时首次使用再创建
+            threshold: 命中所需的最小余弦相似度，为空时按嵌入模型取 default_threshold
+            telemetry_file: 遥测记录文件（JSON Lines）
+            enabled: 是否启用
+            embedding_service: EmbeddingService 实例，为空时使用进程内共享实例
+        """
+        self._vector_service = vector_service
+        self._embedding_service = embedding_service
+        self.threshold = threshold if threshold is not None else default_threshold(self.model_name)
+        self.telemetry_file = telemetry_file
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # 向量库中的向量是否由当前嵌入模型生成；None 表示尚未检查
+        self._index_matches_model = None
+
+    @property
+    def model_name(self) -> str:
+        """嵌入模型名称，写入遥测以便按模型校准阈值；不为此加载模型"""
+        if self._embedding_service is not None:
+            return self._embedding_service.model_name
+        from services.embedding_service import DEFAULT_MODEL
+        return DEFAULT_MODEL
+
+    @property
+    def vector_service(self):
+        """延迟创建向量服务，避免应用启动时加载chromadb"""
+        if self._vector_service is None:
+            from services.vector_service import VectorService
+            self._vector_service = VectorService()
+        return self._vector_service
+
+    @property
+    def embedding_service(self):
+        """向量在本地计算并缓存，不依赖向量库内置的嵌入函数"""
+        if self._embedding_service is None:
+            from services.embedding_service import get_embedding_service
+            self._embedding_service = get_embedding_service()
+        return self._embedding_service
+
+    def _index_ready(self) -> bool:
+        """
+        向量库必须由当前嵌入模型生成：不同模型的向量维度可能相同，混用时相似度没有意义。
+        不一致时停用语义缓存，直到用 scripts/ingest_question_bank.py 重新入库
+        """
+        if self._index_matches_model is None:
+            self._index_matches_model = self.vector_service.bind_embedding_model(self.model_name)
+            if not self._index_matches_model:
+                logger.error(f"语义缓存已停用：向量库不是由 {self.model_name} 生成的，"
+                             f"请运行 scripts/ingest_question_bank.py 重新入库")
+        return self._index_matches_model
+
+    def _space(self) -> str:
+        metadata = getattr(self.vector_service.collection, 'metadata', None) or {}
+        return metadata.get('hnsw:space', 'l2')
+
+    def nearest(self, text: str) -> Optional[Tuple[str, float]]:
+        """
+        查询与文本最相近的已知题目
+
+        Returns:
+            (question_id, similarity)，索引为空或查询失败时返回None
+        """
+        if not self.enabled or not text or not text.strip():
+            return None
+        try:
+            if not self._index_ready():
+                return None
+            query_embedding = self.embedding_service.embed_one(text).tolist()
+            results = self.vector_service.query_batch(query_embeddings=[query_embedding], n_results=1)
+            if not results or not results.get('ids') or not results['ids'][0]:
+                return None
+            question_id = results['ids'][0][0]
+            similarity = distance_to_similarity(results['distances'][0][0], self._space())
+            return question_id, similarity
+        except Exception as e:
+            # 语义缓存失败时直接降级为未命中，不影响主流程
+            logger.error(f"Semantic cache lookup failed: {e}", exc_info=True)
+            return None
+
+    def lookup(self, text: str) -> Tuple[Optional[str], Optional[Tuple[str, float]]]:
+        """
+        执行L3缓存查询并记录遥测
+
+        近似文本往往是同一道题、不同的学生作答，命中时调用方只能复用题目层面的分析
+        （见 question_stem.stem_fields），对错必须针对本次文本重新判断
+
+        Returns:
+            (命中的question_id或None, 最近邻(question_id, similarity)或None)
+        """
+        t0 = time.time()
+        neighbor = self.nearest(text)
+        hit_id = neighbor[0] if neighbor and neighbor[1] >= self.threshold else None
+        self._record({
+            'event': 'lookup',
+            'query_hash': hashlib.sha256(text.encode('utf-8')).hexdigest()[:16] if text else None,
+            'neighbor_id': neighbor[0] if neighbor else None,
+            'similarity': round(neighbor[1], 4) if neighbor else None,
+            'threshold': self.threshold,
+            'model': self.model_name,
+            'decision': 'hit' if hit_id else 'miss',
+            'latency_ms': round((time.time() - t0) * 1000, 2),
+        })
+        if hit_id:
+            logger.info(f"L3 semantic cache HIT: {hit_id} (similarity={neighbor[1]:.4f})")
+        return hit_id, neighbor
+
+    def record_outcome(self, neighbor: Optional[Tuple[str, float]], neighbor_analysis: Dict, fresh_analysis: Dict):
+        """
+        用一次真实的大模型分析结果给最近邻打标签：复用该邻居的结果是否正确
+
+        被标注的样本用于离线计算不同阈值下的准确率和召回率
+        """
+        if not neighbor or not neighbor_analysis or not fresh_analysis:
+            return
+        self._record({
+            'event': 'label',
+            'neighbor_id': neighbor[0],
+            'similarity': round(neighbor[1], 4),
+            'threshold': self.threshold,
+            'model': self.model_name,
+            'agreed': analyses_agree(neighbor_analysis, fresh_analysis),
+        })
+
+    def index_question(self, question_id: str, text: str, analysis: Dict = None) -> bool:
+        """把新题目写入向量索引，使后续的近似文本能够命中"""
+        if not self.enabled or not question_id or not text:
+            return False
+        try:
+            if not self._index_ready():
+                return False
+            analysis = analysis or {}
+            metadata = {'subject': analysis.get('subject'), 'knowledge_point': analysis.get('knowledge_point')}
+            embedding = self.embedding_service.embed_one(text).tolist()
+            return self.vector_service.add_documents_batch([question_id], [text], [metadata], [embedding]) == 1
+        except Exception as e:
+            logger.error(f"Failed to index question {question_id} for semantic cache: {e}", exc_info=True)
+            return False
+
+    def _record(self, record: Dict):
+        record['ts'] = time.time()
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.telemetry_file), exist_ok=True)
+                with open(self.telemetry_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.warning(f"Failed to write semantic cache telemetry: {e}")
+
+
+def load_telemetry(path: str = TELEMETRY_FILE) -> List[Dict]:
+    """读取遥测记录"""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def evaluate_thresholds(records: Iterable[Dict], thresholds: Iterable[float], model: str = None) -> List[Dict]:
+    """
+    基于已标注的样本计算各阈值下的准确率与召回率
+
+    相似度 >= 阈值视为"复用"；agreed=True 表示复用结果是正确的。
+    指定 model 时只统计该嵌入模型的样本，不同模型的相似度不可混用
+    """
+    labelled = [r for r in records if r.get('event') == 'label' and r.get('similarity') is not None
+                and (model is None or r.get('model') == model)]
+    report = []
+    for t in thresholds:
+        tp = sum(1 for r in labelled if r['similarity'] >= t and r['agreed'])
+        fp = sum(1 for r in labelled if r['similarity'] >= t and not r['agreed'])
+        fn = sum(1 for r in labelled if r['similarity'] < t and r['agreed'])
+        report.append({
+            'threshold': t,
+            'precision': round(tp / (tp + fp), 4) if tp + fp else None,
+            'recall': round(tp / (tp + fn), 4) if tp + fn else None,
+            'samples': len(labelled),
+        })
+    return report
+
+
+def suggest_threshold(report: List[Dict], min_precision: float = CALIBRATION_MIN_PRECISION,
+                      min_samples: int = CALIBRATION_MIN_SAMPLES) -> Optional[float]:
+    """
+    从 evaluate_thresholds 的报告中选出准确率达标的最低阈值（召回率最高）
+
+    标注样本不足时返回None，继续使用当前阈值
+    """
+    for row in sorted(report, key=lambda r: r['threshold']):
+        if row['samples'] < min_samples:
+            return None
+        if row['precision'] is not None and row['precision'] >= min_precision:
+            return row['threshold']
+    return None
+
+
+def hit_rate(records: Iterable[Dict]) -> Optional[float]:
+    """统计查询命中率"""
+    lookups = [r for r in records if r.get('event') == 'lookup']
+    if not lookups:
+        return None
+    return round(sum(1 for r in lookups if r.get('decision') == 'hit') / len(lookups), 4)
+
+
+# 全局实例
+semantic_cache = SemanticCache()
+
+
+if __name__ == "__main__":
+    all_records = load_telemetry()
+    model_name = semantic_cache.model_name
+    print(f"嵌入模型: {model_name}，当前阈值: {semantic_cache.threshold}")
+    print(f"命中率: {hit_rate(r for r in all_records if r.get('model') == model_name)}")
+    threshold_report = evaluate_thresholds(all_records, CALIBRATION_THRESHOLDS, model=model_name)
+    for row in threshold_report:
+        print(row)
+    print(f"建议阈值（准确率 >= {CALIBRATION_MIN_PRECISION}）: {suggest_threshold(threshold_report)}")
@@ -0,0 +1,191 @@
+"""
+会话清理服务
+每次登录都会向 user_sessions 插入一行，登出和修改密码只把 is_active 置为 false；
+后台线程定期按批删除已过期和已失效的会话，使会话表及其索引保持精简，并记录表规模和清理速度。
+每轮清理先尝试获取PostgreSQL咨询锁，多个worker或定时任务同时运行时只有拿到锁的一个执行
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_config import setup_logger
+
+logger = setup_logger('session_reaper', level=logging.INFO)
+
+DEFAULT_INTERVAL_SECONDS = float(os.getenv('SESSION_REAPER_INTERVAL_SECONDS', '300'))
+DEFAULT_BATCH_SIZE = int(os.getenv('SESSION_REAPER_BATCH_SIZE', '1000'))
+DEFAULT_MAX_BATCHES = int(os.getenv('SESSION_REAPER_MAX_BATCHES', '100'))
+DEFAULT_BATCH_PAUSE_SECONDS = float(os.getenv('SESSION_REAPER_BATCH_PAUSE_SECONDS', '0.05'))
+# 登出/改密后的会话保留一段时间再删除，便于排查登录问题
+DEFAULT_INACTIVE_GRACE_SECONDS = int(os.getenv('SESSION_REAPER_INACTIVE_GRACE_SECONDS', '3600'))
+# pg_try_advisory_lock 的key，所有清理进程共用
+REAPER_LOCK_KEY = int(os.getenv('SESSION_REAPER_LOCK_KEY', '7310420'))
+
+# 已有数据库升级到精简索引（与 database/schema.sql 一致）
+SESSION_INDEX_DDL = [
+    "DROP INDEX IF EXISTS idx_user_sessions_is_active",
+    "DROP INDEX IF EXISTS idx_user_sessions_token_hash",
+    "CREATE INDEX IF NOT EXISTS idx_user_sessions_active_refresh "
+    "ON user_sessions(refresh_token_hash) WHERE is_active",
+    "CREATE INDEX IF NOT EXISTS idx_user_sessions_inactive ON user_sessions(updated_at) WHERE NOT is_active",
+]
+
+
+class SessionReaper:
+    """按批清理过期/失效会话的后台任务"""
+
+    def __init__(self, data_service=None, interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_batches: int = DEFAULT_MAX_BATCHES,
+                 batch_pause_seconds: float = DEFAULT_BATCH_PAUSE_SECONDS,
+                 inactive_grace_seconds: int = DEFAULT_INACTIVE_GRACE_SECONDS):
+        """
+        Args:
+            data_service: DataServiceV3 实例，为空时首次使用时基于共享的数据库引擎创建
+            interval_seconds: 两轮清理之间的间隔
+            batch_size: 每批删除的行数（每批一个短事务）
+            max_batches: 每轮最多执行的批数，剩余的留给下一轮
+            batch_pause_seconds: 批与批之间的停顿，避免长时间占用IO
+            inactive_grace_seconds: 已失效会话保留多久后再删除
+        """
+        self._data_service = data_service
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.batch_pause_seconds = batch_pause_seconds
+        self.inactive_grace_seconds = inactive_grace_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'runs': 0, 'deleted_total': 0, 'last_run_at': None, 'last_deleted': 0,
+            'last_duration_seconds': 0.0, 'last_rows_per_sec': 0.0, 'backlog': False, 'skipped_rounds': 0
+        }
+
+    @property
+    def data_service(self):
+        if self._data_service is None:
+            from core.resources import get_resource
+            from services.data_service_v3 import DataServiceV3
+            self._data_service = DataServiceV3(engine=get_resource('db_engine'))
+        return self._data_service
+
+    def run_once(self) -> int:
+        """
+        执行一轮清理：按批删除直到没有可删的行或达到 max_batches；
+        其他进程正在清理（咨询锁被占用）时跳过本轮
+
+        Returns:
+            本轮删除的行数
+        """
+        with self._lock, self.data_service.advisory_lock(REAPER_LOCK_KEY) as leader:
+            if not leader:
+                self.stats['skipped_rounds'] += 1
+                self.stats['backlog'] = False
+                return 0
+            start = time.perf_counter()
+            deleted, batches, backlog = 0, 0, False
+            while batches < self.max_batches and not self._stop.is_set():
+                count = self.data_service.delete_expired_sessions(self.batch_size, self.inactive_grace_seconds)
+                deleted += count
+                batches += 1
+                if count < self.batch_size:
+                    break
+                if batches == self.max_batches:
+                    backlog = True
+                    break
+                self._stop.wait(self.batch_pause_seconds)
+
+            duration = time.perf_counter() - start
+            self.stats.update(
+                runs=self.stats['runs'] + 1,
+                deleted_total=self.stats['deleted_total'] + deleted,
+                last_run_at=datetime.now().isoformat(),
+                last_deleted=deleted,
+                last_duration_seconds=round(duration, 3),
+                last_rows_per_sec=round(deleted / duration, 1) if duration > 0 else 0.0,
+                backlog=backlog
+            )
+            if deleted:
+                logger.info(f"清理会话 {deleted} 行，{batches} 批，耗时 {duration:.2f}秒"
+                            + ("，仍有积压" if backlog else ""))
+            return deleted
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                backlog = self.run_once() and self.stats['backlog']
+            except Exception as e:
+                logger.error(f"会话清理失败: {e}")
+                backlog = False
+            # 有积压时尽快进行下一轮
+            self._stop.wait(self.batch_pause_seconds if backlog else self.interval_seconds)
+
+    def start(self):
+        """启动后台清理线程（重复调用无副作用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='session-reaper', daemon=True)
+        self._thread.start()
+        logger.info(f"会话清理线程已启动，间隔 {self.interval_seconds}秒，每批 {self.batch_size} 行")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def metrics(self, include_table: bool = True) -> Dict:
+        """
+        清理指标
+
+        Args:
+            include_table: 是否查询会话表规模（需要扫描会话表）
+
+        Returns:
+            清理统计，include_table 时附带 'table': get_user_session_stats() 的结果
+        """
+        metrics = dict(self.stats, running=self.running)
+        if include_table:
+            metrics['table'] = self.data_service.get_user_session_stats()
+        return metrics
+
+    def ensure_indexes(self) -> bool:
+        """把已有数据库的会话表索引升级为部分索引"""
+        from sqlalchemy import text
+        try:
+            with self.data_service.get_session() as session:
+                for statement in SESSION_INDEX_DDL:
+                    session.execute(text(statement))
+                session.commit()
+            logger.info("会话表索引已更新")
+            return True
+        except Exception as e:
+            logger.error(f"更新会话表索引失败: {e}")
+            return False
+
+
+_reaper: Optional[SessionReaper] = None
+_reaper_lock = threading.Lock()
+
+
+def get_session_reaper() -> SessionReaper:
+    """获取进程内共享的会话清理器"""
+    global _reaper
+    if _reaper is None:
+        with _reaper_lock:
+            if _reaper is None:
+                _reaper = SessionReaper()
+    return _reaper
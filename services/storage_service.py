@@ -15,7 +15,10 @@ def get_question_by_phash(image_path: str):
     if not phash:
         logger.warning(f"Failed to generate phash for {image_path}")
         return None
-        
+    return get_question_by_phash_value(phash)
+
+def get_question_by_phash_value(phash: str):
+    """通过已计算好的phash获取问题（不再读取图片）"""
     question_id = qm.get_question_id_by_phash(phash)
     if question_id:
         question_data = qm.get_question_by_id(question_id)
@@ -34,8 +37,9 @@ def get_question_by_id(question_id: str):
         return question_data
     return None
 
-def add_question(text: str, analysis: dict, image_path: str, existing_question_id: str = None):
-    """添加或更新问题，包含数据验证"""
+def add_question(text: str, analysis: dict, image_path: str, existing_question_id: str = None,
+                 phash: str = None):
+    """添加或更新问题，包含数据验证；已算好phash时传入phash，避免再次读取图片"""
     # 验证输入数据
     if not text or text in ['识别失败', '识别异常']:
         logger.warning(f"Invalid OCR text: {text}")
@@ -45,7 +49,7 @@ def add_question(text: str, analysis: dict, image_path: str, existing_question_i
         logger.warning(f"Invalid analysis data: {analysis}")
         return False
     
-    phash = qm.generate_phash(image_path)
+    phash = phash or qm.generate_phash(image_path)
     question_id = existing_question_id or qm.generate_question_id(text)
     
     success = qm.add_question(question_id, text, analysis, phash, image_path)
@@ -59,9 +63,27 @@ def add_question(text: str, analysis: dict, image_path: str, existing_question_i
 def generate_question_id(text: str) -> str:
     return qm.generate_question_id(text)
 
+# --- Question Stem Facade ---
+def get_stem_analysis(stem_id: str):
+    """获取题干分析（与学生答案无关的部分），没有时返回None"""
+    return qm.get_stem_analysis(stem_id)
+
+def save_stem_analysis(stem_id: str, stem: str, analysis: dict):
+    """保存题干分析，供同一题目的其他学生答案复用"""
+    if not stem or not analysis or not isinstance(analysis, dict):
+        logger.warning(f"Invalid stem analysis for {stem_id}")
+        return False
+    return qm.save_stem_analysis(stem_id, stem, analysis)
+
 def load_question_bank():
     return qm.load_bank()
 
+def search_questions(query: str, subject: str = None, difficulty_level: int = None,
+                     limit: int = 20, offset: int = 0):
+    """全文检索题库（内存倒排索引，题库文件变化后自动重建）"""
+    from services.question_search_service import search_questions as _search
+    return _search(query, subject=subject, difficulty_level=difficulty_level, limit=limit, offset=offset)
+
 def cleanup_invalid_data():
     """清理无效的数据"""
     return qm.cleanup_invalid_data()
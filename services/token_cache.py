@@ -0,0 +1,250 @@
+"""
+认证缓存
+缓存已验证的JWT声明（按令牌hash索引，遵守令牌过期时间）、登出后的撤销集合以及会话有效性，
+使受保护接口的每次鉴权只需一次字典查找
+
+缓存都在进程内，多个worker之间不共享：
+- 撤销集合只在处理登出/改密的进程内生效，其他worker上的访问令牌和没有缓存时一样，
+  在exp之前都能通过JWT验证（声明缓存不会延长这个时间）
+- 会话有效性决定刷新令牌能否换出新的访问令牌，默认不缓存有效的会话（SESSION_CACHE_TTL_SECONDS=0），
+  每次刷新都回源数据库，其他worker上的登出立即生效；设为正数可以省掉这次查询，
+  代价是其他worker上的登出/改密最多延迟这么多秒才对本进程生效。
+  无效的会话不会再变为有效，始终按声明缓存的有效期缓存
+"""
+
+import os
+import sys
+import time
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MAX_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+DEFAULT_TTL_SECONDS = int(os.getenv('TOKEN_CACHE_TTL_SECONDS', '300'))
+DEFAULT_SESSION_TTL_SECONDS = int(os.getenv('SESSION_CACHE_TTL_SECONDS', '0'))
+
+
+def hash_token(token: str) -> str:
+    """令牌hash，与 user_sessions.token_hash 的计算方式一致"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    已验证令牌声明 + 撤销集合 + 会话有效性的进程内缓存
+
+    - 声明缓存：token_hash -> 声明，有效期为 min(令牌exp, 当前时间+ttl)，超出容量时按LRU淘汰
+    - 撤销集合：token_hash -> 令牌exp，登出或修改密码后写入；令牌过期后撤销记录随之清理
+    - 会话缓存：refresh_token_hash -> 会话状态，登出/会话失效时写穿为无效
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 session_ttl_seconds: int = DEFAULT_SESSION_TTL_SECONDS):
+        """
+        Args:
+            max_size: 声明缓存和会话缓存各自的条目上限
+            ttl_seconds: 声明缓存的最长有效时间（秒）
+            session_ttl_seconds: 有效会话的最长缓存时间（秒），0表示不缓存有效的会话
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.session_ttl_seconds = session_ttl_seconds
+        self._claims: 'OrderedDict[str, Tuple[float, Dict]]' = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._sessions: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._user_tokens: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+        self.stats = {'hits': 0, 'misses': 0, 'revoked_hits': 0, 'session_hits': 0, 'session_misses': 0}
+
+    # ---------- 令牌声明 ----------
+
+    def get_claims(self, token_hash: str, now: float = None) -> Tuple[bool, Optional[Dict]]:
+        """
+        查询缓存的声明
+
+        Returns:
+            (found, claims)：已撤销的令牌返回 (True, None)；未缓存或已过期返回 (False, None)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if token_hash in self._revoked:
+                self.stats['revoked_hits'] += 1
+                return True, None
+            entry = self._claims.get(token_hash)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._claims[token_hash]
+                self.stats['misses'] += 1
+                return False, None
+            self._claims.move_to_end(token_hash)
+            self.stats['hits'] += 1
+            return True, dict(entry[1])
+
+    def put_claims(self, token_hash: str, claims: Dict, now: float = None):
+        """缓存刚验证通过的声明；已撤销的令牌不会被缓存"""
+        now = time.time() if now is None else now
+        expires_at = now + self.ttl_seconds
+        if claims.get('exp') is not None:
+            expires_at = min(expires_at, float(claims['exp']))
+        if expires_at <= now:
+            return
+        with self._lock:
+            if token_hash in self._revoked:
+                return
+            self._claims[token_hash] = (expires_at, dict(claims))
+            self._claims.move_to_end(token_hash)
+            if claims.get('sub'):
+                self._user_tokens[claims['sub']][token_hash] = float(claims.get('exp') or expires_at)
+            while len(self._claims) > self.max_size:
+                self._claims.popitem(last=False)
+
+    def track(self, user_id: str, token_hash: str, expires_at: float):
+        """记录用户签发过的令牌（即使声明缓存已淘汰），供整体撤销使用"""
+        with self._lock:
+            self._user_tokens[user_id][token_hash] = float(expires_at)
+
+    def revoke(self, token_hash: str, expires_at: float = None, now: float = None):
+        """撤销单个令牌；expires_at 为令牌的exp，过期后撤销记录可以清理"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._revoke_locked(token_hash, expires_at, now)
+            self._prune_locked(now)
+
+    def revoke_user(self, user_id: str, now: float = None):
+        """撤销用户在本进程内签发或验证过的全部令牌，并把其会话缓存写为无效"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for token_hash, expires_at in self._user_tokens.pop(user_id, {}).items():
+                self._revoke_locked(token_hash, expires_at, now)
+            for session in self._sessions.values():
+                if session['user_id'] == user_id:
+                    session['valid'] = False
+                    session['expires_at'] = self._invalid_session_expiry(now)
+            self._prune_locked(now)
+
+    def is_revoked(self, token_hash: str) -> bool:
+        with self._lock:
+            return token_hash in self._revoked
+
+    def _revoke_locked(self, token_hash: str, expires_at: Optional[float], now: float):
+        # 未知exp时撤销记录永不清理
+        self._revoked[token_hash] = float(expires_at) if expires_at is not None else float('inf')
+        self._claims.pop(token_hash, None)
+
+    def _prune_locked(self, now: float):
+        """清理已过期令牌的撤销和签发记录（过期令牌本身就无法通过JWT验证）"""
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        for token_hash in [h for h, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[token_hash]
+        for user_id in list(self._user_tokens):
+            tokens = self._user_tokens[user_id]
+            for token_hash in [h for h, exp in tokens.items() if exp <= now]:
+                del tokens[token_hash]
+            if not tokens:
+                del self._user_tokens[user_id]
+
+    # ---------- 会话有效性 ----------
+
+    def _invalid_session_expiry(self, now: float) -> float:
+        return now + max(self.session_ttl_seconds, self.ttl_seconds)
+
+    def get_session(self, refresh_hash: str, now: float = None) -> Optional[bool]:
+        """查询缓存的会话有效性，未缓存返回None"""
+        now = time.time() if now is None else now
+        with self._lock:
+            session = self._sessions.get(refresh_hash)
+            if session is None or session['expires_at'] <= now:
+                if session is not None:
+                    del self._sessions[refresh_hash]
+                self.stats['session_misses'] += 1
+                return None
+            self._sessions.move_to_end(refresh_hash)
+            self.stats['session_hits'] += 1
+            return session['valid']
+
+    def put_session(self, user_id: str, refresh_hash: str, valid: bool, access_hash: str = None,
+                    session_expires_at: float = None, now: float = None):
+        """
+        写入会话有效性
+
+        Args:
+            session_expires_at: 会话在数据库中的过期时间（epoch秒），缓存不会超过该时间
+        """
+        now = time.time() if now is None else now
+        if not valid:
+            expires_at = self._invalid_session_expiry(now)
+        else:
+            expires_at = now + self.session_ttl_seconds
+            if session_expires_at is not None:
+                expires_at = min(expires_at, session_expires_at)
+        with self._lock:
+            if expires_at <= now:
+                self._sessions.pop(refresh_hash, None)
+                return
+            self._sessions[refresh_hash] = {
+                'user_id': user_id, 'access_hash': access_hash, 'valid': valid, 'expires_at': expires_at
+            }
+            self._sessions.move_to_end(refresh_hash)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def update_session_access(self, user_id: str, access_hash: str):
+        """会话的访问令牌被刷新后同步更新（与 _update_user_session 的SQL一致：该用户所有活跃会话）"""
+        with self._lock:
+            for session in self._sessions.values():
+                if session['user_id'] == user_id and session['valid']:
+                    session['access_hash'] = access_hash
+
+    def end_session(self, user_id: str, access_hash: str, now: float = None):
+        """
+        登出写穿：访问令牌对应的会话写为无效；
+        该用户其他访问令牌未知的缓存会话直接丢弃，下次回源数据库
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            for refresh_hash, session in list(self._sessions.items()):
+                if session['user_id'] != user_id:
+                    continue
+                if session['access_hash'] == access_hash:
+                    session['valid'] = False
+                    session['expires_at'] = self._invalid_session_expiry(now)
+                elif session['valid']:
+                    del self._sessions[refresh_hash]
+
+    def clear(self):
+        with self._lock:
+            self._claims.clear()
+            self._revoked.clear()
+            self._sessions.clear()
+            self._user_tokens.clear()
+
+    def __len__(self) -> int:
+        return len(self._claims)
+
+
+_shared_caches: Dict[Tuple[str, str], TokenCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_token_cache(jwt_secret: str, jwt_algorithm: str) -> TokenCache:
+    """
+    获取进程内共享的认证缓存
+
+    auth_api 每个请求都会新建 AuthService，缓存必须跨实例共享；按密钥和算法区分，
+    避免不同密钥签发的令牌共用同一份验证结果。
+    默认只缓存令牌声明、撤销集合和无效的会话；有效的会话不缓存（SESSION_CACHE_TTL_SECONDS=0），
+    每次刷新令牌都回源数据库
+    """
+    key = (hash_token(jwt_secret), jwt_algorithm)
+    cache = _shared_caches.get(key)
+    if cache is None:
+        with _shared_lock:
+            cache = _shared_caches.setdefault(key, TokenCache())
+    return cache
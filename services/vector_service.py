@@ -1,9 +1,13 @@
 # services/vector_service.py
 
-import chromadb
 import logging
 import os
 
+from core.lazy_imports import lazy_import
+
+# chromadb takes close to a second to import; load it when the first client is created
+chromadb = lazy_import('chromadb')
+
 logger = logging.getLogger("studyhelper_app")
 
 # --- ChromaDB Client Initialization ---
@@ -12,16 +16,40 @@ logger = logging.getLogger("studyhelper_app")
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(PROJECT_ROOT, 'data', 'chroma_db')
 
-# Ensure the database directory exists
-os.makedirs(DB_PATH, exist_ok=True)
 
-# Initialize a persistent ChromaDB client
-# This will save the database to disk in the specified path
-client = chromadb.PersistentClient(path=DB_PATH)
+def create_client():
+    """
+    Creates a persistent ChromaDB client that saves the database under DB_PATH.
+    Use get_client() to get the process-wide shared client.
+    """
+    # Ensure the database directory exists
+    os.makedirs(DB_PATH, exist_ok=True)
+    return chromadb.PersistentClient(path=DB_PATH)
+
+
+def get_client():
+    """
+    Returns the shared ChromaDB client owned by the resource registry.
+    A client assigned directly to `vector_service.client` takes precedence.
+    """
+    if 'client' in globals():
+        return globals()['client']
+    from core.resources import get_resource
+    return get_resource('vector_client')
+
+
+def __getattr__(name):
+    # Keeps `vector_service.client` working for callers that read it directly
+    if name == 'client':
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # --- Constants ---
 # Define a default collection name for our questions
 DEFAULT_COLLECTION_NAME = "questions_collection"
+# Collection metadata key recording which embedding model produced the stored vectors
+EMBEDDING_MODEL_KEY = "embedding_model"
 
 # --- Service Functions ---
 
@@ -36,7 +64,7 @@ def get_or_create_collection(name: str = DEFAULT_COLLECTION_NAME):
         chromadb.Collection: The collection object.
     """
     try:
-        collection = client.get_or_create_collection(name=name)
+        collection = get_client().get_or_create_collection(name=name)
         logger.info(f"Successfully connected to ChromaDB collection: '{name}'")
         return collection
     except Exception as e:
@@ -97,4 +125,162 @@ def find_similar_documents(collection, query_text: str, n_results: int = 5):
         return results
     except Exception as e:
         logger.error(f"Failed to query collection '{collection.name}': {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+def _clean_metadata(metadata: dict) -> dict:
+    """
+    ChromaDB only accepts str/int/float/bool metadata values.
+    Drops None values and flattens lists into comma-separated strings.
+    """
+    cleaned = {}
+    for key, value in (metadata or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = ",".join(str(v) for v in value)
+        elif not isinstance(value, (str, int, float, bool)):
+            value = str(value)
+        cleaned[key] = value
+    return cleaned
+
+
+class VectorService:
+    """
+    Wraps a single ChromaDB collection with a cached handle and batched writes/queries.
+
+    Documents are upserted in chunks no larger than the client's max batch size, so callers
+    can hand over thousands of questions at once. Precomputed embeddings may be passed in;
+    otherwise the collection's embedding function is used.
+    """
+
+    def __init__(self, collection_name: str = DEFAULT_COLLECTION_NAME, chroma_client=None, batch_size: int = 1000):
+        self.client = chroma_client or get_client()
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self._collection = None
+
+    @property
+    def collection(self):
+        """The collection handle, created on first use and reused afterwards."""
+        if self._collection is None:
+            self._collection = self.client.get_or_create_collection(name=self.collection_name)
+            logger.info(f"Successfully connected to ChromaDB collection: '{self.collection_name}'")
+        return self._collection
+
+    def _chunk_size(self) -> int:
+        try:
+            return max(1, min(self.batch_size, self.client.get_max_batch_size()))
+        except Exception:
+            return self.batch_size
+
+    def count(self) -> int:
+        """Returns the number of documents in the collection."""
+        return self.collection.count()
+
+    def embedding_model(self):
+        """Returns the embedding model recorded on the collection, or None for an untagged collection."""
+        return (self.collection.metadata or {}).get(EMBEDDING_MODEL_KEY)
+
+    def bind_embedding_model(self, model: str) -> bool:
+        """
+        Checks that the collection's vectors come from `model`.
+
+        An empty, untagged collection is tagged with `model`. Returns False when the collection
+        holds vectors from another model (or from an unrecorded one); those are not comparable
+        with `model` vectors and must be re-embedded after reset().
+        """
+        current = self.embedding_model()
+        if current == model:
+            return True
+        if current is None and self.count() == 0:
+            self.reset(model)
+            return True
+        logger.error(f"Collection '{self.collection_name}' holds vectors from '{current}', not '{model}'.")
+        return False
+
+    def reset(self, embedding_model: str = None):
+        """
+        Drops every document by recreating the collection, keeping its settings.
+        Chroma cannot change the distance function through modify(), so the collection is recreated
+        with its old metadata plus the new embedding model tag.
+        """
+        metadata = dict(self.collection.metadata or {})
+        if embedding_model:
+            metadata[EMBEDDING_MODEL_KEY] = embedding_model
+        self.client.delete_collection(self.collection_name)
+        self._collection = self.client.get_or_create_collection(name=self.collection_name, metadata=metadata or None)
+        logger.info(f"Reset collection '{self.collection_name}' (embedding model: {metadata.get(EMBEDDING_MODEL_KEY)}).")
+
+    def add_documents_batch(self, ids: list, documents: list, metadatas: list = None, embeddings: list = None) -> int:
+        """
+        Upserts many documents at once. Existing IDs are overwritten instead of raising.
+
+        Args:
+            ids (list): Unique document IDs.
+            documents (list): Document texts, aligned with ids.
+            metadatas (list): Optional metadata dicts, aligned with ids.
+            embeddings (list): Optional precomputed embeddings, aligned with ids.
+
+        Returns:
+            int: The number of documents written.
+        """
+        if not ids:
+            return 0
+        if len(ids) != len(documents) or (metadatas and len(metadatas) != len(ids)) \
+                or (embeddings is not None and len(embeddings) != len(ids)):
+            raise ValueError("ids, documents, metadatas and embeddings must have the same length")
+
+        written = 0
+        step = self._chunk_size()
+        for start in range(0, len(ids), step):
+            end = start + step
+            kwargs = {"ids": ids[start:end], "documents": documents[start:end]}
+            if metadatas:
+                # Chroma rejects empty metadata dicts, so pass None for those rows.
+                kwargs["metadatas"] = [_clean_metadata(m) or None for m in metadatas[start:end]]
+            if embeddings is not None:
+                kwargs["embeddings"] = embeddings[start:end]
+            try:
+                self.collection.upsert(**kwargs)
+                written += len(kwargs["ids"])
+            except Exception as e:
+                logger.error(f"Failed to upsert batch [{start}:{end}] into collection '{self.collection_name}': {e}", exc_info=True)
+        logger.info(f"Upserted {written}/{len(ids)} documents into collection '{self.collection_name}'.")
+        return written
+
+    def query_batch(self, query_texts: list = None, n_results: int = 5, where: dict = None, query_embeddings: list = None):
+        """
+        Runs many similarity queries in a single call.
+
+        Args:
+            query_texts (list): Query strings (ignored when query_embeddings is given).
+            n_results (int): Number of neighbours per query.
+            where (dict): Optional metadata filter, e.g. {"subject": "数学"}.
+            query_embeddings (list): Optional precomputed query embeddings.
+
+        Returns:
+            dict: Chroma query results with one inner list per query, or None on error.
+        """
+        if not query_texts and query_embeddings is None:
+            return None
+        kwargs = {"n_results": n_results, "include": ["documents", "metadatas", "distances"]}
+        if query_embeddings is not None:
+            kwargs["query_embeddings"] = query_embeddings
+        else:
+            kwargs["query_texts"] = query_texts
+        if where:
+            kwargs["where"] = where
+        try:
+            return self.collection.query(**kwargs)
+        except Exception as e:
+            logger.error(f"Failed to batch-query collection '{self.collection_name}': {e}", exc_info=True)
+            return None
+
+    def delete(self, ids: list) -> bool:
+        """Deletes documents by ID."""
+        try:
+            self.collection.delete(ids=ids)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete documents from '{self.collection_name}': {e}", exc_info=True)
+            return False
@@ -0,0 +1,142 @@
+"""
+访问控制索引测试
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import user_management as um
+from core.access_index import AccessIndex, PermissionBits
+from core.user_management_v2 import UserManagementV2
+
+ROSTER = {
+    'school_info': {'id': 'school_01', 'name': '实验中学'},
+    'grades': [{'id': 'grade_7', 'school_id': 'school_01'}, {'id': 'grade_8', 'school_id': 'school_01'}],
+    'classes': [{'id': 'class_7_1', 'grade_id': 'grade_7'}, {'id': 'class_8_1', 'grade_id': 'grade_8'}],
+    'users': [
+        {'id': 'principal_01', 'role': 'principal', 'school_id': 'school_01'},
+        {'id': 'gm_7', 'role': 'grade_manager', 'grade_id': 'grade_7', 'school_id': 'school_01'},
+        {'id': 'teacher_7_1', 'role': 'teacher', 'grade_id': 'grade_7', 'class_id': 'class_7_1'},
+        {'id': 'teacher_8_1', 'role': 'teacher', 'grade_id': 'grade_8', 'class_id': 'class_8_1'},
+        {'id': 'student_7_1a', 'role': 'student', 'grade_id': 'grade_7', 'class_id': 'class_7_1'},
+        {'id': 'student_7_1b', 'role': 'student', 'grade_id': 'grade_7', 'class_id': 'class_7_1'},
+        {'id': 'student_8_1a', 'role': 'student', 'grade_id': 'grade_8', 'class_id': 'class_8_1'},
+        {'id': 'guest', 'role': 'visitor'},
+    ],
+}
+
+
+def reference_can_access(data, requester_id, target_id):
+    """逐条比较的原始规则"""
+    users = {user['id']: user for user in data['users']}
+    requester, target = users.get(requester_id), users.get(target_id)
+    if not requester or not target:
+        return False
+    if requester_id == target_id:
+        return True
+    role = requester.get('role')
+    if role == 'principal':
+        return True
+    if role == 'grade_manager':
+        return requester.get('grade_id') == target.get('grade_id')
+    if role == 'teacher':
+        return target.get('role') == 'student' and requester.get('class_id') == target.get('class_id')
+    return False
+
+
+@pytest.fixture
+def roster_file(tmp_path, monkeypatch):
+    path = tmp_path / 'school_data.json'
+    path.write_text(json.dumps(ROSTER), encoding='utf-8')
+    monkeypatch.setattr(um, 'DATA_FILE', str(path))
+    um.invalidate_access_index()
+    yield path
+    um.invalidate_access_index()
+
+
+class TestPermissionBits:
+    def test_mask_and_membership(self):
+        bits = PermissionBits(['read', 'write'])
+        mask = bits.mask(['write'])
+        assert bits.has(mask, 'write') and not bits.has(mask, 'read')
+        assert not bits.has(mask, 'unknown')
+        assert bits.names(bits.mask(['read', 'write'])) == ['read', 'write']
+
+
+class TestUserManagementAccess:
+    def test_matches_reference_rules(self, roster_file):
+        ids = [user['id'] for user in ROSTER['users']] + ['missing']
+        for requester_id in ids:
+            for target_id in ids:
+                assert um.can_access_user_data(requester_id, target_id) == \
+                    reference_can_access(ROSTER, requester_id, target_id), (requester_id, target_id)
+
+    def test_managed_users_keep_roster_order(self, roster_file):
+        assert [u['id'] for u in um.get_managed_users('gm_7')] == ['student_7_1a', 'student_7_1b', 'teacher_7_1']
+        assert [u['id'] for u in um.get_managed_users('teacher_7_1')] == ['student_7_1a', 'student_7_1b']
+        assert len(um.get_managed_users('principal_01')) == len(ROSTER['users'])
+        assert um.get_managed_users('student_7_1a') == [] and um.get_managed_users('missing') == []
+
+    def test_permissions(self, roster_file):
+        assert um.get_user_permissions('teacher_7_1') == um.ROLE_PERMISSIONS['teacher']
+        assert um.get_user_permissions('guest') == [] and um.get_user_permissions('missing') == []
+        assert um.has_permission('student_7_1a', 'upload_questions')
+        assert not um.has_permission('student_7_1a', 'view_class_students')
+
+    def test_hierarchy(self, roster_file):
+        hierarchy = um.get_user_hierarchy('student_8_1a')
+        assert hierarchy['class']['id'] == 'class_8_1' and hierarchy['grade']['id'] == 'grade_8'
+        assert hierarchy['school'] is None
+        assert um.get_user_hierarchy('gm_7')['school']['name'] == '实验中学'
+        assert um.get_user_hierarchy('missing') is None
+
+    def test_index_is_reused_until_roster_changes(self, roster_file, monkeypatch):
+        index = um.get_access_index()
+        assert um.get_access_index() is index
+
+        changed = json.loads(json.dumps(ROSTER))
+        changed['users'][4]['class_id'] = 'class_8_1'
+        changed['users'].append({'id': 'student_7_1c', 'role': 'student', 'class_id': 'class_7_1'})
+        roster_file.write_text(json.dumps(changed), encoding='utf-8')
+        stat = os.stat(roster_file)
+        os.utime(roster_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert um.get_access_index() is not index
+        assert um.can_access_user_data('teacher_8_1', 'student_7_1a')
+        assert um.can_access_user_data('teacher_7_1', 'student_7_1c')
+
+    def test_callers_cannot_modify_the_index(self, roster_file):
+        um.get_managed_users('teacher_7_1')[0]['class_id'] = 'class_8_1'
+        assert um.can_access_user_data('teacher_7_1', 'student_7_1a')
+
+
+class TestUserManagementV2Permissions:
+    def test_has_permission_uses_user_permissions(self, tmp_path):
+        data = {'users': [{'id': 'teacher_01', 'role': 'teacher', 'permissions': ['class_management']},
+                          {'id': 'student_01', 'role': 'student'}]}
+        path = tmp_path / 'school_data_v2.json'
+        path.write_text(json.dumps(data), encoding='utf-8')
+        manager = UserManagementV2(str(path))
+
+        assert manager.has_permission('teacher_01', 'class_management')
+        assert not manager.has_permission('teacher_01', 'school_management')
+        assert not manager.has_permission('student_01', 'class_management')
+        assert not manager.has_permission('missing', 'class_management')
+        assert manager.get_user_by_id('student_01')['role'] == 'student'
+
+        # 名单重新加载后索引随之重建
+        data['users'][1]['permissions'] = ['class_management']
+        path.write_text(json.dumps(data), encoding='utf-8')
+        manager._data = None
+        assert manager.has_permission('student_01', 'class_management')
+
+
+def test_shared_visibility_sets():
+    index = AccessIndex(ROSTER)
+    assert index.visible['principal_01'] == frozenset(user['id'] for user in ROSTER['users'])
+    assert index.can_access('guest', 'guest') and not index.can_access('guest', 'student_7_1a')
@@ -0,0 +1,76 @@
+"""
+ANN索引测试
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ann_index import IVFIndex, brute_force_search
+from scripts.benchmark_ann_index import benchmark, synthetic_vectors
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    vectors = synthetic_vectors(3000, 32, clusters=40)
+    ids = [f"q{i}" for i in range(len(vectors))]
+    subjects = ['数学' if i % 2 else '语文' for i in range(len(vectors))]
+    return ids, vectors, subjects
+
+
+class TestIVFIndex:
+    def test_recall_against_brute_force(self, dataset):
+        ids, vectors, _ = dataset
+        results = benchmark(vectors, ids, nprobes=[8], k=10, queries=50)
+        assert results[0]['recall'] >= 0.95
+
+    def test_exact_match_ranks_first(self, dataset):
+        ids, vectors, subjects = dataset
+        index = IVFIndex.build(ids, vectors, subjects)
+        assert index.nlist > 1
+        top_id, similarity = index.search(vectors[123], k=1)[0]
+        assert top_id == 'q123'
+        assert similarity == pytest.approx(1.0, abs=1e-5)
+
+    def test_subject_filter(self, dataset):
+        ids, vectors, subjects = dataset
+        index = IVFIndex.build(ids, vectors, subjects)
+        found = index.search(vectors[0], k=20, subject='数学', nprobe=1)
+        assert len(found) == 20
+        assert all(int(qid[1:]) % 2 == 1 for qid, _ in found)
+        expected = brute_force_search(vectors, ids, vectors[0], k=1, subjects=subjects, subject='数学')
+        assert found[0][0] == expected[0][0]
+
+    def test_add_and_overwrite(self, dataset):
+        ids, vectors, subjects = dataset
+        index = IVFIndex.build(ids[:500], vectors[:500], subjects[:500])
+        index.add(['new'], [vectors[600]], ['物理'])
+        assert index.search(vectors[600], k=1, subject='物理')[0][0] == 'new'
+
+        # 覆盖已有ID，不产生重复
+        index.add(['q1'], [vectors[700]], ['数学'])
+        assert len(index) == 501
+        assert index.search(vectors[700], k=1)[0][0] == 'q1'
+
+    def test_empty_index(self):
+        index = IVFIndex.build([], np.zeros((0, 8)))
+        assert index.search(np.ones(8), k=5) == []
+        index.add(['a'], [np.ones(8)])
+        assert index.search(np.ones(8), k=5)[0][0] == 'a'
+
+    def test_save_and_load(self, dataset, tmp_path):
+        ids, vectors, subjects = dataset
+        index = IVFIndex.build(ids, vectors, subjects)
+        path = str(tmp_path / 'index.npz')
+        index.version = '3:2025-09-01T08:00:00+00:00'
+        index.model = 'paraphrase-multilingual-MiniLM-L12-v2'
+        index.save(path)
+
+        loaded = IVFIndex.load(path)
+        assert len(loaded) == len(index)
+        assert (loaded.version, loaded.model) == (index.version, index.model)
+        assert loaded.search(vectors[42], k=5, subject='语文') == index.search(vectors[42], k=5, subject='语文')
@@ -11,6 +11,19 @@ def mock_get_text_from_image(image_path):
 def mock_get_analysis_for_text(ocr_text):
     return '{"is_correct": false, "error_analysis": "错误"}'
 
+@pytest.fixture(autouse=True)
+def isolated_data(tmp_path, monkeypatch):
+    """Keep the question bank, mistake book and cache telemetry written by the pipeline out of data/ and logs/."""
+    from core import question_manager as qm
+    from services import mistake_book_service
+    from services.semantic_cache_service import semantic_cache
+
+    monkeypatch.setattr(qm, 'BANK_FILE', str(tmp_path / 'question_bank.json'))
+    monkeypatch.setattr(qm, 'PHASH_MAP_FILE', str(tmp_path / 'phash_to_question_id.json'))
+    monkeypatch.setattr(qm, 'STEM_BANK_FILE', str(tmp_path / 'stem_bank.json'))
+    monkeypatch.setattr(mistake_book_service, 'MISTAKES_FILE', str(tmp_path / 'mistakes.json'))
+    monkeypatch.setattr(semantic_cache, 'telemetry_file', str(tmp_path / 'semantic_cache_telemetry.jsonl'))
+
 @patch('services.ocr_service.get_text_from_image', side_effect=mock_get_text_from_image)
 @patch('services.llm_service.get_analysis_for_text', side_effect=mock_get_analysis_for_text)
 def test_ai_analysis_workflow(mock_llm, mock_ocr):
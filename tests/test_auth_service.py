@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.auth_service import AuthService
 from services.data_service_v3 import DataServiceV3
+from services.token_cache import TokenCache
 from core.logger_config import setup_logger
 
 logger = setup_logger('test_auth_service', level='DEBUG')
@@ -37,7 +38,7 @@ class TestAuthService:
             'ACCESS_TOKEN_EXPIRE_MINUTES': '30',
             'REFRESH_TOKEN_EXPIRE_DAYS': '7'
         }):
-            service = AuthService(mock_data_service)
+            service = AuthService(mock_data_service, token_cache=TokenCache())
             return service
     
     @pytest.fixture
@@ -649,9 +650,13 @@ class TestAuthService:
         
         assert auth_service._is_session_valid(user_id, refresh_token) is True
         
-        # 模拟无效会话
+        # 会话有效性已缓存，不再回源数据库
         mock_session.execute.return_value.fetchone.return_value = None
+        assert auth_service._is_session_valid(user_id, refresh_token) is True
+        mock_session.execute.assert_called_once()
         
+        # 会话失效后写穿缓存
+        auth_service._invalidate_user_sessions(user_id)
         assert auth_service._is_session_valid(user_id, refresh_token) is False
 
     def test_invalidate_user_sessions(self, auth_service, mock_session):
@@ -0,0 +1,148 @@
+"""
+多题批量分析测试
+"""
+
+import os
+import sys
+import json
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import question_manager as qm
+from llm.gpt4_analyzer import build_batch_prompt
+from scripts.bulk_analyze import bulk_analyze
+from services.batch_analyzer import (BatchAnalyzer, estimate_tokens, parse_batch_response, plan_batches,
+                                     split_worksheet)
+
+
+def analysis(subject='语文', **extra):
+    return dict({'subject': subject, 'is_correct': True, 'error_analysis': '', 'correct_answer': '',
+                 'solution_steps': '略', 'knowledge_point': '古诗', 'common_mistakes': ''}, **extra)
+
+
+def batch_reply(texts, skip=()):
+    """按题目编号返回结果，skip 中的编号缺失"""
+    items = [analysis(id=i, correct_answer=text) for i, text in enumerate(texts, 1) if i not in skip]
+    return f"```json\n{json.dumps(items, ensure_ascii=False)}\n```"
+
+
+@pytest.fixture
+def llm():
+    with patch('services.batch_analyzer.llm_service') as llm:
+        llm.get_batch_analysis.side_effect = lambda texts, max_tokens: batch_reply(texts)
+        llm.get_analysis_for_text.side_effect = \
+            lambda text: f"```json\n{json.dumps(analysis(correct_answer=text), ensure_ascii=False)}\n```"
+        yield llm
+
+
+class TestPlanning:
+    def test_estimate_tokens(self):
+        assert estimate_tokens('中国的首都是北京') == 8
+        assert estimate_tokens('1 + 1 = 3') == 3
+
+    def test_batches_respect_item_and_output_limits(self):
+        assert plan_batches(['题'] * 10, max_items=4) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        # 输出预算只够3道题
+        assert plan_batches(['题'] * 5, max_items=8, output_tokens_per_item=500, max_output_tokens=1500) == \
+            [[0, 1, 2], [3, 4]]
+
+    def test_batches_respect_input_budget(self):
+        long_text = '长' * 300
+        assert plan_batches(['短', long_text, '短', '短'], max_items=8, input_token_budget=320) == \
+            [[0], [1], [2, 3]]
+
+    def test_batch_prompt_numbers_items(self):
+        prompt = build_batch_prompt(['甲', '乙'])
+        assert '**题目 1:**\n```\n甲\n```' in prompt and '**题目 2:**\n```\n乙\n```' in prompt
+        assert prompt.count('示例 1') == 1
+
+
+class TestParsing:
+    def test_maps_items_by_id(self):
+        reply = json.dumps([analysis(id=2, correct_answer='b'), analysis(id='1', correct_answer='a')])
+        parsed = parse_batch_response(reply, 2)
+        assert parsed[0]['correct_answer'] == 'a' and parsed[1]['correct_answer'] == 'b'
+        assert 'id' not in parsed[0]
+
+    @pytest.mark.parametrize('reply', [
+        'not json',
+        json.dumps(analysis(id=1)),
+        json.dumps([analysis(id=3), analysis(id=0), {'id': 1}]),
+    ])
+    def test_invalid_items_are_dropped(self, reply):
+        assert parse_batch_response(reply, 2) == {}
+
+    def test_duplicate_id_keeps_first(self):
+        reply = json.dumps([analysis(id=1, correct_answer='a'), analysis(id=1, correct_answer='b')])
+        assert parse_batch_response(reply, 1)[0]['correct_answer'] == 'a'
+
+
+class TestBatchAnalyzer:
+    def test_one_request_per_batch(self, llm):
+        texts = ['床前明月光', '疑是地上霜', '举头望明月', '低头思故乡', '床前明月光']
+        analyzer = BatchAnalyzer(max_items=2, max_workers=2)
+        results = analyzer.analyze(texts)
+
+        assert [result['correct_answer'] for result in results] == texts
+        # 重复的题目只分析一次：4道不同题目分为 2+2 两批
+        assert llm.get_batch_analysis.call_count == 2
+        llm.get_analysis_for_text.assert_not_called()
+        assert analyzer.stats['batched_items'] == 4 and analyzer.stats['requests'] == 2
+
+    def test_missing_items_fall_back_to_single_calls(self, llm):
+        llm.get_batch_analysis.side_effect = lambda texts, max_tokens: batch_reply(texts, skip={2})
+        analyzer = BatchAnalyzer(max_items=4)
+        results = analyzer.analyze(['甲', '乙', '丙'])
+
+        assert [result['correct_answer'] for result in results] == ['甲', '乙', '丙']
+        llm.get_analysis_for_text.assert_called_once_with('乙')
+        assert analyzer.stats['fallback_items'] == 1
+
+    def test_failed_request_falls_back_for_every_item(self, llm):
+        llm.get_batch_analysis.side_effect = RuntimeError('timeout')
+        llm.get_analysis_for_text.side_effect = lambda text: 'not json' if text == '乙' else json.dumps(analysis())
+        analyzer = BatchAnalyzer(max_items=4)
+        results = analyzer.analyze(['甲', '乙'])
+
+        assert results[0] is not None and results[1] is None
+        assert analyzer.stats['fallback_items'] == 2 and analyzer.stats['failed_items'] == 1
+
+    def test_single_item_uses_existing_prompt(self, llm):
+        BatchAnalyzer().analyze(['甲'])
+        llm.get_batch_analysis.assert_not_called()
+        llm.get_analysis_for_text.assert_called_once_with('甲')
+
+    def test_max_tokens_scales_with_batch(self, llm):
+        BatchAnalyzer(max_items=8, output_tokens_per_item=400).analyze(['甲', '乙', '丙'])
+        assert llm.get_batch_analysis.call_args.kwargs['max_tokens'] == 1200
+
+
+class TestWorksheet:
+    def test_split_numbered_questions(self):
+        text = '三年级数学练习\n1. 3 + 5 = 8\n2、7 × 6 = 40\n（3）中国的首都是（ 北京 ）\n写出理由\n3.5 + 1 = ?'
+        assert split_worksheet(text) == ['3 + 5 = 8', '7 × 6 = 40', '中国的首都是（ 北京 ）\n写出理由\n3.5 + 1 = ?']
+
+    @pytest.mark.parametrize('text', ['1. 只有一道题', '2. 不从1开始\n3. 第二道', '3.5 + 1.5 = 5\n2.5 × 2 = 5'])
+    def test_unsplittable_text_is_one_question(self, text):
+        assert split_worksheet(text) == [text]
+
+
+def test_bulk_analyze_skips_known_and_grades_locally(llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(qm, 'BANK_FILE', str(tmp_path / 'bank.json'))
+    monkeypatch.setattr(qm, 'PHASH_MAP_FILE', str(tmp_path / 'phash.json'))
+    qm.add_question(qm.generate_question_id('已有的题'), '已有的题', analysis(), None, None)
+
+    questions = [('已有的题', None), ('1 + 1 = 3', None), ('床前明月光', None), ('疑是地上霜', 'sheet.png'),
+                 ('床前明月光', None)]
+    with patch.object(qm, '_save_bank', wraps=qm._save_bank) as save_bank:
+        report = bulk_analyze(questions, BatchAnalyzer(max_items=8))
+    save_bank.assert_called_once()
+
+    assert report['skipped'] == 2 and report['local'] == 1 and report['llm'] == 2 and report['saved'] == 3
+    llm.get_batch_analysis.assert_called_once()
+    bank = qm.load_bank()
+    assert bank[qm.generate_question_id('1 + 1 = 3')]['master_analysis']['graded_by'] == 'fast_grader'
+    assert bank[qm.generate_question_id('疑是地上霜')]['first_submission_image'] == 'sheet.png'
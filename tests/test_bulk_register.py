@@ -0,0 +1,131 @@
+"""
+批量注册用户测试
+"""
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import bcrypt
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.auth_service import AuthService
+from services.password_hasher import PasswordHasher
+from services.token_cache import TokenCache
+
+
+class FakeUsersTable:
+    """按SQL语句分派的假会话：记录每条 INSERT，模拟邮箱唯一约束和外键错误"""
+
+    def __init__(self, existing=(), bad_class_ids=()):
+        self.emails = set(existing)
+        self.bad_class_ids = set(bad_class_ids)
+        self.inserts = []
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        result = MagicMock()
+        if 'SELECT email FROM users' in sql:
+            result.fetchall.return_value = [SimpleNamespace(email=e) for e in params['emails'] if e in self.emails]
+        elif 'INSERT INTO users' in sql:
+            rows = sorted({key.rsplit('_', 1)[1] for key in params}, key=int)
+            if any(params[f'class_id_{n}'] in self.bad_class_ids for n in rows):
+                raise IntegrityError('INSERT', params, Exception('violates foreign key constraint'))
+            self.inserts.append(params)
+            inserted = []
+            for n in rows:
+                if params[f'email_{n}'] not in self.emails:
+                    self.emails.add(params[f'email_{n}'])
+                    inserted.append(SimpleNamespace(email=params[f'email_{n}']))
+            result.fetchall.return_value = inserted
+        return result
+
+    def commit(self):
+        pass
+
+
+def make_service(table):
+    data_service = MagicMock()
+    data_service.get_session.return_value.__enter__.return_value = table
+    return AuthService(data_service, token_cache=TokenCache(), password_hasher=PasswordHasher(rounds=4, workers=0))
+
+
+def student(n, **extra):
+    return dict({'name': f'学生{n}', 'email': f's{n}@example.com', 'password': 'password123', 'role': 'student'}, **extra)
+
+
+class TestParseRoster:
+    def test_csv(self):
+        content = ('\ufeffname,email,password,role,class_id,subject_teach\n'
+                   '张三,a@example.com,password123,student,class_01,\n'
+                   '李老师,b@example.com,password123,teacher,,数学; 物理\n').encode('utf-8')
+        rows = AuthService.parse_roster(content, 'csv')
+        assert rows[0] == {'name': '张三', 'email': 'a@example.com', 'password': 'password123',
+                           'role': 'student', 'class_id': 'class_01'}
+        assert rows[1]['subject_teach'] == ['数学', '物理']
+        assert 'class_id' not in rows[1]
+
+    def test_json(self):
+        users = [student(1)]
+        assert AuthService.parse_roster(json.dumps(users), 'json') == users
+        assert AuthService.parse_roster(json.dumps({'users': users}), 'json') == users
+        with pytest.raises(ValueError):
+            AuthService.parse_roster('{"users": 1}', 'json')
+        with pytest.raises(ValueError):
+            AuthService.parse_roster('', 'xlsx')
+
+
+class TestBulkRegister:
+    def test_per_row_results(self):
+        table = FakeUsersTable(existing={'s2@example.com'})
+        service = make_service(table)
+        rows = [student(1), student(2), student(1), student(3, password='short'),
+                student(4, role='janitor'), student(5, permissions=['view'])]
+
+        report = service.bulk_register_users(rows)
+
+        assert report['total'] == 6 and report['created'] == 2 and report['failed'] == 4
+        messages = [r['message'] for r in report['results']]
+        assert messages == ["注册成功", "邮箱已被注册", "与第1行邮箱重复",
+                            "密码强度不足，至少需要8个字符", "无效的用户角色: janitor", "注册成功"]
+        assert report['results'][0]['user_id'].startswith('student_')
+        assert report['rows_per_sec'] > 0
+
+        # 只有一条多行 INSERT，密码已哈希，JSONB字段已序列化
+        assert len(table.inserts) == 1
+        params = table.inserts[0]
+        assert bcrypt.checkpw(b'password123', params['password_hash_0'].encode())
+        assert params['salt_0'] == params['password_hash_0'][:29]
+        assert json.loads(params['permissions_1']) == ['view']
+
+    def test_batches(self):
+        table = FakeUsersTable()
+        report = make_service(table).bulk_register_users([student(n) for n in range(5)], batch_size=2)
+        assert report['created'] == 5
+        assert len(table.inserts) == 3
+
+    def test_failed_batch_falls_back_to_single_rows(self):
+        table = FakeUsersTable(bad_class_ids={'missing'})
+        rows = [student(1), student(2, class_id='missing'), student(3)]
+        report = make_service(table).bulk_register_users(rows)
+        assert [r['success'] for r in report['results']] == [True, False, True]
+        assert report['results'][1]['message'].startswith("写入失败")
+
+    def test_concurrent_registration_conflict(self):
+        table = FakeUsersTable()
+        service = make_service(table)
+        original = table.execute
+
+        def execute(statement, params):
+            if 'INSERT INTO users' in str(statement):
+                table.emails.add('s1@example.com')
+            return original(statement, params)
+        table.execute = execute
+
+        report = service.bulk_register_users([student(1), student(2)])
+        assert [r['message'] for r in report['results']] == ["邮箱已被注册", "注册成功"]
@@ -0,0 +1,71 @@
+"""
+协同过滤邻居表测试
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommender.collaborative import ItemNeighborTable, build_struggle_matrix, compute_item_neighbors
+from recommender.recommender import QuestionRecommender
+
+
+def outcomes():
+    """s1-s3 都做错了 A 和 B；s4 做错 A 和 C；D 只有人做对"""
+    rows = []
+    for student in ('s1', 's2', 's3'):
+        rows += [(student, 'A', False), (student, 'B', False)]
+    rows += [('s4', 'A', False), ('s4', 'C', False), ('s4', 'C', False), ('s5', 'D', True)]
+    return [rows[:5], rows[5:]]
+
+
+class TestCollaborativeFiltering:
+    def test_struggle_matrix_is_binary_and_ignores_correct_answers(self):
+        matrix, users, items = build_struggle_matrix(outcomes())
+        assert matrix.shape == (4, 3)
+        assert 'D' not in items and 's5' not in users
+        assert matrix.max() == 1.0
+        assert matrix.nnz == 8
+
+    def test_neighbors_respect_support_and_order(self):
+        table = ItemNeighborTable.train(outcomes(), k=5, min_support=1, shrinkage=0.0)
+        similar = dict(table.similar('A'))
+        # cos(A,B) = 3/sqrt(4*3), cos(A,C) = 1/sqrt(4*1)
+        assert similar['B'] == pytest.approx(3 / np.sqrt(12), rel=1e-3)
+        assert similar['C'] == pytest.approx(0.5, rel=1e-3)
+        assert [qid for qid, _ in table.similar('A')] == ['B', 'C']
+
+        strict = ItemNeighborTable.train(outcomes(), k=5, min_support=2)
+        assert [qid for qid, _ in strict.similar('A')] == ['B']
+        assert strict.similar('C') == []
+        assert strict.similar('unknown') == []
+
+    def test_chunking_matches_single_pass(self):
+        rng = np.random.default_rng(0)
+        rows = [(f"s{u}", f"q{q}", False) for u, q in zip(rng.integers(0, 300, 5000), rng.integers(0, 80, 5000))]
+        matrix, _, _ = build_struggle_matrix([rows])
+        single = compute_item_neighbors(matrix, k=10, chunk_size=1000)
+        chunked = compute_item_neighbors(matrix, k=10, chunk_size=7)
+        np.testing.assert_array_equal(single[0], chunked[0])
+        np.testing.assert_allclose(single[1], chunked[1])
+
+    def test_save_and_load(self, tmp_path):
+        table = ItemNeighborTable.train(outcomes(), k=3, min_support=1)
+        path = str(tmp_path / 'neighbors.npz')
+        table.save(path)
+        loaded = ItemNeighborTable.load(path)
+        assert [qid for qid, _ in loaded.similar('A')] == [qid for qid, _ in table.similar('A')]
+        assert ItemNeighborTable.load(str(tmp_path / 'missing.npz')) is None
+
+    def test_recommender_serves_collaborative_neighbors(self):
+        table = ItemNeighborTable.train(outcomes(), k=5, min_support=1)
+        bank = {qid: {'canonical_text': qid, 'master_analysis': {'subject': '数学', 'knowledge_point': kp}}
+                for qid, kp in (('A', '分数'), ('B', '几何'), ('C', '方程'))}
+        recommender = QuestionRecommender.from_sources([], bank, neighbor_table=table)
+        results = recommender.recommend([{'question_id': 'A', 'knowledge_point': '分数', 'subject': '数学'}], k=2)
+        assert [r['id'] for r in results] == ['B', 'C']
+        assert results[0]['reason'] == '做错同类题的同学也常错'
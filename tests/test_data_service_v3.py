@@ -16,6 +16,7 @@ from typing import Dict, List, Any
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.data_service_v3 import DataServiceV3
+from services.ann_index import IVFIndex
 from core.logger_config import setup_logger
 
 logger = setup_logger('test_data_service_v3', level='DEBUG')
@@ -553,6 +554,235 @@ class TestDataServiceV3:
             assert success is False
             mock_session.execute.assert_not_called()
 
+    def test_update_review_schedules_batch(self, data_service, mock_session):
+        """测试批量更新复习计划使用一次 executemany"""
+        updates = [
+            {'entry_id': f'mistake_{i}', 'review_count': 1, 'mastery_level': 2, 'ease_factor': 2.5,
+             'interval_days': 1, 'last_reviewed_at': datetime.now(), 'next_review_at': datetime.now()}
+            for i in range(3)
+        ]
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            success = data_service.update_review_schedules(updates)
+
+            assert success is True
+            mock_session.execute.assert_called_once()
+            assert mock_session.execute.call_args[0][1] == updates
+            mock_session.commit.assert_called_once()
+
+    def test_due_entries_query_uses_next_review_at_directly(self, data_service, mock_session):
+        """测试到期查询直接按 next_review_at 过滤排序，以便使用 (user_id, next_review_at) 索引"""
+        mock_session.execute.return_value = []
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            data_service.get_due_mistake_entries('user_001')
+
+        sql = str(mock_session.execute.call_args[0][0])
+        assert 'mbe.next_review_at <= CURRENT_TIMESTAMP' in sql
+        assert 'ORDER BY mbe.next_review_at' in sql and 'COALESCE' not in sql
+
+    def test_advisory_lock_released_only_when_acquired(self, data_service, mock_session):
+        """测试咨询锁拿到时退出后释放，拿不到时不释放"""
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            mock_session.execute.return_value.scalar.return_value = True
+            with data_service.advisory_lock(42) as acquired:
+                assert acquired is True
+            statements = [str(call[0][0]) for call in mock_session.execute.call_args_list]
+            assert 'pg_try_advisory_lock' in statements[0] and 'pg_advisory_unlock' in statements[-1]
+
+            mock_session.execute.reset_mock()
+            mock_session.execute.return_value.scalar.return_value = False
+            with data_service.advisory_lock(42) as acquired:
+                assert acquired is False
+            mock_session.execute.assert_called_once()
+
+    def test_update_review_schedules_empty(self, data_service, mock_session):
+        """测试空批次不访问数据库"""
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            assert data_service.update_review_schedules([]) is True
+            mock_session.execute.assert_not_called()
+
+    def test_save_question_embeddings_upserts_batch(self, data_service, mock_session):
+        """测试题目向量批量写入使用一次 executemany（之前只取一次同模型写入的事务锁）"""
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            success = data_service.save_question_embeddings({'q1': [0.1, 0.2], 'q2': [0.3, 0.4]}, 'all-MiniLM-L6-v2')
+
+            assert success is True
+            assert mock_session.execute.call_count == 2
+            assert 'pg_advisory_xact_lock' in str(mock_session.execute.call_args_list[0][0][0])
+            params = mock_session.execute.call_args[0][1]
+            assert [p['question_id'] for p in params] == ['q1', 'q2']
+            assert params[0]['embedding_dimension'] == 2
+            assert 'ON CONFLICT' in str(mock_session.execute.call_args[0][0])
+
+    def test_find_similar_questions_builds_and_persists_ann_index(self, data_service, mock_session, tmp_path):
+        """测试相似题目查询：首次查询从 question_embeddings 构建索引并写入磁盘"""
+        rows = [
+            MagicMock(question_id='q_add', embedding_vector=[1.0, 0.0, 0.0], subject='数学'),
+            MagicMock(question_id='q_sub', embedding_vector=[0.9, 0.1, 0.0], subject='数学'),
+            MagicMock(question_id='q_poem', embedding_vector=[0.0, 1.0, 0.0], subject='语文'),
+        ]
+        mock_session.execute.return_value.fetchall.return_value = rows
+        mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=3, latest=None)
+        with patch('services.data_service_v3.ANN_INDEX_DIR', str(tmp_path)), \
+                patch.object(data_service, 'get_session', return_value=mock_session):
+            results = data_service.find_similar_questions([1.0, 0.0, 0.0], k=2, model='test-model')
+            assert [r['question_id'] for r in results] == ['q_add', 'q_sub']
+            assert results[0]['similarity'] == pytest.approx(1.0)
+
+            filtered = data_service.find_similar_questions([1.0, 0.0, 0.0], k=2, subject='语文', model='test-model')
+            assert [r['question_id'] for r in filtered] == ['q_poem']
+
+            # 索引只构建一次
+            mock_session.execute.return_value.fetchall.assert_called_once()
+            assert os.path.exists(os.path.join(str(tmp_path), 'question_embeddings_test-model.npz'))
+
+    def test_stale_ann_index_is_rebuilt(self, data_service, mock_session, tmp_path):
+        """测试磁盘上的索引与数据库版本不一致（新增向量或停用题目）时重建"""
+        rows = [MagicMock(question_id='q_add', embedding_vector=[1.0, 0.0, 0.0], subject='数学'),
+                MagicMock(question_id='q_poem', embedding_vector=[0.0, 1.0, 0.0], subject='语文')]
+        mock_session.execute.return_value.fetchall.return_value = rows
+        mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=2, latest=None)
+        with patch('services.data_service_v3.ANN_INDEX_DIR', str(tmp_path)), \
+                patch.object(data_service, 'get_session', return_value=mock_session):
+            data_service.build_ann_index('test-model')
+
+            # 新进程加载磁盘上的索引：版本一致时直接使用
+            fresh = DataServiceV3.__new__(DataServiceV3)
+            fresh._ann_indexes, fresh._ann_checked_at = {}, {}
+            fresh.get_session = lambda: mock_session
+            fresh._get_ann_index('test-model')
+            assert mock_session.execute.return_value.fetchall.call_count == 1
+
+            # q_poem 被停用后版本变化，过了核对间隔就重建
+            mock_session.execute.return_value.fetchall.return_value = rows[:1]
+            mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=1, latest=None)
+            fresh._ann_checked_at['test-model'] -= 3600
+            assert [r['question_id'] for r in fresh.find_similar_questions([0.0, 1.0, 0.0], k=2,
+                                                                          model='test-model')] == ['q_add']
+            assert mock_session.execute.return_value.fetchall.call_count == 2
+
+    def test_ann_index_of_another_model_is_rebuilt(self, data_service, mock_session, tmp_path):
+        """测试磁盘上的索引由其他模型生成时重建，文本查询的向量模型必须与索引一致"""
+        mock_session.execute.return_value.fetchall.return_value = [
+            MagicMock(question_id='q_add', embedding_vector=[1.0, 0.0, 0.0], subject='数学')]
+        mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=1, latest=None)
+        with patch('services.data_service_v3.ANN_INDEX_DIR', str(tmp_path)), \
+                patch.object(data_service, 'get_session', return_value=mock_session):
+            data_service.build_ann_index('test-model')
+            path = os.path.join(str(tmp_path), 'question_embeddings_test-model.npz')
+            stale = IVFIndex.load(path)
+            stale.model = 'other-model'
+            stale.save(path)
+
+            data_service._ann_indexes.clear()
+            data_service._get_ann_index('test-model')
+            assert mock_session.execute.return_value.fetchall.call_count == 2
+            assert IVFIndex.load(path).model == 'test-model'
+            assert data_service.find_similar_questions('文本查询', model='test-model') == []
+
+    def test_incremental_embeddings_are_persisted(self, data_service, mock_session, tmp_path):
+        """测试增量写入的向量同步写回磁盘上的索引"""
+        mock_session.execute.return_value.fetchall.return_value = [
+            MagicMock(question_id='q_add', embedding_vector=[1.0, 0.0, 0.0], subject='数学')]
+        mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=1, latest=None)
+        with patch('services.data_service_v3.ANN_INDEX_DIR', str(tmp_path)), \
+                patch.object(data_service, 'get_session', return_value=mock_session):
+            data_service.build_ann_index('test-model')
+            mock_session.execute.return_value.__iter__.return_value = [MagicMock(id='q_new', subject='语文')]
+            # 写入前的版本与索引一致，写入后的版本随索引保存
+            mock_session.execute.return_value.fetchone.side_effect = [MagicMock(vectors=1, latest=None),
+                                                                      MagicMock(vectors=2, latest=None)]
+            assert data_service.save_question_embeddings({'q_new': [0.0, 1.0, 0.0]}, 'test-model') is True
+            assert 'pg_advisory_xact_lock' in str(mock_session.execute.call_args_list[-5][0][0])
+
+        loaded = IVFIndex.load(os.path.join(str(tmp_path), 'question_embeddings_test-model.npz'))
+        assert sorted(loaded.ids) == ['q_add', 'q_new'] and loaded.version == '2:'
+
+    def test_incremental_update_does_not_cover_other_writers(self, data_service, mock_session, tmp_path):
+        """测试写入前索引已落后（其他进程写入了向量）时，增量更新不声称覆盖这些向量"""
+        mock_session.execute.return_value.fetchall.return_value = [
+            MagicMock(question_id='q_add', embedding_vector=[1.0, 0.0, 0.0], subject='数学')]
+        mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=1, latest=None)
+        with patch('services.data_service_v3.ANN_INDEX_DIR', str(tmp_path)), \
+                patch.object(data_service, 'get_session', return_value=mock_session):
+            data_service.build_ann_index('test-model')
+            mock_session.execute.return_value.__iter__.return_value = [MagicMock(id='q_new', subject='语文')]
+            mock_session.execute.return_value.fetchone.return_value = MagicMock(vectors=2, latest=None)
+            assert data_service.save_question_embeddings({'q_new': [0.0, 1.0, 0.0]}, 'test-model') is True
+
+            assert data_service._ann_indexes['test-model'].version == '1:'
+            loaded = IVFIndex.load(os.path.join(str(tmp_path), 'question_embeddings_test-model.npz'))
+            assert loaded.ids == ['q_add']
+            # 下次核对时发现版本不一致，全量重建
+            data_service._ann_checked_at['test-model'] -= 3600
+            data_service._get_ann_index('test-model')
+            assert mock_session.execute.return_value.fetchall.call_count == 2
+
+    def test_search_questions_builds_parameterized_tsquery(self, data_service, mock_session):
+        """测试全文检索：子句转换为tsquery，用户输入只通过参数传入"""
+        row = MagicMock(id='q1', canonical_text='解一元二次方程', subject='数学', difficulty_level=2,
+                        score=0.5, total=7, highlight='解一元<mark>二次</mark>方程')
+        mock_session.execute.return_value.fetchall.return_value = [row]
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            result = data_service.search_questions('二次 "一元 二次" func*', subject='数学', limit=1, offset=3)
+
+            assert result['total'] == 7
+            assert result['results'][0]['highlight'] == '解一元<mark>二次</mark>方程'
+            sql = str(mock_session.execute.call_args[0][0])
+            params = mock_session.execute.call_args[0][1]
+            assert "plainto_tsquery('chinese', :q0) && phraseto_tsquery('chinese', :q1)" in sql
+            assert "to_tsquery('chinese', :q2)" in sql
+            assert params['q2'] == 'func:*'
+            assert params['subject'] == '数学'
+            assert (params['limit'], params['offset']) == (1, 3)
+            assert '二次' not in sql
+
+    def test_search_questions_page_past_end_reports_total(self, data_service, mock_session):
+        """测试页码超出结果范围时仍返回真实的命中总数"""
+        mock_session.execute.return_value.fetchall.return_value = []
+        mock_session.execute.return_value.scalar.return_value = 7
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            assert data_service.search_questions('二次', limit=5, offset=10) == {'total': 7, 'results': []}
+            count_sql = str(mock_session.execute.call_args[0][0])
+            assert count_sql.startswith('SELECT COUNT(*)') and 'LIMIT' not in count_sql
+
+            mock_session.execute.reset_mock()
+            assert data_service.search_questions('二次') == {'total': 0, 'results': []}
+            mock_session.execute.assert_called_once()
+
+    def test_search_questions_empty_query(self, data_service, mock_session):
+        """测试空查询不访问数据库"""
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            assert data_service.search_questions('  ') == {'total': 0, 'results': []}
+            mock_session.execute.assert_not_called()
+
+    def test_delete_expired_sessions_in_bounded_batches(self, data_service, mock_session):
+        """测试会话清理：先删过期会话，不足一批时再删已失效会话"""
+        mock_session.execute.side_effect = [MagicMock(rowcount=30), MagicMock(rowcount=20)]
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            assert data_service.delete_expired_sessions(batch_size=100, inactive_grace_seconds=60) == 50
+
+            expired_sql = str(mock_session.execute.call_args_list[0][0][0])
+            assert 'expires_at < CURRENT_TIMESTAMP' in expired_sql and 'SKIP LOCKED' in expired_sql
+            assert mock_session.execute.call_args_list[1][0][1] == {'batch_size': 70, 'grace': 60}
+            mock_session.commit.assert_called_once()
+
+    def test_delete_expired_sessions_full_batch(self, data_service, mock_session):
+        """测试过期会话已满一批时不再删除已失效会话"""
+        mock_session.execute.return_value = MagicMock(rowcount=100)
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            assert data_service.delete_expired_sessions(batch_size=100) == 100
+            assert mock_session.execute.call_count == 1
+
+    def test_get_user_session_stats(self, data_service, mock_session):
+        """测试会话表规模统计"""
+        counts, sizes = MagicMock(), MagicMock()
+        counts._mapping = {'total': 10, 'active': 6, 'expired': 3, 'inactive': 1}
+        sizes._mapping = {'table_bytes': 8192, 'index_bytes': 16384, 'dead_tuples': 2}
+        mock_session.execute.return_value.fetchone.side_effect = [counts, sizes]
+        with patch.object(data_service, 'get_session', return_value=mock_session):
+            stats = data_service.get_user_session_stats()
+            assert stats['active'] == 6 and stats['index_bytes'] == 16384
+
     def test_get_analytics_data_student_role(self, data_service, mock_session):
         """测试获取学生角色的分析数据"""
         # 模拟统计查询结果
@@ -631,6 +861,16 @@ class TestDataServiceV3:
             data_service.close()
             mock_engine.dispose.assert_called_once()
 
+    def test_shared_engine_is_not_disposed(self):
+        """测试传入共享引擎时不新建连接池，close() 也不关闭它"""
+        engine = MagicMock()
+        with patch('services.data_service_v3.create_engine') as mock_create_engine:
+            service = DataServiceV3(engine=engine)
+        mock_create_engine.assert_not_called()
+        assert service.engine is engine
+        service.close()
+        engine.dispose.assert_not_called()
+
     def test_database_connection_error(self):
         """测试数据库连接错误"""
         with patch('services.data_service_v3.create_engine') as mock_engine:
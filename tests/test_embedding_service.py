@@ -0,0 +1,83 @@
+"""
+本地向量化服务测试
+"""
+
+import os
+import sys
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.question_manager import generate_question_id
+from services.embedding_service import EmbeddingService, text_hash
+
+
+class CountingEncoder:
+    """记录每次调用批次的编码器替身，向量由文本长度决定"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, batch_size):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 3.0, 4.0] for t in texts])
+
+
+@pytest.fixture
+def encoder():
+    return CountingEncoder()
+
+
+class TestEmbeddingService:
+    def test_text_hash_matches_question_id(self):
+        assert text_hash(" 1 + 1 = ? ") == generate_question_id("1+1=?")
+
+    def test_batches_and_normalizes(self, encoder):
+        service = EmbeddingService(batch_size=2, encoder=encoder)
+        matrix = service.embed(["a", "bb", "ccc", "dddd", "eeeee"])
+
+        assert matrix.shape == (5, 3)
+        assert [len(c) for c in encoder.calls] == [2, 2, 1]
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-6)
+
+    def test_cache_and_dedupe(self, encoder):
+        service = EmbeddingService(encoder=encoder)
+        first = service.embed(["题目一", "题目二", "题目一"])
+        assert encoder.calls == [["题目一", "题目二"]]
+        np.testing.assert_array_equal(first[0], first[2])
+
+        # 仅空白差异的文本共享同一缓存项
+        service.embed(["题目 一", "题目三"])
+        assert encoder.calls[-1] == ["题目三"]
+        assert service.stats == {'hits': 2, 'misses': 3, 'batches': 2}
+
+    def test_lru_eviction(self, encoder):
+        service = EmbeddingService(cache_size=2, encoder=encoder)
+        service.embed(["a", "b"])
+        service.embed(["a"])       # a 变为最近使用
+        service.embed(["c"])       # 淘汰 b
+        service.embed(["a", "b"])
+        assert encoder.calls[-1] == ["b"]
+
+    def test_persist_and_warm_cache(self, encoder):
+        data_service = MagicMock()
+        data_service.save_question_embeddings.return_value = True
+        service = EmbeddingService(encoder=encoder, data_service=data_service)
+
+        assert service.persist({'q1': 'abc'})
+        saved, model = data_service.save_question_embeddings.call_args[0]
+        assert model == service.model_name
+        assert saved['q1'] == pytest.approx([0.5145, 0.5145, 0.686], abs=1e-3)
+
+        data_service.get_question_embeddings.return_value = {text_hash('新题'): [1.0, 0.0, 0.0]}
+        fresh = EmbeddingService(encoder=encoder, data_service=data_service)
+        assert fresh.warm_cache() == 1
+        calls_before = len(encoder.calls)
+        np.testing.assert_array_equal(fresh.embed_one('新题'), [1.0, 0.0, 0.0])
+        assert len(encoder.calls) == calls_before
+
+    def test_persist_without_data_service(self, encoder):
+        assert EmbeddingService(encoder=encoder).persist({'q1': 'abc'}) is False
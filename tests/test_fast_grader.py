@@ -0,0 +1,116 @@
+"""
+本地快速判题测试
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.evaluate_fast_grader import evaluate
+from services.fast_grader import grade, normalize
+
+SCHEMA_KEYS = {'subject', 'is_correct', 'error_analysis', 'correct_answer', 'solution_steps',
+               'knowledge_point', 'common_mistakes'}
+
+
+class TestArithmetic:
+    def test_analyzer_example(self):
+        analysis = grade('1 + 1 = 3')
+        assert SCHEMA_KEYS <= analysis.keys()
+        assert analysis['subject'] == '数学' and analysis['is_correct'] is False
+        assert analysis['correct_answer'] == '1 + 1 = 2'
+        assert '2' in analysis['error_analysis'] and '3' in analysis['error_analysis']
+
+    @pytest.mark.parametrize('text, correct, answer', [
+        ('1+1=2', True, '1 + 1 = 2'),
+        ('3 + 4 × 2 = 14', False, '3 + 4 × 2 = 11'),
+        ('（3 + 4）× 2 = 14', True, '(3 + 4) × 2 = 14'),
+        ('10 - 2 - 3 = 5', True, '10 - 2 - 3 = 5'),
+        ('8 ÷ 2 ÷ 2 = 2', True, '8 ÷ 2 ÷ 2 = 2'),
+        ('7 ÷ 2 = 3.5', True, '7 ÷ 2 = 3.5'),
+        ('0.1 + 0.2 = 0.3', True, '0.1 + 0.2 = 0.3'),
+        ('1/2 + 1/3 = 2/5', False, '1 ÷ 2 + 1 ÷ 3 = 5/6'),
+        ('2^3 = 6', False, '2 ^ 3 = 8'),
+        ('计算：２×（－3）＝－6', True, '2 × (-3) = -6'),
+    ])
+    def test_exact_grading(self, text, correct, answer):
+        analysis = grade(text)
+        assert analysis['is_correct'] is correct
+        assert analysis['correct_answer'] == answer
+        if correct:
+            assert analysis['error_analysis'] == ''
+
+    def test_steps_follow_operator_precedence(self):
+        assert '3 + 4 × 2 = 3 + 8 = 11' in grade('3 + 4 × 2 = 14')['solution_steps']
+
+    def test_knowledge_points(self):
+        assert grade('1 + 1 = 2')['knowledge_point'] == '整数加减法'
+        assert grade('2 × 3 = 6')['knowledge_point'] == '整数四则运算'
+        assert grade('7 ÷ 2 = 3.5')['knowledge_point'] == '分数与除法运算'
+        assert grade('1.5 + 1 = 2.5')['knowledge_point'] == '小数四则运算'
+
+
+class TestLinearEquations:
+    def test_correct_solution(self):
+        analysis = grade('2x + 3 = 7, x = 2')
+        assert analysis['is_correct'] is True and analysis['correct_answer'] == 'x = 2'
+        assert analysis['knowledge_point'] == '一元一次方程'
+
+    def test_wrong_solution(self):
+        analysis = grade('解方程：3(x-1)=2x+4；x=6')
+        assert analysis['is_correct'] is False and analysis['correct_answer'] == 'x = 7'
+
+    def test_fractional_coefficient(self):
+        assert grade('x/2 + 1 = 4, x = 6')['is_correct'] is True
+
+
+class TestRoundedAnswers:
+    @pytest.mark.parametrize('text', ['10 ÷ 3 = 3.33', '2 ÷ 3 = 0.667', '1 ÷ 3 = 0.3', '3x = 10, x = 3.33'])
+    def test_rounded_decimal_is_deferred(self, text):
+        assert grade(text) is None
+
+    @pytest.mark.parametrize('text', ['10 ÷ 3 = 3.4', '10 ÷ 3 = 3', '7 ÷ 2 = 3.4', '3x = 10, x = 3.4'])
+    def test_wrong_or_exact_results_are_still_graded(self, text):
+        assert grade(text)['is_correct'] is False
+
+    def test_exact_fraction_is_correct(self):
+        assert grade('10 ÷ 3 = 10/3')['is_correct'] is True
+
+
+class TestCoverage:
+    @pytest.mark.parametrize('text', [
+        '中国的首都是北京',
+        '1 + 1 =',
+        '1 + 1',
+        'x + 1 = 3',
+        'x * x = 4, x = 2',
+        '2x + 3 = 2x + 5, x = 1',
+        'x + y = 3, x = 1',
+        '1 / 0 = 1',
+        '9 ** 99999 = 1',
+        '((((2^10)^10)^10)^10)^10 = 1',
+        '__import__("os") = 1',
+        '1 + 1 = 2 = 2',
+    ])
+    def test_out_of_scope_returns_none(self, text):
+        assert grade(text) is None
+
+    def test_normalize(self):
+        assert normalize('２Ｘ＋３＝７，Ｘ＝２？') == '2*x+3=7,x=2'
+        assert normalize('(1+2)(3+4)=21') == '(1+2)*(3+4)=21'
+
+
+def test_evaluate_against_question_bank():
+    bank = {
+        'q1': {'canonical_text': '1+1=3', 'master_analysis': {'is_correct': False, 'correct_answer': '1 + 1 = 2'}},
+        'q2': {'canonical_text': '3×4=12', 'master_analysis': {'is_correct': False, 'correct_answer': '12'}},
+        'q3': {'canonical_text': '白日依山尽', 'master_analysis': {'is_correct': True, 'correct_answer': ''}},
+        'q4': {'canonical_text': '2+2=4', 'master_analysis': {'is_correct': True, 'graded_by': 'fast_grader'}},
+    }
+    report = evaluate(bank)
+    assert report['total'] == 3 and report['covered'] == 2
+    assert report['verdict_agreement'] == 0.5 and report['answer_agreement'] == 1.0
+    assert [item['question_id'] for item in report['disagreements']] == ['q2']
@@ -0,0 +1,53 @@
+"""
+启动导入耗时测试
+每个页面和服务模块在新的解释器中导入，检查重量级库没有被提前导入，且导入耗时不超过预算；
+预算可通过 IMPORT_TIME_BUDGET_MS 调整（较慢的CI机器）
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.lazy_imports import LazyModule, lazy_import
+from scripts.profile_imports import DEFAULT_MODULES, parse_importtime, profile_import, top_imports
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', '2000'))
+
+
+class TestLazyImport:
+    def test_imports_on_first_attribute_access(self):
+        module = lazy_import('json')
+        assert isinstance(module, LazyModule) and not module.loaded
+        assert module.loads('[1]') == [1]
+        assert module.loaded
+
+    def test_missing_module_fails_on_use(self):
+        module = lazy_import('studyhelper_missing_module')
+        with pytest.raises(ModuleNotFoundError):
+            module.anything
+
+
+class TestParseImporttime:
+    def test_parse_and_rank(self):
+        output = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       100 |        100 |     json.decoder\n"
+                  "import time:       200 |        300 |   json\n"
+                  "import time:        50 |       1350 | app\n"
+                  "import time:      1000 |       1000 |   pandas\n")
+        entries = parse_importtime(output)
+        assert [(e['module'], e['depth']) for e in entries] == [
+            ('json.decoder', 2), ('json', 1), ('app', 0), ('pandas', 1)]
+        assert [e['module'] for e in top_imports(entries, 2)] == ['app', 'pandas']
+
+
+@pytest.mark.parametrize('module', DEFAULT_MODULES)
+def test_startup_imports(module):
+    report = profile_import(module)
+    assert report['heavy'] == [], f"{module} 提前导入了 {report['heavy']}"
+    assert report['total_ms'] <= IMPORT_TIME_BUDGET_MS, (
+        f"{module} 导入耗时 {report['total_ms']}ms 超出预算 {IMPORT_TIME_BUDGET_MS}ms: "
+        + ", ".join(f"{e['module']}={e['cumulative_us'] // 1000}ms" for e in top_imports(report['entries'], 5))
+    )
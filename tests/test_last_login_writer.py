@@ -0,0 +1,133 @@
+"""
+最后登录时间批量写入测试
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.auth_service import AuthService
+from services.last_login_writer import LastLoginWriter
+from services.password_hasher import PasswordHasher
+from services.token_cache import TokenCache
+
+
+def make_data_service():
+    data_service = MagicMock()
+    session = data_service.get_session.return_value.__enter__.return_value
+    return data_service, session
+
+
+def executed_sql(session):
+    return [str(call.args[0]) for call in session.execute.call_args_list]
+
+
+class TestLastLoginWriter:
+    def test_coalesces_logins_into_one_update(self):
+        data_service, session = make_data_service()
+        writer = LastLoginWriter(data_service, flush_interval_seconds=60)
+        t0 = datetime(2026, 9, 1, 8, 0, tzinfo=timezone.utc)
+        writer.record('student_01', t0)
+        writer.record('student_02', t0)
+        writer.record('student_01', t0 + timedelta(minutes=5))
+        writer.record('student_01', t0 + timedelta(minutes=1))
+        assert writer.pending() == 2
+
+        assert writer.flush() == 2
+        assert session.execute.call_count == 1
+        params = session.execute.call_args.args[1]
+        written = dict(zip(params['user_ids'], params['times']))
+        assert written == {'student_01': t0 + timedelta(minutes=5), 'student_02': t0}
+        session.commit.assert_called_once()
+        assert writer.pending() == 0 and writer.flush() == 0
+        writer.stop()
+
+    def test_failed_flush_keeps_newest_pending(self):
+        data_service, session = make_data_service()
+        writer = LastLoginWriter(data_service, flush_interval_seconds=60)
+        t0 = datetime(2026, 9, 1, 8, 0, tzinfo=timezone.utc)
+        writer.record('student_01', t0 + timedelta(minutes=5))
+        session.execute.side_effect = Exception('connection lost')
+        assert writer.flush() == 0
+        assert writer.stats['errors'] == 1
+
+        session.execute.side_effect = None
+        writer.record('student_01', t0)
+        assert writer.flush() == 1
+        assert session.execute.call_args.args[1]['times'] == [t0 + timedelta(minutes=5)]
+        writer.stop()
+
+    def test_background_flush_when_full(self):
+        data_service, session = make_data_service()
+        writer = LastLoginWriter(data_service, flush_interval_seconds=60, max_pending=3)
+        for n in range(3):
+            writer.record(f'student_{n}')
+        deadline = time.time() + 5
+        while writer.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        assert writer.stats['written'] == 3
+        writer.stop()
+
+    def test_stop_flushes_remaining(self):
+        data_service, session = make_data_service()
+        writer = LastLoginWriter(data_service, flush_interval_seconds=60)
+        writer.record('student_01')
+        writer.stop()
+        assert writer.stats['written'] == 1
+
+    def test_zero_interval_writes_immediately(self):
+        data_service, session = make_data_service()
+        writer = LastLoginWriter(data_service, flush_interval_seconds=0)
+        writer.record('student_01')
+        assert writer.stats['written'] == 1 and writer._thread is None
+
+
+class TestLoginWritePath:
+    def make_service(self, rounds=4):
+        data_service, session = make_data_service()
+        writer = LastLoginWriter(data_service, flush_interval_seconds=60)
+        service = AuthService(data_service, token_cache=TokenCache(), last_login_writer=writer,
+                              password_hasher=PasswordHasher(rounds=rounds, workers=0))
+        return service, session
+
+    def user(self, rounds):
+        password_hash = bcrypt.hashpw(b'password123', bcrypt.gensalt(rounds)).decode()
+        return {'id': 'student_01', 'name': '张三', 'email': 'a@example.com', 'role': 'student',
+                'permissions': [], 'password_hash': password_hash, 'salt': password_hash[:29]}
+
+    def test_session_insert_is_the_only_write(self):
+        service, session = self.make_service()
+        auth_data = service._complete_login(self.user(4), 'password123')
+
+        statements = executed_sql(session)
+        assert len(statements) == 1 and 'INSERT INTO user_sessions' in statements[0]
+        session.commit.assert_called_once()
+        assert service.last_login_writer.pending() == 1
+        # 默认不缓存有效会话：刷新令牌时回源数据库
+        refresh_hash = service._hash_token(auth_data['refresh_token'])
+        assert service.token_cache.get_session(refresh_hash) is None
+        service.close()
+
+    def test_new_session_written_through_when_session_cache_enabled(self):
+        service, _ = self.make_service()
+        service.token_cache = TokenCache(session_ttl_seconds=60)
+        auth_data = service._complete_login(self.user(4), 'password123')
+        assert service.token_cache.get_session(service._hash_token(auth_data['refresh_token'])) is True
+        service.close()
+
+    def test_rehash_shares_the_session_transaction(self):
+        service, session = self.make_service(rounds=5)
+        service._complete_login(self.user(4), 'password123')
+
+        statements = executed_sql(session)
+        assert len(statements) == 2
+        assert 'INSERT INTO user_sessions' in statements[0] and 'UPDATE users SET password_hash' in statements[1]
+        assert 'last_login' not in statements[1]
+        session.commit.assert_called_once()
+        service.close()
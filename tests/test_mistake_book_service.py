@@ -5,11 +5,13 @@ import os
 import json
 import uuid
 import sys
+import datetime
+from unittest.mock import patch
 
 # Add project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services import mistake_book_service
+from services import mistake_book_service, review_scheduler
 
 class TestMistakeBookService(unittest.TestCase):
 
@@ -17,16 +19,20 @@ class TestMistakeBookService(unittest.TestCase):
         """Set up a temporary, isolated mistakes file for each test."""
         # Generate a unique filename for the test mistakes file
         self.test_mistakes_file = f'test_mistakes_{uuid.uuid4()}.json'
+        self.test_journal_file = self.test_mistakes_file + '.log'
         # Override the service's file path to use our temporary file
         mistake_book_service.MISTAKES_FILE = self.test_mistakes_file
         # Ensure the file is clean before each test
-        if os.path.exists(self.test_mistakes_file):
-            os.remove(self.test_mistakes_file)
+        for path in (self.test_mistakes_file, self.test_journal_file):
+            if os.path.exists(path):
+                os.remove(path)
 
     def tearDown(self):
-        """Clean up the temporary mistakes file after each test."""
-        if os.path.exists(self.test_mistakes_file):
-            os.remove(self.test_mistakes_file)
+        """Clean up the temporary mistakes files after each test."""
+        mistake_book_service._stores.pop(self.test_mistakes_file, None)
+        for path in (self.test_mistakes_file, self.test_journal_file):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_add_mistake_when_incorrect(self):
         """Verify that a mistake is added when the analysis marks the answer as incorrect."""
@@ -44,16 +50,14 @@ class TestMistakeBookService(unittest.TestCase):
         # Assertions
         self.assertTrue(success, "The save operation should succeed.")
         
-        # Verify the content of the mistakes file
-        with open(self.test_mistakes_file, 'r', encoding='utf-8') as f:
-            mistakes_data = json.load(f)
-        
-        self.assertIn(user_id, mistakes_data, "User ID should be a key in the mistakes data.")
-        self.assertEqual(len(mistakes_data[user_id]), 1, "There should be one mistake entry for the user.")
+        # Verify the content of the mistake book
+        user_mistakes = mistake_book_service.get_user_mistakes(user_id)
+        self.assertEqual(len(user_mistakes), 1, "There should be one mistake entry for the user.")
         
-        mistake_entry = mistakes_data[user_id][0]
+        mistake_entry = user_mistakes[0]
         self.assertEqual(mistake_entry['question_id'], question_id)
         self.assertEqual(mistake_entry['review_status'], "needs_review")
+        self.assertEqual(mistake_entry['subject'], "Math")
 
     def test_no_mistake_when_correct(self):
         """Verify that no mistake is added when the analysis marks the answer as correct."""
@@ -71,14 +75,9 @@ class TestMistakeBookService(unittest.TestCase):
         # Assertions
         self.assertTrue(success, "The operation should be considered successful.")
         
-        # Verify that the mistakes file was NOT created or is empty
-        if os.path.exists(self.test_mistakes_file):
-            with open(self.test_mistakes_file, 'r', encoding='utf-8') as f:
-                mistakes_data = json.load(f)
-            self.assertNotIn(user_id, mistakes_data, "User ID should not be in the mistakes data for a correct answer.")
-        else:
-            # If the file doesn't even exist, that's also a pass
-            self.assertTrue(True)
+        # Verify that nothing was recorded or written for the user
+        self.assertEqual(mistake_book_service.get_user_mistakes(user_id), [])
+        self.assertFalse(os.path.exists(self.test_journal_file), "No journal should be written for a correct answer.")
 
     def test_no_duplicate_mistakes(self):
         """Verify that adding the same incorrect question multiple times does not create duplicate entries."""
@@ -93,10 +92,89 @@ class TestMistakeBookService(unittest.TestCase):
         mistake_book_service.add_mistake_if_incorrect(user_id, question_id, incorrect_analysis, submitted_text)
 
         # Verify the content
+        self.assertEqual(len(mistake_book_service.get_user_mistakes(user_id)), 1, "There should only be one entry for the same mistake.")
+        with open(self.test_journal_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1, "The duplicate should not be written to the journal.")
+
+    def test_query_by_indexes(self):
+        """Verify filtering by subject, knowledge point and review status."""
+        user_id = "test_user_04"
+        mistake_book_service.add_mistake_if_incorrect(
+            user_id, "q1", {"is_correct": False, "subject": "数学", "knowledge_point": "分数"}, "1/2 + 1/3 = 2/5")
+        mistake_book_service.add_mistake_if_incorrect(
+            user_id, "q2", {"is_correct": False, "subject": "数学", "knowledge_point": "小数"}, "0.1 + 0.2 = 0.4")
+        mistake_book_service.add_mistake_if_incorrect(
+            user_id, "q3", {"is_correct": False, "subject": "英语", "knowledge_point": "语法"}, "I has a book.")
+
+        self.assertEqual({m['question_id'] for m in mistake_book_service.get_user_mistakes(user_id, subject="数学")}, {"q1", "q2"})
+        self.assertEqual([m['question_id'] for m in mistake_book_service.get_user_mistakes(user_id, knowledge_point="语法")], ["q3"])
+
+        self.assertTrue(mistake_book_service.update_review_status(user_id, "q1", "mastered"))
+        self.assertEqual([m['question_id'] for m in mistake_book_service.get_user_mistakes(user_id, review_status="mastered")], ["q1"])
+        self.assertEqual([m['question_id'] for m in mistake_book_service.get_user_mistakes(user_id, subject="数学", review_status="needs_review")], ["q2"])
+        self.assertFalse(mistake_book_service.update_review_status(user_id, "q1", "unknown"))
+        self.assertFalse(mistake_book_service.update_review_status(user_id, "missing", "reviewed"))
+
+    def test_journal_replay_and_compaction(self):
+        """Verify that a fresh store rebuilds state from the journal and that compaction writes the snapshot."""
+        user_id = "test_user_05"
+        store = mistake_book_service.MistakeBookStore(self.test_mistakes_file, compact_threshold=3)
+        store.add({"user_id": user_id, "question_id": "q1", "subject": "数学", "review_status": "needs_review"})
+        store.add({"user_id": user_id, "question_id": "q2", "subject": "数学", "review_status": "needs_review"})
+        store.update(user_id, "q1", review_status="reviewed")
+
+        # The third journal record triggers compaction into the snapshot file
+        self.assertFalse(os.path.exists(self.test_journal_file))
         with open(self.test_mistakes_file, 'r', encoding='utf-8') as f:
-            mistakes_data = json.load(f)
-        
-        self.assertEqual(len(mistakes_data[user_id]), 1, "There should only be one entry for the same mistake.")
+            self.assertEqual(len(json.load(f)[user_id]), 2)
+
+        store.add({"user_id": user_id, "question_id": "q3", "subject": "英语", "review_status": "needs_review"})
+        reloaded = mistake_book_service.MistakeBookStore(self.test_mistakes_file, compact_threshold=3)
+        self.assertEqual(reloaded.count(user_id), 3)
+        self.assertEqual(reloaded.get(user_id, "q1")['review_status'], "reviewed")
+        self.assertEqual(len(reloaded.query(user_id, subject="数学")), 2)
+
+    def test_record_review_schedules_and_sets_status(self):
+        """Verify that reviews go through the SM-2 scheduler, which also drives review_status and the due list."""
+        user_id = "test_user_06"
+        for question_id in ("q1", "q2"):
+            mistake_book_service.add_mistake_if_incorrect(user_id, question_id, {"is_correct": False}, "1 + 1 = 3")
+        # Entries were just added; review a day later so both are already due
+        reviewed_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+
+        self.assertTrue(mistake_book_service.record_review(user_id, "q1", 5, reviewed_at=reviewed_at))
+        entry = mistake_book_service.get_store().get(user_id, "q1")
+        self.assertEqual(entry['review_status'], "reviewed")
+        self.assertEqual(entry['interval_days'], 1)
+        self.assertEqual(entry['next_review_at'], (reviewed_at + datetime.timedelta(days=1)).isoformat())
+        self.assertFalse(mistake_book_service.record_review(user_id, "missing", 5))
+
+        due = mistake_book_service.get_due_mistakes(user_id, now=reviewed_at)
+        self.assertEqual([e['question_id'] for e in due], ["q2"])
+        later = reviewed_at + datetime.timedelta(days=2)
+        self.assertEqual({e['question_id'] for e in mistake_book_service.get_due_mistakes(user_id, now=later)},
+                         {"q1", "q2"})
+
+    def test_due_queue_is_built_once_and_kept_in_step(self):
+        """Verify that the due list comes from one per-process queue updated by adds and reviews, in UTC."""
+        user_id = "test_user_07"
+        mistake_book_service.add_mistake_if_incorrect(user_id, "q1", {"is_correct": False}, "1 + 1 = 3")
+        added = datetime.datetime.fromisoformat(mistake_book_service.get_store().get(user_id, "q1")['added_timestamp'])
+        self.assertEqual(added.utcoffset(), datetime.timedelta(0))
+
+        now = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=1)
+        with patch.object(review_scheduler.ReviewScheduler, 'load_items',
+                          autospec=True, side_effect=review_scheduler.ReviewScheduler.load_items) as load_items:
+            self.assertEqual([e['question_id'] for e in mistake_book_service.get_due_mistakes(user_id, now=now)],
+                             ["q1"])
+            # Another user with the same question does not collide in the shared queue
+            mistake_book_service.add_mistake_if_incorrect("test_user_08", "q1", {"is_correct": False}, "2 + 2 = 5")
+            mistake_book_service.add_mistake_if_incorrect(user_id, "q2", {"is_correct": False}, "3 + 3 = 7")
+            mistake_book_service.record_review(user_id, "q1", 5, reviewed_at=now)
+            self.assertEqual([e['question_id'] for e in mistake_book_service.get_due_mistakes(user_id, now=now)],
+                             ["q2"])
+            self.assertEqual(len(mistake_book_service.get_due_mistakes("test_user_08", now=now)), 1)
+        self.assertEqual(load_items.call_count, 1)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,211 @@
+"""
+分级模型路由测试
+端点指向本地的桩服务（兼容OpenAI接口），按模型名模拟延迟和错误
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import llm_service
+from services import model_router as router_module
+from services.model_router import LARGE, SMALL, ModelEndpoint, ModelRouter, classify
+
+EASY = '中国的首都是北京'
+HARD = '证明：三角形的内角和等于180度'
+
+
+class StubLLM:
+    """本地桩服务：behavior[模型名] = {'delay': 秒, 'delays': [前几次请求的秒数], 'status': HTTP状态码}"""
+
+    def __init__(self):
+        self.behavior = {}
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                model = body['model']
+                stub.calls.append(model)
+                behavior = stub.behavior.get(model, {})
+                delays = behavior.get('delays')
+                time.sleep(delays.pop(0) if delays else behavior.get('delay', 0))
+                status = behavior.get('status', 200)
+                content = json.dumps({'subject': '测试', 'knowledge_point': model}, ensure_ascii=False)
+                payload = {
+                    'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': model,
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': f"```json\n{content}\n```"}}],
+                    'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+                } if status == 200 else {'error': {'message': 'stub failure', 'type': 'server_error'}}
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubLLM()
+    yield server
+    server.close()
+
+
+def make_router(stub, **options):
+    endpoints = {
+        SMALL: ModelEndpoint('small', 'stub-small', stub.base_url, api_key='test', latency_slo_ms=2000, timeout_s=5),
+        LARGE: ModelEndpoint('large', 'stub-large', stub.base_url, api_key='test', cost=4.0,
+                             latency_slo_ms=5000, timeout_s=5),
+    }
+    options.setdefault('min_hedge_ms', 1000)
+    return ModelRouter(endpoints, **options)
+
+
+def served_by(result):
+    return json.loads(result.split('```json\n')[1].split('\n```')[0])['knowledge_point']
+
+
+class TestClassify:
+    @pytest.mark.parametrize('text', ['1 + 1 = 3', EASY, 'What is the capital of China? Beijing',
+                                      '长方形长5厘米，宽3厘米，周长是多少？'])
+    def test_easy(self, text):
+        assert classify(text).tier == SMALL
+
+    @pytest.mark.parametrize('text', [
+        HARD,
+        '甲乙两地相距360千米，一辆汽车从甲地开往乙地，前2小时行了120千米，照这样的速度，还要几小时到达乙地？',
+        '阅读下面的短文，回答问题。\n' + '春天来了，' * 30,
+    ])
+    def test_hard(self, text):
+        assert classify(text).tier == LARGE
+
+    def test_fast_grader_items_are_easy(self):
+        assert classify('2x + 3 = 7, x = 2').reasons == ['fast_grader']
+
+
+class TestModelRouter:
+    def test_routes_by_difficulty(self, stub):
+        router = make_router(stub)
+        assert served_by(router.analyze(EASY)) == 'stub-small'
+        assert served_by(router.analyze(HARD)) == 'stub-large'
+        assert stub.calls == ['stub-small', 'stub-large']
+        assert router.stats['routed_small'] == 1 and router.stats['routed_large'] == 1
+
+    def test_failure_fails_over_and_steers_traffic(self, stub):
+        stub.behavior['stub-small'] = {'status': 500}
+        router = make_router(stub)
+        for _ in range(4):
+            assert served_by(router.analyze(EASY)) == 'stub-large'
+
+        small = router.endpoints[SMALL]
+        assert small.error_ewma >= router_module.ERROR_THRESHOLD and not small.healthy()
+        # 每次都先试小模型再转到大模型；错误率超过阈值后简单题直接发往大模型
+        assert stub.calls == ['stub-small', 'stub-large'] * 4
+        stub.calls.clear()
+        router.analyze(EASY)
+        assert stub.calls == ['stub-large'] and router.stats['steered'] >= 1
+
+    def test_default_endpoints_use_chat_model(self, monkeypatch):
+        for tier in (SMALL, LARGE):
+            monkeypatch.delenv(f"LLM_{tier.upper()}_MODEL", raising=False)
+            monkeypatch.delenv(f"LLM_{tier.upper()}_MAX_TOKENS", raising=False)
+        endpoints = router_module.default_endpoints()
+        assert endpoints[SMALL].model == endpoints[LARGE].model == router_module.DEFAULT_MODEL
+        assert endpoints[LARGE].max_tokens > endpoints[SMALL].max_tokens
+
+    def test_unhealthy_endpoint_is_probed_after_cooldown(self, stub):
+        router = make_router(stub)
+        small = router.endpoints[SMALL]
+        small.error_ewma, small.last_error_at = 1.0, time.monotonic()
+        assert router.candidates(SMALL)[0] is router.endpoints[LARGE]
+        small.last_error_at -= router_module.COOLDOWN_SECONDS + 1
+        assert router.candidates(SMALL)[0] is small
+
+    def test_slow_endpoint_is_steered_by_latency(self, stub):
+        router = make_router(stub)
+        large = router.endpoints[LARGE]
+        large.record(9000, ok=True)
+        assert router.candidates(LARGE)[0] is router.endpoints[SMALL]
+        # 冷却期过后放请求试探，试探请求恢复正常后EWMA回落
+        large.last_slow_at -= router_module.COOLDOWN_SECONDS + 1
+        assert router.candidates(LARGE)[0] is large
+        assert served_by(router.analyze(HARD)) == 'stub-large'
+        assert large.latency_ewma_ms < 9000
+
+    def test_hedge_fires_for_tail_latency(self, stub):
+        # 只有第一次请求慢：对冲请求发往同一档位并先返回
+        stub.behavior['stub-small'] = {'delays': [1.5]}
+        router = make_router(stub, min_hedge_ms=100)
+        router.endpoints[SMALL].latency_ewma_ms = 20
+
+        t0 = time.perf_counter()
+        result = router.analyze(EASY)
+        assert time.perf_counter() - t0 < 1.0
+        assert served_by(result) == 'stub-small'
+        assert stub.calls == ['stub-small', 'stub-small']
+        assert router.stats['hedged'] == 1 and router.stats['hedge_wins'] == 1
+        # 落后的请求在后台跑完，延迟仍计入EWMA
+        assert wait_until(lambda: router.endpoints[SMALL].requests == 2)
+        assert router.endpoints[LARGE].requests == 0
+
+    def test_failed_hedge_pair_fails_over(self, stub):
+        stub.behavior['stub-small'] = {'delays': [0.3], 'status': 500}
+        router = make_router(stub, min_hedge_ms=100)
+        router.endpoints[SMALL].latency_ewma_ms = 20
+
+        assert served_by(router.analyze(EASY)) == 'stub-large'
+        assert router.stats['hedged'] == 1 and router.stats['failovers'] == 1
+
+    def test_hedges_are_rate_limited(self, stub):
+        stub.behavior['stub-small'] = {'delay': 0.3}
+        router = make_router(stub, min_hedge_ms=50, max_hedge_ratio=0)
+        router.endpoints[SMALL].latency_ewma_ms = 10
+        router.analyze(EASY)
+        router.analyze(EASY)
+        assert router.stats['hedged'] == 1
+
+    def test_all_endpoints_failing_raises(self, stub):
+        stub.behavior = {'stub-small': {'status': 500}, 'stub-large': {'status': 500}}
+        router = make_router(stub)
+        with pytest.raises(Exception):
+            router.analyze(EASY)
+        assert router.stats['failovers'] == 1
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_llm_service_uses_router_when_enabled():
+    with patch.object(router_module, 'ENABLED', True), \
+            patch.object(router_module.model_router, 'analyze', return_value='routed') as analyze:
+        assert llm_service.get_analysis_for_text(EASY) == 'routed'
+        analyze.assert_called_once_with(EASY)
+    with patch.object(router_module, 'ENABLED', False), \
+            patch('services.llm_service.analyze_question_with_gpt4', return_value='direct'):
+        assert llm_service.get_analysis_for_text(EASY) == 'direct'
@@ -0,0 +1,121 @@
+"""
+密码哈希服务测试
+"""
+
+import os
+import sys
+import asyncio
+from unittest.mock import MagicMock
+
+import bcrypt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.auth_service import AuthService
+from services.password_hasher import PasswordHasher, PasswordHasherBusy, hash_rounds
+from services.token_cache import TokenCache
+
+
+@pytest.fixture
+def hasher():
+    return PasswordHasher(rounds=4, workers=0)
+
+
+class TestPasswordHasher:
+    def test_hash_and_verify(self, hasher):
+        password_hash = hasher.hash('testpassword123')
+        assert hash_rounds(password_hash) == 4
+        assert hasher.verify('testpassword123', password_hash) is True
+        assert hasher.verify('wrongpassword', password_hash) is False
+        assert hasher.verify('testpassword123', 'not-a-bcrypt-hash') is False
+
+    def test_async_api(self, hasher):
+        async def run():
+            password_hash = await hasher.hash_async('testpassword123')
+            return await hasher.verify_async('testpassword123', password_hash)
+        assert asyncio.run(run()) is True
+
+    def test_process_pool(self):
+        hasher = PasswordHasher(rounds=4, workers=1)
+        try:
+            password_hash = hasher.hash('testpassword123')
+            assert hasher.verify('testpassword123', password_hash) is True
+        finally:
+            hasher.shutdown()
+
+    def test_backpressure(self):
+        hasher = PasswordHasher(rounds=4, workers=0, max_pending=1, queue_timeout=0.01)
+        hasher._slots.acquire()
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('testpassword123')
+        with pytest.raises(PasswordHasherBusy):
+            asyncio.run(hasher.verify_async('testpassword123', 'x'))
+        assert hasher.stats['rejected'] == 2
+        hasher._slots.release()
+        assert hasher.hash('testpassword123')
+
+    def test_needs_rehash(self, hasher):
+        assert hasher.needs_rehash(bcrypt.hashpw(b'pw', bcrypt.gensalt(5)).decode()) is True
+        assert hasher.needs_rehash(hasher.hash('pw')) is False
+        assert hasher.needs_rehash('plain') is False
+
+
+@pytest.fixture
+def session():
+    return MagicMock()
+
+
+@pytest.fixture
+def auth_service(session, hasher):
+    data_service = MagicMock()
+    data_service.get_session.return_value.__enter__.return_value = session
+    return AuthService(data_service, token_cache=TokenCache(), password_hasher=hasher)
+
+
+def _user_row(password_hash):
+    row = MagicMock()
+    row._mapping = {
+        'id': 'student_1', 'name': '张三', 'email': 'a@example.com', 'role': 'student',
+        'password_hash': password_hash, 'salt': password_hash[:29], 'permissions': [], 'status': 'active'
+    }
+    return row
+
+
+class TestAuthServiceHashing:
+    def test_salt_is_embedded_in_hash(self, auth_service):
+        password_hash, salt = auth_service.hash_password('testpassword123')
+        assert password_hash.startswith(salt) and len(salt) == 29
+        assert auth_service.verify_password('testpassword123', password_hash, salt) is True
+        assert auth_service.verify_password('testpassword123', password_hash, 'wrong_salt') is False
+
+    def test_login_rehashes_outdated_cost(self, auth_service, session):
+        old_hash = bcrypt.hashpw(b'testpassword123', bcrypt.gensalt(5)).decode()
+        session.execute.return_value.fetchone.return_value = _user_row(old_hash)
+
+        success, _, auth_data = auth_service.login_user('a@example.com', 'testpassword123')
+        assert success is True and auth_data['user']['id'] == 'student_1'
+
+        params = session.execute.call_args_list[-1][0][1]
+        assert hash_rounds(params['password_hash']) == 4
+        assert bcrypt.checkpw(b'testpassword123', params['password_hash'].encode())
+
+    def test_login_without_rehash(self, auth_service, session):
+        session.execute.return_value.fetchone.return_value = _user_row(auth_service.hash_password('testpassword123')[0])
+        assert auth_service.login_user('a@example.com', 'testpassword123')[0] is True
+        assert 'password_hash' not in session.execute.call_args_list[-1][0][1]
+
+    def test_login_async(self, auth_service, session):
+        session.execute.return_value.fetchone.return_value = _user_row(auth_service.hash_password('testpassword123')[0])
+        assert asyncio.run(auth_service.login_user_async('a@example.com', 'testpassword123'))[0] is True
+        success, message, _ = asyncio.run(auth_service.login_user_async('a@example.com', 'wrongpassword'))
+        assert success is False and message == "邮箱或密码错误"
+
+    def test_login_async_propagates_busy(self, auth_service, session, hasher):
+        session.execute.return_value.fetchone.return_value = _user_row(auth_service.hash_password('testpassword123')[0])
+        hasher.max_pending = 1
+        hasher._slots = type(hasher._slots)(1)
+        hasher._slots.acquire()
+        with pytest.raises(PasswordHasherBusy):
+            asyncio.run(auth_service.login_user_async('a@example.com', 'testpassword123'))
+        assert auth_service.login_user('a@example.com', 'testpassword123')[1] == "登录请求过多，请稍后重试"
@@ -0,0 +1,98 @@
+"""
+题目全文检索服务测试
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import question_manager as qm
+from services import question_search_service as qss
+from services.question_search_service import QuestionSearchIndex, parse_query, tokenize
+
+
+BANK = {
+    'q1': {'canonical_text': '解一元二次方程 x^2-4=0', 'master_analysis': {'subject': '数学', 'difficulty_level': 2}},
+    'q2': {'canonical_text': '求二次函数 y=x^2+2x 的顶点坐标 function', 'master_analysis': {'subject': '数学', 'difficulty_level': 3}},
+    'q3': {'canonical_text': '默写古诗《静夜思》', 'master_analysis': {'subject': '语文', 'difficulty_level': 1}},
+    'q4': {'canonical_text': '二次根式化简：二次根式的性质', 'master_analysis': {'subject': '数学', 'difficulty_level': 2}},
+}
+
+
+@pytest.fixture
+def index():
+    return QuestionSearchIndex.from_bank(BANK)
+
+
+class TestTokenizer:
+    def test_cjk_bigrams_and_ascii_words(self):
+        assert [t for t, _, _ in tokenize('解方程 Function 3x')] == ['解方', '方程', 'function', '3x']
+
+    def test_parse_query(self):
+        assert parse_query('二次 "一元 二次" func*') == [
+            {'text': '二次', 'phrase': False, 'prefix': False},
+            {'text': '一元 二次', 'phrase': True, 'prefix': False},
+            {'text': 'func', 'phrase': False, 'prefix': True},
+        ]
+        assert parse_query('  ') == []
+
+
+class TestQuestionSearchIndex:
+    def test_ranked_results_with_highlight(self, index):
+        result = index.search('二次根式')
+        assert result['total'] == 1
+        hit = result['results'][0]
+        assert hit['question_id'] == 'q4'
+        assert hit['highlight'] == '<mark>二次根式</mark>化简：<mark>二次根式</mark>的性质'
+
+        # 词频更高的题目排在前面
+        ranked = [r['question_id'] for r in index.search('二次')['results']]
+        assert ranked[0] == 'q4'
+        assert set(ranked) == {'q1', 'q2', 'q4'}
+
+    def test_terms_are_anded(self, index):
+        assert [r['question_id'] for r in index.search('二次 顶点')['results']] == ['q2']
+        assert index.search('二次 静夜思')['total'] == 0
+
+    def test_phrase_requires_adjacency(self, index):
+        assert index.search('"一元二次"')['total'] == 1
+        assert index.search('"一元方程"')['total'] == 0
+
+    def test_prefix_and_single_character(self, index):
+        assert [r['question_id'] for r in index.search('func*')['results']] == ['q2']
+        assert index.search('func')['total'] == 0
+        assert {r['question_id'] for r in index.search('思')['results']} == {'q3'}
+
+    def test_filters_and_pagination(self, index):
+        assert [r['question_id'] for r in index.search('二次', difficulty_level=3)['results']] == ['q2']
+        assert index.search('二次', subject='语文')['total'] == 0
+        page1 = index.search('二次', limit=2, offset=0)
+        page2 = index.search('二次', limit=2, offset=2)
+        assert page1['total'] == page2['total'] == 3
+        assert len(page1['results']) == 2 and len(page2['results']) == 1
+
+    def test_update_and_remove(self, index):
+        index.add('q3', '背诵古诗《春晓》', subject='语文')
+        assert index.search('静夜思')['total'] == 0
+        assert index.search('春晓')['total'] == 1
+        index.remove('q3')
+        assert index.search('春晓')['total'] == 0
+
+
+class TestBankIndex:
+    def test_rebuilds_when_bank_changes(self, tmp_path, monkeypatch):
+        bank_file = tmp_path / 'bank.json'
+        bank_file.write_text(json.dumps(BANK, ensure_ascii=False), encoding='utf-8')
+        monkeypatch.setattr(qm, 'BANK_FILE', str(bank_file))
+        monkeypatch.setattr(qss, '_index', None)
+
+        assert qss.search_questions('静夜思')['total'] == 1
+        assert qss.get_search_index() is qss.get_search_index()
+
+        bank = dict(BANK, q5={'canonical_text': '静夜思的作者是谁', 'master_analysis': {'subject': '语文'}})
+        bank_file.write_text(json.dumps(bank, ensure_ascii=False), encoding='utf-8')
+        assert qss.search_questions('静夜思')['total'] == 2
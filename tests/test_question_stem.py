@@ -0,0 +1,143 @@
+"""
+题干与学生答案分离测试
+"""
+
+import os
+import sys
+import json
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import question_manager as qm
+from services.question_stem import local_verdict, merge_analysis, numeric_tokens, same_numbers, split_stem_answer
+
+
+class TestSplitStemAnswer:
+    @pytest.mark.parametrize('text, stem, answer', [
+        ('中国的首都是哪里？答：北京', '中国的首都是哪里？', '北京'),
+        ('下列哪个是质数？A.4 B.6 C.7 D.9\n答案：C', '下列哪个是质数？A.4 B.6 C.7 D.9', 'C'),
+        ('长方形长5厘米，宽3厘米，面积是（15）平方厘米', '长方形长5厘米，宽3厘米，面积是（ ）平方厘米', '15'),
+        ('床前明月光，__疑是地上霜__', '床前明月光，（ ）', '疑是地上霜'),
+        ('25 × 4 = 100', '25 × 4 =', '100'),
+        ('下列哪个是质数？（ C ）A.4 B.6 C.7 D.9', '下列哪个是质数？（ ）A.4 B.6 C.7 D.9', 'C'),
+        ('《静夜思》的作者是（ 杜甫 ）', '《静夜思》的作者是（ ）', '杜甫'),
+        ('如图（1），三角形的内角和是（ 180 ）度', '如图（1），三角形的内角和是（ ）度', '180'),
+    ])
+    def test_splits_filled_answer(self, text, stem, answer):
+        assert split_stem_answer(text) == (stem, answer)
+
+    @pytest.mark.parametrize('text', [
+        '直角三角形两条直角边为3和4，斜边为6',
+        '计算下面各题（5分）',
+        '长方形的面积是多少？（单位：平方厘米）',
+        '2x + 3 = 7',
+        '',
+    ])
+    def test_keeps_text_without_answer(self, text):
+        assert split_stem_answer(text) == (text, '')
+
+    @pytest.mark.parametrize('text', [
+        '如图（1），求角A的度数',
+        '第（2）题中，三角形的周长是多少？',
+        '小明（男孩）今年几岁？',
+        '计算下面各题（写出过程）：25×4',
+        '比较大小（保留两位小数）',
+        '（1）长方形的面积怎么求？',
+    ])
+    def test_references_and_annotations_are_not_answers(self, text):
+        assert split_stem_answer(text) == (text, '')
+
+    def test_overlong_answer_is_not_split(self):
+        text = '中国的首都是哪里？答：' + '北京是中国的首都，也是政治文化中心' * 3
+        assert split_stem_answer(text) == (text, '')
+
+    def test_same_stem_for_different_answers(self):
+        assert split_stem_answer('3 + 5 = （8）')[0] == split_stem_answer('3 + 5 = （9）')[0]
+
+
+class TestNumericTokens:
+    def test_tokens_in_order(self):
+        assert numeric_tokens('长方形长５厘米，宽3.5厘米') == ['5', '3.5']
+
+    def test_same_numbers(self):
+        assert same_numbers('两条直角边为3和4', '直角边分别是 3 和 4')
+        assert not same_numbers('两条直角边为3和4', '两条直角边为6和8')
+        assert not same_numbers('两条直角边为3和4', '两条直角边为4和3')
+
+
+class TestLocalVerdict:
+    @pytest.mark.parametrize('student, reference, expected', [
+        ('北京', '北京。', True),
+        ('０.５', '1/2', True),
+        ('15', '15平方厘米', True),
+        ('16', '15', False),
+        ('c', 'C. 7', True),
+        ('B', 'C', False),
+        ('3.4', '10/3', False),
+    ])
+    def test_local_cases(self, student, reference, expected):
+        assert local_verdict(student, reference)['is_correct'] is expected
+
+    @pytest.mark.parametrize('student, reference', [
+        ('杜甫', '李白'),
+        ('x = 2', '2'),
+        ('', '15'),
+        ('3.33', '10/3'),
+        ('0.67米', '2/3米'),
+    ])
+    def test_undecidable_needs_llm(self, student, reference):
+        assert local_verdict(student, reference) is None
+
+
+def test_merge_analysis_has_full_schema():
+    stem = {'subject': '数学', 'correct_answer': '15', 'solution_steps': '5 × 3 = 15',
+            'knowledge_point': '长方形面积', 'common_mistakes': '与周长混淆'}
+    merged = merge_analysis(stem, {'is_correct': False, 'error_analysis': '算成了周长'}, 'stem1', '16')
+    assert merged['is_correct'] is False and merged['error_analysis'] == '算成了周长'
+    assert merged['correct_answer'] == '15' and merged['stem_id'] == 'stem1' and merged['student_answer'] == '16'
+    assert merge_analysis(stem, {'is_correct': True, 'error_analysis': 'x'}, 'stem1', '15')['error_analysis'] == ''
+
+
+class TestStemBank:
+    @pytest.fixture(autouse=True)
+    def stem_bank(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(qm, 'STEM_BANK_FILE', str(tmp_path / 'stem_bank.json'))
+
+    def test_concurrent_saves_are_not_lost(self, monkeypatch):
+        monkeypatch.setattr(qm, 'STEM_JOURNAL_MAX_BYTES', 2000)
+        threads = [threading.Thread(target=qm.save_stem_analysis, args=(f's{i}', f'题干{i}', {'correct_answer': str(i)}))
+                   for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert {qm.get_stem_analysis(f's{i}')['correct_answer'] for i in range(50)} == {str(i) for i in range(50)}
+        # 日志超过大小后折叠进快照
+        with open(qm.STEM_BANK_FILE, encoding='utf-8') as f:
+            assert len(json.load(f)) > 0
+
+    def test_compaction_keeps_latest_analysis(self):
+        qm.save_stem_analysis('s1', '题干', {'correct_answer': '1'})
+        qm.save_stem_analysis('s1', '题干', {'correct_answer': '2'})
+        assert qm.compact_stem_bank()
+        assert not os.path.exists(qm.STEM_BANK_FILE + '.log')
+        assert qm.get_stem_analysis('s1') == {'correct_answer': '2'}
+        assert qm.load_stem_bank()['s1']['first_seen_timestamp']
+
+    def test_lookups_reuse_loaded_bank_until_files_change(self, monkeypatch):
+        qm.save_stem_analysis('s1', '题干', {'correct_answer': '1'})
+        loads = []
+        load_stem_bank = qm.load_stem_bank
+        monkeypatch.setattr(qm, 'load_stem_bank', lambda: loads.append(1) or load_stem_bank())
+
+        assert qm.get_stem_analysis('s1') == {'correct_answer': '1'}
+        assert qm.get_stem_analysis('s2') is None
+        assert len(loads) == 1
+        # 日志追加后文件大小变化，重新载入
+        qm.save_stem_analysis('s2', '题干2', {'correct_answer': '2'})
+        assert qm.get_stem_analysis('s2') == {'correct_answer': '2'}
+        assert len(loads) == 2
@@ -0,0 +1,108 @@
+"""
+练习题推荐器测试
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommender.recommender import QuestionRecommender
+
+
+SAMPLE = [
+    {"id": 1, "question": "什么是牛顿第一定律？", "knowledge_point": "牛顿运动定律", "explanation": "..."},
+]
+BANK = {
+    'f1': {'canonical_text': '计算 1/2 + 1/3', 'master_analysis': {'subject': '数学', 'knowledge_point': '分数加法', 'difficulty_level': 2}},
+    'f2': {'canonical_text': '计算 3/4 + 1/8', 'master_analysis': {'subject': '数学', 'knowledge_point': '分数加法', 'difficulty_level': 3}},
+    'g1': {'canonical_text': '求三角形面积', 'master_analysis': {'subject': '数学', 'knowledge_point': '三角形面积', 'difficulty_level': 2}},
+    'p1': {'canonical_text': '默写《静夜思》', 'master_analysis': {'subject': '语文', 'knowledge_point': '古诗默写', 'difficulty_level': 1}},
+    'x1': {'canonical_text': '没有知识点的题目', 'master_analysis': {'subject': '数学'}},
+}
+
+
+@pytest.fixture
+def recommender():
+    return QuestionRecommender.from_sources(SAMPLE, BANK)
+
+
+def mistake(question_id, knowledge_point, subject='数学', status='needs_review', days_ago=0):
+    return {'question_id': question_id, 'knowledge_point': knowledge_point, 'subject': subject,
+            'review_status': status, 'added_timestamp': (datetime.now() - timedelta(days=days_ago)).isoformat()}
+
+
+class TestQuestionRecommender:
+    def test_index_skips_questions_without_knowledge_point(self, recommender):
+        assert len(recommender) == 5
+        assert recommender.get('x1') is None
+        assert recommender.get(1)['knowledge_point'] == '牛顿运动定律'
+
+    def test_find_by_knowledge_point_exact_then_substring(self, recommender):
+        assert {q['id'] for q in recommender.find_by_knowledge_point('分数加法')} == {'f1', 'f2'}
+        assert [q['id'] for q in recommender.find_by_knowledge_point('牛顿')] == ['1']
+        assert recommender.find_by_knowledge_point('不存在') == []
+
+    def test_weak_knowledge_points_rank_first_and_seen_excluded(self, recommender):
+        mistakes = [mistake('f1', '分数加法'), mistake('g0', '三角形面积', status='mastered')]
+        results = recommender.recommend(mistakes, k=3)
+        assert [r['id'] for r in results][:2] == ['f2', 'g1']
+        assert results[0]['reason'] == '基于错题推荐'
+        assert 'f1' not in {r['id'] for r in results}
+
+    def test_recent_mistakes_outweigh_old_ones(self, recommender):
+        mistakes = [mistake('a', '三角形面积', days_ago=120), mistake('b', '分数加法', days_ago=1)]
+        assert recommender.recommend(mistakes, k=1)[0]['knowledge_point'] == '分数加法'
+
+    def test_filters(self, recommender):
+        mistakes = [mistake('f1', '分数加法')]
+        assert [r['id'] for r in recommender.recommend(mistakes, k=5, difficulty=2)] == ['g1']
+        assert [r['id'] for r in recommender.recommend(mistakes, k=5, subject='语文')] == ['p1']
+
+    def test_cold_start(self, recommender):
+        assert len(recommender.recommend([], k=3)) == 3
+
+    def test_recommend_for_class(self, recommender):
+        results = recommender.recommend_for_class({
+            's1': [mistake('f1', '分数加法')],
+            's2': [mistake('p0', '古诗默写', subject='语文')],
+        }, k=1)
+        assert results['s1'][0]['id'] == 'f2'
+        assert results['s2'][0]['id'] == 'p1'
+
+    def test_topk_is_fast_on_large_pool(self):
+        bank = {f"q{i}": {'canonical_text': f"题目{i}",
+                          'master_analysis': {'subject': '数学', 'knowledge_point': f"知识点{i % 500}"}}
+                for i in range(50000)}
+        large = QuestionRecommender.from_sources([], bank)
+        mistakes = [mistake(f"q{i}", f"知识点{i}") for i in range(3)]
+        large.recommend(mistakes, k=10)
+        t0 = time.perf_counter()
+        for _ in range(100):
+            results = large.recommend(mistakes, k=10)
+        assert (time.perf_counter() - t0) / 100 < 0.005
+        assert len(results) == 10
+
+
+def test_shared_recommender_reloads_when_bank_changes(tmp_path, monkeypatch):
+    from core import question_manager as qm
+    from recommender import recommender as recommender_module
+
+    monkeypatch.setattr(qm, 'BANK_FILE', str(tmp_path / 'bank.json'))
+    monkeypatch.setattr(qm, 'PHASH_MAP_FILE', str(tmp_path / 'phash.json'))
+    recommender_module.reset_recommender()
+    pool = str(tmp_path / 'missing_pool.json')
+    qm.add_question('f1', BANK['f1']['canonical_text'], BANK['f1']['master_analysis'], None, None)
+
+    shared = recommender_module.get_recommender(pool)
+    assert recommender_module.get_recommender(pool) is shared and len(shared) == 1
+
+    # 新入库的题目无需重启即进入推荐池
+    qm.add_question('g1', BANK['g1']['canonical_text'], BANK['g1']['master_analysis'], None, None)
+    reloaded = recommender_module.get_recommender(pool)
+    assert reloaded is not shared and reloaded.get('g1') is not None
+    recommender_module.reset_recommender()
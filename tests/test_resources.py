@@ -0,0 +1,133 @@
+"""
+进程级资源注册表测试
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.resources import ResourceRegistry, ResourceUnavailable, get_registry
+
+
+class FakeResource:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+        self.healthy = True
+
+    def close(self):
+        self.log.append(('close', self.name))
+
+
+def make_registry(log, **kwargs):
+    registry = ResourceRegistry(**kwargs)
+    for name in ('engine', 'client'):
+        registry.register(name, lambda name=name: log.append(('create', name)) or FakeResource(name, log),
+                          health_check=lambda r: r.healthy, close=FakeResource.close)
+    return registry
+
+
+class TestResourceRegistry:
+    def test_created_once_across_threads(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        registry = ResourceRegistry()
+        registry.register('ocr_engine', factory)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('ocr_engine'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert len({id(r) for r in results}) == 1
+        assert registry.get('ocr_engine') is results[0]
+
+    def test_failure_is_not_retried_until_backoff_expires(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('model missing')
+            return 'engine'
+
+        registry = ResourceRegistry(retry_after_seconds=60)
+        registry.register('ocr_engine', factory)
+        with pytest.raises(RuntimeError):
+            registry.get('ocr_engine')
+        with pytest.raises(ResourceUnavailable):
+            registry.get('ocr_engine')
+        assert len(attempts) == 1
+        assert registry.health()['ocr_engine']['error'] == 'model missing'
+
+        registry.retry_after_seconds = 0
+        assert registry.get('ocr_engine') == 'engine'
+        assert registry.health()['ocr_engine']['error'] is None
+
+    def test_warmup_and_health(self):
+        log = []
+        registry = make_registry(log)
+        assert registry.health()['engine'] == {'initialized': False, 'healthy': False,
+                                               'init_seconds': None, 'error': None}
+        assert log == []
+
+        assert registry.warmup(['engine']) == {'engine': True}
+        registry.get('engine').healthy = False
+        health = registry.health()
+        assert health['engine']['initialized'] and not health['engine']['healthy']
+        assert not health['client']['initialized']
+
+    def test_background_warmup(self):
+        log = []
+        registry = make_registry(log)
+        assert registry.warmup(background=True) == {}
+        registry._warmup_thread.join(5)
+        assert registry.peek('engine') is not None and registry.peek('client') is not None
+
+    def test_shutdown_closes_in_reverse_order(self):
+        log = []
+        registry = make_registry(log)
+        registry.get('client')
+        registry.get('engine')
+        registry.shutdown()
+        assert log[2:] == [('close', 'engine'), ('close', 'client')]
+        assert registry.peek('engine') is None
+
+        # 关闭后再次使用会重新创建
+        registry.get('engine')
+        assert log[-1] == ('create', 'engine')
+
+    def test_register_and_set(self):
+        log = []
+        registry = make_registry(log)
+        with pytest.raises(ValueError):
+            registry.register('engine', object)
+        with pytest.raises(KeyError):
+            registry.get('missing')
+
+        old = registry.get('engine')
+        registry.register('engine', lambda: 'new', replace=True)
+        assert ('close', 'engine') in log
+        assert registry.get('engine') == 'new'
+
+        registry.set('client', 'injected')
+        assert registry.get('client') == 'injected'
+        assert old is not registry.get('engine')
+
+
+def test_default_resources_are_registered_lazily():
+    registry = get_registry()
+    assert set(registry.names()) >= {'ocr_engine', 'vector_client', 'db_engine', 'llm_client'}
+    assert get_registry() is registry
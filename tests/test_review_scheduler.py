@@ -0,0 +1,130 @@
+"""
+ReviewScheduler 测试用例
+测试SM-2复习调度和到期队列
+"""
+
+import os
+import sys
+import pytest
+from unittest.mock import Mock
+from datetime import datetime, timedelta, timezone
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.review_scheduler import (
+    ReviewItem, ReviewScheduler, apply_sm2, review_status_for, MIN_EASE_FACTOR
+)
+
+NOW = datetime(2025, 9, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+
+class TestReviewScheduler:
+    """ReviewScheduler 测试类"""
+
+    @pytest.fixture
+    def scheduler(self):
+        """包含两个学生错题的调度器"""
+        scheduler = ReviewScheduler()
+        items = [
+            ReviewItem(entry_id=f'm{i}', user_id='student_01', next_review_at=NOW - timedelta(days=i))
+            for i in range(5)
+        ]
+        items.append(ReviewItem(entry_id='future', user_id='student_01', next_review_at=NOW + timedelta(days=3)))
+        items.append(ReviewItem(entry_id='other', user_id='student_02', next_review_at=NOW - timedelta(days=1)))
+        scheduler.load_items(items)
+        return scheduler
+
+    def test_sm2_intervals_grow_on_success(self):
+        """测试连续答对时间隔按 1 -> 6 -> EF 增长"""
+        item = ReviewItem(entry_id='m1', user_id='s1')
+        apply_sm2(item, 5, NOW)
+        assert item.interval_days == 1
+        apply_sm2(item, 5, NOW)
+        assert item.interval_days == 6
+        apply_sm2(item, 4, NOW)
+        assert item.interval_days == 16  # round(6 * 2.7)
+        assert item.review_count == 3
+        assert item.next_review_at == NOW + timedelta(days=item.interval_days)
+
+    def test_sm2_failure_resets(self):
+        """测试答错时重置间隔与掌握度，难度因子不低于下限"""
+        item = ReviewItem(entry_id='m1', user_id='s1', mastery_level=4, interval_days=30)
+        for _ in range(10):
+            apply_sm2(item, 0, NOW)
+        assert item.interval_days == 1
+        assert item.mastery_level == 1
+        assert item.ease_factor == MIN_EASE_FACTOR
+        assert review_status_for(item) == 'needs_review'
+
+    def test_next_due_ordering_and_limit(self, scheduler):
+        """测试按到期时间返回前N个，且不包含未到期和其他学生的条目"""
+        due = scheduler.next_due('student_01', limit=3, now=NOW)
+        assert [item.entry_id for item in due] == ['m4', 'm3', 'm2']
+
+        all_due = scheduler.next_due('student_01', limit=100, now=NOW)
+        assert 'future' not in {item.entry_id for item in all_due}
+        assert len(all_due) == 5
+        assert scheduler.due_count('student_01', now=NOW) == 5
+        assert scheduler.next_due('unknown', now=NOW) == []
+
+    def test_record_reviews_reorders_queue(self, scheduler):
+        """测试复习后的条目移到队列后面，并批量持久化"""
+        data_service = Mock()
+        scheduler.data_service = data_service
+
+        updated = scheduler.record_reviews([('m4', 5), ('m3', 5), ('missing', 5)], reviewed_at=NOW)
+
+        assert [item.entry_id for item in updated] == ['m4', 'm3']
+        due = scheduler.next_due('student_01', limit=10, now=NOW)
+        assert [item.entry_id for item in due] == ['m2', 'm1', 'm0']
+        data_service.update_review_schedules.assert_called_once()
+        assert len(data_service.update_review_schedules.call_args[0][0]) == 2
+
+    def test_remove_and_upsert(self, scheduler):
+        """测试删除与重复写入不会产生重复条目"""
+        scheduler.remove('m4')
+        item = scheduler.get_item('m3')
+        scheduler.upsert(item)
+        scheduler.upsert(item)
+        due = scheduler.next_due('student_01', limit=10, now=NOW)
+        assert [i.entry_id for i in due] == ['m3', 'm2', 'm1', 'm0']
+
+    def test_recompute_all(self):
+        """测试夜间重算根据上次复习时间修正到期时间"""
+        scheduler = ReviewScheduler()
+        item = ReviewItem(entry_id='m1', user_id='s1', interval_days=6,
+                          last_reviewed_at=NOW - timedelta(days=7), next_review_at=NOW + timedelta(days=30))
+        scheduler.load_items([item])
+        assert scheduler.next_due('s1', now=NOW) == []
+
+        assert scheduler.recompute_all(now=NOW) == 1
+        assert [i.entry_id for i in scheduler.next_due('s1', now=NOW)] == ['m1']
+
+    def test_from_row_handles_db_and_json_entries(self):
+        """测试从数据库行和JSON错题条目构造"""
+        db_item = ReviewItem.from_row({
+            'id': 'uuid-1', 'user_id': 's1', 'review_count': None, 'mastery_level': 2,
+            'last_reviewed_at': '2025-08-30T08:00:00+08:00', 'interval_days': 1,
+        })
+        assert db_item.next_review_at == datetime(2025, 8, 31, 0, 0, 0, tzinfo=timezone.utc)
+
+        json_item = ReviewItem.from_row({
+            'mistake_id': 'mistake_s1_q1', 'user_id': 's1', 'added_timestamp': '2025-08-01T10:00:00',
+        })
+        assert json_item.entry_id == 'mistake_s1_q1'
+        assert json_item.next_review_at == datetime(2025, 8, 1, 10, 0, 0, tzinfo=timezone.utc)
+
+    def test_times_are_timezone_aware(self, scheduler):
+        """测试写入 TIMESTAMPTZ 列的时间都带时区，未复习且加入时间未知的错题从现在起到期"""
+        item = ReviewItem.from_row({'id': 'm9', 'user_id': 's1'})
+        assert item.next_review_at.tzinfo is not None
+        assert item.next_review_at > NOW
+
+        scheduler.data_service = Mock()
+        scheduler.record_reviews([('m0', 4)], reviewed_at=datetime(2025, 9, 1, 8, 0, 0))
+        params = scheduler.data_service.update_review_schedules.call_args[0][0][0]
+        assert params['last_reviewed_at'] == NOW
+        assert params['next_review_at'] == NOW + timedelta(days=1)
+        # 不带时区的 now 按UTC处理
+        assert scheduler.due_count('student_01', now=datetime(2025, 9, 1, 8, 0, 0)) == 4
@@ -0,0 +1,344 @@
+"""
+智能搜题流水线测试
+"""
+
+import os
+import sys
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import question_manager as qm
+from services.search_pipeline import OCR_ERROR, SearchPipeline, SpeculationBudget
+
+USER = {'id': 'student_01', 'role': 'student'}
+QUESTION = '直角三角形两条直角边为3和4，斜边为6'
+ANALYSIS = {'subject': '数学', 'is_correct': False}
+ANSWERED = '一个长方形长5厘米，宽3厘米，面积是（ 15 ）平方厘米'
+STEM_ANALYSIS = {'subject': '数学', 'correct_answer': '15', 'solution_steps': '5 × 3 = 15',
+                 'knowledge_point': '长方形面积', 'common_mistakes': '与周长混淆'}
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / 'question.png'
+    Image.new('RGB', (64, 64), color='red').save(path)
+    return str(path)
+
+
+@pytest.fixture
+def services():
+    """替换流水线依赖的服务，默认所有缓存未命中"""
+    with patch('services.search_pipeline.storage_service') as storage, \
+            patch('services.search_pipeline.ocr_service') as ocr, \
+            patch('services.search_pipeline.llm_service') as llm, \
+            patch('services.search_pipeline.semantic_cache') as cache, \
+            patch('services.search_pipeline.mistake_book_service') as mistakes, \
+            patch('services.search_pipeline.qm.get_question_id_by_phash', return_value=None):
+        storage.get_question_by_phash_value.return_value = None
+        storage.get_question_by_id.return_value = None
+        storage.generate_question_id.side_effect = qm.generate_question_id
+        storage.add_question.return_value = True
+        storage.get_stem_analysis.return_value = None
+        ocr.get_text_from_image.return_value = [QUESTION]
+        llm.get_analysis_for_text.return_value = f"```json\n{json.dumps(ANALYSIS)}\n```"
+        llm.get_stem_analysis.return_value = json.dumps(STEM_ANALYSIS, ensure_ascii=False)
+        llm.check_answer.return_value = json.dumps({'is_correct': False, 'error_analysis': '算成了周长'})
+        llm.recheck_submission.return_value = json.dumps({'is_correct': True, 'error_analysis': ''})
+        cache.lookup.return_value = (None, None)
+        cache.nearest.return_value = None
+        yield MagicMock(storage=storage, ocr=ocr, llm=llm, cache=cache, mistakes=mistakes)
+
+
+def cached_question(question_id='q1'):
+    return {'question_id': question_id, 'canonical_text': QUESTION, 'master_analysis': ANALYSIS}
+
+
+class TestSearchPipeline:
+    def test_miss_runs_every_stage_and_saves_once(self, services, image_path):
+        result = SearchPipeline().run(USER, image_path, record_mistakes=True)
+
+        assert result.cache_status == 'miss' and result.analysis == ANALYSIS
+        assert result.question_id == qm.generate_question_id(QUESTION)
+        services.llm.get_analysis_for_text.assert_called_once_with(QUESTION)
+        # 解码后的图片直接交给OCR，phash随入库一起传入，不再重复读取图片
+        assert isinstance(services.ocr.get_text_from_image.call_args.args[0], Image.Image)
+        assert services.storage.add_question.call_args.kwargs['phash'] == qm.generate_phash(image_path)
+        services.mistakes.add_mistake_if_incorrect.assert_called_once()
+        services.cache.index_question.assert_called_once()
+        stages = {span['stage'] for span in result.spans}
+        assert stages == {'decode', 'phash', 'ocr', 'fast_grade', 'text_hash', 'semantic', 'llm', 'save'}
+
+    def test_phash_hit_does_not_wait_for_ocr(self, services, image_path):
+        release = threading.Event()
+
+        def slow_ocr(image):
+            release.wait(5)
+            return [QUESTION]
+
+        services.ocr.get_text_from_image.side_effect = slow_ocr
+        services.storage.get_question_by_phash_value.return_value = cached_question()
+        try:
+            result = SearchPipeline().run(USER, image_path)
+            assert not release.is_set()
+        finally:
+            release.set()
+
+        assert result.cache_status == 'phash_hit' and result.question_id == 'q1'
+        assert result.ocr_text == QUESTION
+        services.llm.get_analysis_for_text.assert_not_called()
+        services.storage.save_submission.assert_called_once_with('student_01', 'q1', '(Image match)')
+
+    def test_text_hash_hit_links_new_image(self, services, image_path):
+        services.storage.get_question_by_id.return_value = cached_question()
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.cache_status == 'text_hash_hit'
+        services.cache.lookup.assert_not_called()
+        assert services.storage.add_question.call_args.kwargs['phash'] == qm.generate_phash(image_path)
+        services.llm.get_analysis_for_text.assert_not_called()
+
+    def test_semantic_hit(self, services, image_path):
+        services.cache.lookup.return_value = ('q9', ('q9', 0.97))
+        services.storage.get_question_by_id.side_effect = lambda qid: cached_question('q9') if qid == 'q9' else None
+        neighbor = dict(cached_question('q9'), master_analysis=dict(
+            STEM_ANALYSIS, is_correct=False, error_analysis='斜边算错了'))
+        services.storage.get_question_by_id.side_effect = lambda qid: neighbor if qid == 'q9' else None
+        result = SearchPipeline().run(USER, image_path, record_mistakes=True)
+
+        # 只复用近似题目的讲解，对错针对本次文本重新判断；提交记在近似题目名下，不以本次文本入库
+        assert result.cache_status == 'semantic_hit'
+        assert result.question_id == 'q9'
+        services.llm.get_analysis_for_text.assert_not_called()
+        services.llm.recheck_submission.assert_called_once_with(QUESTION, '15')
+        assert result.analysis == dict(STEM_ANALYSIS, is_correct=True, error_analysis='')
+        services.storage.add_question.assert_not_called()
+        services.storage.save_submission.assert_called_once_with(USER['id'], 'q9', QUESTION)
+        services.mistakes.add_mistake_if_incorrect.assert_called_once_with(
+            USER['id'], result.question_id, result.analysis, QUESTION)
+        assert 'answer_check' in {span['stage'] for span in result.spans}
+
+    def test_semantic_neighbor_with_different_numbers_is_a_miss(self, services, image_path):
+        services.cache.lookup.return_value = ('q9', ('q9', 0.98))
+        neighbor = dict(cached_question('q9'), canonical_text='直角三角形两条直角边为6和8，斜边为10',
+                        master_analysis=dict(STEM_ANALYSIS, correct_answer='10'))
+        services.storage.get_question_by_id.side_effect = lambda qid: neighbor if qid == 'q9' else None
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.cache_status == 'miss' and result.question_id == qm.generate_question_id(QUESTION)
+        services.llm.recheck_submission.assert_not_called()
+        services.llm.get_analysis_for_text.assert_called_once_with(QUESTION)
+
+    def test_semantic_hit_with_unparsable_recheck_is_an_error(self, services, image_path):
+        services.cache.lookup.return_value = ('q9', ('q9', 0.97))
+        services.storage.get_question_by_id.side_effect = lambda qid: cached_question('q9') if qid == 'q9' else None
+        services.llm.recheck_submission.return_value = 'not json'
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.analysis is None and result.error.startswith('AI批改结果解析失败')
+        services.storage.add_question.assert_not_called()
+
+    def test_given_text_skips_ocr_and_image_match(self, services, image_path):
+        services.storage.get_question_by_phash_value.return_value = cached_question()
+        result = SearchPipeline().run(USER, image_path, ocr_text='中国的首都是上海')
+
+        assert result.cache_status == 'miss' and result.ocr_text == '中国的首都是上海'
+        services.ocr.get_text_from_image.assert_not_called()
+        services.storage.get_question_by_phash_value.assert_not_called()
+
+    def test_force_new_analysis_skips_caches(self, services, image_path):
+        services.storage.get_question_by_phash_value.return_value = cached_question()
+        services.storage.get_question_by_id.return_value = cached_question()
+        services.cache.nearest.return_value = ('q1', 0.5)
+        result = SearchPipeline().run(USER, image_path, force_new_analysis=True)
+
+        assert result.cache_status == 'miss'
+        services.cache.lookup.assert_not_called()
+        services.cache.record_outcome.assert_called_once()
+        services.llm.get_analysis_for_text.assert_called_once()
+
+    def test_arithmetic_is_graded_locally(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = ['1 + 1 = 3']
+        pipeline = SearchPipeline(speculative=True)
+        result = pipeline.run(USER, image_path, record_mistakes=True)
+
+        assert result.cache_status == 'local_grade'
+        assert result.analysis['is_correct'] is False and result.analysis['correct_answer'] == '1 + 1 = 2'
+        services.llm.get_analysis_for_text.assert_not_called()
+        services.cache.lookup.assert_not_called()
+        assert pipeline.stats['speculative_started'] == 0
+        # 本地判题结果和大模型结果一样入库、记入错题本
+        services.storage.add_question.assert_called_once()
+        services.mistakes.add_mistake_if_incorrect.assert_called_once()
+
+    def test_force_new_analysis_bypasses_local_grader(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = ['1 + 1 = 3']
+        services.storage.get_stem_analysis.return_value = STEM_ANALYSIS
+        result = SearchPipeline().run(USER, image_path, force_new_analysis=True)
+
+        # 重新分析时题干缓存也不使用
+        assert result.cache_status == 'miss'
+        services.storage.get_stem_analysis.assert_not_called()
+        services.llm.get_stem_analysis.assert_called_once_with('1 + 1 =')
+
+    def test_ocr_failure_without_cache_hit(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = ['识别失败']
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.analysis is None and result.error == OCR_ERROR
+        services.llm.get_analysis_for_text.assert_not_called()
+
+    def test_unparseable_llm_response(self, services, image_path):
+        services.llm.get_analysis_for_text.return_value = 'not json'
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.analysis is None and result.error.startswith('AI分析结果解析失败')
+        services.storage.add_question.assert_not_called()
+
+
+class TestStemCache:
+    def test_stem_miss_analyzes_stem_once_and_caches_it(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = [ANSWERED]
+        result = SearchPipeline().run(USER, image_path)
+
+        stem = '一个长方形长5厘米，宽3厘米，面积是（ ）平方厘米'
+        stem_id = qm.generate_question_id(stem)
+        assert result.cache_status == 'miss' and result.analysis['is_correct'] is True
+        assert result.analysis['stem_id'] == stem_id and result.analysis['student_answer'] == '15'
+        services.llm.get_stem_analysis.assert_called_once_with(stem)
+        services.storage.save_stem_analysis.assert_called_once_with(stem_id, stem, STEM_ANALYSIS)
+        # 答案与标准答案数值相同，本地即可判断；带答案的题目不查语义缓存
+        services.llm.check_answer.assert_not_called()
+        services.llm.get_analysis_for_text.assert_not_called()
+        services.cache.lookup.assert_not_called()
+        assert result.question_id == qm.generate_question_id(ANSWERED)
+        stages = {span['stage'] for span in result.spans}
+        assert 'stem' in stages and 'semantic' not in stages
+
+    def test_stem_hit_only_checks_the_answer(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = ['一个长方形长5厘米，宽3厘米，面积是（ 16 ）平方厘米']
+        services.storage.get_stem_analysis.return_value = STEM_ANALYSIS
+        result = SearchPipeline().run(USER, image_path, record_mistakes=True)
+
+        assert result.cache_status == 'stem_hit'
+        assert result.analysis['is_correct'] is False and result.analysis['knowledge_point'] == '长方形面积'
+        services.llm.get_stem_analysis.assert_not_called()
+        services.llm.get_analysis_for_text.assert_not_called()
+        services.storage.add_question.assert_called_once()
+        services.mistakes.add_mistake_if_incorrect.assert_called_once()
+
+    def test_answer_checked_by_llm_when_not_comparable(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = ['《静夜思》的作者是（ 杜甫 ）']
+        services.storage.get_stem_analysis.return_value = dict(STEM_ANALYSIS, correct_answer='李白')
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.cache_status == 'stem_hit'
+        services.llm.check_answer.assert_called_once_with('《静夜思》的作者是（ ）', '李白', '杜甫')
+        assert result.analysis['is_correct'] is False and result.analysis['error_analysis'] == '算成了周长'
+        assert 'answer_check' in {span['stage'] for span in result.spans}
+
+    def test_unparseable_answer_check(self, services, image_path):
+        services.ocr.get_text_from_image.return_value = ['《静夜思》的作者是（ 杜甫 ）']
+        services.storage.get_stem_analysis.return_value = dict(STEM_ANALYSIS, correct_answer='李白')
+        services.llm.check_answer.return_value = 'not json'
+        result = SearchPipeline().run(USER, image_path)
+
+        assert result.analysis is None and result.error.startswith('AI批改结果解析失败')
+        services.storage.add_question.assert_not_called()
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSpeculativeLLM:
+    def test_llm_overlaps_cache_lookups_on_miss(self, services, image_path):
+        llm_started = threading.Event()
+        services.llm.get_analysis_for_text.side_effect = \
+            lambda text: llm_started.set() or f"```json\n{json.dumps(ANALYSIS)}\n```"
+        # 语义查询要等大模型请求发出后才返回，串行执行时等待会超时
+        waited = []
+        services.cache.lookup.side_effect = lambda text: (waited.append(llm_started.wait(5)), (None, None))[1]
+        pipeline = SearchPipeline(speculative=True)
+        result = pipeline.run(USER, image_path)
+
+        assert waited == [True]
+        assert result.cache_status == 'miss' and result.analysis == ANALYSIS
+        services.llm.get_analysis_for_text.assert_called_once()
+        assert pipeline.stats['speculative_used'] == 1
+        assert pipeline.budget._inflight == 0
+
+    def test_speculative_calls_do_not_occupy_stage_threads(self, services, image_path):
+        release = threading.Event()
+        threads = []
+        services.llm.get_analysis_for_text.side_effect = \
+            lambda text: (threads.append(threading.current_thread().name), release.wait(5))[1] and 'late'
+        services.storage.get_question_by_id.return_value = cached_question()
+        pipeline = SearchPipeline(max_workers=2, speculative=True)
+        try:
+            first = pipeline.run(USER, image_path)
+            assert wait_until(lambda: threads)
+            # 预先请求仍在阻塞，另一次搜题的缓存阶段照常执行
+            second = pipeline.run(USER, image_path)
+        finally:
+            release.set()
+
+        assert first.cache_status == second.cache_status == 'text_hash_hit'
+        assert threads[0].startswith('search-speculative')
+
+    def test_cache_hit_abandons_speculation(self, services, image_path):
+        release = threading.Event()
+        services.llm.get_analysis_for_text.side_effect = lambda text: release.wait(5) and 'late'
+        services.storage.get_question_by_id.return_value = cached_question()
+        pipeline = SearchPipeline(speculative=True)
+        try:
+            result = pipeline.run(USER, image_path)
+        finally:
+            release.set()
+
+        assert result.cache_status == 'text_hash_hit' and result.analysis == ANALYSIS
+        assert wait_until(lambda: pipeline.stats['speculative_cancelled'] + pipeline.stats['speculative_wasted'] == 1)
+        assert pipeline.budget._inflight == 0
+
+    def test_semantic_hit_is_labelled_with_speculative_result(self, services, image_path):
+        fresh = {'subject': '数学', 'is_correct': True}
+        llm_done = threading.Event()
+
+        def llm(text):
+            llm_done.set()
+            return json.dumps(fresh)
+
+        services.llm.get_analysis_for_text.side_effect = llm
+        services.cache.lookup.side_effect = lambda text: (llm_done.wait(5), ('q9', ('q9', 0.97)))[1]
+        services.storage.get_question_by_id.side_effect = lambda qid: cached_question('q9') if qid == 'q9' else None
+        pipeline = SearchPipeline(speculative=True)
+        result = pipeline.run(USER, image_path)
+
+        assert result.cache_status == 'semantic_hit'
+        assert wait_until(lambda: services.cache.record_outcome.called)
+        services.cache.record_outcome.assert_called_once_with(('q9', 0.97), ANALYSIS, fresh)
+        assert pipeline.budget.wasted_last_hour() == 1
+
+    def test_exhausted_budget_falls_back_to_serial_call(self, services, image_path):
+        pipeline = SearchPipeline(speculative=True, budget=SpeculationBudget(max_inflight=2, max_wasted_per_hour=0))
+        result = pipeline.run(USER, image_path)
+
+        assert result.cache_status == 'miss'
+        services.llm.get_analysis_for_text.assert_called_once()
+        assert pipeline.stats['speculative_denied'] == 1 and pipeline.stats['speculative_started'] == 0
+
+
+def test_speculation_budget_limits():
+    budget = SpeculationBudget(max_inflight=1, max_wasted_per_hour=1)
+    assert budget.try_acquire() and not budget.try_acquire()
+    budget.release(wasted=True)
+    assert budget.wasted_last_hour() == 1 and not budget.try_acquire()
@@ -0,0 +1,149 @@
+"""
+语义缓存服务测试
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_service import EmbeddingService
+from services.semantic_cache_service import (
+    MODEL_THRESHOLDS, SemanticCache, analyses_agree, default_threshold, distance_to_similarity, evaluate_thresholds,
+    hit_rate, load_telemetry, suggest_threshold
+)
+
+
+class FakeVectorService:
+    """按预设距离返回最近邻的向量服务替身"""
+
+    def __init__(self, neighbor_id=None, distance=None):
+        self.neighbor_id = neighbor_id
+        self.distance = distance
+        self.collection = type('Collection', (), {'metadata': {'hnsw:space': 'cosine'}})()
+        self.indexed = []
+        self.model = None
+
+    def bind_embedding_model(self, model):
+        self.model = self.model or model
+        return self.model == model
+
+    def query_batch(self, query_texts=None, n_results=5, where=None, query_embeddings=None):
+        if self.neighbor_id is None:
+            return {'ids': [[]], 'distances': [[]]}
+        return {'ids': [[self.neighbor_id]], 'distances': [[self.distance]]}
+
+    def add_documents_batch(self, ids, documents, metadatas=None, embeddings=None):
+        assert len(embeddings) == len(ids)
+        self.indexed.extend(zip(ids, documents, metadatas))
+        return len(ids)
+
+
+def make_cache(vector_service, telemetry_file, **kwargs):
+    embeddings = EmbeddingService(encoder=lambda texts, batch_size: [[float(len(t)), 1.0] for t in texts])
+    return SemanticCache(vector_service, telemetry_file=telemetry_file, embedding_service=embeddings, **kwargs)
+
+
+@pytest.fixture
+def telemetry_file(tmp_path):
+    return str(tmp_path / 'telemetry.jsonl')
+
+
+class TestSimilarity:
+    def test_distance_conversion(self):
+        assert distance_to_similarity(0.05, 'cosine') == pytest.approx(0.95)
+        # 归一化向量的l2平方距离: d = 2 - 2cos
+        assert distance_to_similarity(0.2, 'l2') == pytest.approx(0.9)
+
+    def test_analyses_agree_ignores_whitespace_in_answer(self):
+        a = {'subject': '数学', 'is_correct': False, 'correct_answer': 'x = 2'}
+        b = {'subject': '数学', 'is_correct': False, 'correct_answer': 'x=2'}
+        assert analyses_agree(a, b)
+        assert not analyses_agree(a, dict(b, correct_answer='x=3'))
+        assert not analyses_agree(a, None)
+
+
+class TestSemanticCache:
+    def test_hit_above_threshold(self, telemetry_file):
+        cache = make_cache(FakeVectorService('q1', 0.03), telemetry_file, threshold=0.95, enabled=True)
+        hit_id, neighbor = cache.lookup("1+1=?")
+        assert hit_id == 'q1'
+        assert neighbor[1] == pytest.approx(0.97)
+        assert load_telemetry(telemetry_file)[0]['decision'] == 'hit'
+
+    def test_miss_below_threshold_still_reports_neighbor(self, telemetry_file):
+        cache = make_cache(FakeVectorService('q1', 0.2), telemetry_file, threshold=0.95, enabled=True)
+        hit_id, neighbor = cache.lookup("1+2=?")
+        assert hit_id is None
+        assert neighbor[0] == 'q1'
+
+    def test_empty_index_and_disabled(self, telemetry_file):
+        cache = make_cache(FakeVectorService(), telemetry_file, enabled=True)
+        assert cache.lookup("题目") == (None, None)
+        disabled = make_cache(FakeVectorService('q1', 0.0), telemetry_file, enabled=False)
+        assert disabled.nearest("题目") is None
+        assert not disabled.index_question('q2', '题目')
+
+    def test_index_from_another_model_disables_cache(self, telemetry_file):
+        service = FakeVectorService('q1', 0.01)
+        service.model = 'all-MiniLM-L6-v2'
+        cache = make_cache(service, telemetry_file, enabled=True)
+        assert cache.lookup("1+1=?") == (None, None)
+        assert not cache.index_question('q2', '新题目')
+        assert service.indexed == []
+
+    def test_index_question(self, telemetry_file):
+        service = FakeVectorService()
+        cache = make_cache(service, telemetry_file, enabled=True)
+        assert cache.index_question('q2', '新题目', {'subject': '数学', 'knowledge_point': '加法'})
+        assert service.indexed == [('q2', '新题目', {'subject': '数学', 'knowledge_point': '加法'})]
+
+
+class TestDefaultThreshold:
+    def test_threshold_follows_embedding_model(self, telemetry_file, monkeypatch):
+        monkeypatch.delenv('SEMANTIC_CACHE_THRESHOLD', raising=False)
+        cache = make_cache(FakeVectorService(), telemetry_file)
+        assert cache.threshold == MODEL_THRESHOLDS[cache.model_name]
+        assert default_threshold('all-MiniLM-L6-v2') == MODEL_THRESHOLDS['all-MiniLM-L6-v2']
+        monkeypatch.setenv('SEMANTIC_CACHE_THRESHOLD', '0.9')
+        assert default_threshold(cache.model_name) == 0.9
+
+
+class TestThresholdReport:
+    def test_precision_recall(self, telemetry_file):
+        cache = make_cache(FakeVectorService(), telemetry_file, enabled=True)
+        same = {'subject': '数学', 'is_correct': True, 'correct_answer': '2'}
+        other = dict(same, correct_answer='3')
+        cache.record_outcome(('a', 0.99), same, same)
+        cache.record_outcome(('b', 0.93), same, other)
+        cache.record_outcome(('c', 0.90), same, same)
+
+        report = {row['threshold']: row for row in evaluate_thresholds(load_telemetry(telemetry_file), [0.92, 0.95])}
+        assert report[0.92]['precision'] == 0.5
+        assert report[0.92]['recall'] == 0.5
+        assert report[0.95]['precision'] == 1.0
+        assert report[0.95]['samples'] == 3
+
+    def test_records_are_tagged_and_filtered_by_model(self, telemetry_file):
+        cache = make_cache(FakeVectorService('q1', 0.03), telemetry_file, enabled=True)
+        same = {'subject': '数学', 'is_correct': True, 'correct_answer': '2'}
+        cache.lookup("1+1=?")
+        cache.record_outcome(('a', 0.99), same, same)
+        records = load_telemetry(telemetry_file)
+        assert {r['model'] for r in records} == {cache.model_name}
+        records.append({'event': 'label', 'similarity': 0.99, 'agreed': False, 'model': 'all-MiniLM-L6-v2'})
+        assert evaluate_thresholds(records, [0.95], model=cache.model_name)[0]['precision'] == 1.0
+        assert evaluate_thresholds(records, [0.95])[0]['precision'] == 0.5
+
+    def test_suggest_threshold_picks_lowest_precise_threshold(self):
+        records = [{'event': 'label', 'similarity': s, 'agreed': s >= 0.93} for s in (0.90, 0.91, 0.93, 0.96, 0.99)]
+        report = evaluate_thresholds(records, [0.90, 0.92, 0.95])
+        assert suggest_threshold(report, min_precision=1.0, min_samples=5) == 0.92
+        assert suggest_threshold(report, min_precision=1.0, min_samples=6) is None
+
+    def test_hit_rate(self):
+        records = [{'event': 'lookup', 'decision': 'hit'}, {'event': 'lookup', 'decision': 'miss'}, {'event': 'label'}]
+        assert hit_rate(records) == 0.5
+        assert hit_rate([]) is None
@@ -0,0 +1,72 @@
+"""
+API服务容器测试
+"""
+
+import os
+import sys
+from unittest.mock import MagicMock
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.service_container import ServiceContainer, get_service_container, lifespan, set_service_container
+
+
+class FakeReaper:
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+def make_container(**kwargs):
+    kwargs.setdefault('reaper', FakeReaper())
+    return ServiceContainer(data_service=MagicMock(), **kwargs)
+
+
+class TestServiceContainer:
+    def test_services_created_once(self):
+        container = make_container(start_reaper=True)
+        container.startup()
+        auth_service = container.auth_service
+        container.startup()
+        assert container.auth_service is auth_service
+        assert auth_service.data_service is container.data_service
+        assert container.reaper.running
+
+        container.shutdown()
+        assert not container.started and not container._reaper.running
+        container._data_service.close.assert_called_once()
+
+    def test_starts_on_first_use(self):
+        container = make_container(start_reaper=False)
+        assert not container.started
+        assert container.auth_service is not None
+        assert container.started and not container._reaper.running
+
+    def test_lifespan_shares_services_across_requests(self):
+        container = make_container(start_reaper=True)
+        set_service_container(container)
+        try:
+            router = APIRouter(lifespan=lifespan)
+
+            @router.get('/service-id')
+            def service_id(services: ServiceContainer = Depends(get_service_container)):
+                return {'id': id(services.auth_service)}
+
+            app = FastAPI()
+            app.include_router(router)
+            with TestClient(app) as client:
+                assert container.started and app.state.services is container
+                ids = {client.get('/service-id').json()['id'] for _ in range(3)}
+                assert ids == {id(container.auth_service)}
+            assert not container.started
+            assert not container._reaper.running
+        finally:
+            set_service_container(None)
@@ -0,0 +1,83 @@
+"""
+会话清理服务测试
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.session_reaper import SessionReaper
+
+
+class FakeDataService:
+    """每次调用删除 min(batch_size, 剩余行数) 行"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self.leader = True
+
+    @contextmanager
+    def advisory_lock(self, key):
+        yield self.leader
+
+    def delete_expired_sessions(self, batch_size, inactive_grace_seconds):
+        self.calls.append((batch_size, inactive_grace_seconds))
+        deleted = min(batch_size, self.rows)
+        self.rows -= deleted
+        return deleted
+
+    def get_user_session_stats(self):
+        return {'total': self.rows}
+
+
+def make_reaper(rows, **kwargs):
+    kwargs.setdefault('batch_pause_seconds', 0)
+    return SessionReaper(FakeDataService(rows), **kwargs)
+
+
+class TestSessionReaper:
+    def test_run_once_deletes_until_partial_batch(self):
+        reaper = make_reaper(250, batch_size=100, inactive_grace_seconds=30)
+        assert reaper.run_once() == 250
+        assert reaper.data_service.calls == [(100, 30)] * 3
+        assert reaper.stats['deleted_total'] == 250 and reaper.stats['backlog'] is False
+        assert reaper.stats['last_rows_per_sec'] > 0
+
+    def test_max_batches_leaves_backlog(self):
+        reaper = make_reaper(1000, batch_size=100, max_batches=3)
+        assert reaper.run_once() == 300
+        assert reaper.stats['backlog'] is True
+        assert reaper.run_once() == 300
+        assert reaper.stats['runs'] == 2 and reaper.stats['deleted_total'] == 600
+
+    def test_round_skipped_without_lock(self):
+        reaper = make_reaper(50)
+        reaper.data_service.leader = False
+        assert reaper.run_once() == 0
+        assert reaper.data_service.calls == [] and reaper.stats['skipped_rounds'] == 1
+
+    def test_metrics(self):
+        reaper = make_reaper(5)
+        reaper.run_once()
+        metrics = reaper.metrics()
+        assert metrics['table'] == {'total': 0}
+        assert metrics['last_deleted'] == 5 and metrics['running'] is False
+        assert 'table' not in reaper.metrics(include_table=False)
+
+    def test_background_thread(self):
+        reaper = make_reaper(50, batch_size=10, interval_seconds=60)
+        reaper.start()
+        reaper.start()
+        try:
+            deadline = time.time() + 5
+            while reaper.stats['runs'] == 0 and time.time() < deadline:
+                time.sleep(0.01)
+            assert reaper.running
+            assert reaper.stats['deleted_total'] == 50
+        finally:
+            reaper.stop()
+        assert not reaper.running
@@ -260,14 +260,33 @@ class TestStudentDashboard(unittest.TestCase):
             col.__exit__ = Mock(return_value=None)
         mock_st.columns.return_value = mock_cols
         
-        with patch('components.student_dashboard.st', mock_st):
+        recommendations = [{
+            'id': 'q1', 'question': '计算 3/4 + 1/8', 'knowledge_point': '分数加法',
+            'subject': '数学', 'difficulty': 2, 'score': 1.0, 'reason': '基于错题推荐'
+        }]
+        
+        with patch('components.student_dashboard.st', mock_st), \
+                patch('components.student_dashboard.recommend_for_user', return_value=recommendations) as mock_recommend:
             self.dashboard.render_recommended_exercises('student_01')
             
             # 验证调用了正确的组件
+            mock_recommend.assert_called_once_with('student_01', k=5)
             mock_st.subheader.assert_called_once_with("🚀 推荐练习")
             mock_st.container.assert_called()
             mock_st.warning.assert_not_called()
     
+    def test_render_recommended_exercises_empty(self):
+        """测试没有可推荐题目时的提示"""
+        self.dashboard.user_management.get_user_by_id.return_value = self.test_user
+        mock_st = Mock()
+        
+        with patch('components.student_dashboard.st', mock_st), \
+                patch('components.student_dashboard.recommend_for_user', return_value=[]):
+            self.dashboard.render_recommended_exercises('student_01')
+            
+            mock_st.info.assert_called_once_with("暂无推荐练习，先去拍题练习吧！")
+            mock_st.container.assert_not_called()
+    
     def test_render_learning_trends_with_data(self):
         """测试学习趋势渲染（有数据）"""
         # 设置模拟返回值
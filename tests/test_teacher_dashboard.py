@@ -144,13 +144,13 @@ class TestTeacherDashboard:
         assert hasattr(teacher_dashboard, 'data_service')
         assert hasattr(teacher_dashboard, 'user_management')
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
-    @patch('streamlit.columns')
-    @patch('streamlit.metric')
-    @patch('streamlit.container')
-    @patch('streamlit.write')
-    @patch('streamlit.divider')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
+    @patch('components.teacher_dashboard.st.columns')
+    @patch('components.teacher_dashboard.st.metric')
+    @patch('components.teacher_dashboard.st.container')
+    @patch('components.teacher_dashboard.st.write')
+    @patch('components.teacher_dashboard.st.divider')
     def test_render_class_overview_success(self, mock_divider, mock_write, mock_container, 
                                          mock_metric, mock_columns, mock_warning, mock_subheader,
                                          teacher_dashboard, mock_teacher_data, mock_class_data):
@@ -182,16 +182,16 @@ class TestTeacherDashboard:
             # 由于Mock的限制，我们验证基本调用而不是具体次数
             assert mock_metric.called or mock_write.called
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
     def test_render_class_overview_no_teacher(self, mock_warning, mock_subheader, teacher_dashboard):
         """测试班级概览 - 无教师信息"""
         with patch.object(teacher_dashboard.user_management, 'get_user_by_id', return_value=None):
             teacher_dashboard.render_class_overview('invalid_id')
             mock_warning.assert_called_with("无法获取教师信息")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
     def test_render_class_overview_no_classes(self, mock_warning, mock_subheader, teacher_dashboard, mock_teacher_data):
         """测试班级概览 - 无管理班级"""
         with patch.object(teacher_dashboard.user_management, 'get_user_by_id', return_value=mock_teacher_data), \
@@ -199,12 +199,12 @@ class TestTeacherDashboard:
             teacher_dashboard.render_class_overview('teacher_01')
             mock_warning.assert_called_with("您还没有管理的班级")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
-    @patch('streamlit.write')
-    @patch('streamlit.plotly_chart')
-    @patch('streamlit.info')
-    @patch('streamlit.divider')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
+    @patch('components.teacher_dashboard.st.write')
+    @patch('components.teacher_dashboard.st.plotly_chart')
+    @patch('components.teacher_dashboard.st.info')
+    @patch('components.teacher_dashboard.st.divider')
     def test_render_subject_analysis_success(self, mock_divider, mock_info, mock_plotly_chart, 
                                            mock_write, mock_warning, mock_subheader,
                                            teacher_dashboard, mock_teacher_data, mock_class_data):
@@ -218,8 +218,8 @@ class TestTeacherDashboard:
             mock_subheader.assert_called_with("📚 学科分析")
             assert mock_write.call_count >= 2  # 至少2个学科
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
     def test_render_subject_analysis_no_subjects(self, mock_warning, mock_subheader, teacher_dashboard):
         """测试学科分析 - 无教授学科"""
         teacher_no_subjects = {'id': 'teacher_01', 'name': '张老师', 'role': 'teacher'}
@@ -227,13 +227,13 @@ class TestTeacherDashboard:
             teacher_dashboard.render_subject_analysis('teacher_01')
             mock_warning.assert_called_with("未设置教授学科")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
-    @patch('streamlit.dataframe')
-    @patch('streamlit.write')
-    @patch('streamlit.metric')
-    @patch('streamlit.columns')
-    @patch('streamlit.info')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
+    @patch('components.teacher_dashboard.st.dataframe')
+    @patch('components.teacher_dashboard.st.write')
+    @patch('components.teacher_dashboard.st.metric')
+    @patch('components.teacher_dashboard.st.columns')
+    @patch('components.teacher_dashboard.st.info')
     def test_render_student_ranking_success(self, mock_info, mock_columns, mock_metric, 
                                           mock_write, mock_dataframe, mock_warning, mock_subheader,
                                           teacher_dashboard, mock_student_data, mock_learning_stats):
@@ -251,24 +251,24 @@ class TestTeacherDashboard:
             mock_subheader.assert_called_with("🏆 学生排名")
             mock_dataframe.assert_called_once()
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
     def test_render_student_ranking_no_students(self, mock_warning, mock_subheader, teacher_dashboard):
         """测试学生排名 - 无管理学生"""
         with patch.object(teacher_dashboard.user_management, 'get_managed_students', return_value=[]):
             teacher_dashboard.render_student_ranking('teacher_01')
             mock_warning.assert_called_with("您还没有管理的学生")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.success')
-    @patch('streamlit.warning')
-    @patch('streamlit.write')
-    @patch('streamlit.metric')
-    @patch('streamlit.columns')
-    @patch('streamlit.button')
-    @patch('streamlit.info')
-    @patch('streamlit.divider')
-    @patch('streamlit.container')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.success')
+    @patch('components.teacher_dashboard.st.warning')
+    @patch('components.teacher_dashboard.st.write')
+    @patch('components.teacher_dashboard.st.metric')
+    @patch('components.teacher_dashboard.st.columns')
+    @patch('components.teacher_dashboard.st.button')
+    @patch('components.teacher_dashboard.st.info')
+    @patch('components.teacher_dashboard.st.divider')
+    @patch('components.teacher_dashboard.st.container')
     def test_render_attention_students_success(self, mock_container, mock_divider, mock_info, mock_button, 
                                              mock_columns, mock_metric, mock_write, 
                                              mock_warning, mock_success, mock_subheader,
@@ -298,8 +298,8 @@ class TestTeacherDashboard:
             # 验证调用
             mock_subheader.assert_called_with("⚠️ 重点关注学生")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.success')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.success')
     def test_render_attention_students_no_attention(self, mock_success, mock_subheader, teacher_dashboard):
         """测试重点关注学生 - 无需要关注的学生"""
         class_no_attention = [{'id': 'class_01', 'name': '五年级一班', 'needs_attention_students': []}]
@@ -307,12 +307,12 @@ class TestTeacherDashboard:
             teacher_dashboard.render_attention_students('teacher_01')
             mock_success.assert_called_with("目前没有需要特别关注的学生，班级表现良好！")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.warning')
-    @patch('streamlit.write')
-    @patch('streamlit.columns')
-    @patch('streamlit.divider')
-    @patch('streamlit.container')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.warning')
+    @patch('components.teacher_dashboard.st.write')
+    @patch('components.teacher_dashboard.st.columns')
+    @patch('components.teacher_dashboard.st.divider')
+    @patch('components.teacher_dashboard.st.container')
     def test_render_teaching_suggestions_success(self, mock_container, mock_divider, mock_columns, mock_write, 
                                                mock_warning, mock_subheader,
                                                teacher_dashboard, mock_teacher_data, mock_class_data):
@@ -339,11 +339,11 @@ class TestTeacherDashboard:
             # 验证调用
             mock_subheader.assert_called_with("💡 教学建议")
     
-    @patch('streamlit.subheader')
-    @patch('streamlit.button')
-    @patch('streamlit.success')
-    @patch('streamlit.info')
-    @patch('streamlit.divider')
+    @patch('components.teacher_dashboard.st.subheader')
+    @patch('components.teacher_dashboard.st.button')
+    @patch('components.teacher_dashboard.st.success')
+    @patch('components.teacher_dashboard.st.info')
+    @patch('components.teacher_dashboard.st.divider')
     def test_render_quick_actions(self, mock_divider, mock_info, mock_success, mock_button, mock_subheader,
                                 teacher_dashboard):
         """测试快速操作渲染"""
@@ -356,10 +356,10 @@ class TestTeacherDashboard:
         mock_subheader.assert_called_with("⚡ 快速操作")
         assert mock_button.call_count >= 6  # 6个快速操作按钮
     
-    @patch('streamlit.title')
-    @patch('streamlit.write')
-    @patch('streamlit.tabs')
-    @patch('streamlit.divider')
+    @patch('components.teacher_dashboard.st.title')
+    @patch('components.teacher_dashboard.st.write')
+    @patch('components.teacher_dashboard.st.tabs')
+    @patch('components.teacher_dashboard.st.divider')
     def test_render_teacher_dashboard_success(self, mock_divider, mock_tabs, mock_write, mock_title,
                                             teacher_dashboard, mock_teacher_data):
         """测试教师仪表盘主界面渲染成功"""
@@ -390,7 +390,7 @@ class TestTeacherDashboard:
                 "💡 教学建议"
             ])
     
-    @patch('streamlit.error')
+    @patch('components.teacher_dashboard.st.error')
     def test_render_teacher_dashboard_no_teacher(self, mock_error, teacher_dashboard):
         """测试教师仪表盘 - 无教师信息"""
         with patch.object(teacher_dashboard.user_management, 'get_user_by_id', return_value=None):
@@ -0,0 +1,161 @@
+"""
+认证缓存测试
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.auth_service import AuthService
+from services.token_cache import TokenCache, get_token_cache
+
+
+class TestTokenCache:
+    def test_claims_expire_at_token_exp_or_ttl(self):
+        cache = TokenCache(ttl_seconds=300)
+        cache.put_claims('a', {'sub': 'u1', 'exp': 1000}, now=900)
+        assert cache.get_claims('a', now=950) == (True, {'sub': 'u1', 'exp': 1000})
+        assert cache.get_claims('a', now=1000) == (False, None)
+
+        cache.put_claims('b', {'sub': 'u1', 'exp': 10000}, now=900)
+        assert cache.get_claims('b', now=1199)[0] is True
+        assert cache.get_claims('b', now=1200)[0] is False
+
+    def test_lru_bound(self):
+        cache = TokenCache(max_size=2)
+        cache.put_claims('a', {'sub': 'u1'})
+        cache.put_claims('b', {'sub': 'u1'})
+        cache.get_claims('a')
+        cache.put_claims('c', {'sub': 'u1'})
+        assert len(cache) == 2
+        assert cache.get_claims('b') == (False, None)
+        assert cache.get_claims('a')[0] is True
+
+    def test_revoked_tokens_are_rejected_and_pruned(self):
+        cache = TokenCache()
+        cache.put_claims('a', {'sub': 'u1', 'exp': 2000}, now=1000)
+        cache.revoke('a', 2000, now=1000)
+        assert cache.get_claims('a', now=1000) == (True, None)
+        cache.put_claims('a', {'sub': 'u1', 'exp': 2000}, now=1000)
+        assert cache.get_claims('a', now=1000) == (True, None)
+
+        cache.revoke('b', 3000, now=2500)
+        assert not cache.is_revoked('a')
+        assert cache.is_revoked('b')
+
+    def test_revoke_user_covers_evicted_tokens(self):
+        cache = TokenCache(max_size=1, session_ttl_seconds=60)
+        cache.track('u1', 'issued', 9e9)
+        cache.put_claims('a', {'sub': 'u1', 'exp': 9e9})
+        cache.put_claims('b', {'sub': 'u2', 'exp': 9e9})
+        cache.put_session('u1', 'r1', True)
+        cache.revoke_user('u1')
+        assert cache.is_revoked('issued') and cache.is_revoked('a')
+        assert not cache.is_revoked('b')
+        assert cache.get_session('r1') is False
+
+    def test_session_write_through_on_logout(self):
+        cache = TokenCache(session_ttl_seconds=60)
+        cache.put_session('u1', 'r1', True, access_hash='a1')
+        cache.put_session('u1', 'r2', True, access_hash='other')
+        cache.put_session('u2', 'r3', True, access_hash='a1')
+        cache.end_session('u1', 'a1')
+        assert cache.get_session('r1') is False
+        assert cache.get_session('r2') is None
+        assert cache.get_session('r3') is True
+
+    def test_valid_sessions_not_cached_by_default(self):
+        cache = TokenCache(session_ttl_seconds=0, ttl_seconds=300)
+        cache.put_session('u1', 'r1', True, access_hash='a1', now=1000)
+        assert cache.get_session('r1', now=1000) is None
+        # 无效的会话不会再变为有效，仍然缓存
+        cache.put_session('u1', 'r2', False, now=1000)
+        assert cache.get_session('r2', now=1299) is False
+        assert cache.get_session('r2', now=1300) is None
+
+    def test_session_entry_bounded_by_db_expiry(self):
+        cache = TokenCache(session_ttl_seconds=60)
+        cache.put_session('u1', 'r1', True, session_expires_at=1010, now=1000)
+        assert cache.get_session('r1', now=1005) is True
+        assert cache.get_session('r1', now=1010) is None
+
+    def test_shared_cache_is_keyed_by_secret(self):
+        assert get_token_cache('s1', 'HS256') is get_token_cache('s1', 'HS256')
+        assert get_token_cache('s1', 'HS256') is not get_token_cache('s2', 'HS256')
+
+
+@pytest.fixture
+def session():
+    return MagicMock()
+
+
+@pytest.fixture
+def auth_service(session):
+    data_service = MagicMock()
+    data_service.get_session.return_value.__enter__.return_value = session
+    with patch.dict(os.environ, {'JWT_SECRET': 'test-secret-key-for-token-cache-tests'}):
+        return AuthService(data_service, token_cache=TokenCache())
+
+
+class TestAuthServiceCaching:
+    def test_verify_token_decodes_once(self, auth_service):
+        token = auth_service.create_access_token('user_001', 'student')
+        with patch('services.auth_service.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(5):
+                assert auth_service.verify_token(token)['sub'] == 'user_001'
+        assert decode.call_count == 1
+
+    def test_cached_claims_are_copies(self, auth_service):
+        token = auth_service.create_access_token('user_001', 'student')
+        auth_service.verify_token(token)['role'] = 'admin'
+        assert auth_service.verify_token(token)['role'] == 'student'
+
+    def test_expired_token_not_cached(self, auth_service):
+        expired = jwt.encode({'sub': 'u', 'type': 'access', 'exp': datetime.utcnow() - timedelta(hours=1)},
+                             auth_service.jwt_secret, algorithm='HS256')
+        assert auth_service.verify_token(expired) is None
+        assert len(auth_service.token_cache) == 0
+
+    def test_logout_revokes_access_token(self, auth_service):
+        token = auth_service.create_access_token('user_001', 'student')
+        assert auth_service.verify_token(token) is not None
+        assert auth_service.logout_user('user_001', token) is True
+        assert auth_service.verify_token(token) is None
+
+    def test_password_change_revokes_all_tokens_and_sessions(self, auth_service, session):
+        auth_service.token_cache = TokenCache(session_ttl_seconds=60)
+        access = auth_service.create_access_token('user_001', 'student')
+        refresh = auth_service.create_refresh_token('user_001')
+        auth_service._save_user_session('user_001', access, refresh)
+        assert auth_service._is_session_valid('user_001', refresh) is True
+        session.execute.assert_called_once()
+
+        auth_service._invalidate_user_sessions('user_001')
+        assert auth_service.verify_token(access) is None
+        assert auth_service.verify_token(refresh) is None
+        assert auth_service._is_session_valid('user_001', refresh) is False
+
+    def test_refresh_uses_cached_session(self, auth_service, session):
+        auth_service.token_cache = TokenCache(session_ttl_seconds=60)
+        refresh = auth_service.create_refresh_token('user_001')
+        row = MagicMock(expires_at=datetime.utcnow() + timedelta(days=1))
+        session.execute.return_value.fetchone.return_value = row
+        assert auth_service._is_session_valid('user_001', refresh) is True
+        assert auth_service._is_session_valid('user_001', refresh) is True
+        assert session.execute.call_count == 1
+
+    def test_refresh_checks_database_by_default(self, auth_service, session):
+        # 其他worker上的登出只体现在数据库里，默认每次刷新都回源
+        refresh = auth_service.create_refresh_token('user_001')
+        session.execute.return_value.fetchone.return_value = MagicMock(
+            expires_at=datetime.utcnow() + timedelta(days=1))
+        assert auth_service._is_session_valid('user_001', refresh) is True
+        session.execute.return_value.fetchone.return_value = None
+        assert auth_service._is_session_valid('user_001', refresh) is False
+        assert session.execute.call_count == 2
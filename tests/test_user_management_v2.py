@@ -549,5 +549,63 @@ class TestUserManagementV2(unittest.TestCase):
         manager = self.um.get_grade_manager_by_grade('nonexistent')
         self.assertIsNone(manager)
 
+
+class TestLastLoginSideStore(unittest.TestCase):
+    """最后登录时间写入日志而不是重写名单文件"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.temp_dir, 'school_data_v2.json')
+        data = {'metadata': {'version': '2.0'}, 'users': [
+            {'id': 'student_01', 'name': '小明', 'role': 'student', 'last_login': '2025-07-12T10:00:00'},
+            {'id': 'student_02', 'name': '小红', 'role': 'student'},
+        ]}
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(self.data_file, 'rb') as f:
+            self.roster_bytes = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_login_does_not_rewrite_roster(self):
+        um = UserManagementV2(self.data_file)
+        for _ in range(40):
+            self.assertTrue(um.update_user_last_login('student_02'))
+        self.assertFalse(um.update_user_last_login('nonexistent'))
+
+        with open(self.data_file, 'rb') as f:
+            self.assertEqual(f.read(), self.roster_bytes)
+        self.assertIsNotNone(um.get_user_by_id('student_02')['last_login'])
+        with open(um.last_login_file, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 40)
+
+    def test_merged_on_read(self):
+        um = UserManagementV2(self.data_file)
+        um.update_user_last_login('student_01')
+        latest = um.get_user_by_id('student_01')['last_login']
+
+        # 新实例（如另一个进程）读取名单时合并日志
+        other = UserManagementV2(self.data_file)
+        self.assertEqual(other.get_user_by_id('student_01')['last_login'], latest)
+        self.assertNotIn('last_login', other.get_user_by_id('student_02'))
+
+    def test_log_is_compacted(self):
+        from core import user_management_v2 as module
+        um = UserManagementV2(self.data_file)
+        original = module.LAST_LOGIN_COMPACT_LINES
+        module.LAST_LOGIN_COMPACT_LINES = 5
+        try:
+            for _ in range(3):
+                um.update_user_last_login('student_01')
+                um.update_user_last_login('student_02')
+        finally:
+            module.LAST_LOGIN_COMPACT_LINES = original
+        with open(um.last_login_file, encoding='utf-8') as f:
+            self.assertLessEqual(len(f.readlines()), 3)
+        other = UserManagementV2(self.data_file)
+        self.assertEqual(other.get_user_by_id('student_02')['last_login'],
+                         um.get_user_by_id('student_02')['last_login'])
+
 if __name__ == '__main__':
     unittest.main(verbosity=2) 
\ No newline at end of file
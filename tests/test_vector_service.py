@@ -68,5 +68,85 @@ class TestVectorService(unittest.TestCase):
         self.assertEqual(len(results['ids'][0]), 1)
         self.assertEqual(results['ids'][0][0], "doc3", "The most similar document should be about Paris being the capital.")
 
+
+class TestVectorServiceClass(unittest.TestCase):
+    """Tests for the batched VectorService, using precomputed embeddings so no model download is needed."""
+
+    def setUp(self):
+        self.test_db_path = f'test_chroma_db_{uuid.uuid4()}'
+        os.makedirs(self.test_db_path, exist_ok=True)
+        chroma_client = vector_service.chromadb.PersistentClient(path=self.test_db_path)
+        self.service = vector_service.VectorService(f"test_collection_{uuid.uuid4().hex}", chroma_client=chroma_client, batch_size=7)
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            shutil.rmtree(self.test_db_path)
+
+    @staticmethod
+    def _embedding(i):
+        # One-hot style vectors make nearest-neighbour results deterministic.
+        vec = [0.0] * 32
+        vec[i % 32] = 1.0
+        return vec
+
+    def test_collection_handle_is_cached(self):
+        self.assertIs(self.service.collection, self.service.collection)
+
+    def test_add_documents_batch_upserts_in_chunks(self):
+        ids = [f"q{i}" for i in range(20)]
+        docs = [f"question {i}" for i in range(20)]
+        metas = [{"subject": "数学", "knowledge_point": None, "tags": ["a", "b"]} for _ in range(20)]
+        embeddings = [self._embedding(i) for i in range(20)]
+
+        self.assertEqual(self.service.add_documents_batch(ids, docs, metas, embeddings), 20)
+        self.assertEqual(self.service.count(), 20)
+
+        # Re-ingesting the same IDs overwrites rather than failing or duplicating.
+        docs[0] = "question 0 (edited)"
+        self.assertEqual(self.service.add_documents_batch(ids, docs, metas, embeddings), 20)
+        self.assertEqual(self.service.count(), 20)
+        stored = self.service.collection.get(ids=["q0"])
+        self.assertEqual(stored['documents'][0], "question 0 (edited)")
+        self.assertEqual(stored['metadatas'][0]['tags'], "a,b")
+
+    def test_bind_embedding_model(self):
+        client = self.service.client
+        service = vector_service.VectorService(f"test_collection_{uuid.uuid4().hex}", chroma_client=client)
+        client.get_or_create_collection(service.collection_name, metadata={"hnsw:space": "cosine"})
+
+        # An empty collection is tagged and keeps its distance function
+        self.assertTrue(service.bind_embedding_model("model-a"))
+        self.assertEqual(service.collection.metadata, {"hnsw:space": "cosine", "embedding_model": "model-a"})
+        service.add_documents_batch(["q1"], ["question 1"], None, [self._embedding(1)])
+        self.assertTrue(service.bind_embedding_model("model-a"))
+
+        # Vectors from another model are refused until the collection is reset
+        self.assertFalse(service.bind_embedding_model("model-b"))
+        service.reset("model-b")
+        self.assertEqual(service.count(), 0)
+        self.assertTrue(service.bind_embedding_model("model-b"))
+
+    def test_untagged_collection_with_vectors_is_refused(self):
+        self.service.add_documents_batch(["q1"], ["question 1"], None, [self._embedding(1)])
+        self.assertIsNone(self.service.embedding_model())
+        self.assertFalse(self.service.bind_embedding_model("model-a"))
+
+    def test_add_documents_batch_rejects_misaligned_input(self):
+        with self.assertRaises(ValueError):
+            self.service.add_documents_batch(["q1", "q2"], ["only one"])
+
+    def test_query_batch_returns_one_result_list_per_query(self):
+        ids = [f"q{i}" for i in range(5)]
+        self.service.add_documents_batch(ids, [f"question {i}" for i in range(5)],
+                                         [{"subject": "数学" if i % 2 else "语文"} for i in range(5)],
+                                         [self._embedding(i) for i in range(5)])
+
+        results = self.service.query_batch(query_embeddings=[self._embedding(1), self._embedding(3)], n_results=1)
+        self.assertEqual([r[0] for r in results['ids']], ["q1", "q3"])
+
+        filtered = self.service.query_batch(query_embeddings=[self._embedding(1)], n_results=5, where={"subject": "语文"})
+        self.assertEqual(set(filtered['ids'][0]), {"q0", "q2", "q4"})
+        self.assertIsNone(self.service.query_batch([]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file